@@ -0,0 +1,107 @@
+# analisis/anotacion.py
+
+from datetime import datetime
+from analisis.periodo import en_periodo
+from analisis.estadisticas import EstadisticasTiempos
+
+# Tiempos que se acumulan antes de volcarlos por lotes en las estadísticas.
+_TAMANO_LOTE_TIEMPOS = 4096
+
+
+class AuditoriaAnotacion:
+    """
+    Pruebas de auditoría V.2: tiempos de anotación en el RCF de las facturas electrónicas
+    registradas dentro del periodo. Se alimenta fila a fila con procesar().
+
+    Los tiempos no se guardan: se acumulan en unas EstadisticasTiempos por mes de
+    registro, y las del periodo completo se obtienen fusionando las mensuales. El
+    detalle por factura sólo se conserva para la página pedida (detalle=(pagina, por_pagina)).
+    """
+
+    COLUMNAS = ('id', 'numero_factura', 'proveedor_nif', 'fecha_factura',
+                'fecha_presentacion_registro', 'fecha_registro_rcf')
+
+    def __init__(self, fecha_inicio_str, fecha_fin_str, detalle=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.total_facturas = 0
+        self.facturas_sin_fechas = []
+        self.estadisticas_mes = {}
+        self._pendientes = {}
+        self.detalle = detalle
+        self.total_tiempos = 0
+        self.tiempos_detalle = []
+
+    def filtros(self):
+        return [('eq', 'es_electronica', True),
+                ('gte', 'fecha_registro_rcf', self.fecha_inicio_str),
+                ('lte', 'fecha_registro_rcf', self.fecha_fin_str)]
+
+    def aplica(self, f):
+        return f.get('es_electronica') is True and \
+            en_periodo(f.get('fecha_registro_rcf'), self.fecha_inicio_str, self.fecha_fin_str)
+
+    def procesar(self, f):
+        self.total_facturas += 1
+        f_presentacion = f.get('fecha_presentacion_registro')
+        f_registro = f.get('fecha_registro_rcf')
+        if not f_presentacion or not f_registro:
+            self.facturas_sin_fechas.append(f.get('id'))
+            return
+        try:
+            dt_presentacion = datetime.fromisoformat(f_presentacion.replace('Z', '+00:00'))
+            dt_registro = datetime.fromisoformat(f_registro.replace('Z', '+00:00'))
+            diferencia_minutos = (dt_registro - dt_presentacion).total_seconds() / 60
+        except Exception as e:
+            self.facturas_sin_fechas.append(f.get('id'))
+            return
+        self._agregar_tiempo(dt_registro.strftime('%Y-%m'), f.get('id'), diferencia_minutos)
+
+    def _agregar_tiempo(self, mes, factura_id, minutos):
+        pendientes = self._pendientes.setdefault(mes, [])
+        pendientes.append(minutos)
+        if len(pendientes) >= _TAMANO_LOTE_TIEMPOS:
+            self._volcar(mes)
+        if self.detalle:
+            pagina, por_pagina = self.detalle
+            if (pagina - 1) * por_pagina <= self.total_tiempos < pagina * por_pagina:
+                self.tiempos_detalle.append({"id": factura_id, "minutos": minutos})
+        self.total_tiempos += 1
+
+    def _volcar(self, mes):
+        if mes not in self.estadisticas_mes:
+            self.estadisticas_mes[mes] = EstadisticasTiempos()
+        self.estadisticas_mes[mes].agregar_lote(self._pendientes.pop(mes))
+
+    def resultado(self):
+        for mes in list(self._pendientes):
+            self._volcar(mes)
+        total = EstadisticasTiempos()
+        for estadisticas in self.estadisticas_mes.values():
+            total.fusionar(estadisticas)
+        resultado = {
+            "periodo_analizado": {"inicio": self.fecha_inicio_str, "fin": self.fecha_fin_str},
+            "total_facturas_electronicas_analizadas": self.total_facturas,
+            "tiempos_anotacion": total.resumen(),
+            "tiempos_anotacion_por_mes": {
+                mes: self.estadisticas_mes[mes].resumen() for mes in sorted(self.estadisticas_mes)
+            },
+            "facturas_sin_fechas": self.facturas_sin_fechas
+        }
+        if self.detalle:
+            pagina, por_pagina = self.detalle
+            resultado["tiempos_anotacion"]["detalle"] = {
+                "pagina": pagina,
+                "por_pagina": por_pagina,
+                "total": self.total_tiempos,
+                "tiempos": self.tiempos_detalle,
+            }
+        return resultado
+
+
+def combinar_estadisticas(sketches):
+    """Fusiona estadísticas serializadas (p. ej. las mensuales) en un único resumen."""
+    total = EstadisticasTiempos()
+    for datos in sketches:
+        total.fusionar(EstadisticasTiempos.desde_dict(datos))
+    return total.resumen()
@@ -0,0 +1,30 @@
+# analisis/completa.py
+
+
+def columnas_union(auditorias):
+    """Columnas que necesita el conjunto de auditorías, más las que usan sus predicados."""
+    columnas = ['es_electronica']
+    for auditoria in auditorias:
+        columnas += [c for c in auditoria.COLUMNAS if c not in columnas]
+    for columna in ('fecha_registro_rcf', 'fecha_factura'):
+        if columna not in columnas:
+            columnas.append(columna)
+    return ', '.join(columnas)
+
+
+def filtro_union(auditorias):
+    """Filtro 'or_' que selecciona de una vez las filas que necesita cualquiera de las auditorías."""
+    grupos = []
+    for auditoria in auditorias:
+        grupo = auditoria.filtros()
+        if grupo not in grupos:
+            grupos.append(grupo)
+    return [('or_', None, grupos)]
+
+
+def ejecutar_en_un_recorrido(filas, auditorias):
+    """Reparte cada fila entre las auditorías a las que corresponde."""
+    for f in filas:
+        for auditoria in auditorias:
+            if auditoria.aplica(f):
+                auditoria.procesar(f)
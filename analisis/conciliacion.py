@@ -0,0 +1,304 @@
+# analisis/conciliacion.py
+#
+# Conciliación del registro de facturas de la plataforma (FACe) con su anotación en el
+# RCF ('facturas'). Es un hash join: el registro, acotado al periodo exportado, se indexa
+# en memoria por número de registro y por (NIF, número, fecha de la factura), y las
+# facturas del RCF, el lado mayor, se recorren por bloques buscando cada una en esos
+# índices de una vez (pandas.Index.get_indexer). Del RCF sólo se conservan contadores y
+# las filas de detalle, hasta LIMITE_DETALLE.
+
+import datetime
+import numpy as np
+import pandas as pd
+from analisis.importes import a_centimos, a_euros
+from analisis.nif import normalizar_nifs
+
+# Filas de cada lista de detalle (el resto sólo cuenta).
+LIMITE_DETALLE = 1000
+
+# Facturas del RCF que se concilian a la vez.
+TAMANO_BLOQUE_CONCILIACION = 50000
+
+# Diferencia entre la fecha de registro de la plataforma y la de presentación en el RCF
+# que no se considera discrepancia (absorbe horas locales frente a UTC).
+TOLERANCIA_FECHA_REGISTRO = pd.Timedelta(hours=24)
+
+CAMPOS_DISCREPANCIA = ('importe', 'fecha_factura', 'fecha_registro', 'proveedor_nif', 'numero_factura')
+
+
+def _texto(valores):
+    """Texto normalizado para comparar claves (sin espacios, en mayúsculas); nulos y vacíos como None."""
+    # Una pasada en Python por valor es más rápida que encadenar métodos .str de pandas.
+    return pd.Series([''.join(str(v).split()).upper() or None if v is not None and v == v else None
+                      for v in np.asarray(valores, dtype=object).tolist()], dtype=object)
+
+
+def _nifs(valores):
+    """NIF en su forma canónica (analisis.nif), como se guardan al importar; nulos como None."""
+    return pd.Series(normalizar_nifs(pd.Series(valores, dtype=object).to_numpy()), dtype=object)
+
+
+def _instantes(valores):
+    """Instantes (datetime64 sin zona, en UTC) de fechas en texto ISO 8601 o ya convertidas."""
+    serie = pd.Series(valores).reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.tz_convert('UTC').dt.tz_localize(None) if serie.dt.tz is not None else serie
+    instantes = pd.to_datetime(serie.astype(object), utc=True, format='ISO8601', errors='coerce')
+    return instantes.dt.tz_localize(None)
+
+
+def _dias(instantes):
+    """Fecha AAAA-MM-DD de cada instante (NaN para los nulos)."""
+    dias = pd.Series(np.datetime_as_string(instantes.to_numpy(dtype='datetime64[D]'), unit='D'), dtype=object)
+    return dias.where(instantes.notna().to_numpy())
+
+
+def _dias_fecha(valores):
+    """
+    Como _dias(_instantes(valores)), sin convertir las fechas que ya están en texto como
+    AAAA-MM-DD (las de fecha_factura en 'facturas').
+    """
+    valores = np.asarray(valores, dtype=object)
+    dias = pd.Series([v if type(v) is str and len(v) == 10 and v[4] == '-' and v[7] == '-' else None
+                      for v in valores.tolist()], dtype=object)
+    resto = (dias.isna() & pd.notna(valores)).to_numpy()
+    if resto.any():
+        dias[resto] = _dias(_instantes(valores[resto])).to_numpy()
+    return dias
+
+
+def _clave_factura(nifs, numeros, dias):
+    """Clave NIF|número|fecha (NaN si falta alguna parte)."""
+    return nifs.str.cat([numeros, dias], sep='|')
+
+
+def _primeras(claves):
+    """Índice de las claves no nulas (primera aparición) y la posición de cada una en el lado indexado."""
+    primeras = (claves.notna() & ~claves.duplicated()).to_numpy()
+    return pd.Index(claves[primeras].to_numpy()), np.flatnonzero(primeras)
+
+
+def _buscar(indice, posiciones, claves):
+    """Posición en el lado indexado de cada clave (-1 si no está)."""
+    if not len(indice):
+        return np.full(len(claves), -1, dtype=np.int64)
+    encontradas = indice.get_indexer(claves.to_numpy())
+    return np.where(encontradas >= 0, posiciones[np.maximum(encontradas, 0)], -1)
+
+
+def _valor(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.isoformat()
+    return valor
+
+
+class ConciliacionRegistro:
+    """
+    Conciliación del registro de la plataforma (importacion.registro.leer_registro) con las
+    facturas del RCF entre 'fecha_inicio' y 'fecha_fin' (AAAA-MM-DD, por la fecha de registro;
+    por defecto, las del propio registro). Cada factura del RCF se empareja por su número de
+    registro y, si no lo tiene o no está en el registro, por NIF, número y fecha. Se
+    alimenta con bloques de facturas con procesar_lote(); resultado() devuelve las facturas
+    que faltan en el RCF (con los días pendientes hasta 'fecha_corte', hoy por defecto), las
+    del RCF que faltan en la plataforma y las discrepancias de importe, fechas, NIF y número.
+    """
+
+    COLUMNAS = ('id', 'numero_registro', 'numero_factura', 'proveedor_nif', 'fecha_factura', 'total_factura',
+                'fecha_presentacion_registro', 'fecha_registro_rcf')
+    # Columnas que 'facturas' puede no tener (añadidas después del esquema inicial): si
+    # faltan no se leen, y las facturas se emparejan sólo por NIF, número y fecha.
+    COLUMNAS_OPCIONALES = ('numero_registro',)
+
+    def __init__(self, registro, fecha_inicio=None, fecha_fin=None, fecha_corte=None, plataforma=None):
+        self.registro = registro.reset_index(drop=True)
+        self.plataforma = plataforma
+        self.fecha_corte = fecha_corte or datetime.date.today().isoformat()
+
+        self.numeros_registro = _texto(self.registro['numero_registro'])
+        nifs = _nifs(self.registro['proveedor_nif'])
+        numeros = _texto(self.registro['numero_factura'])
+        fechas_factura = _dias(_instantes(self.registro['fecha_factura']))
+        self.claves_factura = _clave_factura(nifs, numeros, fechas_factura)
+        self.sin_clave = (self.numeros_registro.isna() & self.claves_factura.isna()).to_numpy()
+        self.nifs_texto = nifs.to_numpy()
+        self.numeros = numeros.to_numpy()
+        self.fechas_factura = fechas_factura.to_numpy()
+        self.fechas_registro = _instantes(self.registro['fecha_registro']).to_numpy()
+        # Importes del registro ya en céntimos (Int64 con nulos, como los lee importacion.registro).
+        importes = pd.array(self.registro['total_factura'], dtype='Int64')
+        self.centimos = importes.to_numpy(dtype=np.int64, na_value=0)
+        self.importe_valido = ~importes.isna()
+
+        # Índices del hash join: clave -> posición de su primera fila en el registro.
+        self.por_registro = _primeras(self.numeros_registro)
+        self.por_factura = _primeras(self.claves_factura)
+
+        dias_registro = _dias(pd.Series(self.fechas_registro)).dropna()
+        self.fecha_inicio = fecha_inicio or (dias_registro.min() if len(dias_registro) else None)
+        self.fecha_fin = fecha_fin or (dias_registro.max() if len(dias_registro) else None)
+
+        self.emparejado = np.zeros(len(self.registro), dtype=bool)
+        self.total_facturas_rcf = 0
+        self.emparejadas_por_registro = 0
+        self.emparejadas_por_factura = 0
+        self.total_faltan_en_plataforma = 0
+        self.faltan_en_plataforma = []
+        self.discrepancias_por_campo = {campo: 0 for campo in CAMPOS_DISCREPANCIA}
+        self.discrepancias = []
+
+    def filtros(self):
+        # Una factura registrada en el periodo se expidió, como tarde, al final del periodo.
+        filtros = [('eq', 'es_electronica', True)]
+        if self.plataforma:
+            filtros.append(('eq', 'plataforma', self.plataforma))
+        if self.fecha_fin:
+            filtros.append(('lte', 'fecha_factura', self.fecha_fin))
+        return filtros
+
+    def _en_periodo(self, dias):
+        en_periodo = dias.notna()
+        if self.fecha_inicio:
+            en_periodo &= dias >= self.fecha_inicio
+        if self.fecha_fin:
+            en_periodo &= dias <= self.fecha_fin
+        return en_periodo.to_numpy()
+
+    def _discrepancias(self, facturas, rcf, presentacion, filas, posiciones):
+        """
+        Compara los campos de las facturas del RCF emparejadas ('filas', con su fecha, NIF y
+        número ya normalizados en 'rcf' y su fecha de presentación en 'presentacion') con su
+        fila del registro ('posiciones').
+        """
+        centimos_rcf, importe_valido_rcf = a_centimos(pd.Series(facturas['total_factura'], dtype=object))
+        plataforma = {'fecha_factura': self.fechas_factura, 'proveedor_nif': self.nifs_texto,
+                      'numero_factura': self.numeros}
+
+        distinto = {
+            'importe': self.importe_valido[posiciones] & importe_valido_rcf[filas]
+            & (self.centimos[posiciones] != centimos_rcf[filas]),
+            'fecha_registro': np.abs(self.fechas_registro[posiciones] - presentacion[filas])
+            > TOLERANCIA_FECHA_REGISTRO.to_timedelta64(),
+        }
+        for campo in ('fecha_factura', 'proveedor_nif', 'numero_factura'):
+            a, b = plataforma[campo][posiciones], rcf[campo][filas]
+            distinto[campo] = pd.notna(a) & pd.notna(b) & (a != b)
+        valores = {
+            'importe': lambda p, f: (a_euros(self.centimos[p]), a_euros(centimos_rcf[f])),
+            'fecha_factura': lambda p, f: (self.fechas_factura[p], rcf['fecha_factura'][f]),
+            'fecha_registro': lambda p, f: (pd.Timestamp(self.fechas_registro[p]), pd.Timestamp(presentacion[f])),
+            'proveedor_nif': lambda p, f: (self.registro['proveedor_nif'][p], facturas['proveedor_nif'][f]),
+            'numero_factura': lambda p, f: (self.registro['numero_factura'][p], facturas['numero_factura'][f]),
+        }
+        for campo in CAMPOS_DISCREPANCIA:
+            mascara = distinto[campo]
+            self.discrepancias_por_campo[campo] += int(mascara.sum())
+            for i in np.flatnonzero(mascara)[:max(LIMITE_DETALLE - len(self.discrepancias), 0)].tolist():
+                p, f = int(posiciones[i]), int(filas[i])
+                valor_plataforma, valor_rcf = valores[campo](p, f)
+                self.discrepancias.append({
+                    "numero_registro": _valor(self.registro['numero_registro'][p]),
+                    "factura_id": _valor(facturas['id'][f]),
+                    "numero_factura": _valor(self.registro['numero_factura'][p]),
+                    "proveedor_nif": _valor(self.registro['proveedor_nif'][p]),
+                    "campo": campo,
+                    "valor_plataforma": _valor(valor_plataforma),
+                    "valor_rcf": _valor(valor_rcf),
+                })
+
+    def procesar_lote(self, filas):
+        """Concilia un bloque de facturas del RCF (diccionarios con las COLUMNAS; las opcionales pueden faltar)."""
+        facturas = pd.DataFrame(filas, columns=list(self.COLUMNAS), dtype=object)
+        self.total_facturas_rcf += len(facturas)
+        if not len(facturas):
+            return
+
+        posiciones = _buscar(*self.por_registro, _texto(facturas['numero_registro']))
+        por_registro = posiciones >= 0
+        nifs, numeros = _nifs(facturas['proveedor_nif']), _texto(facturas['numero_factura'])
+        fechas = _dias_fecha(facturas['fecha_factura'])
+        claves = _clave_factura(nifs, numeros, fechas)
+        posiciones = np.where(por_registro, posiciones, _buscar(*self.por_factura, claves))
+        emparejadas = posiciones >= 0
+        self.emparejadas_por_registro += int(por_registro.sum())
+        self.emparejadas_por_factura += int((emparejadas & ~por_registro).sum())
+        self.emparejado[posiciones[emparejadas]] = True
+        presentacion = _instantes(facturas['fecha_presentacion_registro'])
+        rcf = {'fecha_factura': fechas.to_numpy(), 'proveedor_nif': nifs.to_numpy(),
+               'numero_factura': numeros.to_numpy()}
+        self._discrepancias(facturas, rcf, presentacion.to_numpy(), np.flatnonzero(emparejadas),
+                            posiciones[emparejadas])
+
+        # Las del RCF sin pareja sólo faltan en la plataforma si entraron en el periodo conciliado.
+        entrada = presentacion.copy()
+        sin_presentacion = (~emparejadas & entrada.isna().to_numpy())
+        if sin_presentacion.any():
+            entrada[sin_presentacion] = _instantes(facturas['fecha_registro_rcf'][sin_presentacion]).to_numpy()
+        faltan = ~emparejadas & self._en_periodo(_dias(entrada))
+        self.total_faltan_en_plataforma += int(faltan.sum())
+        for f in np.flatnonzero(faltan)[:max(LIMITE_DETALLE - len(self.faltan_en_plataforma), 0)].tolist():
+            fila = facturas.iloc[f]
+            self.faltan_en_plataforma.append({
+                "factura_id": _valor(fila['id']),
+                "numero_registro": _valor(fila['numero_registro']),
+                "numero_factura": _valor(fila['numero_factura']),
+                "proveedor_nif": _valor(fila['proveedor_nif']),
+                "fecha_factura": _valor(fila['fecha_factura']),
+                "importe": _valor(fila['total_factura']),
+                "fecha_presentacion_registro": _valor(entrada[f]),
+            })
+
+    def _faltan_en_rcf(self):
+        """
+        Filas del registro sin factura en el RCF. Una factura registrada varias veces (mismo
+        NIF, número y fecha) cuenta una sola vez y no falta si alguno de sus registros se emparejó.
+        """
+        codigos, _ = pd.factorize(self.claves_factura)
+        con_clave = codigos >= 0
+        grupo_emparejado = np.bincount(codigos[con_clave], weights=self.emparejado[con_clave],
+                                       minlength=codigos.max() + 1 if len(codigos) else 0) > 0
+        emparejado = self.emparejado.copy()
+        emparejado[con_clave] |= grupo_emparejado[codigos[con_clave]]
+        repetida = ((self.claves_factura.notna() & self.claves_factura.duplicated()) |
+                    (self.numeros_registro.notna() & self.numeros_registro.duplicated())).to_numpy()
+        fechas_registro = pd.Series(self.fechas_registro)
+        # Las filas sin fecha de registro están en el registro exportado: no se descartan por periodo.
+        dias_registro = _dias(fechas_registro)
+        en_periodo = self._en_periodo(dias_registro) | dias_registro.isna().to_numpy()
+        faltan = ~emparejado & ~repetida & ~self.sin_clave & en_periodo
+
+        pendientes = (pd.Timestamp(self.fecha_corte) - fechas_registro.dt.normalize()).dt.days
+        orden = np.flatnonzero(faltan)
+        orden = orden[np.argsort(-pendientes.to_numpy(dtype=float, na_value=-1)[orden], kind='stable')]
+        filas = [{
+            "numero_registro": _valor(self.registro['numero_registro'][p]),
+            "numero_factura": _valor(self.registro['numero_factura'][p]),
+            "proveedor_nif": _valor(self.registro['proveedor_nif'][p]),
+            "nombre_proveedor": _valor(self.registro['nombre_proveedor'][p]),
+            "fecha_factura": _valor(self.fechas_factura[p]),
+            "importe": a_euros(self.centimos[p]) if self.importe_valido[p] else None,
+            "fecha_registro": _valor(fechas_registro[p]),
+            "dias_pendientes": int(pendientes[p]) if pd.notna(pendientes[p]) else None,
+        } for p in orden[:LIMITE_DETALLE].tolist()]
+        return int(faltan.sum()), int(repetida.sum()), filas
+
+    def resultado(self):
+        total_faltan, repetidas, faltan_en_rcf = self._faltan_en_rcf()
+        return {
+            "periodo": {"inicio": self.fecha_inicio, "fin": self.fecha_fin},
+            "fecha_corte": self.fecha_corte,
+            "total_registro": len(self.registro),
+            "registros_sin_clave": int(self.sin_clave.sum()),
+            "registros_repetidos": repetidas,
+            "total_facturas_rcf": self.total_facturas_rcf,
+            "emparejadas": int(self.emparejado.sum()),
+            "emparejadas_por_registro": self.emparejadas_por_registro,
+            "emparejadas_por_factura": self.emparejadas_por_factura,
+            "total_faltan_en_rcf": total_faltan,
+            "faltan_en_rcf": faltan_en_rcf,
+            "total_faltan_en_plataforma": self.total_faltan_en_plataforma,
+            "faltan_en_plataforma": self.faltan_en_plataforma,
+            "discrepancias_por_campo": self.discrepancias_por_campo,
+            "discrepancias": self.discrepancias,
+        }
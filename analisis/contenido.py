@@ -0,0 +1,122 @@
+# analisis/contenido.py
+
+import numpy as np
+from analisis.nif import validar_nifs
+from datos.dir3 import MOTIVOS_DIR3
+
+# Documentos no válidos que se devuelven con su detalle (el resto sólo cuenta).
+LIMITE_DETALLE = 1000
+
+
+def _porcentaje(parte, total):
+    return round(parte * 100 / total, 2) if total else 0.0
+
+
+class ValidacionesContenido:
+    """
+    Validaciones del contenido de las facturas (Orden HAP/1650/2015) a partir del resumen
+    de los documentos Facturae importados (importacion.facturae) y de la verificación de su
+    firma (importacion.firma): cuenta los documentos y sus facturas, y los que no superan
+    cada validación. Se alimenta fila a fila con procesar() (documentos) y
+    procesar_firma() (firmas); el NIF del emisor de todos los documentos se valida de una vez
+    en resultado() (analisis.nif). Con 'catalogo' (datos.dir3.CatalogoDIR3), resultado() valida
+    además de una vez los códigos DIR3 de todos los documentos.
+    """
+
+    COLUMNAS = ('id', 'nombre', 'origen', 'formato_valido', 'numero_facturas', 'errores', 'proveedor_nif',
+                'oficina_contable', 'organo_gestor', 'unidad_tramitadora')
+    COLUMNAS_FIRMAS = ('id', 'nombre', 'origen', 'firmado', 'firma_valida', 'numero_facturas', 'errores')
+
+    def __init__(self, catalogo=None):
+        self.catalogo = catalogo
+        self.total_documentos = 0
+        self.total_facturas = 0
+        self.documentos_firma_verificada = 0
+        self.no_validos = {
+            "Formato Facturae": {"documentos": 0, "facturas": 0},
+            "Firma electrónica": {"documentos": 0, "facturas": 0},
+            "NIF emisor": {"documentos": 0, "facturas": 0},
+            "Códigos DIR3": {"documentos": 0, "facturas": 0},
+        }
+        self.detalle = []
+        self.documentos = []
+        self.nifs = []
+        self.ternas = ([], [], [])
+        # Documentos ya validados por resultado(), que se puede llamar más de una vez.
+        self.validados = 0
+        self.motivos_dir3 = {clave: 0 for clave, _ in MOTIVOS_DIR3.values()}
+
+    def filtros(self):
+        return []
+
+    def _no_valido(self, validacion, d, errores=None):
+        facturas = d.get('numero_facturas') or 0
+        self.no_validos[validacion]["documentos"] += 1
+        self.no_validos[validacion]["facturas"] += facturas
+        if len(self.detalle) < LIMITE_DETALLE:
+            self.detalle.append({
+                "nombre": d.get('nombre'),
+                "origen": d.get('origen'),
+                "validacion": validacion,
+                "errores": errores if errores is not None else d.get('errores') or [],
+            })
+
+    def procesar(self, d):
+        self.total_documentos += 1
+        self.total_facturas += d.get('numero_facturas') or 0
+        if d.get('formato_valido') is not True:
+            self._no_valido("Formato Facturae", d)
+        self.documentos.append({c: d.get(c) for c in ('nombre', 'origen', 'numero_facturas')})
+        self.nifs.append(d.get('proveedor_nif'))
+        if self.catalogo is not None:
+            for codigos, papel in zip(self.ternas, ('oficina_contable', 'organo_gestor', 'unidad_tramitadora')):
+                codigos.append(d.get(papel))
+
+    def procesar_firma(self, f):
+        self.documentos_firma_verificada += 1
+        if f.get('firma_valida') is not True:
+            self._no_valido("Firma electrónica", f)
+
+    def _validar_nifs(self, desde):
+        """Documentos (a partir de 'desde') cuyo NIF emisor no tiene formato o carácter de control correctos."""
+        validos, _ = validar_nifs(self.nifs[desde:])
+        for posicion in (desde + np.flatnonzero(~validos)).tolist():
+            nif = self.nifs[posicion]
+            self._no_valido("NIF emisor", self.documentos[posicion],
+                            [f"NIF no válido: {nif}" if nif else "Sin NIF del emisor"])
+
+    def _validar_dir3(self, desde):
+        """Suma a motivos_dir3 las facturas por motivo DIR3 desde 'desde'; los no válidos pasan al detalle."""
+        if desde >= len(self.documentos):
+            return
+        mascaras = self.catalogo.validar_ternas(*(codigos[desde:] for codigos in self.ternas))
+        for posicion in (desde + np.flatnonzero(mascaras)).tolist():
+            d, mascara = self.documentos[posicion], int(mascaras[posicion - desde])
+            for bit, (clave, _) in MOTIVOS_DIR3.items():
+                if mascara & bit:
+                    self.motivos_dir3[clave] += d.get('numero_facturas') or 0
+            self._no_valido("Códigos DIR3", d, [texto for bit, (_, texto) in MOTIVOS_DIR3.items() if mascara & bit])
+
+    def resultado(self):
+        # Sólo se validan los documentos recibidos desde la llamada anterior.
+        self._validar_nifs(self.validados)
+        motivos_dir3 = None
+        if self.catalogo is not None and self.catalogo.disponible:
+            self._validar_dir3(self.validados)
+            motivos_dir3 = dict(self.motivos_dir3)
+        self.validados = len(self.documentos)
+        return {
+            "total_documentos": self.total_documentos,
+            "total_facturas": self.total_facturas,
+            "documentos_firma_verificada": self.documentos_firma_verificada,
+            "validaciones": [{
+                "validacion": validacion,
+                "documentos_no_validos": no_validos["documentos"],
+                "facturas_no_validas": no_validos["facturas"],
+                "porcentaje": _porcentaje(no_validos["facturas"], self.total_facturas),
+            } for validacion, no_validos in self.no_validos.items()
+                if validacion != "Códigos DIR3" or motivos_dir3 is not None],
+            "documentos_no_validos": self.detalle,
+            "catalogo_dir3": self.catalogo.resumen() if motivos_dir3 is not None else None,
+            "motivos_dir3": motivos_dir3,
+        }
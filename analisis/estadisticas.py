@@ -0,0 +1,181 @@
+# analisis/estadisticas.py
+
+import math
+import numpy as np
+
+# Límites (en minutos) del histograma de tiempos de anotación. El último tramo es abierto.
+LIMITES_HISTOGRAMA_MINUTOS = [0, 15, 30, 60, 120, 240, 480, 1440, 2880, 10080, 43200]
+
+# Valores más próximos a cero que esto se cuentan como cero en el sketch.
+_MINIMO_INDEXABLE = 1e-9
+
+
+class SketchCuantiles:
+    """
+    Sketch de cuantiles con error relativo acotado (algoritmo DDSketch).
+
+    Cada valor se asigna a un cubo logarítmico ceil(log_gamma(|x|)), por lo que el
+    cuantil devuelto difiere del real como mucho en 'precision_relativa' (1 % por
+    defecto). Ocupa memoria proporcional al rango de magnitudes, no al número de
+    valores, y dos sketches con la misma precisión se fusionan sumando sus cubos.
+    """
+
+    def __init__(self, precision_relativa=0.01):
+        self.precision_relativa = precision_relativa
+        self.gamma = (1 + precision_relativa) / (1 - precision_relativa)
+        self._log_gamma = math.log(self.gamma)
+        self.positivos = {}
+        self.negativos = {}
+        self.ceros = 0
+        self.total = 0
+
+    def agregar_lote(self, valores):
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[np.isfinite(valores)]
+        positivos = valores[valores > _MINIMO_INDEXABLE]
+        negativos = -valores[valores < -_MINIMO_INDEXABLE]
+        self.ceros += len(valores) - len(positivos) - len(negativos)
+        self.total += len(valores)
+        for cubos, magnitudes in ((self.positivos, positivos), (self.negativos, negativos)):
+            if not len(magnitudes):
+                continue
+            indices = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+            unicos, cuentas = np.unique(indices, return_counts=True)
+            for indice, cuenta in zip(unicos.tolist(), cuentas.tolist()):
+                cubos[indice] = cubos.get(indice, 0) + cuenta
+
+    def fusionar(self, otro):
+        if otro.precision_relativa != self.precision_relativa:
+            raise ValueError("Sólo se pueden fusionar sketches con la misma precisión relativa")
+        for cubos, otros in ((self.positivos, otro.positivos), (self.negativos, otro.negativos)):
+            for indice, cuenta in otros.items():
+                cubos[indice] = cubos.get(indice, 0) + cuenta
+        self.ceros += otro.ceros
+        self.total += otro.total
+        return self
+
+    def _valor_cubo(self, indice):
+        return 2 * self.gamma ** indice / (self.gamma + 1)
+
+    def cuantil(self, q):
+        if not self.total:
+            return None
+        rango = q * (self.total - 1)
+        acumulado = 0
+        for indice in sorted(self.negativos, reverse=True):
+            acumulado += self.negativos[indice]
+            if acumulado > rango:
+                return -self._valor_cubo(indice)
+        acumulado += self.ceros
+        if acumulado > rango:
+            return 0.0
+        for indice in sorted(self.positivos):
+            acumulado += self.positivos[indice]
+            if acumulado > rango:
+                return self._valor_cubo(indice)
+        return self._valor_cubo(max(self.positivos))
+
+    def a_dict(self):
+        return {
+            "precision_relativa": self.precision_relativa,
+            "positivos": {str(i): n for i, n in self.positivos.items()},
+            "negativos": {str(i): n for i, n in self.negativos.items()},
+            "ceros": self.ceros,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sketch = cls(datos["precision_relativa"])
+        sketch.positivos = {int(i): n for i, n in datos.get("positivos", {}).items()}
+        sketch.negativos = {int(i): n for i, n in datos.get("negativos", {}).items()}
+        sketch.ceros = datos.get("ceros", 0)
+        sketch.total = sum(sketch.positivos.values()) + sum(sketch.negativos.values()) + sketch.ceros
+        return sketch
+
+
+class EstadisticasTiempos:
+    """
+    Acumulador en streaming de tiempos (en minutos): total, media, mínimo, máximo,
+    percentiles mediante SketchCuantiles e histograma de tramos fijos.
+    Su estado cabe en unos pocos KB y es fusionable, de modo que las estadísticas
+    anuales se obtienen combinando las mensuales sin releer facturas.
+    """
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, limites=None, precision_relativa=0.01):
+        self.limites = list(limites or LIMITES_HISTOGRAMA_MINUTOS)
+        # Un tramo para valores negativos, uno por cada par de límites y uno abierto al final.
+        self.histograma = np.zeros(len(self.limites) + 1, dtype=np.int64)
+        self.sketch = SketchCuantiles(precision_relativa)
+        self.total = 0
+        self.suma = 0.0
+        self.minimo = None
+        self.maximo = None
+
+    def agregar_lote(self, valores):
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[np.isfinite(valores)]
+        if not len(valores):
+            return
+        self.total += len(valores)
+        self.suma += float(valores.sum())
+        minimo, maximo = float(valores.min()), float(valores.max())
+        self.minimo = minimo if self.minimo is None else min(self.minimo, minimo)
+        self.maximo = maximo if self.maximo is None else max(self.maximo, maximo)
+        tramos = np.searchsorted(self.limites, valores, side='right')
+        self.histograma += np.bincount(tramos, minlength=len(self.histograma))
+        self.sketch.agregar_lote(valores)
+
+    def fusionar(self, otra):
+        if otra.limites != self.limites:
+            raise ValueError("Sólo se pueden fusionar estadísticas con los mismos tramos de histograma")
+        self.total += otra.total
+        self.suma += otra.suma
+        for atributo, elegir in (('minimo', min), ('maximo', max)):
+            valores = [v for v in (getattr(self, atributo), getattr(otra, atributo)) if v is not None]
+            setattr(self, atributo, elegir(valores) if valores else None)
+        self.histograma += otra.histograma
+        self.sketch.fusionar(otra.sketch)
+        return self
+
+    def resumen(self):
+        """Resumen en minutos para las respuestas de la API (incluye el estado fusionable)."""
+        resumen = {
+            "total": self.total,
+            "promedio_minutos": self.suma / self.total if self.total else None,
+            "minimo_minutos": self.minimo,
+            "maximo_minutos": self.maximo,
+        }
+        for p in self.PERCENTILES:
+            resumen[f"p{p}_minutos"] = self.sketch.cuantil(p / 100)
+        tramos = [None] + self.limites + [None]
+        resumen["histograma"] = [
+            {"desde_minutos": tramos[i], "hasta_minutos": tramos[i + 1], "facturas": int(n)}
+            for i, n in enumerate(self.histograma)
+        ]
+        resumen["sketch"] = self.a_dict()
+        return resumen
+
+    def a_dict(self):
+        return {
+            "limites": self.limites,
+            "histograma": self.histograma.tolist(),
+            "total": self.total,
+            "suma": self.suma,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "cuantiles": self.sketch.a_dict(),
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        sketch = SketchCuantiles.desde_dict(datos["cuantiles"])
+        estadisticas = cls(datos["limites"], sketch.precision_relativa)
+        estadisticas.histograma = np.asarray(datos["histograma"], dtype=np.int64)
+        estadisticas.sketch = sketch
+        estadisticas.total = datos["total"]
+        estadisticas.suma = datos["suma"]
+        estadisticas.minimo = datos["minimo"]
+        estadisticas.maximo = datos["maximo"]
+        return estadisticas
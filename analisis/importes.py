@@ -0,0 +1,95 @@
+# analisis/importes.py
+#
+# Representación común de los importes: arrays int64 de céntimos. Se construyen una vez,
+# al leer las filas, y todas las comprobaciones y agregaciones de importes trabajan sobre
+# ellos, de modo que las sumas son exactas y no hay conversiones fila a fila.
+
+import numpy as np
+import pandas as pd
+
+# Importe escrito como texto: signo, parte entera y decimales (con punto o coma decimal).
+_IMPORTE_TEXTO = r'^\s*([+-]?)(\d*)(?:[.,](\d*))?\s*$'
+
+_TIPOS_NUMERICOS = ('integer', 'floating', 'mixed-integer-float', 'empty')
+
+# Un decimal de hasta 15 cifras se representa sin pérdida en float64.
+_MAXIMO_TEXTO_FLOAT = 15
+
+
+def _centimos_numericos(numeros):
+    """Céntimos de un array float64, redondeando la mitad lejos de cero como un importe decimal."""
+    # Por encima de 9e16 euros los céntimos no caben en int64.
+    validos = np.isfinite(numeros) & (np.abs(numeros) < 9e16)
+    numeros = np.where(validos, numeros, 0)
+    # El redondeo previo elimina el ruido binario (1.005 * 100 = 100.49999999999999).
+    absolutos = np.floor(np.round(np.abs(numeros) * 100, 6) + 0.5)
+    return (np.sign(numeros) * absolutos).astype(np.int64), validos
+
+
+def _centimos_texto(textos):
+    """Céntimos de una serie de textos decimales, sin pasar por float."""
+    partes = textos.str.extract(_IMPORTE_TEXTO)
+    signo, entero, decimales = partes[0], partes[1], partes[2].fillna('')
+    # Hasta 16 cifras enteras: el importe en céntimos cabe en int64.
+    validos = partes[1].notna() & ((entero.str.len() > 0) | (decimales.str.len() > 0)) & \
+        (entero.str.len() <= 16)
+    entero = pd.to_numeric(entero.where(validos & (entero.str.len() > 0), '0')).to_numpy(dtype=np.int64)
+    fraccion = pd.to_numeric(decimales.str[:2].str.ljust(2, '0').where(validos, '0')).to_numpy(dtype=np.int64)
+    redondeo = (decimales.str[2:3] >= '5').to_numpy() & validos.to_numpy()
+    centimos = entero * 100 + fraccion + redondeo
+    centimos = np.where((signo == '-').to_numpy(), -centimos, centimos)
+    return centimos.astype(np.int64), validos.to_numpy()
+
+
+def a_centimos(valores):
+    """
+    Convierte una secuencia de importes (números, texto o Decimal) en céntimos enteros.
+    Devuelve (centimos, validos): un array int64 y una máscara de los valores que son
+    importes; los no válidos (None, texto no numérico) quedan a 0 en 'centimos'.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(list(valores), dtype=object)
+    if pd.api.types.infer_dtype(serie, skipna=True) in _TIPOS_NUMERICOS:
+        return _centimos_numericos(serie.to_numpy(dtype=float, na_value=np.nan))
+
+    centimos = np.zeros(len(serie), dtype=np.int64)
+    validos = np.zeros(len(serie), dtype=bool)
+    tipos = serie.map(type)
+    numericos = tipos.isin((int, float, np.int64, np.float64)).to_numpy()
+    if numericos.any():
+        centimos[numericos], validos[numericos] = _centimos_numericos(
+            serie[numericos].to_numpy(dtype=float, na_value=np.nan))
+    otros = ~numericos & serie.notna().to_numpy() & ~(tipos == bool).to_numpy()
+    if otros.any():
+        centimos[otros], validos[otros] = _centimos_textos(serie[otros].astype(str))
+    return centimos, validos
+
+
+def _centimos_textos(textos):
+    """
+    Céntimos de una serie de textos. Los de hasta _MAXIMO_TEXTO_FLOAT caracteres se
+    representan sin pérdida en float64 y se convierten con pd.to_numeric; el resto se
+    interpreta dígito a dígito con _centimos_texto.
+    """
+    textos = textos.str.strip()
+    cortos = (textos.str.len() <= _MAXIMO_TEXTO_FLOAT).to_numpy()
+    centimos = np.zeros(len(textos), dtype=np.int64)
+    validos = np.zeros(len(textos), dtype=bool)
+    if cortos.any():
+        decimales = textos[cortos].str.replace(',', '.', regex=False)
+        formato = decimales.str.fullmatch(r'[+-]?(?:\d+\.?\d*|\.\d+)').to_numpy()
+        numeros = pd.to_numeric(decimales.where(formato), errors='coerce').to_numpy(dtype=float)
+        centimos[cortos], validos[cortos] = _centimos_numericos(numeros)
+    if not cortos.all():
+        centimos[~cortos], validos[~cortos] = _centimos_texto(textos[~cortos])
+    return centimos, validos
+
+
+def a_euros(centimos):
+    """Importe en euros (para las respuestas JSON) de un total en céntimos."""
+    return int(centimos) / 100
+
+
+def sumar(centimos):
+    """Suma exacta de un array de céntimos."""
+    return int(np.sum(centimos, dtype=np.int64))
+
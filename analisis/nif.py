@@ -0,0 +1,191 @@
+# analisis/nif.py
+
+import numpy as np
+import pandas as pd
+
+# Longitud de un NIF: 8 dígitos y letra (DNI) o letra, 7 dígitos y carácter de control.
+LONGITUD_NIF = 9
+
+# Tipo de titular (Orden EHA/451/2008) según el primer carácter del NIF: clave, caracteres
+# y descripción. Los DNI, los NIE (X, Y, Z) y los NIF especiales (K, L, M) son de personas físicas.
+TIPOS_ENTIDAD = {
+    'persona_fisica': ('0123456789KLMXYZ', 'Persona física (DNI, NIE o NIF K, L, M)'),
+    'sociedad_anonima': ('A', 'Sociedad anónima'),
+    'sociedad_limitada': ('B', 'Sociedad de responsabilidad limitada'),
+    'sociedad_colectiva': ('C', 'Sociedad colectiva'),
+    'sociedad_comanditaria': ('D', 'Sociedad comanditaria'),
+    'comunidad_bienes': ('E', 'Comunidad de bienes, herencia yacente u otra entidad sin personalidad jurídica'),
+    'sociedad_cooperativa': ('F', 'Sociedad cooperativa'),
+    'asociacion': ('G', 'Asociación o fundación'),
+    'comunidad_propietarios': ('H', 'Comunidad de propietarios en régimen de propiedad horizontal'),
+    'sociedad_civil': ('J', 'Sociedad civil'),
+    'entidad_extranjera': ('N', 'Entidad extranjera'),
+    'corporacion_local': ('P', 'Corporación local'),
+    'organismo_publico': ('Q', 'Organismo público'),
+    'congregacion_religiosa': ('R', 'Congregación o institución religiosa'),
+    'administracion_publica': ('S', 'Órgano de la Administración del Estado o de una comunidad autónoma'),
+    'union_temporal_empresas': ('U', 'Unión temporal de empresas'),
+    'otras_entidades': ('V', 'Otro tipo de entidad (agrupaciones de interés económico, fondos...)'),
+    'establecimiento_permanente': ('W', 'Establecimiento permanente de entidad no residente'),
+}
+
+_LETRAS_DNI = np.frombuffer(b'TRWAGMYFPDXBNJZSQVHLCKE', dtype=np.uint8)
+_LETRAS_CIF = np.frombuffer(b'JABCDEFGHI', dtype=np.uint8)
+
+# Clase de NIF según su primer carácter, que fija cómo se calcula el control.
+_DNI, _NIE, _ESPECIAL, _CIF_DIGITO, _CIF_LETRA, _CIF = 1, 2, 3, 4, 5, 6
+_CLASE = np.zeros(256, dtype=np.uint8)
+for _caracteres, _clase in ((b'0123456789', _DNI), (b'XYZ', _NIE), (b'KLM', _ESPECIAL),
+                            (b'ABEH', _CIF_DIGITO), (b'NPQRSW', _CIF_LETRA), (b'CDFGJUV', _CIF)):
+    _CLASE[list(_caracteres)] = _clase
+
+_TIPO = np.full(256, None, dtype=object)
+for _clave, (_caracteres, _) in TIPOS_ENTIDAD.items():
+    _TIPO[list(_caracteres.encode('ascii'))] = _clave
+
+# Bytes que se quitan al normalizar (espacios, guiones, puntos y barras, como en la importación).
+_SEPARADOR = np.zeros(256, dtype=bool)
+_SEPARADOR[list(b'\x00 \t\n\r\x0b\x0c-./')] = True
+
+
+def _binarios(nifs):
+    """NIF como array de bytes (UTF-8; b'' para los nulos)."""
+    if isinstance(nifs, np.ndarray) and nifs.dtype.kind == 'S':
+        return nifs
+    valores = np.asarray(nifs, dtype=object).ravel()
+    nulos = pd.isna(valores)
+    if nulos.any():
+        valores = np.where(nulos, '', valores)
+    try:
+        return valores.astype('S')
+    except UnicodeEncodeError:
+        return np.array([str(v).encode('utf-8') for v in valores.tolist()], dtype='S')
+
+
+def _compactar(matriz, conservar):
+    """Mueve a la izquierda, sin cambiar su orden, los bytes que se conservan de cada fila."""
+    orden = np.argsort(~conservar, axis=1, kind='stable')
+    return np.take_along_axis(matriz, orden, 1) * np.take_along_axis(conservar, orden, 1)
+
+
+def _normalizar(nifs):
+    """
+    Matriz de bytes (una fila por NIF, ceros al final) de la forma canónica de cada NIF y su
+    longitud: en mayúsculas, sin separadores, sin el prefijo de país 'ES' y, en los DNI de
+    menos de 8 cifras, con ceros a la izquierda.
+    """
+    binarios = _binarios(nifs)
+    n = len(binarios)
+    ancho = max(binarios.dtype.itemsize, LONGITUD_NIF)
+    matriz = np.zeros((n, ancho), dtype=np.uint8)
+    if n:
+        matriz[:, :binarios.dtype.itemsize] = np.ascontiguousarray(binarios).view(np.uint8).reshape(n, -1)
+    np.subtract(matriz, 32, out=matriz, where=(matriz >= ord('a')) & (matriz <= ord('z')))
+
+    # Sólo se reordenan las filas con un separador delante de un carácter que se conserva.
+    conservar = ~_SEPARADOR[matriz]
+    desordenadas = np.flatnonzero((conservar[:, 1:] & ~conservar[:, :-1]).any(axis=1))
+    if len(desordenadas):
+        matriz[desordenadas] = _compactar(matriz[desordenadas], conservar[desordenadas])
+        conservar[desordenadas] = np.sort(conservar[desordenadas], axis=1)[:, ::-1]
+    matriz *= conservar
+    longitud = conservar.sum(axis=1)
+
+    # Prefijo de país de los NIF-IVA (ESB12345678)
+    con_prefijo = np.flatnonzero((longitud == LONGITUD_NIF + 2) & (matriz[:, 0] == ord('E')) & (matriz[:, 1] == ord('S')))
+    if len(con_prefijo):
+        matriz[con_prefijo, :-2] = matriz[con_prefijo, 2:]
+        matriz[con_prefijo, -2:] = 0
+        longitud[con_prefijo] -= 2
+
+    # DNI sin los ceros a la izquierda (1234567L -> 01234567L)
+    cortos = np.flatnonzero((longitud >= 2) & (longitud < LONGITUD_NIF))
+    if len(cortos):
+        filas, largo = matriz[cortos, :LONGITUD_NIF], longitud[cortos]
+        posiciones = np.arange(LONGITUD_NIF)
+        digitos = (filas >= ord('0')) & (filas <= ord('9'))
+        ultimo = filas[np.arange(len(cortos)), largo - 1]
+        dni = ((digitos | (posiciones >= (largo - 1)[:, None])).all(axis=1) &
+               (ultimo >= ord('A')) & (ultimo <= ord('Z')))
+        filas, largo, cortos = filas[dni], largo[dni], cortos[dni]
+        origen = posiciones - (LONGITUD_NIF - largo)[:, None]
+        matriz[cortos, :LONGITUD_NIF] = np.where(origen >= 0, np.take_along_axis(filas, np.maximum(origen, 0), 1),
+                                                 ord('0'))
+        longitud[cortos] = LONGITUD_NIF
+    return matriz, longitud
+
+
+def _validos(matriz, longitud):
+    """Máscara de los NIF (forma canónica) con formato y carácter de control correctos."""
+    # Una fila por posición: las operaciones por columna recorren memoria contigua.
+    nif = np.ascontiguousarray(matriz[:, :LONGITUD_NIF].T)
+    clase = _CLASE[nif[0]]
+    cifras = nif.astype(np.int32) - ord('0')
+    cuerpo = ((cifras[1:8] >= 0) & (cifras[1:8] <= 9)).all(axis=0) & (longitud == LONGITUD_NIF) & (clase != 0)
+    control = nif[8]
+
+    # DNI y NIE: letra del número de 8 cifras (X, Y, Z del NIE valen 0, 1, 2) módulo 23
+    cifras[0] = np.where(clase == _NIE, nif[0].astype(np.int32) - ord('X'), cifras[0])
+    personal = (clase == _DNI) | (clase == _NIE)
+    numero = cifras[0] * 10 ** 7
+    for posicion in range(1, 8):
+        numero += cifras[posicion] * 10 ** (7 - posicion)
+    letra_dni = _LETRAS_DNI[numero % 23]
+
+    # CIF y NIF especiales: suma de las cifras pares y de los dígitos del doble de las impares
+    dobles = cifras[1:8:2] * 2
+    suma = (dobles // 10 + dobles % 10).sum(axis=0) + cifras[2:8:2].sum(axis=0)
+    digito_cif = np.where(cuerpo, (10 - suma % 10) % 10, 0)
+    es_digito = control == digito_cif + ord('0')
+    es_letra = control == _LETRAS_CIF[digito_cif]
+
+    return cuerpo & np.select(
+        [personal, (clase == _ESPECIAL) | (clase == _CIF_LETRA), clase == _CIF_DIGITO],
+        [control == letra_dni, es_letra, es_digito],
+        es_digito | es_letra)
+
+
+def _textos(matriz, longitud):
+    """Forma canónica como array de objetos str (None para los vacíos)."""
+    ancho = max(int(longitud.max()) if len(longitud) else 0, 1)
+    bytes_ = np.ascontiguousarray(matriz[:, :ancho])
+    if bytes_.size and bytes_.max() >= 128:
+        textos = np.array([b.decode('utf-8', 'replace') for b in bytes_.view(f'S{ancho}').ravel().tolist()],
+                          dtype=object)
+    else:
+        # ASCII: cada byte es un carácter de un array 'U' (UCS-4), sin decodificar
+        textos = bytes_.astype(np.uint32).view(f'U{ancho}').ravel().astype(object)
+    textos[longitud == 0] = None
+    return textos
+
+
+def normalizar_nifs(nifs):
+    """
+    Forma canónica de cada NIF de un array: en mayúsculas, sin espacios, guiones, puntos ni
+    barras, sin el prefijo 'ES' de los NIF-IVA y, en los DNI de menos de 8 cifras, con ceros
+    a la izquierda. Devuelve un array de objetos str (None para los nulos y vacíos); los
+    valores que no son un NIF se normalizan igualmente.
+    """
+    return _textos(*_normalizar(nifs))
+
+
+def validar_nifs(nifs):
+    """
+    Valida de una vez un array de NIF (DNI, NIE, CIF y NIF especiales K, L, M) con su
+    carácter de control. Devuelve (validos, canonicos): la máscara booleana y la forma
+    canónica de cada NIF (ver normalizar_nifs).
+    """
+    matriz, longitud = _normalizar(nifs)
+    return _validos(matriz, longitud), _textos(matriz, longitud)
+
+
+def clasificar_nifs(nifs):
+    """
+    Como validar_nifs, y además el tipo de titular de cada NIF según su primer carácter
+    (una clave de TIPOS_ENTIDAD; None para los NIF no válidos). Devuelve
+    (validos, canonicos, tipos).
+    """
+    matriz, longitud = _normalizar(nifs)
+    validos = _validos(matriz, longitud)
+    tipos = np.where(validos, _TIPO[matriz[:, 0]], None)
+    return validos, _textos(matriz, longitud), tipos
@@ -0,0 +1,333 @@
+# analisis/papel.py
+
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from analisis.periodo import en_periodo
+from analisis.importes import a_centimos, a_euros, sumar
+from analisis.nif import TIPOS_ENTIDAD, clasificar_nifs, normalizar_nifs
+
+# Fechas ISO que se pueden resolver sin datetime.fromisoformat: su día es el de los
+# diez primeros caracteres. El resto (formatos compactos, valores erróneos) se trata fila a fila.
+_FECHA_ISO = r'\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?(?:Z|[+-]\d{2}:?\d{2})?'
+
+
+# Tipos de titular obligados a expedir factura electrónica (art. 4 Ley 25/2013) y letra del
+# artículo que los recoge. Los demás (personas físicas, cooperativas, asociaciones...) pueden
+# presentar la factura en papel, salvo que la entidad amplíe la obligación.
+TIPOS_OBLIGADOS = {
+    'sociedad_anonima': 'a',
+    'sociedad_limitada': 'b',
+    'entidad_extranjera': 'c',
+    'establecimiento_permanente': 'd',
+    'union_temporal_empresas': 'e',
+    'otras_entidades': 'f',
+}
+
+# Importe (euros, IVA incluido) hasta el que las administraciones pueden excluir las
+# facturas de la obligación (art. 4, último párrafo).
+UMBRAL_EXENCION = 5000
+
+# Clasificación de cada factura en papel frente a la obligación, por orden de prioridad.
+CLASIFICACION_OBLIGACION = {
+    'nif_no_valido': "NIF del emisor no válido: no se puede determinar la obligación",
+    'tipo_no_obligado': "Tipo de emisor no obligado a la factura electrónica",
+    'proveedor_exento': "Proveedor excluido de la obligación por la entidad",
+    'exenta_por_importe': "Importe no superior al umbral de exención de la entidad",
+    'obligada': "Emisor obligado a la factura electrónica",
+}
+
+
+def _verdadero(serie):
+    """Equivalente vectorizado de bool(valor) para una columna de objetos Python."""
+    return serie.astype(bool).to_numpy()
+
+
+def _dia_iso(serie):
+    """Día (datetime64) de cada fecha ISO de la serie; NaT si no tiene el formato esperado."""
+    validas = serie.str.fullmatch(_FECHA_ISO, na=False)
+    dias = pd.to_datetime(serie.where(validas).str[:10], format='%Y-%m-%d', errors='coerce')
+    return dias.to_numpy()
+
+
+def _dias_fila(f_presentacion_str, f_registro_str):
+    """Cálculo fila a fila de V.1.2, como respaldo para las fechas que no son ISO simples."""
+    f_presentacion = datetime.fromisoformat(f_presentacion_str.replace('Z', '+00:00')).date()
+    f_registro = datetime.fromisoformat(f_registro_str.replace('Z', '+00:00')).date()
+    return (f_registro - f_presentacion).days
+
+
+def _claves(nifs_canonicos, numeros, fechas):
+    canonicos = np.asarray(nifs_canonicos, dtype=object)
+    return pd.DataFrame({
+        'nif': np.where(pd.isna(canonicos), '', canonicos),
+        'num': pd.Series(numeros, dtype=object).astype(str).str.strip().to_numpy(),
+        'fecha': pd.Series(fechas, dtype=object).astype(str).str.strip().to_numpy(),
+    })
+
+
+def claves_duplicidad(nifs, numeros, fechas):
+    """
+    Clave normalizada de la prueba de duplicidad V.1.4, la misma con la que la importación
+    reconoce las facturas ya existentes: NIF en su forma canónica (analisis.nif), número y
+    fecha sin espacios en los extremos. Devuelve un DataFrame (nif, num, fecha).
+    """
+    return _claves(normalizar_nifs(nifs), numeros, fechas)
+
+
+class ObligacionFacturaElectronica:
+    """
+    Configuración de la entidad para la obligación de factura electrónica (art. 4 Ley 25/2013):
+    tipos de titular obligados (claves de analisis.nif.TIPOS_ENTIDAD), importe en euros hasta
+    el que las facturas quedan excluidas (None o 0: sin exclusión por importe) y NIF de los
+    proveedores excluidos (p. ej., los de servicios en el exterior).
+    """
+
+    def __init__(self, tipos_obligados=tuple(TIPOS_OBLIGADOS), umbral_exencion=UMBRAL_EXENCION, nifs_exentos=()):
+        desconocidos = sorted(set(tipos_obligados) - set(TIPOS_ENTIDAD))
+        if desconocidos:
+            raise ValueError(f"Tipos de titular desconocidos: {', '.join(desconocidos)}")
+        self.tipos_obligados = tuple(tipos_obligados)
+        self.umbral_exencion = umbral_exencion or None
+        self.umbral_centimos = round(umbral_exencion * 100) if umbral_exencion else None
+        self.nifs_exentos = frozenset(n for n in normalizar_nifs(list(nifs_exentos)) if n)
+
+    def criterios(self):
+        return {
+            "tipos_obligados": list(self.tipos_obligados),
+            "umbral_exencion": self.umbral_exencion,
+            "proveedores_exentos": len(self.nifs_exentos),
+        }
+
+    def clasificar(self, tipos, nifs_canonicos, centimos, importe_valido):
+        """
+        Clave de CLASIFICACION_OBLIGACION de cada factura a partir del tipo de titular de su
+        NIF (None si no es válido; ver analisis.nif.clasificar_nifs), del NIF canónico y del
+        importe en céntimos. Las facturas sin importe válido no se excluyen por importe.
+        """
+        tipos = pd.Series(tipos, dtype=object)
+        exenta_por_importe = np.zeros(len(tipos), dtype=bool)
+        if self.umbral_centimos is not None:
+            exenta_por_importe = importe_valido & (centimos <= self.umbral_centimos)
+        return np.select(
+            [tipos.isna().to_numpy(),
+             ~tipos.isin(self.tipos_obligados).to_numpy(),
+             pd.Series(nifs_canonicos, dtype=object).isin(self.nifs_exentos).to_numpy(),
+             exenta_por_importe],
+            ['nif_no_valido', 'tipo_no_obligado', 'proveedor_exento', 'exenta_por_importe'],
+            'obligada').astype(object)
+
+    def requisito(self, tipo):
+        """Requisito que incumple una factura en papel de un emisor del tipo indicado."""
+        letra = TIPOS_OBLIGADOS.get(tipo)
+        if letra:
+            return f"Obligado a la factura electrónica (art. 4.{letra} Ley 25/2013)"
+        return "Obligado a la factura electrónica por la entidad"
+
+
+def auditar_papel(df, fecha_inicio_str, fecha_fin_str, obligacion=None):
+    """
+    Pruebas V.1 en forma columnar sobre un DataFrame (dtype object) con las columnas
+    de AuditoriaPapel.COLUMNAS, en el orden en que se leyeron las facturas.
+
+    El plazo de 30 días se calcula con un parseo vectorizado de las fechas y la
+    duplicidad con una única agrupación por la clave normalizada (NIF, número, fecha),
+    de modo que el coste crece linealmente con el número de facturas. La obligación de
+    factura electrónica de cada factura se decide con 'obligacion'
+    (ObligacionFacturaElectronica; por defecto, la del art. 4 con el umbral de 5.000 euros).
+    """
+    obligacion = obligacion or ObligacionFacturaElectronica()
+    ids = df['id']
+    presentacion = df['fecha_presentacion_registro']
+    registro = df['fecha_registro_rcf']
+
+    # V.1.2: plazo de anotación (cada id se cuenta una sola vez)
+    con_id = _verdadero(ids) & ~ids.duplicated().to_numpy()
+    hay_presentacion = _verdadero(presentacion)
+    hay_registro = _verdadero(registro)
+    sin_presentacion = con_id & ~hay_presentacion
+    sin_registro = con_id & hay_presentacion & ~hay_registro
+    con_fechas = con_id & hay_presentacion & hay_registro
+
+    dias = np.full(len(df), np.nan)
+    idx_fechas = np.flatnonzero(con_fechas)
+    dia_presentacion = _dia_iso(presentacion.iloc[idx_fechas])
+    dia_registro = _dia_iso(registro.iloc[idx_fechas])
+    resueltas = ~np.isnat(dia_presentacion) & ~np.isnat(dia_registro)
+    dias[idx_fechas[resueltas]] = (dia_registro[resueltas] - dia_presentacion[resueltas]) / np.timedelta64(1, 'D')
+
+    ids_arr = ids.to_numpy(dtype=object)
+    num_arr = df['numero_factura'].to_numpy(dtype=object)
+    nif_arr = df['proveedor_nif'].to_numpy(dtype=object)
+    nif_valido, nif_canonico, tipo_entidad = clasificar_nifs(nif_arr)
+    fecha_f_arr = df['fecha_factura'].to_numpy(dtype=object)
+    presentacion_arr = presentacion.to_numpy(dtype=object)
+    registro_arr = registro.to_numpy(dtype=object)
+
+    errores_fechas = []
+    for i in idx_fechas[~resueltas]:
+        try:
+            dias[i] = _dias_fila(presentacion_arr[i], registro_arr[i])
+        except Exception as e:
+            errores_fechas.append({
+                "id": ids_arr[i],
+                "error": str(e),
+                "fecha_presentacion": presentacion_arr[i],
+                "fecha_registro_rcf": registro_arr[i]
+            })
+
+    idx_fuera = np.flatnonzero(dias > 30)
+    fuera_plazo = [{
+        "id": factura_id,
+        "numero_factura": numero,
+        "proveedor_nif": nif,
+        "fecha_presentacion": f_presentacion,
+        "fecha_registro_rcf": f_registro,
+        "dias_transcurridos": dias_diferencia
+    } for factura_id, numero, nif, f_presentacion, f_registro, dias_diferencia in zip(
+        ids_arr[idx_fuera].tolist(), num_arr[idx_fuera].tolist(), nif_arr[idx_fuera].tolist(),
+        presentacion_arr[idx_fuera].tolist(), registro_arr[idx_fuera].tolist(),
+        dias[idx_fuera].astype(np.int64).tolist())]
+
+    # V.1.4: duplicidad por (NIF, número, fecha) normalizados
+    con_clave = np.flatnonzero(_verdadero(ids) & _verdadero(df['proveedor_nif']) &
+                               _verdadero(df['numero_factura']) & _verdadero(df['fecha_factura']))
+    claves = _claves(nif_canonico[con_clave], num_arr[con_clave], fecha_f_arr[con_clave])
+    grupo = claves.groupby(['nif', 'num', 'fecha'], sort=False).ngroup().to_numpy()
+    tamanos = np.bincount(grupo) if len(grupo) else np.zeros(0, dtype=int)
+    en_duplicado = tamanos[grupo] >= 2
+    filas_dup, grupos_dup = con_clave[en_duplicado], grupo[en_duplicado]
+
+    ids_unicos = pd.Series(ids_arr[filas_dup], dtype=object).groupby(grupos_dup, sort=False).unique()
+    ids_por_grupo = {g: sorted(v.tolist()) for g, v in ids_unicos.items()}
+
+    duplicadas_list = [{
+        "id": factura_id,
+        "numero_factura": numero,
+        "proveedor_nif": nif,
+        "fecha_factura": fecha_f,
+        "fecha_registro_rcf": f_registro,
+        "ids_duplicados_asociados": ids_por_grupo[g]
+    } for factura_id, numero, nif, fecha_f, f_registro, g in zip(
+        ids_arr[filas_dup].tolist(), num_arr[filas_dup].tolist(), nif_arr[filas_dup].tolist(),
+        fecha_f_arr[filas_dup].tolist(), registro_arr[filas_dup].tolist(), grupos_dup.tolist())]
+
+    # Obligación de factura electrónica (art. 4 Ley 25/2013) de cada factura
+    centimos, importe_valido = a_centimos(df['total_factura'])
+    importes = np.where(importe_valido, centimos, 0)
+    clasificacion = obligacion.clasificar(tipo_entidad, nif_canonico, centimos, importe_valido)
+    obligada = clasificacion == 'obligada'
+    por_clasificacion = pd.DataFrame({'clasificacion': clasificacion, 'centimos': importes}) \
+        .groupby('clasificacion')['centimos'].agg(['size', 'sum'])
+    resumen_obligacion = [{
+        "clasificacion": clave,
+        "descripcion": descripcion,
+        "numero_facturas": int(por_clasificacion['size'].get(clave, 0)),
+        "importe_total": a_euros(por_clasificacion['sum'].get(clave, 0)),
+    } for clave, descripcion in CLASIFICACION_OBLIGACION.items()]
+
+    idx_obligadas = np.flatnonzero(obligada)
+    obligadas = [{
+        "id": factura_id,
+        "numero_factura": numero,
+        "proveedor_nif": nif,
+        "tipo_entidad": tipo,
+        "fecha_factura": fecha_f,
+        "importe": a_euros(importe),
+        "requisito_incumplido": obligacion.requisito(tipo),
+    } for factura_id, numero, nif, tipo, fecha_f, importe in zip(
+        ids_arr[idx_obligadas].tolist(), num_arr[idx_obligadas].tolist(), nif_arr[idx_obligadas].tolist(),
+        tipo_entidad[idx_obligadas].tolist(), fecha_f_arr[idx_obligadas].tolist(), importes[idx_obligadas].tolist())]
+
+    # Importes por proveedor, en céntimos exactos, con sus facturas obligadas
+    por_proveedor = pd.DataFrame({
+        'nif': nif_canonico,
+        'centimos': importes,
+        'obligadas': obligada,
+        'centimos_obligadas': np.where(obligada, importes, 0),
+        'tipo': tipo_entidad,
+    }).groupby('nif', sort=False, dropna=False).agg(
+        numero=('centimos', 'size'), centimos=('centimos', 'sum'), obligadas=('obligadas', 'sum'),
+        centimos_obligadas=('centimos_obligadas', 'sum'), tipo=('tipo', 'first'))
+    por_proveedor = por_proveedor.sort_values('centimos', ascending=False, kind='stable')
+    resumen_proveedores = [{
+        "proveedor_nif": nif if isinstance(nif, str) else None,
+        "tipo_entidad": tipo if isinstance(tipo, str) else None,
+        "numero_facturas": numero,
+        "importe_total": a_euros(importe),
+        "facturas_obligadas": int(numero_obligadas),
+        "importe_obligadas": a_euros(importe_obligadas),
+    } for nif, tipo, numero, importe, numero_obligadas, importe_obligadas in zip(
+        por_proveedor.index.tolist(), por_proveedor['tipo'].tolist(), por_proveedor['numero'].tolist(),
+        por_proveedor['centimos'].tolist(), por_proveedor['obligadas'].tolist(),
+        por_proveedor['centimos_obligadas'].tolist())]
+
+    # V.1.3: NIF del emisor con formato y carácter de control correctos
+    idx_nif = np.flatnonzero(con_id & ~nif_valido)
+    nif_no_valido = [{
+        "id": factura_id,
+        "numero_factura": numero,
+        "proveedor_nif": nif,
+    } for factura_id, numero, nif in zip(ids_arr[idx_nif].tolist(), num_arr[idx_nif].tolist(),
+                                         nif_arr[idx_nif].tolist())]
+
+    return {
+        "periodo_analizado": {"inicio": fecha_inicio_str, "fin": fecha_fin_str},
+        "total_facturas_papel_analizadas": len(df),
+        "importe_total_facturas_papel": a_euros(sumar(centimos[importe_valido])),
+        "facturas_papel_por_proveedor": resumen_proveedores,
+        "v1_2_fuera_plazo_30_dias": fuera_plazo,
+        "v1_2_sin_fecha_presentacion": ids_arr[sin_presentacion].tolist(),
+        "v1_2_sin_fecha_registro_rcf": ids_arr[sin_registro].tolist(),
+        "v1_3_nif_emisor_no_valido": nif_no_valido,
+        "v1_4_duplicadas_potenciales": sorted(duplicadas_list, key=lambda x: (x['proveedor_nif'], x['numero_factura'], x['fecha_factura'])),
+        "v1_5_obligacion_factura_electronica": {
+            "criterios": obligacion.criterios(),
+            "clasificacion": resumen_obligacion,
+            "facturas_obligadas": obligadas,
+        },
+        "requiere_verificacion_manual": {
+            "v1_1_completitud": True,
+            "v1_3_contenido": True
+        },
+        "errores_procesamiento_fechas": errores_fechas
+    }
+
+
+class AuditoriaPapel:
+    """
+    Pruebas de auditoría V.1 sobre facturas en papel registradas en el RCF dentro del periodo.
+    Las filas recibidas con procesar() se guardan por columnas y resultado() las evalúa
+    de una vez con auditar_papel().
+    """
+
+    COLUMNAS = ('id', 'numero_factura', 'proveedor_nif', 'fecha_factura',
+                'fecha_presentacion_registro', 'fecha_registro_rcf', 'total_factura')
+
+    def __init__(self, fecha_inicio_str, fecha_fin_str, obligacion=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.obligacion = obligacion
+        self.columnas = {c: [] for c in self.COLUMNAS}
+
+    def filtros(self):
+        return [('eq', 'es_electronica', False),
+                ('gte', 'fecha_registro_rcf', self.fecha_inicio_str),
+                ('lte', 'fecha_registro_rcf', self.fecha_fin_str)]
+
+    def aplica(self, f):
+        return f.get('es_electronica') is False and \
+            en_periodo(f.get('fecha_registro_rcf'), self.fecha_inicio_str, self.fecha_fin_str)
+
+    def procesar(self, f):
+        for columna, valores in self.columnas.items():
+            valores.append(f.get(columna))
+
+    def dataframe(self):
+        # En el orden de la ruta V.1 (fecha_registro_rcf, id) aunque las filas lleguen en otro,
+        # como en la auditoría completa, que las recorre por id.
+        df = pd.DataFrame({c: pd.Series(v, dtype=object) for c, v in self.columnas.items()})
+        return df.sort_values(['fecha_registro_rcf', 'id'], kind='stable', na_position='last', ignore_index=True)
+
+    def resultado(self):
+        return auditar_papel(self.dataframe(), self.fecha_inicio_str, self.fecha_fin_str, self.obligacion)
@@ -0,0 +1,18 @@
+# analisis/periodo.py
+
+
+def en_periodo(valor, inicio, fin):
+    """
+    Réplica en Python de los filtros gte/lte de PostgREST sobre una columna de fecha
+    o de timestamp: si la columna tiene hora, 'YYYY-MM-DD' equivale a las 00:00 de ese día.
+    Un extremo a None no limita el periodo.
+    """
+    if not valor:
+        return False
+    texto = str(valor).replace('T', ' ')[:19]
+    con_hora = len(texto) > 10
+    if inicio and texto < (f"{inicio} 00:00:00" if con_hora else inicio):
+        return False
+    if fin and texto > (f"{fin} 00:00:00" if con_hora else fin):
+        return False
+    return True
@@ -0,0 +1,133 @@
+# analisis/permanencia.py
+
+import numpy as np
+import pandas as pd
+from analisis.tramitacion import ESTADOS_VALIDOS, ordenar_historico
+
+# Plataformas que se comparan en los tiempos de tramitación (el nombre se compara sin
+# distinguir mayúsculas) y clave con la que aparecen en las respuestas.
+PLATAFORMAS_COMPARADAS = {'FACE': 'face', 'RCF': 'rcf'}
+
+_NS_DIA = 86400 * 10**9
+
+
+def _numero(valor):
+    """Valor numérico apto para JSON (NaN pasa a None)."""
+    return None if pd.isna(valor) else float(valor)
+
+
+def tiempos_por_estado(facturas, estados, fechas, plataformas):
+    """
+    Tiempo que pasa cada factura en cada estado del histórico, por plataforma.
+
+    Los eventos se ordenan una vez por (plataforma, factura, fecha); la permanencia en un
+    estado es la diferencia con el evento siguiente de la misma factura y plataforma (el
+    último estado, todavía abierto, no tiene permanencia) y 'hasta_estado' es el tiempo
+    desde el primer evento de la factura hasta que entra en el estado.
+
+    Devuelve un DataFrame con una fila por evento fechado: plataforma, estado (categórico en
+    el orden de ESTADOS_VALIDOS; NaN si no es un estado válido), mes
+    ('YYYY-MM' de entrada en el estado), permanencia_dias y hasta_estado_dias.
+    """
+    orden, grupos, instantes = ordenar_historico(facturas, fechas, plataformas)
+    fechados = instantes != np.iinfo(np.int64).min
+    orden, grupos, instantes = orden[fechados], grupos[fechados], instantes[fechados]
+
+    siguiente_misma = np.zeros(len(orden), dtype=bool)
+    siguiente_misma[:-1] = grupos[1:] == grupos[:-1]
+    permanencia = np.full(len(orden), np.nan)
+    permanencia[:-1][siguiente_misma[:-1]] = (instantes[1:] - instantes[:-1])[siguiente_misma[:-1]] / _NS_DIA
+
+    # Índice del primer evento de cada grupo, propagado a todos sus eventos
+    inicio_grupo = np.ones(len(orden), dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+    primero = np.maximum.accumulate(np.where(inicio_grupo, np.arange(len(orden)), 0))
+    hasta_estado = (instantes - instantes[primero]) / _NS_DIA
+
+    return pd.DataFrame({
+        'plataforma': pd.Series(np.asarray(plataformas, dtype=object)[orden], dtype=object).str.upper().to_numpy(),
+        'estado': pd.Categorical(np.asarray(estados, dtype=object)[orden], categories=ESTADOS_VALIDOS),
+        'mes': np.datetime_as_string(instantes.astype('datetime64[ns]'), unit='M'),
+        'permanencia_dias': permanencia,
+        'hasta_estado_dias': hasta_estado,
+    })
+
+
+def resumir_tiempos(tiempos, claves):
+    """
+    Media, mediana y p95 de la permanencia (y media del tiempo hasta el estado) agrupando
+    por 'claves' más la plataforma. Devuelve una lista de diccionarios, uno por grupo de
+    'claves', con las estadísticas de FACe y RCF y la diferencia de medias FACe - RCF.
+    """
+    tiempos = tiempos[tiempos['plataforma'].isin(list(PLATAFORMAS_COMPARADAS))]
+    grupos = tiempos.groupby(list(claves) + ['plataforma'], sort=True, observed=True)
+    estadisticas = pd.DataFrame({
+        'facturas': grupos.size(),
+        'media_dias': grupos['permanencia_dias'].mean(),
+        'mediana_dias': grupos['permanencia_dias'].median(),
+        'p95_dias': grupos['permanencia_dias'].quantile(0.95),
+        'media_hasta_estado_dias': grupos['hasta_estado_dias'].mean(),
+    })
+
+    resumen = {}
+    for indice, fila in zip(estadisticas.index, estadisticas.itertuples(index=False)):
+        *valores_clave, plataforma = indice
+        entrada = resumen.setdefault(tuple(valores_clave), dict(zip(claves, valores_clave)))
+        entrada[PLATAFORMAS_COMPARADAS[plataforma]] = {
+            "facturas": int(fila.facturas),
+            "media_dias": _numero(fila.media_dias),
+            "mediana_dias": _numero(fila.mediana_dias),
+            "p95_dias": _numero(fila.p95_dias),
+            "media_hasta_estado_dias": _numero(fila.media_hasta_estado_dias),
+        }
+    for entrada in resumen.values():
+        media_face = (entrada.get('face') or {}).get('media_dias')
+        media_rcf = (entrada.get('rcf') or {}).get('media_dias')
+        entrada['diferencia_media_dias'] = \
+            media_face - media_rcf if media_face is not None and media_rcf is not None else None
+    return list(resumen.values())
+
+
+class TiemposTramitacion:
+    """
+    Tiempos de tramitación por estado a partir del histórico de estados, comparando FACe y
+    RCF: permanencia media, mediana y p95 por estado (en total y por mes de entrada en el
+    estado) y tiempo medio hasta alcanzar cada estado. Los eventos recibidos con procesar()
+    se guardan por columnas y resultado() los calcula de una vez.
+
+    Se lee el histórico completo para no cortar permanencias; el periodo (fecha_inicio,
+    fecha_fin) limita los meses de entrada en el estado que se resumen.
+    """
+
+    COLUMNAS = ('id', 'factura_id', 'estado', 'fecha_estado', 'plataforma')
+
+    def __init__(self, fecha_inicio_str=None, fecha_fin_str=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.columnas = {c: [] for c in self.COLUMNAS}
+
+    def filtros(self):
+        return []
+
+    def procesar(self, f):
+        for columna, valores in self.columnas.items():
+            valores.append(f.get(columna))
+
+    def procesar_columnas(self, eventos):
+        """Como procesar(), con un bloque de eventos ya en columnas (p. ej. del almacén del histórico)."""
+        for columna, valores in self.columnas.items():
+            valores.extend(eventos[columna].tolist() if columna in eventos else [None] * len(eventos))
+
+    def resultado(self):
+        tiempos = tiempos_por_estado(self.columnas['factura_id'], self.columnas['estado'],
+                                     self.columnas['fecha_estado'], self.columnas['plataforma'])
+        if self.fecha_inicio_str:
+            tiempos = tiempos[tiempos['mes'] >= self.fecha_inicio_str[:7]]
+        if self.fecha_fin_str:
+            tiempos = tiempos[tiempos['mes'] <= self.fecha_fin_str[:7]]
+        return {
+            "periodo_analizado": {"inicio": self.fecha_inicio_str, "fin": self.fecha_fin_str},
+            "total_eventos_historico": len(self.columnas['id']),
+            "tiempos_por_estado": resumir_tiempos(tiempos, ['estado']),
+            "tiempos_por_estado_y_mes": resumir_tiempos(tiempos, ['mes', 'estado']),
+        }
@@ -0,0 +1,94 @@
+# analisis/ranking.py
+#
+# Ranking de proveedores sobre el resumen mensual (analisis.resumen): se recorren sus
+# celdas, ya agregadas por proveedor en la base de datos, acumulando un contador por
+# proveedor, y los K primeros se eligen con un montículo acotado (heapq.nlargest). La
+# memoria es O(K + proveedores distintos), con independencia del número de facturas.
+
+import heapq
+from analisis.importes import a_euros
+
+# Proveedores que se devuelven por defecto y como máximo en cada ranking.
+K_POR_DEFECTO = 10
+K_MAXIMO = 1000
+
+
+def _porcentaje(parte, total):
+    return round(parte * 100 / total, 2) if total else 0.0
+
+
+class RankingProveedores:
+    """
+    Los 'k' proveedores con más facturas y con más importe entre las celdas del resumen
+    mensual que cumplen los filtros: meses 'desde' y 'hasta' (AAAA-MM, incluidos, por la
+    fecha de la factura), 'estados' (uno o varios) y canal ('es_electronica'). Se alimenta
+    celda a celda con procesar(); cada proveedor lleva su porcentaje sobre el total filtrado.
+    """
+
+    COLUMNAS = ('clave', 'proveedor_nif', 'numero_facturas', 'importe_centimos')
+
+    def __init__(self, k=K_POR_DEFECTO, desde=None, hasta=None, estados=None, es_electronica=None):
+        self.k = k
+        self.desde = desde
+        self.hasta = hasta
+        self.estados = list(estados) if estados else None
+        self.es_electronica = es_electronica
+        self.facturas = {}
+        self.centimos = {}
+        self.total_facturas = 0
+        self.total_centimos = 0
+
+    def filtros(self):
+        filtros = [('gt', 'numero_facturas', 0)]
+        if self.desde:
+            filtros.append(('gte', 'mes', self.desde))
+        if self.hasta:
+            filtros.append(('lte', 'mes', self.hasta))
+        if self.estados:
+            filtros.append(('eq', 'estado', self.estados[0]) if len(self.estados) == 1
+                           else ('in_', 'estado', self.estados))
+        if self.es_electronica is not None:
+            filtros.append(('eq', 'es_electronica', self.es_electronica))
+        return filtros
+
+    def procesar(self, c):
+        nif = c.get('proveedor_nif')
+        facturas = int(c.get('numero_facturas') or 0)
+        centimos = int(c.get('importe_centimos') or 0)
+        self.facturas[nif] = self.facturas.get(nif, 0) + facturas
+        self.centimos[nif] = self.centimos.get(nif, 0) + centimos
+        self.total_facturas += facturas
+        self.total_centimos += centimos
+
+    def _fila(self, nif):
+        return {
+            "proveedor_nif": nif,
+            "numero_facturas": self.facturas[nif],
+            "porcentaje_facturas": _porcentaje(self.facturas[nif], self.total_facturas),
+            "importe_total": a_euros(self.centimos[nif]),
+            "porcentaje_importe": _porcentaje(self.centimos[nif], self.total_centimos),
+        }
+
+    def resultado(self):
+        # A igualdad de facturas decide el importe y viceversa; después, el NIF (los nulos al final).
+        def desempate(nif):
+            return (nif is not None, tuple(-ord(caracter) for caracter in nif or ''))
+
+        por_facturas = heapq.nlargest(self.k, self.facturas,
+                                      key=lambda nif: (self.facturas[nif], self.centimos[nif], desempate(nif)))
+        por_importe = heapq.nlargest(self.k, self.centimos,
+                                     key=lambda nif: (self.centimos[nif], self.facturas[nif], desempate(nif)))
+        return {
+            "filtros": {
+                "desde": self.desde,
+                "hasta": self.hasta,
+                "estados": self.estados,
+                "es_electronica": self.es_electronica,
+            },
+            "k": self.k,
+            "total_facturas": self.total_facturas,
+            "importe_total": a_euros(self.total_centimos),
+            "total_proveedores": len(self.facturas),
+            "por_numero_facturas": [self._fila(nif) for nif in por_facturas],
+            "por_importe": [self._fila(nif) for nif in por_importe],
+        }
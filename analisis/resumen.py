@@ -0,0 +1,184 @@
+# analisis/resumen.py
+#
+# Resumen mensual de 'facturas': un agregado materializado (cubo) con una celda por mes,
+# estado, es_electronica y proveedor_nif, con el número de facturas, su importe y la suma
+# de los tiempos de anotación. Los cuadros de mando leen sus celdas en lugar de las
+# facturas, de modo que su coste depende del número de meses y grupos, no de facturas.
+#
+# El mes es el de fecha_factura, que forma parte de la clave con la que se importan las
+# facturas: una factura actualizada nunca cambia de mes, así que para mantener el cubo
+# basta con recalcular los meses de las facturas escritas (ResumenMensual.actualizar).
+
+import re
+import numpy as np
+import pandas as pd
+from datos.historico import MES_SIN_FECHA
+from datos.repositorio import lotes
+from analisis.importes import a_centimos, a_euros
+
+DIMENSIONES = ('mes', 'estado', 'es_electronica', 'proveedor_nif')
+MEDIDAS = ('numero_facturas', 'importe_centimos', 'segundos_anotacion', 'facturas_con_anotacion')
+
+# Columnas de 'facturas' con las que se calculan las celdas.
+COLUMNAS_FACTURAS = ('id', 'fecha_factura', 'estado', 'es_electronica', 'proveedor_nif', 'total_factura',
+                     'fecha_presentacion_registro', 'fecha_registro_rcf')
+
+# Facturas que se agregan a la vez al recorrer 'facturas'.
+TAMANO_BLOQUE_RESUMEN = 100000
+
+_MES = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+
+def _instantes(valores):
+    return pd.to_datetime(pd.Series(valores, dtype=object), utc=True, format='ISO8601', errors='coerce')
+
+
+def celdas_facturas(df):
+    """
+    Celdas del cubo (DIMENSIONES y MEDIDAS, una fila por combinación presente) de un
+    DataFrame de facturas con las columnas COLUMNAS_FACTURAS.
+    """
+    fechas = pd.Series(df['fecha_factura'], dtype=object).astype(str).str[:7]
+    estados = pd.Series(df['estado'], dtype=object)
+    centimos, importe_valido = a_centimos(pd.Series(df['total_factura'], dtype=object))
+    anotacion = _instantes(df['fecha_registro_rcf']) - _instantes(df['fecha_presentacion_registro'])
+    con_anotacion = anotacion.notna().to_numpy()
+    tabla = pd.DataFrame({
+        'mes': fechas.where(fechas.str.fullmatch(_MES.pattern), MES_SIN_FECHA).to_numpy(dtype=object),
+        'estado': estados.where(estados.notna(), None).to_numpy(dtype=object),
+        'es_electronica': pd.Series(df['es_electronica'], dtype=object).map({True: True, False: False})
+        .astype(object).to_numpy(),
+        'proveedor_nif': pd.Series(df['proveedor_nif'], dtype=object).to_numpy(dtype=object),
+        'numero_facturas': np.ones(len(df), dtype=np.int64),
+        'importe_centimos': np.where(importe_valido, centimos, 0),
+        'segundos_anotacion': np.where(con_anotacion, anotacion.dt.total_seconds().fillna(0).to_numpy(), 0)
+        .astype(np.int64),
+        'facturas_con_anotacion': con_anotacion.astype(np.int64),
+    })
+    return _agrupar(tabla, DIMENSIONES)
+
+
+def _agrupar(celdas, dimensiones):
+    if not len(celdas):
+        return pd.DataFrame(columns=[*dimensiones, *MEDIDAS])
+    return celdas.groupby(list(dimensiones), dropna=False, sort=False)[list(MEDIDAS)].sum().reset_index()
+
+
+def claves_celdas(celdas):
+    """Clave de texto de cada celda (mes|estado|t/f|nif, vacío para los nulos), que identifica su fila."""
+    def texto(columna):
+        return pd.Series(celdas[columna], dtype=object).fillna('').astype(str)
+
+    electronica = pd.Series(celdas['es_electronica'], dtype=object).map({True: 't', False: 'f'}).fillna('')
+    return (texto('mes') + '|' + texto('estado') + '|' + electronica + '|' + texto('proveedor_nif')).tolist()
+
+
+class ResumenMensual:
+    """
+    Resumen mensual de las facturas (ver la cabecera del módulo) en la tabla 'tabla' del
+    repositorio, con una fila por celda identificada por 'clave'. actualizar() recalcula
+    unos meses (tras una importación), reconstruir() todo el cubo y consultar() devuelve
+    cualquier corte agregado leyendo sólo celdas.
+    """
+
+    def __init__(self, repositorio, tabla='resumen_mensual', tabla_facturas='facturas', tamano_pagina=None,
+                 tamano_lote=500):
+        self.repositorio = repositorio
+        self.tabla = tabla
+        self.tabla_facturas = tabla_facturas
+        self.tamano_pagina = tamano_pagina
+        self.tamano_lote = tamano_lote
+
+    def _celdas(self, filtros):
+        """Celdas de las facturas que cumplen los filtros, agregando por bloques."""
+        parciales = []
+        if self.repositorio.existe_tabla(self.tabla_facturas):
+            facturas = self.repositorio.iterar(self.tabla_facturas, ', '.join(COLUMNAS_FACTURAS), filtros=filtros,
+                                               tamano_pagina=self.tamano_pagina)
+            for bloque in lotes(facturas, TAMANO_BLOQUE_RESUMEN):
+                parciales.append(celdas_facturas(pd.DataFrame(bloque, columns=list(COLUMNAS_FACTURAS), dtype=object)))
+        if not parciales:
+            return _agrupar(pd.DataFrame(), DIMENSIONES)
+        return _agrupar(pd.concat(parciales, ignore_index=True), DIMENSIONES)
+
+    def _escribir(self, celdas, filtros_existentes):
+        """
+        Escribe las celdas recalculadas y pone a cero las que ya existían en el mismo ámbito
+        y han dejado de tener facturas. Devuelve el número de celdas con facturas.
+        """
+        filas = celdas.astype(object).where(celdas.notna(), None).to_dict('records')
+        claves = claves_celdas(celdas)
+        for fila, clave in zip(filas, claves):
+            fila['clave'] = clave
+        if self.repositorio.existe_tabla(self.tabla):
+            nuevas = set(claves)
+            for existente in self.repositorio.iterar(self.tabla, ', '.join(['clave', *DIMENSIONES]),
+                                                     filtros=filtros_existentes, orden=('clave',),
+                                                     tamano_pagina=self.tamano_pagina):
+                if existente['clave'] not in nuevas:
+                    filas.append(dict(existente, **{m: 0 for m in MEDIDAS}))
+        if filas:
+            self.repositorio.upsert(self.tabla, filas, on_conflict='clave', tamano_lote=self.tamano_lote)
+        return len(claves)
+
+    def actualizar(self, meses):
+        """
+        Recalcula las celdas de los meses indicados ('AAAA-MM', o MES_SIN_FECHA para las
+        facturas sin fecha_factura; los demás valores se ignoran) a partir de sus facturas.
+        Devuelve {'meses': [...], 'celdas': n}.
+        """
+        meses = sorted({m for m in meses if isinstance(m, str) and (_MES.fullmatch(m) or m == MES_SIN_FECHA)})
+        celdas = 0
+        for mes in meses:
+            if mes == MES_SIN_FECHA:
+                filtros = [('is_', 'fecha_factura', None)]
+            else:
+                siguiente = (pd.Period(mes, 'M') + 1).strftime('%Y-%m')
+                filtros = [('gte', 'fecha_factura', f"{mes}-01"), ('lt', 'fecha_factura', f"{siguiente}-01")]
+            celdas += self._escribir(self._celdas(filtros), [('eq', 'mes', mes)])
+        return {"meses": meses, "celdas": celdas}
+
+    def reconstruir(self):
+        """Recalcula el cubo completo con un recorrido de todas las facturas. Devuelve {'meses': [...], 'celdas': n}."""
+        celdas = self._celdas([])
+        return {"meses": sorted(celdas['mes'].unique().tolist()), "celdas": self._escribir(celdas, [])}
+
+    def consultar(self, dimensiones=('mes',), desde=None, hasta=None, estado=None, es_electronica=None,
+                  proveedor_nif=None):
+        """
+        Corte del cubo: las medidas agregadas por 'dimensiones' (subconjunto de DIMENSIONES;
+        vacío para el total) de las celdas entre los meses 'desde' y 'hasta' (incluidos) que
+        cumplen los filtros de estado, canal y proveedor. Devuelve las filas con el número de
+        facturas, el importe total y el tiempo medio de anotación (en horas), ordenadas por
+        las dimensiones, y el número de celdas leídas.
+        """
+        desconocidas = [d for d in dimensiones if d not in DIMENSIONES]
+        if desconocidas:
+            raise ValueError(f"Dimensiones desconocidas: {', '.join(desconocidas)}")
+        filtros = [('gt', 'numero_facturas', 0)]
+        if desde:
+            filtros.append(('gte', 'mes', desde))
+        if hasta:
+            filtros.append(('lte', 'mes', hasta))
+        for columna, valor in (('estado', estado), ('es_electronica', es_electronica), ('proveedor_nif', proveedor_nif)):
+            if valor is not None:
+                filtros.append(('eq', columna, valor))
+
+        celdas = []
+        if self.repositorio.existe_tabla(self.tabla):
+            celdas = list(self.repositorio.iterar(self.tabla, ', '.join(['clave', *DIMENSIONES, *MEDIDAS]),
+                                                  filtros=filtros, orden=('clave',), tamano_pagina=self.tamano_pagina))
+        tabla = pd.DataFrame(celdas, columns=['clave', *DIMENSIONES, *MEDIDAS])
+        if dimensiones:
+            agregado = _agrupar(tabla, dimensiones).sort_values(list(dimensiones), kind='stable', na_position='last')
+        else:
+            agregado = pd.DataFrame([{m: int(pd.to_numeric(tabla[m]).sum()) for m in MEDIDAS}])
+        filas = [{
+            **{d: fila[d] if pd.notna(fila[d]) else None for d in dimensiones},
+            "numero_facturas": int(fila['numero_facturas']),
+            "importe_total": a_euros(fila['importe_centimos']),
+            "facturas_con_anotacion": int(fila['facturas_con_anotacion']),
+            "media_horas_anotacion": round(fila['segundos_anotacion'] / fila['facturas_con_anotacion'] / 3600, 2)
+            if fila['facturas_con_anotacion'] else None,
+        } for fila in agregado.to_dict('records')]
+        return {"dimensiones": list(dimensiones), "filas": filas, "celdas_leidas": len(celdas)}
@@ -0,0 +1,231 @@
+# analisis/tramitacion.py
+
+import numpy as np
+import pandas as pd
+from analisis.periodo import en_periodo
+
+ESTADOS_VALIDOS = ["REGISTRADA", "REGISTRADA EN RCF", "VERIFICADA EN RCF", "RECIBIDA EN DESTINO",
+                   "CONFORMADA", "CONTABILIZADA", "PAGADA", "ANULADA", "RECHAZADA"]
+
+# Tabla de transiciones del histórico de estados: estados a los que se puede pasar
+# directamente desde cada uno. None es el inicio del histórico de una factura. Repetir
+# el estado actual (un reenvío del mismo evento) siempre está permitido.
+TRANSICIONES_VALIDAS = {
+    None: ["REGISTRADA", "REGISTRADA EN RCF"],
+    "REGISTRADA": ["REGISTRADA EN RCF", "ANULADA", "RECHAZADA"],
+    "REGISTRADA EN RCF": ["VERIFICADA EN RCF", "RECIBIDA EN DESTINO", "ANULADA", "RECHAZADA"],
+    "VERIFICADA EN RCF": ["RECIBIDA EN DESTINO", "ANULADA", "RECHAZADA"],
+    "RECIBIDA EN DESTINO": ["CONFORMADA", "ANULADA", "RECHAZADA"],
+    "CONFORMADA": ["CONTABILIZADA", "ANULADA", "RECHAZADA"],
+    "CONTABILIZADA": ["PAGADA", "ANULADA"],
+    "PAGADA": [],
+    "ANULADA": [],
+    "RECHAZADA": [],
+}
+
+# Código entero del inicio del histórico (los estados se codifican por su posición en ESTADOS_VALIDOS).
+_INICIO = len(ESTADOS_VALIDOS)
+
+
+def _matriz_transiciones():
+    """Matriz booleana [estado anterior, estado siguiente] compilada desde TRANSICIONES_VALIDAS."""
+    codigo = {estado: i for i, estado in enumerate(ESTADOS_VALIDOS)}
+    codigo[None] = _INICIO
+    permitidas = np.eye(_INICIO + 1, dtype=bool)
+    permitidas[_INICIO, _INICIO] = False
+    for origen, destinos in TRANSICIONES_VALIDAS.items():
+        for destino in destinos:
+            permitidas[codigo[origen], codigo[destino]] = True
+    return permitidas
+
+
+def codificar_estados(estados):
+    """Código entero de cada estado (posición en ESTADOS_VALIDOS); -1 si no es un estado válido."""
+    return pd.Categorical(estados, categories=ESTADOS_VALIDOS).codes.astype(np.int64)
+
+
+def ordenar_historico(facturas, fechas, plataformas=None):
+    """
+    Ordena una vez los eventos por (plataforma, factura, fecha) y devuelve (orden, grupos, instantes):
+    la permutación, un código entero por (plataforma, factura) y el instante (ns UTC, NaT como
+    mínimo) de cada evento, ya ordenados. Los empates conservan el orden de lectura.
+    """
+    codigos_factura = pd.factorize(pd.Series(facturas, dtype=object))[0].astype(np.int64)
+    if plataformas is None:
+        codigos_plataforma = np.zeros(len(codigos_factura), dtype=np.int64)
+    else:
+        codigos_plataforma = pd.factorize(pd.Series(plataformas, dtype=object))[0].astype(np.int64)
+    grupos = codigos_plataforma * (codigos_factura.max(initial=0) + 2) + codigos_factura
+    instantes = pd.to_datetime(pd.Series(fechas, dtype=object), utc=True, format='ISO8601',
+                               errors='coerce').to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    orden = np.lexsort((instantes, grupos))
+    return orden, grupos[orden], instantes[orden]
+
+
+def validar_transiciones(facturas, estados, fechas, plataformas=None):
+    """
+    Valida el recorrido de cada factura por el histórico de estados (eventos en columnas:
+    factura, estado, fecha y, opcionalmente, plataforma). Tras ordenar los eventos por
+    (plataforma, factura, fecha), cada evento se compara con el anterior de la misma factura
+    y plataforma mediante la matriz de transiciones, todo en operaciones vectorizadas.
+
+    Devuelve un DataFrame con los eventos no válidos (factura, plataforma, desde, hasta, fecha, tipo),
+    en orden de factura y fecha. Tipos: 'estado_desconocido', 'sin_fecha', 'inicio_incompleto'
+    (el histórico no empieza por un estado inicial), 'posterior_a_estado_final',
+    'retroceso', 'salto' (faltan estados intermedios) y 'transicion_no_permitida'.
+    """
+    estados = np.asarray(estados, dtype=object)
+    fechas = np.asarray(fechas, dtype=object)
+    orden, grupos, instantes = ordenar_historico(facturas, fechas, plataformas)
+    codigos = codificar_estados(estados[orden])
+
+    # Los eventos sin fecha o con estado desconocido no forman parte del recorrido.
+    sin_fecha = instantes == np.iinfo(np.int64).min
+    desconocido = codigos < 0
+    en_recorrido = ~sin_fecha & ~desconocido
+    idx = np.flatnonzero(en_recorrido)
+    grupo_r, codigo_r = grupos[idx], codigos[idx]
+
+    anterior = np.full(len(idx), _INICIO, dtype=np.int64)
+    misma_factura = np.zeros(len(idx), dtype=bool)
+    misma_factura[1:] = grupo_r[1:] == grupo_r[:-1]
+    anterior[misma_factura] = codigo_r[:-1][misma_factura[1:]]
+    invalida = ~_matriz_transiciones()[anterior, codigo_r]
+
+    # Flujo principal: los estados de ESTADOS_VALIDOS hasta PAGADA, en su orden.
+    finales = np.array([not TRANSICIONES_VALIDAS[e] for e in ESTADOS_VALIDOS] + [False])
+    en_flujo = np.arange(_INICIO + 1) <= ESTADOS_VALIDOS.index("PAGADA")
+    ambos_en_flujo = en_flujo[anterior] & en_flujo[codigo_r]
+    tipo_recorrido = np.select(
+        [anterior == _INICIO, finales[anterior],
+         ambos_en_flujo & (codigo_r < anterior), ambos_en_flujo & (codigo_r > anterior)],
+        ['inicio_incompleto', 'posterior_a_estado_final', 'retroceso', 'salto'],
+        default='transicion_no_permitida')
+
+    tipos = np.full(len(codigos), None, dtype=object)
+    tipos[sin_fecha] = 'sin_fecha'
+    tipos[desconocido] = 'estado_desconocido'
+    tipos[idx[invalida]] = tipo_recorrido[invalida]
+    desde = np.full(len(codigos), None, dtype=object)
+    nombres = np.array(ESTADOS_VALIDOS + [None], dtype=object)
+    desde[idx] = nombres[anterior]
+
+    erroneos = np.flatnonzero(tipos != None)  # noqa: E711 (comparación elemento a elemento)
+    facturas_ordenadas = np.asarray(facturas, dtype=object)[orden]
+    plataformas = np.full(len(orden), None, dtype=object) if plataformas is None \
+        else np.asarray(plataformas, dtype=object)[orden]
+    return pd.DataFrame({
+        'factura_id': facturas_ordenadas[erroneos],
+        'plataforma': plataformas[erroneos],
+        'desde': desde[erroneos],
+        'hasta': estados[orden][erroneos],
+        'fecha': fechas[orden][erroneos],
+        'tipo': tipos[erroneos],
+    })
+
+
+class AuditoriaTramitacion:
+    """
+    Pruebas de auditoría V.4: comprueba que el estado de cada factura electrónica
+    esté dentro de los valores válidos. Se alimenta fila a fila con procesar().
+    """
+
+    COLUMNAS = ('id', 'numero_factura', 'proveedor_nif', 'estado', 'fecha_factura')
+
+    def __init__(self, fecha_inicio_str=None, fecha_fin_str=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.total_facturas = 0
+        self.estados_incorrectos = []
+
+    def filtros(self):
+        filtros = [('eq', 'es_electronica', True)]
+        if self.fecha_inicio_str:
+            filtros.append(('gte', 'fecha_factura', self.fecha_inicio_str))
+        if self.fecha_fin_str:
+            filtros.append(('lte', 'fecha_factura', self.fecha_fin_str))
+        return filtros
+
+    def aplica(self, f):
+        if f.get('es_electronica') is not True:
+            return False
+        if not self.fecha_inicio_str and not self.fecha_fin_str:
+            return True
+        return en_periodo(f.get('fecha_factura'), self.fecha_inicio_str, self.fecha_fin_str)
+
+    def procesar(self, f):
+        self.total_facturas += 1
+        estado = f.get('estado', '')
+        if estado not in ESTADOS_VALIDOS:
+            self.estados_incorrectos.append({
+                "id": f.get('id'),
+                "numero_factura": f.get('numero_factura'),
+                "estado": estado
+            })
+
+    def resultado(self):
+        return {
+            "total_facturas_tramitacion": self.total_facturas,
+            "facturas_con_estado_incorrecto": self.estados_incorrectos
+        }
+
+
+class AuditoriaTransiciones:
+    """
+    Pruebas de auditoría V.4 sobre el histórico de estados: valida la secuencia de estados
+    de cada factura con TRANSICIONES_VALIDAS (p. ej. PAGADA antes de CONTABILIZADA, o
+    estados intermedios que faltan). Los eventos recibidos con procesar() se guardan por
+    columnas y resultado() los valida de una vez con validar_transiciones().
+
+    Con periodo se leen los eventos hasta fecha_fin (el recorrido completo hasta entonces) y
+    se informa de las facturas con algún evento dentro del periodo.
+    """
+
+    COLUMNAS = ('id', 'factura_id', 'estado', 'fecha_estado', 'plataforma')
+
+    def __init__(self, fecha_inicio_str=None, fecha_fin_str=None, plataforma=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.plataforma = plataforma
+        self.columnas = {c: [] for c in self.COLUMNAS}
+
+    def filtros(self):
+        filtros = []
+        if self.plataforma:
+            filtros.append(('eq', 'plataforma', self.plataforma))
+        if self.fecha_fin_str:
+            filtros.append(('lte', 'fecha_estado', self.fecha_fin_str))
+        return filtros
+
+    def procesar(self, f):
+        for columna, valores in self.columnas.items():
+            valores.append(f.get(columna))
+
+    def procesar_columnas(self, eventos):
+        """Como procesar(), con un bloque de eventos ya en columnas (p. ej. del almacén del histórico)."""
+        for columna, valores in self.columnas.items():
+            valores.extend(eventos[columna].tolist() if columna in eventos else [None] * len(eventos))
+
+    def resultado(self):
+        facturas = self.columnas['factura_id']
+        fechas = self.columnas['fecha_estado']
+        errores = validar_transiciones(facturas, self.columnas['estado'], fechas, self.columnas['plataforma'])
+
+        facturas_periodo = set(facturas)
+        if self.fecha_inicio_str:
+            desde = pd.Timestamp(self.fecha_inicio_str, tz='UTC')
+            instantes = pd.to_datetime(pd.Series(fechas, dtype=object), utc=True, format='ISO8601', errors='coerce')
+            facturas_periodo = set(pd.Series(facturas, dtype=object)[(instantes >= desde).to_numpy()])
+            errores = errores[errores['factura_id'].isin(facturas_periodo)]
+
+        facturas_con_errores = [{
+            "factura_id": factura_id,
+            "transiciones_invalidas": grupo[['plataforma', 'desde', 'hasta', 'fecha', 'tipo']].to_dict('records')
+        } for factura_id, grupo in errores.groupby('factura_id', sort=False, dropna=False)]
+
+        return {
+            "total_eventos_historico": len(facturas),
+            "total_facturas_historico": len(facturas_periodo),
+            "transiciones_invalidas_por_tipo": errores['tipo'].value_counts().to_dict(),
+            "facturas_con_transiciones_invalidas": facturas_con_errores
+        }
@@ -0,0 +1,171 @@
+# analisis/validaciones.py
+
+import re
+import numpy as np
+from analisis.periodo import en_periodo
+from analisis.importes import a_centimos, a_euros, sumar
+
+_TERMINO = re.compile(r'\s*([+-]?)\s*([A-Za-z_][A-Za-z0-9_]*)\s*')
+
+# Filas que se acumulan antes de evaluar las reglas sobre ellas.
+TAMANO_BLOQUE_VALIDACIONES = 10000
+
+
+def _terminos(lado):
+    """Coeficientes (+1/-1) de una suma de columnas escrita como 'a - b + c'."""
+    terminos = {}
+    posicion = 0
+    while posicion < len(lado):
+        encontrado = _TERMINO.match(lado, posicion)
+        if not encontrado or encontrado.end() == posicion or (posicion and not encontrado.group(1)):
+            raise ValueError(f"Expresión no válida: {lado}")
+        signo = -1 if encontrado.group(1) == '-' else 1
+        columna = encontrado.group(2)
+        terminos[columna] = terminos.get(columna, 0) + signo
+        posicion = encontrado.end()
+    return terminos
+
+
+class Regla:
+    """
+    Validación aritmética de importes: una igualdad entre sumas de columnas, p. ej.
+    'total_importe_bruto - total_descuentos + total_cargos = total_importe_bruto_antes_impuestos'.
+    Se incumple cuando los dos lados difieren en más de 'tolerancia_centimos'.
+    """
+
+    def __init__(self, nombre, expresion, mensaje, tolerancia_centimos=0):
+        izquierda, _, derecha = expresion.partition('=')
+        if not derecha:
+            raise ValueError(f"La expresión de la regla {nombre} no contiene '='")
+        self.nombre = nombre
+        self.expresion = expresion
+        self.mensaje = mensaje
+        self.tolerancia_centimos = tolerancia_centimos
+        # Coeficiente de cada columna en (izquierda - derecha)
+        self.coeficientes = _terminos(izquierda)
+        for columna, coeficiente in _terminos(derecha).items():
+            self.coeficientes[columna] = self.coeficientes.get(columna, 0) - coeficiente
+        self.columnas = tuple(self.coeficientes)
+
+
+# Reglas de contenido de la Orden HAP/1650/2015 (V.3). Para añadir una comprobación basta
+# con declararla aquí.
+REGLAS_V3 = [
+    Regla('base_imponible',
+          'total_importe_bruto - total_descuentos + total_cargos = total_importe_bruto_antes_impuestos',
+          "Error en cálculo de total_importe_bruto_antes_impuestos"),
+    Regla('total_factura',
+          'total_importe_bruto_antes_impuestos + total_impuestos_repercutidos - total_impuestos_retenidos = total_factura',
+          "Error en cálculo de total_factura"),
+]
+
+
+class MotorReglas:
+    """
+    Compila un conjunto de reglas en una matriz de coeficientes (reglas x columnas), de
+    modo que todas se evalúan a la vez sobre un bloque de filas con un único producto
+    matricial en céntimos enteros.
+    """
+
+    def __init__(self, reglas):
+        self.reglas = list(reglas)
+        self.columnas = list(dict.fromkeys(c for regla in self.reglas for c in regla.columnas))
+        self.coeficientes = np.array(
+            [[regla.coeficientes.get(c, 0) for c in self.columnas] for regla in self.reglas], dtype=np.int64
+        ).reshape(len(self.reglas), len(self.columnas))
+        self.tolerancias = np.array([regla.tolerancia_centimos for regla in self.reglas], dtype=np.int64)
+
+    def evaluar(self, centimos):
+        """
+        'centimos' es una matriz int64 (columnas x filas) en el orden de self.columnas.
+        Devuelve una matriz booleana (reglas x filas) con True donde la regla se incumple.
+        """
+        residuos = self.coeficientes @ centimos
+        return np.abs(residuos) > self.tolerancias[:, None]
+
+
+def reglas_por_nombre(nombres):
+    """Reglas de REGLAS_V3 con los nombres indicados. Lanza ValueError si alguno no existe."""
+    disponibles = {regla.nombre: regla for regla in REGLAS_V3}
+    desconocidas = [n for n in nombres if n not in disponibles]
+    if desconocidas:
+        raise ValueError(f"Reglas desconocidas: {', '.join(desconocidas)}")
+    return [disponibles[n] for n in nombres]
+
+
+class AuditoriaValidaciones:
+    """
+    Pruebas de auditoría V.3: validaciones del contenido de las facturas electrónicas
+    (sumas y redondeos de los importes). Se alimenta fila a fila con procesar(); las
+    filas se guardan por columnas y las reglas activas se evalúan por bloques.
+    """
+
+    def __init__(self, fecha_inicio_str=None, fecha_fin_str=None, reglas=None):
+        self.fecha_inicio_str = fecha_inicio_str
+        self.fecha_fin_str = fecha_fin_str
+        self.motor = MotorReglas(REGLAS_V3 if reglas is None else reglas)
+        # total_factura se lee siempre: el importe total se informa sean cuales sean las reglas.
+        self.COLUMNAS = ('id', 'numero_factura', *dict.fromkeys((*self.motor.columnas, 'total_factura')))
+        self.total_facturas = 0
+        self.importe_total_centimos = 0
+        self.resultados_validaciones = []
+        self._bloque = {c: [] for c in self.COLUMNAS}
+
+    def filtros(self):
+        filtros = [('eq', 'es_electronica', True)]
+        if self.fecha_inicio_str:
+            filtros.append(('gte', 'fecha_factura', self.fecha_inicio_str))
+        if self.fecha_fin_str:
+            filtros.append(('lte', 'fecha_factura', self.fecha_fin_str))
+        return filtros
+
+    def aplica(self, f):
+        if f.get('es_electronica') is not True:
+            return False
+        if not self.fecha_inicio_str and not self.fecha_fin_str:
+            return True
+        return en_periodo(f.get('fecha_factura'), self.fecha_inicio_str, self.fecha_fin_str)
+
+    def procesar(self, f):
+        self.total_facturas += 1
+        for columna, valores in self._bloque.items():
+            valores.append(f.get(columna, 0))
+        if len(self._bloque['id']) >= TAMANO_BLOQUE_VALIDACIONES:
+            self._evaluar_bloque()
+
+    def _evaluar_bloque(self):
+        bloque = self._bloque
+        self._bloque = {c: [] for c in self.COLUMNAS}
+        if not bloque['id']:
+            return
+        n = len(bloque['id'])
+        centimos = np.zeros((len(self.motor.columnas), n), dtype=np.int64)
+        primera_no_valida = np.full(n, -1)
+        for i, columna in enumerate(self.motor.columnas):
+            centimos[i], validos = a_centimos(bloque[columna])
+            primera_no_valida[(primera_no_valida < 0) & ~validos] = i
+        totales, validos = a_centimos(bloque['total_factura'])
+        self.importe_total_centimos += sumar(totales[validos])
+
+        incumplidas = self.motor.evaluar(centimos)
+        incumplidas[:, primera_no_valida >= 0] = False
+        con_errores = np.flatnonzero(incumplidas.any(axis=0) | (primera_no_valida >= 0))
+        for fila in con_errores.tolist():
+            if primera_no_valida[fila] >= 0:
+                columna = self.motor.columnas[primera_no_valida[fila]]
+                errores = [f"Error al procesar datos numéricos: valor no numérico en {columna}"]
+            else:
+                errores = [regla.mensaje for regla, mal in zip(self.motor.reglas, incumplidas[:, fila]) if mal]
+            self.resultados_validaciones.append({
+                "id": bloque['id'][fila],
+                "numero_factura": bloque['numero_factura'][fila],
+                "errores": errores
+            })
+
+    def resultado(self):
+        self._evaluar_bloque()
+        return {
+            "total_facturas_validadas": self.total_facturas,
+            "importe_total_facturas_validadas": a_euros(self.importe_total_centimos),
+            "facturas_con_errores": self.resultados_validaciones
+        }
@@ -12,6 +12,14 @@ import base64
 import supabase
 from PIL import Image
 import xlsxwriter
+from datos.repositorio import RepositorioSupabase
+from importacion.lectura import vista_previa
+from importacion.perfiles import obtener_perfil
+from importacion.pipeline import importar_facturas
+from importacion.puntos_control import PuntosControl
+from analisis.contenido import ValidacionesContenido
+from analisis.resumen import ResumenMensual
+from datos.dir3 import CatalogoDIR3
 
 # Configuración de la página
 st.set_page_config(
@@ -293,19 +301,45 @@ def show_importacion_datos():
         
         if uploaded_file is not None:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
-                else:
-                    df = pd.read_excel(uploaded_file)
-                
+                # Sólo se leen las primeras filas; el fichero se procesa por bloques al importarlo
                 st.write("Vista previa de los datos:")
-                st.dataframe(df.head())
+                st.dataframe(vista_previa(uploaded_file, uploaded_file.name))
                 
                 if st.button("Procesar facturas", key="procesar_facturas"):
+                    # Importación por bloques con escritura por lotes en 'facturas'
+                    uploaded_file.seek(0)
+                    barra = st.progress(0.0, text="Importando facturas...")
+                    # Si el mismo fichero tiene una importación interrumpida, se reanuda desde su último lote confirmado
+                    repositorio = RepositorioSupabase(get_supabase_client())
+                    # Al terminar se recalculan en el resumen mensual los meses importados
+                    resumen_mensual = ResumenMensual(repositorio, os.environ.get("TABLA_RESUMEN_MENSUAL", "resumen_mensual"))
+                    resumen = None
+                    for estado in importar_facturas(repositorio, uploaded_file, uploaded_file.name, obtener_perfil(plataforma),
+                                                    puntos_control=PuntosControl(repositorio), resumen=resumen_mensual):
+                        if resumen is None and estado["reanudada_desde_fila"]:
+                            info_box(
+                                "Importación reanudada",
+                                f"Este fichero ya se había importado en parte: se continúa desde la fila {estado['reanudada_desde_fila']}."
+                            )
+                        resumen = estado
+                        fraccion = resumen["bytes_leidos"] / resumen["bytes_totales"] if resumen["bytes_totales"] else 0.0
+                        barra.progress(
+                            min(fraccion, 1.0),
+                            text=f"{resumen['filas_escritas']} facturas importadas de {resumen['filas_leidas']} filas leídas"
+                        )
                     success_box(
                         "Procesamiento exitoso",
-                        f"Se han procesado {len(df)} facturas correctamente."
+                        f"Se han importado {resumen['filas_escritas']} facturas ({resumen['filas_nuevas']} nuevas y "
+                        f"{resumen['filas_actualizadas']} actualizadas; {resumen['filas_omitidas']} sin cambios omitidas) "
+                        f"en {resumen['segundos']} segundos."
                     )
+                    if resumen["filas_descartadas"] or resumen["valores_no_validos"]:
+                        no_validos = ", ".join(f"{c}: {n}" for c, n in resumen["valores_no_validos"].items())
+                        warning_box(
+                            "Filas con incidencias",
+                            f"{resumen['filas_descartadas']} filas descartadas por no tener número, NIF o fecha de factura. "
+                            f"Valores no válidos por columna: {no_validos or 'ninguno'}."
+                        )
             except Exception as e:
                 warning_box(
                     "Error al procesar el archivo",
@@ -633,11 +667,29 @@ def show_contenido_facturas():
     # Validaciones de la Orden HAP/1650/2015
     st.markdown('<h2 class="section-header">Validaciones de la Orden HAP/1650/2015</h2>', unsafe_allow_html=True)
     
-    # Datos de ejemplo para validaciones
+    # Validaciones calculadas sobre los documentos Facturae importados y sus firmas (tablas 'documentos_facturae' y 'firmas_facturae')
+    # Con un catálogo DIR3 local (DIR3_CATALOGO_RUTA) se validan también los códigos DIR3
+    ruta_dir3 = os.environ.get("DIR3_CATALOGO_RUTA")
+    validaciones = ValidacionesContenido(CatalogoDIR3(ruta_dir3) if ruta_dir3 else None)
+    try:
+        repositorio = RepositorioSupabase(get_supabase_client())
+        for d in repositorio.iterar('documentos_facturae', ', '.join(validaciones.COLUMNAS), filtros=validaciones.filtros()):
+            validaciones.procesar(d)
+        for f in repositorio.iterar('firmas_facturae', ', '.join(validaciones.COLUMNAS_FIRMAS), filtros=validaciones.filtros()):
+            validaciones.procesar_firma(f)
+    except Exception as e:
+        warning_box("No se han podido calcular las validaciones de contenido", str(e))
+    por_validacion = {v["validacion"]: v for v in validaciones.resultado()["validaciones"]}
+    etiquetas = {
+        "Validación de formato Facturae": "Formato Facturae",
+        "Validación de firma electrónica": "Firma electrónica",
+        "Validación de NIF emisor": "NIF emisor",
+        "Validación de códigos DIR3": "Códigos DIR3",
+    }
     df_validaciones = pd.DataFrame({
-        "Validación": ["Validación de formato Facturae", "Validación de firma electrónica", "Validación de NIF emisor", "Validación de códigos DIR3"],
-        "Nº facturas": [0, 0, 0, 0],
-        "Porcentaje": [0.0, 0.0, 0.0, 0.0]
+        "Validación": list(etiquetas),
+        "Nº facturas": [por_validacion.get(v, {}).get("facturas_no_validas", 0) for v in etiquetas.values()],
+        "Porcentaje": [por_validacion.get(v, {}).get("porcentaje", 0.0) for v in etiquetas.values()]
     })
     
     st.dataframe(df_validaciones)
@@ -3,12 +3,18 @@
 from flask import Flask
 from routes.main_routes import main_bp
 from routes.audit import audit_bp  # Importa el blueprint desde routes/audit/__init__.py
+from routes.importacion_routes import importacion_bp
+from routes.dir3_routes import dir3_bp
+from routes.resumen_routes import resumen_bp
 
 app = Flask(__name__)
 
 # Registrar blueprints
 app.register_blueprint(main_bp)
 app.register_blueprint(audit_bp)
+app.register_blueprint(importacion_bp)
+app.register_blueprint(dir3_bp)
+app.register_blueprint(resumen_bp)
 
 if __name__ == '__main__':
     import os
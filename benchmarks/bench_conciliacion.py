@@ -0,0 +1,70 @@
+# benchmarks/bench_conciliacion.py
+#
+# Mide la conciliación del registro de FACe con el RCF (analisis.conciliacion) con un
+# registro sintético de un año y un RCF con el doble de facturas, la mitad sin número de
+# registro (se emparejan por NIF, número y fecha), sin contar la lectura de ninguno de los dos.
+#
+# Uso: python -m benchmarks.bench_conciliacion [registros]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from analisis.conciliacion import ConciliacionRegistro, TAMANO_BLOQUE_CONCILIACION
+from datos.repositorio import lotes
+
+
+def facturas_sinteticas(n, semilla=0):
+    """Facturas electrónicas de 2024 como filas de 'facturas' (diccionarios, fechas en texto)."""
+    rng = np.random.default_rng(semilla)
+    fechas = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 366, n), 'D')
+    registro = fechas + pd.to_timedelta(rng.integers(0, 3 * 86400, n), 's')
+    numeros = rng.integers(0, 10 ** 8, 5000)
+    letras = np.frombuffer(b'TRWAGMYFPDXBNJZSQVHLCKE', dtype='S1').astype(str)
+    nifs = np.char.add(np.char.zfill(numeros.astype(str), 8), letras[numeros % 23])[rng.integers(0, 5000, n)]
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'numero_registro': np.where(np.arange(n) % 2 == 0, None, [f'REGAGE24e{i:08d}' for i in range(n)]),
+        'numero_factura': [f'F-{i}' for i in range(n)],
+        'proveedor_nif': nifs.astype(object),
+        'fecha_factura': fechas.strftime('%Y-%m-%d'),
+        'total_factura': np.round(rng.uniform(1, 5000, n), 2),
+        'fecha_presentacion_registro': registro.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+        'fecha_registro_rcf': (registro + pd.Timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+    })
+
+
+def registro_sintetico(facturas):
+    """Registro de la plataforma (como lo devuelve importacion.registro.leer_registro) de esas facturas."""
+    return pd.DataFrame({
+        'numero_registro': [f'REGAGE24e{i:08d}' for i in range(len(facturas))],
+        'numero_factura': facturas['numero_factura'],
+        'proveedor_nif': facturas['proveedor_nif'],
+        'nombre_proveedor': None,
+        'fecha_factura': pd.to_datetime(facturas['fecha_factura']).astype('datetime64[s]'),
+        'fecha_registro': pd.to_datetime(facturas['fecha_presentacion_registro'], utc=True)
+        .dt.tz_localize(None).astype('datetime64[s]'),
+        'total_factura': pd.array(np.round(facturas['total_factura'].to_numpy() * 100).astype(np.int64), dtype='Int64'),
+        'estado': None,
+    })
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    facturas = facturas_sinteticas(2 * n)
+    # El registro tiene las n primeras facturas menos las 100 primeras, que faltan en el RCF.
+    registro = registro_sintetico(facturas.iloc[:n])
+    filas = facturas.iloc[100:].astype(object).where(facturas.iloc[100:].notna(), None).to_dict('records')
+
+    t0 = time.perf_counter()
+    conciliacion = ConciliacionRegistro(registro, fecha_corte='2025-01-31')
+    t1 = time.perf_counter()
+    for bloque in lotes(filas, TAMANO_BLOQUE_CONCILIACION):
+        conciliacion.procesar_lote(bloque)
+    resultado = conciliacion.resultado()
+    t2 = time.perf_counter()
+    print(f"registro: {len(registro)} filas indexadas en {t1 - t0:.2f} s")
+    print(f"RCF: {len(filas)} facturas conciliadas en {t2 - t1:.2f} s "
+          f"({(t2 - t1) / len(filas) * 1e6:.1f} µs/factura)")
+    print(f"emparejadas {resultado['emparejadas']}, faltan en RCF {resultado['total_faltan_en_rcf']}, "
+          f"faltan en la plataforma {resultado['total_faltan_en_plataforma']}")
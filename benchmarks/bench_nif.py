@@ -0,0 +1,38 @@
+# benchmarks/bench_nif.py
+#
+# Mide la validación y normalización vectorizada de NIF (analisis.nif.clasificar_nifs)
+# con volúmenes crecientes de DNI, NIE y CIF sintéticos, con y sin separadores.
+#
+# Uso: python -m benchmarks.bench_nif [n_max]
+
+import sys
+import time
+import numpy as np
+from analisis.nif import clasificar_nifs
+
+
+def nifs_sinteticos(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    numeros = rng.integers(0, 10 ** 8, n)
+    letras = np.frombuffer(b'TRWAGMYFPDXBNJZSQVHLCKE', dtype='S1')
+    dni = np.char.add(np.char.zfill(numeros.astype(str), 8), letras[numeros % 23].astype(str))
+    cif = np.char.add(np.char.add(rng.choice(list('ABGPQ'), n), np.char.zfill((numeros % 10 ** 7).astype(str), 7)),
+                      rng.integers(0, 10, n).astype(str))
+    nifs = np.where(rng.random(n) < 0.5, dni, cif).astype(object)
+    # Un 10 % con el formato con que suelen teclearse (minúsculas, guiones y puntos).
+    tecleados = rng.random(n) < 0.1
+    nifs[tecleados] = [f" {nif[:2]}.{nif[2:5]}.{nif[5:8]}-{nif[8:].lower()}" for nif in nifs[tecleados]]
+    return nifs
+
+
+if __name__ == '__main__':
+    n_max = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n = 10_000
+    print(f"{'nif':>10} {'segundos':>10} {'ns/nif':>8} {'válidos':>8}")
+    while n <= n_max:
+        nifs = nifs_sinteticos(n)
+        t0 = time.perf_counter()
+        validos, _, _ = clasificar_nifs(nifs)
+        segundos = time.perf_counter() - t0
+        print(f"{n:>10} {segundos:>10.3f} {segundos / n * 1e9:>8.0f} {validos.mean():>8.1%}")
+        n *= 10
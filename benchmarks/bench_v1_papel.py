@@ -0,0 +1,46 @@
+# benchmarks/bench_v1_papel.py
+#
+# Mide el motor columnar de V.1 (analisis.papel.auditar_papel) con volúmenes crecientes
+# de facturas sintéticas. El tiempo por factura debe mantenerse estable (coste lineal).
+#
+# Uso: python -m benchmarks.bench_v1_papel [n_max]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from analisis.papel import auditar_papel
+
+
+def facturas_sinteticas(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    inicio = np.datetime64('2024-01-01')
+    presentacion = inicio + rng.integers(0, 365, n).astype('timedelta64[D]')
+    registro = presentacion + rng.integers(0, 45, n).astype('timedelta64[D]')
+    fecha_factura = presentacion - rng.integers(0, 10, n).astype('timedelta64[D]')
+    # Un 5 % de las facturas repite la clave de otra para generar grupos de duplicadas.
+    numero = np.char.add('F', rng.integers(0, n, n).astype(str))
+    repetidas = rng.random(n) < 0.05
+    numero[repetidas] = numero[rng.integers(0, n, repetidas.sum())]
+    return pd.DataFrame({
+        'id': pd.Series(np.arange(1, n + 1), dtype=object),
+        'numero_factura': pd.Series(numero, dtype=object),
+        'proveedor_nif': pd.Series(np.char.add('B', rng.integers(0, 50, n).astype(str)), dtype=object),
+        'fecha_factura': pd.Series(np.datetime_as_string(fecha_factura), dtype=object),
+        'fecha_presentacion_registro': pd.Series(np.char.add(np.datetime_as_string(presentacion), 'T09:30:00Z'), dtype=object),
+        'fecha_registro_rcf': pd.Series(np.char.add(np.datetime_as_string(registro), 'T12:00:00+00:00'), dtype=object),
+        'total_factura': pd.Series(np.round(rng.uniform(10, 50000, n), 2), dtype=object),
+    })
+
+
+if __name__ == '__main__':
+    n_max = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n = 10_000
+    print(f"{'facturas':>10} {'segundos':>10} {'µs/factura':>11}")
+    while n <= n_max:
+        df = facturas_sinteticas(n)
+        t0 = time.perf_counter()
+        auditar_papel(df, '2024-01-01', '2024-12-31')
+        segundos = time.perf_counter() - t0
+        print(f"{n:>10} {segundos:>10.2f} {segundos / n * 1e6:>11.2f}")
+        n *= 10
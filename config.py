@@ -3,19 +3,107 @@
 import os
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from datos.repositorio import RepositorioSupabase
+from datos.local import RepositorioLocal
+from datos.historico import AlmacenHistorico
+from datos.dir3 import CatalogoDIR3
+from analisis.papel import ObligacionFacturaElectronica, TIPOS_OBLIGADOS, UMBRAL_EXENCION
+from analisis.resumen import ResumenMensual
 
 load_dotenv()
 
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+# Origen de datos de la API: 'supabase' (por defecto) o 'local' (fichero SQLite en DATOS_LOCAL_RUTA,
+# por ejemplo una instantánea creada con 'python -m datos.local').
+DATOS_BACKEND = os.environ.get("DATOS_BACKEND", "supabase").lower()
+DATOS_LOCAL_RUTA = os.environ.get("DATOS_LOCAL_RUTA", "auditoria_local.sqlite")
+
+supabase = None
+repositorio = None
+
+if DATOS_BACKEND == "local":
+    repositorio = RepositorioLocal(DATOS_LOCAL_RUTA)
+    print(f"Usando la copia local de datos en {DATOS_LOCAL_RUTA}.")
+elif not SUPABASE_URL or not SUPABASE_KEY:
     print("ERROR CRÍTICO: Las variables de entorno SUPABASE_URL y SUPABASE_SERVICE_KEY deben estar definidas.")
-    supabase = None
 else:
     try:
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        repositorio = RepositorioSupabase(supabase)
         print("Conexión con Supabase establecida correctamente.")
     except Exception as e:
         print(f"Error CRÍTICO al inicializar el cliente de Supabase: {e}")
         supabase = None
+
+# Número de filas por página al recorrer 'facturas' con paginación keyset.
+# Debe ser menor o igual que el 'max-rows' configurado en PostgREST.
+TAMANO_PAGINA_FACTURAS = int(os.environ.get("TAMANO_PAGINA_FACTURAS", 1000))
+
+# Segundos durante los que se reutiliza el total estimado de facturas (GET /api/facturas?count=estimated).
+TTL_ESTIMACION_TOTAL = int(os.environ.get("TTL_ESTIMACION_TOTAL", 300))
+
+# Tabla del histórico de estados de las facturas: un evento por fila con
+# factura_id, estado, fecha_estado y plataforma ('FACe', 'RCF', ...).
+TABLA_HISTORICO_ESTADOS = os.environ.get("TABLA_HISTORICO_ESTADOS", "historico_estados")
+
+# Carpeta del almacén local del histórico de estados (datos.historico: segmentos comprimidos
+# por mes, sólo de añadir). Si se define, la importación del histórico escribe en él y las
+# auditorías V.4 lo leen en lugar de la tabla TABLA_HISTORICO_ESTADOS.
+HISTORICO_ESTADOS_RUTA = os.environ.get("HISTORICO_ESTADOS_RUTA")
+almacen_historico = AlmacenHistorico(HISTORICO_ESTADOS_RUTA) if HISTORICO_ESTADOS_RUTA else None
+
+# Importación de ficheros de facturas: filas leídas por bloque (acota la memoria usada) y
+# filas por petición de escritura (upsert) en 'facturas'.
+TAMANO_BLOQUE_IMPORTACION = int(os.environ.get("TAMANO_BLOQUE_IMPORTACION", 10000))
+TAMANO_LOTE_IMPORTACION = int(os.environ.get("TAMANO_LOTE_IMPORTACION", 500))
+
+# Columnas que identifican una factura al importarla (deben tener un índice único en
+# 'facturas'): una factura ya existente se actualiza en lugar de duplicarse.
+CLAVE_IMPORTACION_FACTURAS = os.environ.get("CLAVE_IMPORTACION_FACTURAS", "proveedor_nif,numero_factura,fecha_factura")
+
+# Tabla con los puntos de control de las importaciones (una fila por fichero, perfil y
+# tabla, con índice único en hash_fichero, perfil y tabla): permite reanudar una
+# importación interrumpida volviendo a subir el mismo fichero.
+TABLA_IMPORTACIONES = os.environ.get("TABLA_IMPORTACIONES", "importaciones")
+
+# Importación de documentos Facturae (importacion.facturae): tabla con el resumen de cada
+# documento (índice único en hash_documento), ruta opcional del XSD oficial (se usa si
+# está instalado lxml; si no, se valida con el esquema estructural interno) y procesos
+# del pool de análisis (por defecto, los núcleos disponibles).
+TABLA_DOCUMENTOS_FACTURAE = os.environ.get("TABLA_DOCUMENTOS_FACTURAE", "documentos_facturae")
+FACTURAE_XSD = os.environ.get("FACTURAE_XSD") or None
+PROCESOS_FACTURAE = int(os.environ.get("PROCESOS_FACTURAE", 0)) or None
+
+# Verificación de la firma electrónica de los documentos Facturae (importacion.firma):
+# tabla con el resultado de cada documento (índice único en hash_documento) y carpeta del
+# almacén de confianza local (certificados raíz e intermedios en PEM o DER). Sin almacén
+# ninguna cadena de certificados es de confianza.
+TABLA_FIRMAS_FACTURAE = os.environ.get("TABLA_FIRMAS_FACTURAE", "firmas_facturae")
+FIRMA_ALMACEN_CONFIANZA = os.environ.get("FIRMA_ALMACEN_CONFIANZA") or None
+
+# Carpeta del catálogo DIR3 local (datos.dir3: índice compacto de oficinas contables,
+# órganos gestores, unidades tramitadoras y sus relaciones). Se publica subiendo el
+# fichero de relaciones a POST /api/dir3/catalogo y se recarga sin reiniciar la API.
+DIR3_CATALOGO_RUTA = os.environ.get("DIR3_CATALOGO_RUTA")
+catalogo_dir3 = CatalogoDIR3(DIR3_CATALOGO_RUTA) if DIR3_CATALOGO_RUTA else None
+
+# Obligación de factura electrónica de la entidad (art. 4 Ley 25/2013), que V.1 aplica a las
+# facturas en papel: tipos de titular obligados (claves de analisis.nif.TIPOS_ENTIDAD separadas
+# por comas), importe en euros hasta el que se excluyen las facturas (0: sin exclusión) y NIF
+# de los proveedores excluidos, separados por comas.
+FACTURA_ELECTRONICA_TIPOS_OBLIGADOS = os.environ.get("FACTURA_ELECTRONICA_TIPOS_OBLIGADOS", ",".join(TIPOS_OBLIGADOS))
+FACTURA_ELECTRONICA_UMBRAL_EXENCION = float(os.environ.get("FACTURA_ELECTRONICA_UMBRAL_EXENCION", UMBRAL_EXENCION))
+FACTURA_ELECTRONICA_NIFS_EXENTOS = os.environ.get("FACTURA_ELECTRONICA_NIFS_EXENTOS", "")
+obligacion_factura_electronica = ObligacionFacturaElectronica(
+    [t.strip() for t in FACTURA_ELECTRONICA_TIPOS_OBLIGADOS.split(',') if t.strip()],
+    FACTURA_ELECTRONICA_UMBRAL_EXENCION,
+    [n for n in FACTURA_ELECTRONICA_NIFS_EXENTOS.split(',') if n.strip()])
+
+# Tabla del resumen mensual de las facturas (analisis.resumen: una fila por mes, estado,
+# es_electronica y proveedor_nif, identificada por la columna única 'clave'). Las
+# importaciones recalculan los meses que escriben; GET /api/resumen/mensual lee sus cortes.
+TABLA_RESUMEN_MENSUAL = os.environ.get("TABLA_RESUMEN_MENSUAL", "resumen_mensual")
+resumen_mensual = ResumenMensual(repositorio, TABLA_RESUMEN_MENSUAL, tamano_pagina=TAMANO_PAGINA_FACTURAS,
+                                 tamano_lote=TAMANO_LOTE_IMPORTACION) if repositorio else None
@@ -0,0 +1,297 @@
+# datos/dir3.py
+#
+# Catálogo local de unidades DIR3 (oficinas contables, órganos gestores y unidades
+# tramitadoras) y de las relaciones (OC, OG, UT) válidas, en una carpeta con un índice
+# compacto que se abre con mmap: los códigos ordenados como bytes de ancho fijo (búsqueda
+# binaria), el papel de cada código como máscara de bits, los nombres concatenados con sus
+# desplazamientos, y cada terna válida codificada como un entero de 64 bits a partir de
+# las posiciones de sus tres códigos, también ordenadas. Abrirlo no lee los datos, así que
+# tarda milisegundos, y una columna entera de facturas se valida con unas pocas búsquedas
+# vectorizadas.
+#
+# Cada catálogo publicado se escribe en una carpeta de versión nueva y el manifiesto se
+# sustituye de forma atómica; los lectores (de este u otros procesos) detectan el cambio
+# del manifiesto y cambian de índice sin reiniciar la aplicación.
+
+import json
+import os
+import shutil
+import threading
+import datetime
+import numpy as np
+import pandas as pd
+
+PAPELES_DIR3 = ('oficina_contable', 'organo_gestor', 'unidad_tramitadora')
+
+# Bit de cada papel en la máscara de papeles de un código.
+BITS_PAPEL = {'oficina_contable': 1, 'organo_gestor': 2, 'unidad_tramitadora': 4}
+
+# Motivos de una terna no válida (bits de la máscara de validar_ternas) y su descripción.
+MOTIVOS_DIR3 = {
+    1: ('oficina_contable_desconocida', "Oficina contable no existe en DIR3"),
+    2: ('organo_gestor_desconocido', "Órgano gestor no existe en DIR3"),
+    4: ('unidad_tramitadora_desconocida', "Unidad tramitadora no existe en DIR3"),
+    8: ('relacion_no_valida', "Relación OC-OG-UT no registrada en DIR3"),
+    16: ('codigos_incompletos', "Faltan códigos DIR3"),
+}
+
+# Ancho mínimo de los códigos en el índice (los códigos DIR3 tienen 9 caracteres).
+ANCHO_CODIGO = 9
+
+# Cada posición ocupa 21 bits en la clave de una terna (hasta 2.097.152 códigos).
+_BITS_POSICION = 21
+_MANIFIESTO = 'manifiesto.json'
+_ESCRITURA = threading.Lock()
+
+
+def normalizar_codigos(codigos):
+    """Códigos DIR3 comparables: array de bytes ASCII sin espacios y en mayúsculas (b'' para los nulos)."""
+    if isinstance(codigos, np.ndarray) and codigos.dtype.kind == 'S':
+        binarios = codigos
+    else:
+        serie = pd.Series(codigos, dtype=object)
+        textos = serie.where(serie.notna(), '').tolist()
+        try:
+            binarios = np.array(textos, dtype='S')
+        except UnicodeEncodeError:
+            binarios = np.array([str(t).encode('ascii', 'replace') for t in textos], dtype='S')
+    binarios = np.strings.strip(binarios) if len(binarios) else binarios.astype('S1')
+    # Mayúsculas sobre los bytes (los códigos son ASCII): a-z pasan a A-Z.
+    letras = binarios.view(np.uint8)
+    letras[(letras >= ord('a')) & (letras <= ord('z'))] -= 32
+    return binarios
+
+
+class _Indice:
+    """Arrays de una versión del catálogo, abiertos con mmap."""
+
+    def __init__(self, carpeta, manifiesto):
+        def abrir(nombre):
+            return np.load(os.path.join(carpeta, nombre), mmap_mode='r')
+
+        self.manifiesto = manifiesto
+        self.codigos = abrir('codigos.npy')
+        self.papeles = abrir('papeles.npy')
+        self.desplazamientos = abrir('desplazamientos.npy')
+        self.ternas = abrir('ternas.npy')
+        tamano = os.path.getsize(os.path.join(carpeta, 'nombres.bin'))
+        self.nombres = np.memmap(os.path.join(carpeta, 'nombres.bin'), dtype=np.uint8, mode='r') \
+            if tamano else np.zeros(0, dtype=np.uint8)
+
+    def posiciones(self, codigos):
+        """Posición de cada código en el índice (-1 si no está)."""
+        return self.posiciones_normalizadas(normalizar_codigos(codigos))
+
+    def posiciones_normalizadas(self, codigos):
+        """Como posiciones(), para códigos ya pasados por normalizar_codigos()."""
+        posiciones = np.full(len(codigos), -1, dtype=np.int64)
+        ancho = self.codigos.dtype.itemsize
+        # Un código más largo que el índice no está (y truncarlo podría confundirlo con otro).
+        longitudes = np.strings.str_len(codigos)
+        presentes = (longitudes > 0) & (longitudes <= ancho)
+        if not presentes.any() or not len(self.codigos):
+            return posiciones
+        buscados = codigos[presentes].astype(f'S{ancho}')
+        encontradas = np.searchsorted(self.codigos, buscados)
+        dentro = encontradas < len(self.codigos)
+        coinciden = np.zeros(len(buscados), dtype=bool)
+        coinciden[dentro] = self.codigos[encontradas[dentro]] == buscados[dentro]
+        posiciones[np.flatnonzero(presentes)[coinciden]] = encontradas[coinciden]
+        return posiciones
+
+    def nombre(self, posicion):
+        inicio, fin = int(self.desplazamientos[posicion]), int(self.desplazamientos[posicion + 1])
+        return bytes(self.nombres[inicio:fin]).decode('utf-8') or None
+
+
+def _clave_ternas(oc, og, ut):
+    return (oc.astype(np.uint64) << np.uint64(2 * _BITS_POSICION)) | \
+           (og.astype(np.uint64) << np.uint64(_BITS_POSICION)) | ut.astype(np.uint64)
+
+
+class CatalogoDIR3:
+    """
+    Catálogo DIR3 en una carpeta local (ver la cabecera del módulo). Se publica con
+    publicar() y se consulta con buscar(), existen() y validar_ternas(); antes de cada
+    consulta se comprueba si el manifiesto ha cambiado y, si es así, se abre el índice
+    nuevo. Sin catálogo publicado, 'disponible' es False.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._indice = None
+        self._firma = None
+        self._cerrojo = threading.Lock()
+
+    # --- Lectura y recarga ---
+
+    def _firma_manifiesto(self):
+        try:
+            estado = os.stat(os.path.join(self.ruta, _MANIFIESTO))
+        except FileNotFoundError:
+            return None
+        return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+    def indice(self):
+        """Índice de la versión publicada (se vuelve a abrir si el manifiesto ha cambiado), o None."""
+        firma = self._firma_manifiesto()
+        if firma != self._firma:
+            with self._cerrojo:
+                if firma != self._firma:
+                    indice = None
+                    if firma is not None:
+                        with open(os.path.join(self.ruta, _MANIFIESTO), encoding='utf-8') as f:
+                            manifiesto = json.load(f)
+                        indice = _Indice(os.path.join(self.ruta, manifiesto['carpeta']), manifiesto)
+                    self._indice, self._firma = indice, firma
+        return self._indice
+
+    @property
+    def disponible(self):
+        return self.indice() is not None
+
+    def resumen(self):
+        """Manifiesto de la versión publicada (versión, códigos, ternas, fuente y fecha), o None."""
+        indice = self.indice()
+        return dict(indice.manifiesto) if indice is not None else None
+
+    # --- Consultas ---
+
+    def buscar(self, codigo):
+        """Código DIR3 con su nombre y papeles ({'codigo', 'nombre', 'papeles'}), o None si no existe."""
+        indice = self.indice()
+        if indice is None:
+            return None
+        posicion = int(indice.posiciones([codigo])[0])
+        if posicion < 0:
+            return None
+        mascara = int(indice.papeles[posicion])
+        return {
+            'codigo': indice.codigos[posicion].decode('ascii'),
+            'nombre': indice.nombre(posicion),
+            'papeles': [p for p in PAPELES_DIR3 if mascara & BITS_PAPEL[p]],
+        }
+
+    def existen(self, codigos, papel=None):
+        """Array booleano: si cada código existe en el catálogo (con ese 'papel', si se indica)."""
+        indice = self.indice()
+        if indice is None:
+            return np.zeros(len(codigos), dtype=bool)
+        posiciones = indice.posiciones(codigos)
+        existen = posiciones >= 0
+        if papel is not None:
+            existen[existen] = (indice.papeles[posiciones[existen]] & BITS_PAPEL[papel]) != 0
+        return existen
+
+    def validar_ternas(self, oficinas, organos, unidades):
+        """
+        Valida columnas de códigos (OC, OG, UT) de una vez. Devuelve un array uint8 con los
+        bits de MOTIVOS_DIR3 de cada fila (0 si la terna es válida): código que no existe
+        con ese papel, relación no registrada o códigos que faltan. Lanza ValueError si no
+        hay catálogo publicado.
+        """
+        indice = self.indice()
+        if indice is None:
+            raise ValueError("No hay catálogo DIR3 publicado")
+        mascara = np.zeros(len(oficinas), dtype=np.uint8)
+        posiciones = []
+        for papel, codigos in zip(PAPELES_DIR3, (oficinas, organos, unidades)):
+            normalizados = normalizar_codigos(codigos)
+            posicion = indice.posiciones_normalizadas(normalizados)
+            faltan = normalizados == b''
+            existe = posicion >= 0
+            existe[existe] = (indice.papeles[posicion[existe]] & BITS_PAPEL[papel]) != 0
+            mascara[faltan] |= 16
+            mascara[~faltan & ~existe] |= BITS_PAPEL[papel]
+            posiciones.append(np.where(existe, posicion, 0))
+        conocidas = mascara == 0
+        if conocidas.any() and len(indice.ternas):
+            claves = _clave_ternas(*(p[conocidas] for p in posiciones))
+            encontradas = np.searchsorted(indice.ternas, claves)
+            registradas = np.zeros(len(claves), dtype=bool)
+            dentro = encontradas < len(indice.ternas)
+            registradas[dentro] = indice.ternas[encontradas[dentro]] == claves[dentro]
+            mascara[np.flatnonzero(conocidas)[~registradas]] |= 8
+        elif conocidas.any():
+            mascara[conocidas] |= 8
+        return mascara
+
+    # --- Publicación ---
+
+    def publicar(self, relaciones, fuente=None):
+        """
+        Publica un catálogo nuevo a partir de sus relaciones: DataFrame (o diccionario de
+        columnas) con oficina_contable, organo_gestor y unidad_tramitadora y, opcionalmente,
+        nombre_oficina_contable, nombre_organo_gestor y nombre_unidad_tramitadora. Las filas
+        sin alguno de los tres códigos sólo dan de alta los códigos que tienen. Se escribe en
+        una carpeta de versión nueva y se sustituye el manifiesto; se conserva la versión
+        anterior (por los lectores que aún la tengan abierta) y se borran las demás.
+        Devuelve el manifiesto nuevo.
+        """
+        relaciones = pd.DataFrame(relaciones)
+        codigos = {p: normalizar_codigos(relaciones[p] if p in relaciones else [None] * len(relaciones))
+                   for p in PAPELES_DIR3}
+        todos = np.concatenate([codigos[p] for p in PAPELES_DIR3])
+        bits = np.repeat([BITS_PAPEL[p] for p in PAPELES_DIR3], len(relaciones)).astype(np.uint8)
+        nombres = np.concatenate([relaciones[f'nombre_{p}'].astype(object).to_numpy() if f'nombre_{p}' in relaciones
+                                  else np.full(len(relaciones), None, dtype=object) for p in PAPELES_DIR3])
+        altas = todos != b''
+
+        unicos, posicion = np.unique(todos[altas], return_inverse=True)
+        if len(unicos) >= 1 << _BITS_POSICION:
+            raise ValueError(f"El catálogo DIR3 tiene demasiados códigos ({len(unicos)})")
+        tabla_codigos = unicos.astype(f'S{max(ANCHO_CODIGO, unicos.dtype.itemsize)}')
+        papeles = np.zeros(len(unicos), dtype=np.uint8)
+        np.bitwise_or.at(papeles, posicion, bits[altas])
+
+        nombres = pd.Series(nombres[altas], index=posicion).dropna().astype(str).str.strip()
+        nombres = nombres[nombres != '']
+        nombres = nombres[~nombres.index.duplicated()].reindex(range(len(unicos)), fill_value='')
+        binarios = [n.encode('utf-8') for n in nombres]
+        desplazamientos = np.zeros(len(unicos) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in binarios], out=desplazamientos[1:])
+
+        completas = np.logical_and.reduce([codigos[p] != b'' for p in PAPELES_DIR3])
+        ternas = np.unique(_clave_ternas(*(np.searchsorted(tabla_codigos, codigos[p][completas].astype(tabla_codigos.dtype))
+                                           for p in PAPELES_DIR3)))
+
+        with _ESCRITURA:
+            os.makedirs(self.ruta, exist_ok=True)
+            anterior = self._manifiesto_publicado()
+            version = (anterior['version'] + 1) if anterior else 1
+            carpeta = f'version-{version:06d}'
+            destino = os.path.join(self.ruta, carpeta)
+            os.makedirs(destino, exist_ok=True)
+            np.save(os.path.join(destino, 'codigos.npy'), tabla_codigos)
+            np.save(os.path.join(destino, 'papeles.npy'), papeles)
+            np.save(os.path.join(destino, 'desplazamientos.npy'), desplazamientos)
+            np.save(os.path.join(destino, 'ternas.npy'), ternas)
+            with open(os.path.join(destino, 'nombres.bin'), 'wb') as f:
+                f.write(b''.join(binarios))
+            manifiesto = {
+                'version': version,
+                'carpeta': carpeta,
+                'codigos': int(len(unicos)),
+                'oficinas_contables': int(((papeles & 1) != 0).sum()),
+                'organos_gestores': int(((papeles & 2) != 0).sum()),
+                'unidades_tramitadoras': int(((papeles & 4) != 0).sum()),
+                'ternas': int(len(ternas)),
+                'fuente': fuente,
+                'publicado': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            }
+            ruta = os.path.join(self.ruta, _MANIFIESTO)
+            with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(manifiesto, f, ensure_ascii=False)
+            os.replace(ruta + '.tmp', ruta)
+            conservar = {carpeta, anterior['carpeta'] if anterior else None}
+            for nombre in os.listdir(self.ruta):
+                if nombre.startswith('version-') and nombre not in conservar:
+                    shutil.rmtree(os.path.join(self.ruta, nombre), ignore_errors=True)
+        return manifiesto
+
+    def _manifiesto_publicado(self):
+        try:
+            with open(os.path.join(self.ruta, _MANIFIESTO), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,384 @@
+# datos/historico.py
+#
+# Almacén local del histórico de estados, sólo de añadir: los eventos se guardan por
+# columnas en segmentos comprimidos (.npz) dentro de una carpeta por mes del evento
+# (AAAA-MM, o 'sin_fecha'). Los estados y las plataformas se guardan como códigos de un
+# diccionario común al almacén y cada segmento va ordenado por (factura_id, fecha_estado),
+# de modo que los eventos de unas facturas se localizan por búsqueda binaria. Un
+# manifiesto JSON describe los segmentos (mes, filas y rangos de factura y fecha) para
+# descartar sin abrirlos los que no pueden cumplir un filtro.
+
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from datos.paginacion import ErrorConsulta
+
+COLUMNAS_HISTORICO = ('id', 'factura_id', 'estado', 'fecha_estado', 'plataforma')
+
+# Columnas codificadas con el diccionario del almacén.
+COLUMNAS_DICCIONARIO = ('estado', 'plataforma')
+
+# Columnas que identifican un evento: uno con los mismos valores que otro ya guardado no se añade.
+CLAVE_EVENTO = ('factura_id', 'estado', 'fecha_estado', 'plataforma')
+
+MES_SIN_FECHA = 'sin_fecha'
+
+_NAT = np.iinfo(np.int64).min
+_MANIFIESTO = 'manifiesto.json'
+_ESCRITURA = threading.Lock()
+
+
+def _instantes(valores):
+    """Instantes (ns UTC como int64, NaT como mínimo) de una serie de fechas ISO 8601 o datetime."""
+    instantes = pd.to_datetime(pd.Series(valores, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    return instantes.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+
+def _limite(valor):
+    return int(_instantes([valor])[0])
+
+
+def _mayor(actual, limite):
+    return limite if actual is None else max(actual, limite)
+
+
+def _menor(actual, limite):
+    return limite if actual is None else min(actual, limite)
+
+
+def fechas_iso(instantes):
+    """Texto ISO 8601 con zona UTC ('+00:00', como las devuelve Supabase) de instantes int64 en ns."""
+    instantes = np.asarray(instantes, dtype=np.int64)
+    fechas = instantes.astype('datetime64[ns]')
+    unidad = 's' if not (instantes[instantes != _NAT] % 10**9).any() else 'us'
+    textos = np.char.add(np.datetime_as_string(fechas, unit=unidad), '+00:00').astype(object)
+    textos[instantes == _NAT] = None
+    return textos
+
+
+class AlmacenHistorico:
+    """
+    Histórico de estados en una carpeta local (ver la cabecera del módulo). Se escribe con
+    anadir() y se lee con leer(), que admite los mismos filtros (operador, columna, valor)
+    que los repositorios para las columnas del histórico. Un único proceso escribe a la vez.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    # --- Manifiesto y diccionario ---
+
+    def _manifiesto(self):
+        try:
+            with open(os.path.join(self.ruta, _MANIFIESTO), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'diccionario': {c: [] for c in COLUMNAS_DICCIONARIO}, 'siguiente_id': 1, 'segmentos': []}
+
+    def _guardar_manifiesto(self, manifiesto):
+        ruta = os.path.join(self.ruta, _MANIFIESTO)
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        os.replace(ruta + '.tmp', ruta)
+
+    @staticmethod
+    def _codificar(diccionario, valores):
+        """Códigos (int16, -1 para nulos) de unos valores, añadiendo al diccionario los nuevos."""
+        codigos, unicos = pd.factorize(pd.Series(valores, dtype=object))
+        textos = pd.Index(unicos, dtype=object).astype(str).str.strip()
+        diccionario.extend(v for v in textos.unique() if v and v not in diccionario)
+        # El código -1 (nulo) toma el último elemento del mapa, que también es -1.
+        mapa = np.append(pd.Index(diccionario, dtype=object).get_indexer(textos), -1).astype(np.int16)
+        return mapa[codigos]
+
+    # --- Escritura ---
+
+    def _escribir_segmento(self, manifiesto, mes, columnas, numero=None):
+        carpeta = os.path.join(self.ruta, mes)
+        os.makedirs(carpeta, exist_ok=True)
+        if numero is None:
+            numero = 1 + max((s['numero'] for s in manifiesto['segmentos'] if s['mes'] == mes), default=0)
+        fichero = os.path.join(mes, f'segmento-{numero:06d}.npz')
+        with open(os.path.join(self.ruta, fichero + '.tmp'), 'wb') as f:
+            np.savez_compressed(f, **columnas)
+        os.replace(os.path.join(self.ruta, fichero + '.tmp'), os.path.join(self.ruta, fichero))
+        fechas = columnas['fecha_estado'][columnas['fecha_estado'] != _NAT]
+        manifiesto['segmentos'].append({
+            'mes': mes,
+            'numero': numero,
+            'fichero': fichero,
+            'filas': int(len(columnas['id'])),
+            'factura_min': int(columnas['factura_id'].min()),
+            'factura_max': int(columnas['factura_id'].max()),
+            'fecha_min': int(fechas.min()) if len(fechas) else None,
+            'fecha_max': int(fechas.max()) if len(fechas) else None,
+        })
+
+    @staticmethod
+    def _ordenar(columnas):
+        orden = np.lexsort((columnas['fecha_estado'], columnas['factura_id']))
+        return {c: v[orden] for c, v in columnas.items()}
+
+    def _sin_repetidos(self, manifiesto, mes, columnas):
+        """
+        Los eventos de un mes (columnas) cuya CLAVE_EVENTO no está ya en los segmentos del
+        mes que pueden contenerla (por su rango de facturas) ni antes en el mismo bloque.
+        """
+        claves = pd.MultiIndex.from_arrays([columnas[c] for c in CLAVE_EVENTO])
+        repetidos = claves.duplicated()
+        desde, hasta = int(columnas['factura_id'].min()), int(columnas['factura_id'].max())
+        guardados = [self._abrir(s) for s in manifiesto['segmentos']
+                     if s['mes'] == mes and s['factura_min'] <= hasta and s['factura_max'] >= desde]
+        if guardados:
+            repetidos = repetidos | claves.isin(pd.MultiIndex.from_arrays(
+                [np.concatenate([g[c] for g in guardados]) for c in CLAVE_EVENTO]))
+        return {c: v[~repetidos] for c, v in columnas.items()}
+
+    def anadir(self, eventos):
+        """
+        Añade eventos (DataFrame o diccionario de columnas con factura_id, estado,
+        fecha_estado, plataforma y, opcionalmente, id) en un segmento nuevo por mes. Los
+        eventos sin id reciben uno correlativo. Se descartan los que no tienen un
+        factura_id entero y se omiten los que ya están en el almacén (CLAVE_EVENTO), de modo
+        que volver a importar un fichero no duplica sus eventos. Devuelve {'eventos':
+        añadidos, 'repetidos': n, 'descartados': n, 'segmentos': n, 'meses': [meses con
+        eventos nuevos]}.
+        """
+        eventos = pd.DataFrame(eventos)
+        if eventos.empty:
+            return {'eventos': 0, 'repetidos': 0, 'descartados': 0, 'segmentos': 0, 'meses': []}
+        facturas = pd.to_numeric(eventos.get('factura_id'), errors='coerce')
+        validos = (facturas.notna() & (facturas % 1 == 0)).to_numpy()
+        eventos, facturas = eventos[validos], facturas[validos]
+        descartados = int((~validos).sum())
+        if eventos.empty:
+            return {'eventos': 0, 'repetidos': 0, 'descartados': descartados, 'segmentos': 0, 'meses': []}
+
+        os.makedirs(self.ruta, exist_ok=True)
+        with _ESCRITURA:
+            manifiesto = self._manifiesto()
+            ids = pd.to_numeric(eventos['id'], errors='coerce') if 'id' in eventos else \
+                pd.Series(np.nan, index=eventos.index)
+            sin_id = ids.isna().to_numpy()
+            ids = ids.to_numpy(dtype=np.float64, copy=True)
+            ids[sin_id] = manifiesto['siguiente_id'] + np.arange(int(sin_id.sum()))
+            ids = ids.astype(np.int64)
+            columnas = {
+                'id': ids,
+                'factura_id': facturas.to_numpy(dtype=np.int64),
+                'fecha_estado': _instantes(eventos.get('fecha_estado', pd.Series(None, index=eventos.index))),
+            }
+            for columna in COLUMNAS_DICCIONARIO:
+                columnas[columna] = self._codificar(
+                    manifiesto['diccionario'][columna],
+                    eventos[columna] if columna in eventos else [None] * len(eventos))
+            manifiesto['siguiente_id'] = max(manifiesto['siguiente_id'], int(ids.max()) + 1)
+
+            codigos_mes, meses = pd.factorize(columnas['fecha_estado'].astype('datetime64[ns]').astype('datetime64[M]'),
+                                              use_na_sentinel=False)
+            nombres, anadidos = [], 0
+            for codigo, mes in sorted(enumerate(meses), key=lambda m: str(m[1])):
+                nombre = MES_SIN_FECHA if pd.isna(mes) else str(mes)[:7]
+                del_mes = self._sin_repetidos(manifiesto, nombre, {c: v[codigos_mes == codigo]
+                                                                  for c, v in columnas.items()})
+                if not len(del_mes['id']):
+                    continue
+                nombres.append(nombre)
+                anadidos += len(del_mes['id'])
+                self._escribir_segmento(manifiesto, nombre, self._ordenar(del_mes))
+            self._guardar_manifiesto(manifiesto)
+        return {'eventos': anadidos, 'repetidos': len(eventos) - anadidos, 'descartados': descartados,
+                'segmentos': len(nombres), 'meses': nombres}
+
+    def compactar(self, meses=None):
+        """
+        Une en un solo segmento los segmentos de cada mes (o sólo de los de 'meses') que
+        tengan varios. Los eventos no cambian. Devuelve el número de meses compactados.
+        """
+        with _ESCRITURA:
+            manifiesto = self._manifiesto()
+            compactados = 0
+            for mes_segmento in sorted({s['mes'] for s in manifiesto['segmentos']}):
+                del_mes = [s for s in manifiesto['segmentos'] if s['mes'] == mes_segmento]
+                if (meses is not None and mes_segmento not in meses) or len(del_mes) < 2:
+                    continue
+                partes = [self._abrir(s) for s in del_mes]
+                columnas = self._ordenar({c: np.concatenate([p[c] for p in partes]) for c in COLUMNAS_HISTORICO})
+                # El segmento compactado lleva un número nuevo: los antiguos se borran después de publicarlo.
+                numero = 1 + max(s['numero'] for s in del_mes)
+                manifiesto['segmentos'] = [s for s in manifiesto['segmentos'] if s['mes'] != mes_segmento]
+                self._escribir_segmento(manifiesto, mes_segmento, columnas, numero)
+                self._guardar_manifiesto(manifiesto)
+                for segmento in del_mes:
+                    os.remove(os.path.join(self.ruta, segmento['fichero']))
+                compactados += 1
+            return compactados
+
+    # --- Lectura ---
+
+    def _abrir(self, segmento):
+        with np.load(os.path.join(self.ruta, segmento['fichero'])) as datos:
+            return {c: datos[c] for c in COLUMNAS_HISTORICO}
+
+    @staticmethod
+    def _condiciones(filtros, diccionario):
+        """Filtros traducidos a rangos de fecha y factura y a conjuntos de códigos o ids admitidos."""
+        condiciones = {'desde': None, 'hasta': None, 'facturas': None, 'factura_min': None, 'factura_max': None,
+                       'excluir': {c: set() for c in COLUMNAS_DICCIONARIO},
+                       'codigos': {c: None for c in COLUMNAS_DICCIONARIO}}
+        for operador, columna, valor in filtros:
+            if columna == 'fecha_estado' and operador in ('gt', 'gte', 'lt', 'lte'):
+                limite = _limite(valor)
+                if operador in ('gt', 'gte'):
+                    condiciones['desde'] = _mayor(condiciones['desde'], limite + (operador == 'gt'))
+                else:
+                    condiciones['hasta'] = _menor(condiciones['hasta'], limite - (operador == 'lt'))
+            elif columna == 'factura_id' and operador in ('eq', 'in_'):
+                ids = set(int(v) for v in (valor if operador == 'in_' else [valor]))
+                condiciones['facturas'] = ids if condiciones['facturas'] is None else condiciones['facturas'] & ids
+            elif columna == 'factura_id' and operador in ('gt', 'gte', 'lt', 'lte'):
+                limite = int(valor)
+                if operador in ('gt', 'gte'):
+                    condiciones['factura_min'] = _mayor(condiciones['factura_min'], limite + (operador == 'gt'))
+                else:
+                    condiciones['factura_max'] = _menor(condiciones['factura_max'], limite - (operador == 'lt'))
+            elif columna in COLUMNAS_DICCIONARIO and operador in ('eq', 'in_', 'neq'):
+                valores = [str(v) for v in (valor if operador == 'in_' else [valor])]
+                codigos = {diccionario[columna].index(v) for v in valores if v in diccionario[columna]}
+                if operador == 'neq':
+                    condiciones['excluir'][columna] |= codigos
+                else:
+                    previos = condiciones['codigos'][columna]
+                    condiciones['codigos'][columna] = codigos if previos is None else previos & codigos
+            else:
+                raise ErrorConsulta(f"Filtro no soportado por el almacén del histórico: {operador} {columna}")
+        return condiciones
+
+    @staticmethod
+    def _descartable(segmento, condiciones):
+        """Si el segmento no puede tener eventos que cumplan los filtros, según el manifiesto."""
+        if condiciones['desde'] is not None or condiciones['hasta'] is not None:
+            if segmento['fecha_min'] is None:
+                return True
+            if condiciones['desde'] is not None and segmento['fecha_max'] < condiciones['desde']:
+                return True
+            if condiciones['hasta'] is not None and segmento['fecha_min'] > condiciones['hasta']:
+                return True
+        if condiciones['factura_min'] is not None and segmento['factura_max'] < condiciones['factura_min']:
+            return True
+        if condiciones['factura_max'] is not None and segmento['factura_min'] > condiciones['factura_max']:
+            return True
+        facturas = condiciones['facturas']
+        if facturas is not None and not any(segmento['factura_min'] <= f <= segmento['factura_max'] for f in facturas):
+            return True
+        return False
+
+    @staticmethod
+    def _posiciones_facturas(facturas_segmento, facturas):
+        """Posiciones de los eventos de unas facturas en un segmento ordenado por factura_id."""
+        inicios = np.searchsorted(facturas_segmento, facturas, side='left')
+        finales = np.searchsorted(facturas_segmento, facturas, side='right')
+        longitudes = finales - inicios
+        if not longitudes.sum():
+            return np.zeros(0, dtype=np.int64)
+        desplazamientos = np.repeat(inicios - np.cumsum(longitudes) + longitudes, longitudes)
+        return np.arange(longitudes.sum()) + desplazamientos
+
+    def _leer_segmento(self, segmento, condiciones, columnas, facturas):
+        with np.load(os.path.join(self.ruta, segmento['fichero'])) as datos:
+            facturas_segmento = datos['factura_id']
+            if facturas is not None:
+                posiciones = self._posiciones_facturas(facturas_segmento, facturas)
+            else:
+                posiciones = None
+            seleccion = {}
+
+            def columna(nombre):
+                if nombre not in seleccion:
+                    valores = facturas_segmento if nombre == 'factura_id' else datos[nombre]
+                    seleccion[nombre] = valores if posiciones is None else valores[posiciones]
+                return seleccion[nombre]
+
+            mascara = np.ones(len(facturas_segmento) if posiciones is None else len(posiciones), dtype=bool)
+            if condiciones['desde'] is not None:
+                mascara &= columna('fecha_estado') >= condiciones['desde']
+            if condiciones['hasta'] is not None:
+                fechas = columna('fecha_estado')
+                mascara &= (fechas <= condiciones['hasta']) & (fechas != _NAT)
+            if condiciones['factura_min'] is not None:
+                mascara &= columna('factura_id') >= condiciones['factura_min']
+            if condiciones['factura_max'] is not None:
+                mascara &= columna('factura_id') <= condiciones['factura_max']
+            for nombre in COLUMNAS_DICCIONARIO:
+                if condiciones['codigos'][nombre] is not None:
+                    mascara &= np.isin(columna(nombre), list(condiciones['codigos'][nombre]))
+                if condiciones['excluir'][nombre]:
+                    mascara &= ~np.isin(columna(nombre), list(condiciones['excluir'][nombre]))
+            return {c: columna(c)[mascara] for c in columnas}
+
+    def leer(self, filtros=(), columnas=COLUMNAS_HISTORICO, fechas_texto=True):
+        """
+        Eventos que cumplen los filtros (operador, columna, valor), como DataFrame con las
+        columnas pedidas, ordenados por mes y, dentro de cada segmento, por factura y fecha.
+        Admite rangos de fecha_estado y factura_id, eq/in_ de factura_id y eq/in_/neq de
+        estado y plataforma; los demás filtros lanzan ErrorConsulta. Los estados y las
+        plataformas se devuelven como texto y fecha_estado como texto ISO 8601 (con
+        'fechas_texto' a False, como datetime64 UTC).
+        """
+        columnas = [c for c in columnas if c in COLUMNAS_HISTORICO]
+        manifiesto = self._manifiesto()
+        diccionario = manifiesto['diccionario']
+        condiciones = self._condiciones(filtros, diccionario)
+        vacio = any(c is not None and not c for c in condiciones['codigos'].values()) or \
+            (condiciones['facturas'] is not None and not condiciones['facturas'])
+        facturas = None if condiciones['facturas'] is None else np.array(sorted(condiciones['facturas']), dtype=np.int64)
+        partes = [] if vacio else [
+            self._leer_segmento(s, condiciones, columnas, facturas)
+            for s in sorted(manifiesto['segmentos'], key=lambda s: (s['mes'], s['numero']))
+            if not self._descartable(s, condiciones)
+        ]
+        resultado = {}
+        for c in columnas:
+            valores = np.concatenate([p[c] for p in partes]) if partes else np.zeros(0, dtype=np.int64)
+            if c in COLUMNAS_DICCIONARIO:
+                nombres = np.array(diccionario[c] + [None], dtype=object)
+                valores = nombres[valores.astype(np.int64)] if len(valores) else valores.astype(object)
+            elif c == 'fecha_estado':
+                # El mínimo de int64 es NaT en datetime64.
+                valores = fechas_iso(valores) if fechas_texto else \
+                    pd.to_datetime(valores.astype('datetime64[ns]'), utc=True)
+            resultado[c] = valores
+        return pd.DataFrame(resultado, columns=columnas)
+
+    def eventos_facturas(self, factura_ids, columnas=COLUMNAS_HISTORICO, fechas_texto=True):
+        """Todos los eventos de unas facturas (por factura_id)."""
+        return self.leer([('in_', 'factura_id', list(factura_ids))], columnas, fechas_texto)
+
+    def eventos_periodo(self, desde=None, hasta=None, plataforma=None, estados=None,
+                        columnas=COLUMNAS_HISTORICO, fechas_texto=True):
+        """Eventos (transiciones) con fecha_estado entre 'desde' y 'hasta', opcionalmente de una plataforma y unos estados."""
+        filtros = []
+        if desde:
+            filtros.append(('gte', 'fecha_estado', desde))
+        if hasta:
+            filtros.append(('lte', 'fecha_estado', hasta))
+        if plataforma:
+            filtros.append(('eq', 'plataforma', plataforma))
+        if estados:
+            filtros.append(('in_', 'estado', list(estados)))
+        return self.leer(filtros, columnas, fechas_texto)
+
+    def resumen(self):
+        """Eventos, segmentos, meses y bytes en disco del almacén."""
+        manifiesto = self._manifiesto()
+        segmentos = manifiesto['segmentos']
+        return {
+            'eventos': sum(s['filas'] for s in segmentos),
+            'segmentos': len(segmentos),
+            'meses': sorted({s['mes'] for s in segmentos}),
+            'bytes': sum(os.path.getsize(os.path.join(self.ruta, s['fichero'])) for s in segmentos),
+            'estados': list(manifiesto['diccionario']['estado']),
+            'plataformas': list(manifiesto['diccionario']['plataforma']),
+        }
@@ -0,0 +1,306 @@
+# datos/local.py
+
+import json
+import re
+import sqlite3
+import sys
+
+from datos.paginacion import ErrorConsulta, TAMANO_PAGINA_POR_DEFECTO, columnas_seleccion
+from datos.repositorio import Repositorio, OPERADORES, lotes
+
+# Los booleanos se guardan como 0/1 y los objetos como texto JSON; con los tipos
+# declarados de la tabla se devuelven igual que los entrega Supabase.
+sqlite3.register_converter('BOOLEAN', lambda valor: valor not in (b'0', b''))
+sqlite3.register_converter('JSON', lambda valor: json.loads(valor))
+
+_IDENTIFICADOR = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_OPERADORES_SQL = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+# Índices que se crean al guardar una tabla local, equivalentes a los filtros de las auditorías.
+INDICES_LOCALES = {
+    'facturas': [('fecha_registro_rcf', 'id'), ('fecha_factura', 'id'), ('es_electronica',)],
+    'historico_estados': [('factura_id', 'fecha_estado'), ('plataforma', 'fecha_estado')],
+}
+
+
+def _identificador(nombre):
+    if not _IDENTIFICADOR.match(nombre):
+        raise ErrorConsulta(f"Identificador no válido: {nombre}")
+    return f'"{nombre}"'
+
+
+def _tipo_sqlite(valor):
+    if isinstance(valor, bool):
+        return 'BOOLEAN'
+    if isinstance(valor, int):
+        return 'INTEGER'
+    if isinstance(valor, float):
+        return 'REAL'
+    if isinstance(valor, (dict, list)):
+        return 'JSON'
+    return 'TEXT'
+
+
+def _valor_sqlite(valor):
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor)
+    return valor
+
+
+def _where(filtros):
+    condiciones, parametros = [], []
+    for operador, columna, valor in filtros:
+        if operador not in OPERADORES:
+            raise ErrorConsulta(f"Operador no soportado: {operador}")
+        if operador == 'or_':
+            alternativas = []
+            for grupo in valor:
+                condiciones_grupo, parametros_grupo = _where(grupo)
+                alternativas.append('(' + (' AND '.join(condiciones_grupo) or '1') + ')')
+                parametros.extend(parametros_grupo)
+            condiciones.append('(' + (' OR '.join(alternativas) or '0') + ')')
+            continue
+        col = _identificador(columna)
+        if operador == 'in_':
+            valores = list(valor)
+            if not valores:
+                condiciones.append('0')
+                continue
+            condiciones.append(f"{col} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+        elif operador == 'is_':
+            condiciones.append(f"{col} IS NULL")
+        else:
+            condiciones.append(f"{col} {_OPERADORES_SQL[operador]} ?")
+            parametros.append(valor)
+    return condiciones, parametros
+
+
+def _order_by(orden, descendente):
+    """ORDER BY que, como PostgreSQL, trata NULL como el valor más alto."""
+    direccion = ' DESC' if descendente else ''
+    partes = []
+    for columna in orden:
+        col = _identificador(columna)
+        partes.append(f"({col} IS NULL){direccion}")
+        partes.append(f"{col}{direccion}")
+    return f" ORDER BY {', '.join(partes)}" if partes else ''
+
+
+def _condicion_keyset(orden, cursor, descendente):
+    """Equivalente SQL de datos.paginacion._filtro_keyset."""
+    condiciones, parametros = [], []
+    for i, columna in enumerate(orden):
+        col = _identificador(columna)
+        valor = cursor[i]
+        if i == len(orden) - 1:
+            siguiente, params_siguiente = f"{col} {'<' if descendente else '>'} ?", [valor]
+        elif descendente:
+            if valor is None:
+                siguiente, params_siguiente = f"{col} IS NOT NULL", []
+            else:
+                siguiente, params_siguiente = f"{col} < ?", [valor]
+        else:
+            if valor is None:
+                continue
+            siguiente, params_siguiente = f"({col} > ? OR {col} IS NULL)", [valor]
+
+        iguales, params_iguales = [], []
+        for j in range(i):
+            if cursor[j] is None:
+                iguales.append(f"{_identificador(orden[j])} IS NULL")
+            else:
+                iguales.append(f"{_identificador(orden[j])} = ?")
+                params_iguales.append(cursor[j])
+        condiciones.append('(' + ' AND '.join(iguales + [siguiente]) + ')')
+        parametros.extend(params_iguales + params_siguiente)
+    if not condiciones:
+        return '0', []
+    return '(' + ' OR '.join(condiciones) + ')', parametros
+
+
+class RepositorioLocal(Repositorio):
+    """
+    Repositorio sobre un fichero SQLite local (por ejemplo, una instantánea de Supabase
+    creada con crear_instantanea). Admite los mismos filtros y el mismo orden que
+    RepositorioSupabase, de modo que las auditorías se pueden ejecutar sin conexión.
+    """
+
+    nombre = 'copia local (SQLite)'
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, detect_types=sqlite3.PARSE_DECLTYPES)
+        conexion.row_factory = sqlite3.Row
+        return conexion
+
+    def _ejecutar(self, sql, parametros):
+        conexion = self._conectar()
+        try:
+            return [dict(fila) for fila in conexion.execute(sql, parametros)]
+        except sqlite3.Error as e:
+            raise ErrorConsulta(str(e))
+        finally:
+            conexion.close()
+
+    def _select(self, tabla, columnas, filtros, orden):
+        lista = [c.strip() for c in columnas_seleccion(columnas, orden).split(',')]
+        seleccion = '*' if '*' in lista else ', '.join(_identificador(c) for c in lista)
+        condiciones, parametros = _where(filtros)
+        sql = f"SELECT {seleccion} FROM {_identificador(tabla)}"
+        return sql, condiciones, parametros
+
+    def consultar(self, tabla, columnas='*', filtros=(), orden=(), descendente=False, rango=None):
+        sql, condiciones, parametros = self._select(tabla, columnas, filtros, ())
+        if condiciones:
+            sql += " WHERE " + ' AND '.join(condiciones)
+        sql += _order_by(orden, descendente)
+        if rango is not None:
+            sql += " LIMIT ? OFFSET ?"
+            parametros += [rango[1] - rango[0] + 1, rango[0]]
+        return self._ejecutar(sql, parametros)
+
+    def leer_pagina(self, tabla, columnas, filtros=(), orden=('id',), cursor=None,
+                    tamano_pagina=None, descendente=False):
+        sql, condiciones, parametros = self._select(tabla, columnas, filtros, orden)
+        if cursor is not None:
+            condicion, params_cursor = _condicion_keyset(orden, cursor, descendente)
+            condiciones.append(condicion)
+            parametros += params_cursor
+        if condiciones:
+            sql += " WHERE " + ' AND '.join(condiciones)
+        sql += _order_by(orden, descendente) + " LIMIT ?"
+        parametros.append(tamano_pagina or TAMANO_PAGINA_POR_DEFECTO)
+        return self._ejecutar(sql, parametros)
+
+    def iterar(self, tabla, columnas, filtros=(), orden=('id',), tamano_pagina=None):
+        """En local basta con una única consulta leída por bloques de tamano_pagina filas."""
+        sql, condiciones, parametros = self._select(tabla, columnas, filtros, orden)
+        if condiciones:
+            sql += " WHERE " + ' AND '.join(condiciones)
+        sql += _order_by(orden, False)
+        conexion = self._conectar()
+        try:
+            cursor = conexion.execute(sql, parametros)
+            while True:
+                bloque = cursor.fetchmany(tamano_pagina or TAMANO_PAGINA_POR_DEFECTO)
+                if not bloque:
+                    return
+                for fila in bloque:
+                    yield dict(fila)
+        except sqlite3.Error as e:
+            raise ErrorConsulta(str(e))
+        finally:
+            conexion.close()
+
+    def contar_estimado(self, tabla, ttl_segundos=300):
+        """En local el recuento exacto es barato, así que no se estima."""
+        return self._ejecutar(f"SELECT COUNT(*) AS total FROM {_identificador(tabla)}", [])[0]['total']
+
+    def existe_tabla(self, tabla):
+        """Las tablas locales se crean con el primer upsert, así que pueden no existir todavía."""
+        return bool(self._ejecutar("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", [tabla]))
+
+    def existe_columna(self, tabla, columna):
+        """Las columnas locales se crean con el upsert que trae el primer valor."""
+        return any(c['name'] == columna for c in self._ejecutar(f"PRAGMA table_info({_identificador(tabla)})", []))
+
+    def upsert(self, tabla, filas, on_conflict='id', tamano_lote=1000):
+        """
+        Inserta o actualiza filas (diccionarios). Crea la tabla y las columnas que falten
+        a partir de los tipos de los valores recibidos. Con varias columnas en 'on_conflict'
+        (separadas por comas) la clave se declara como índice único. Devuelve el número de
+        filas escritas.
+        """
+        conexion = self._conectar()
+        escritas = 0
+        try:
+            for lote in lotes(filas, tamano_lote):
+                escritas += self._escribir_lote(conexion, tabla, lote, on_conflict)
+            return escritas
+        except sqlite3.Error as e:
+            raise ErrorConsulta(str(e))
+        finally:
+            conexion.close()
+
+    def _asegurar_tabla(self, conexion, tabla, lote, clave):
+        tipos = {}
+        for fila in lote:
+            for columna, valor in fila.items():
+                if valor is not None and columna not in tipos:
+                    tipos[columna] = _tipo_sqlite(valor)
+                tipos.setdefault(columna, None)
+        existentes = {fila[1] for fila in conexion.execute(f"PRAGMA table_info({_identificador(tabla)})")}
+        if not existentes:
+            # Sin 'id' en las filas (clave natural), las filas reciben un id autonumérico como en Supabase.
+            definiciones = [] if 'id' in tipos else [f"{_identificador('id')} INTEGER PRIMARY KEY"]
+            for columna, tipo in tipos.items():
+                definicion = f"{_identificador(columna)} {tipo or 'TEXT'}"
+                if [columna] == clave:
+                    definicion += " PRIMARY KEY" if 'id' in tipos else " UNIQUE"
+                definiciones.append(definicion)
+            conexion.execute(f"CREATE TABLE {_identificador(tabla)} ({', '.join(definiciones)})")
+            for columnas_indice in INDICES_LOCALES.get(tabla, []):
+                if all(c in tipos for c in columnas_indice):
+                    nombre_indice = _identificador(f"idx_{tabla}_{'_'.join(columnas_indice)}")
+                    conexion.execute(
+                        f"CREATE INDEX IF NOT EXISTS {nombre_indice} ON {_identificador(tabla)} "
+                        f"({', '.join(_identificador(c) for c in columnas_indice)})"
+                    )
+        else:
+            for columna, tipo in tipos.items():
+                if columna not in existentes:
+                    conexion.execute(
+                        f"ALTER TABLE {_identificador(tabla)} ADD COLUMN {_identificador(columna)} {tipo or 'TEXT'}"
+                    )
+        if len(clave) > 1 and all(c in tipos or c in existentes for c in clave):
+            conexion.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_identificador(f'uq_{tabla}_' + '_'.join(clave))} "
+                f"ON {_identificador(tabla)} ({', '.join(_identificador(c) for c in clave)})"
+            )
+
+    def _escribir_lote(self, conexion, tabla, lote, on_conflict):
+        clave = [c.strip() for c in on_conflict.split(',')]
+        self._asegurar_tabla(conexion, tabla, lote, clave)
+        columnas = list(dict.fromkeys(c for fila in lote for c in fila))
+        lista = ', '.join(_identificador(c) for c in columnas)
+        sql = f"INSERT INTO {_identificador(tabla)} ({lista}) VALUES ({', '.join('?' * len(columnas))})"
+        if all(c in columnas for c in clave):
+            actualizaciones = ', '.join(
+                f"{_identificador(c)} = excluded.{_identificador(c)}" for c in columnas if c not in clave
+            )
+            sql += f" ON CONFLICT({', '.join(_identificador(c) for c in clave)}) DO " + (
+                f"UPDATE SET {actualizaciones}" if actualizaciones else "NOTHING"
+            )
+        with conexion:
+            conexion.executemany(sql, [[_valor_sqlite(fila.get(c)) for c in columnas] for fila in lote])
+        return len(lote)
+
+
+def crear_instantanea(repositorio_origen, ruta_destino, tablas=('facturas',), tamano_pagina=None):
+    """
+    Copia las tablas indicadas desde otro repositorio (normalmente Supabase) a un
+    fichero SQLite, recorriéndolas por páginas. Devuelve {tabla: filas copiadas}.
+    """
+    destino = RepositorioLocal(ruta_destino)
+    copiadas = {}
+    for tabla in tablas:
+        filas = repositorio_origen.iterar(tabla, '*', tamano_pagina=tamano_pagina)
+        copiadas[tabla] = destino.upsert(tabla, filas, tamano_lote=tamano_pagina or TAMANO_PAGINA_POR_DEFECTO)
+    return copiadas
+
+
+if __name__ == '__main__':
+    # Uso: python -m datos.local destino.sqlite [tabla ...]
+    from config import supabase
+    from datos.repositorio import RepositorioSupabase
+
+    if len(sys.argv) < 2 or not supabase:
+        print("Uso: python -m datos.local destino.sqlite [tabla ...] (requiere conexión con Supabase)")
+        sys.exit(1)
+    resumen = crear_instantanea(RepositorioSupabase(supabase), sys.argv[1], tuple(sys.argv[2:]) or ('facturas',))
+    for tabla, total in resumen.items():
+        print(f"{tabla}: {total} filas copiadas")
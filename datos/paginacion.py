@@ -0,0 +1,216 @@
+# datos/paginacion.py
+
+import base64
+import json
+import time
+
+TAMANO_PAGINA_POR_DEFECTO = 1000
+
+
+class ErrorConsulta(Exception):
+    """Error devuelto por la base de datos al consultar una página de resultados."""
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar."""
+
+
+def datos_respuesta(respuesta):
+    """
+    Extrae las filas de una respuesta de PostgREST o lanza ErrorConsulta
+    si la respuesta no contiene datos o trae un error.
+    """
+    if not hasattr(respuesta, 'data') or (hasattr(respuesta, 'error') and respuesta.error):
+        detalles = str(respuesta.error) if hasattr(respuesta, 'error') else str(respuesta)
+        raise ErrorConsulta(detalles)
+    return respuesta.data or []
+
+
+def _valor_filtro(valor):
+    """Entrecomilla un valor para usarlo dentro de un filtro 'or' de PostgREST."""
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    texto = str(valor).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{texto}"'
+
+
+def _condicion_filtro(operador, columna, valor):
+    if operador == 'in_':
+        return f"{columna}.in.({','.join(_valor_filtro(v) for v in valor)})"
+    if operador == 'is_':
+        return f"{columna}.is.null"
+    return f"{columna}.{operador}.{_valor_filtro(valor)}"
+
+
+def _expresion_or(grupos):
+    """
+    Expresión 'or' de PostgREST para una lista de grupos de filtros: cada grupo es una
+    secuencia de tuplas (operador, columna, valor) que deben cumplirse a la vez.
+    """
+    partes = []
+    for grupo in grupos:
+        condiciones = [_condicion_filtro(*filtro) for filtro in grupo]
+        partes.append(condiciones[0] if len(condiciones) == 1 else f"and({','.join(condiciones)})")
+    return ','.join(partes)
+
+
+def aplicar_filtros(consulta, filtros):
+    """
+    Aplica filtros (operador, columna, valor) a una consulta de PostgREST. El operador
+    'or_' recibe columna None y como valor una lista de grupos (ver _expresion_or).
+    """
+    for operador, columna, valor in filtros:
+        if operador == 'or_':
+            consulta = consulta.or_(_expresion_or(valor))
+        elif operador == 'is_':
+            consulta = consulta.is_(columna, 'null')
+        else:
+            consulta = getattr(consulta, operador)(columna, valor)
+    return consulta
+
+
+def _condicion_igual(columna, valor):
+    if valor is None:
+        return f"{columna}.is.null"
+    return f"{columna}.eq.{_valor_filtro(valor)}"
+
+
+def _condicion_siguiente(columna, valor, descendente, admite_nulos=True):
+    """
+    Condición "posterior al cursor" para una columna. PostgreSQL ordena los NULL
+    como el valor más alto (al final en ascendente, al principio en descendente),
+    así que se tratan igual aquí. Devuelve None si ninguna fila puede cumplirla.
+    """
+    if not admite_nulos:
+        return f"{columna}.{'lt' if descendente else 'gt'}.{_valor_filtro(valor)}"
+    if descendente:
+        if valor is None:
+            return f"{columna}.not.is.null"
+        return f"{columna}.lt.{_valor_filtro(valor)}"
+    if valor is None:
+        return None
+    return f"or({columna}.gt.{_valor_filtro(valor)},{columna}.is.null)"
+
+
+def _filtro_keyset(orden, cursor, descendente=False):
+    """
+    Construye la expresión 'or' de PostgREST equivalente a (c1, c2, ...) > (v1, v2, ...)
+    (o '<' si el orden es descendente). Por ejemplo, para ('fecha_registro_rcf', 'id'):
+        or(fecha_registro_rcf.gt.X,fecha_registro_rcf.is.null),
+        and(fecha_registro_rcf.eq.X,id.gt.Y)
+    La última columna (el desempate único) nunca es nula.
+    """
+    condiciones = []
+    for i, columna in enumerate(orden):
+        admite_nulos = i < len(orden) - 1
+        siguiente = _condicion_siguiente(columna, cursor[i], descendente, admite_nulos)
+        if siguiente is None:
+            continue
+        iguales = [_condicion_igual(orden[j], cursor[j]) for j in range(i)]
+        if iguales:
+            condiciones.append(f"and({','.join(iguales + [siguiente])})")
+        else:
+            condiciones.append(siguiente)
+    return ','.join(condiciones)
+
+
+def codificar_cursor(valores):
+    """Convierte los valores del cursor en una cadena opaca apta para URL."""
+    texto = json.dumps(list(valores), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, num_columnas):
+    """Operación inversa de codificar_cursor. Lanza CursorInvalido si no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+    except Exception:
+        raise CursorInvalido(f"Cursor inválido: {cursor}")
+    if not isinstance(valores, list) or len(valores) != num_columnas:
+        raise CursorInvalido(f"Cursor inválido: {cursor}")
+    return tuple(valores)
+
+
+def columnas_seleccion(columnas, orden):
+    lista_columnas = [c.strip() for c in columnas.split(',')]
+    if '*' not in lista_columnas:
+        lista_columnas += [c for c in orden if c not in lista_columnas]
+    return ', '.join(lista_columnas)
+
+
+def leer_pagina(cliente, tabla, columnas, filtros=(), orden=('id',), cursor=None,
+                tamano_pagina=None, descendente=False):
+    """
+    Lee una única página ordenada por las columnas de 'orden' a partir del cursor
+    (valores de esas columnas en la última fila de la página anterior).
+
+    - filtros: secuencia de tuplas (operador, columna, valor), p. ej. ('eq', 'es_electronica', True).
+    - orden: columnas que forman el cursor. La última debe ser única y no nula
+      (normalmente 'id'); las demás pueden contener NULL.
+
+    A diferencia de .range(offset, ...), cada página se resuelve con un índice sobre
+    las columnas del cursor, por lo que su coste no depende de lo profunda que sea.
+    """
+    tamano_pagina = tamano_pagina or TAMANO_PAGINA_POR_DEFECTO
+    consulta = aplicar_filtros(cliente.table(tabla).select(columnas_seleccion(columnas, orden)), filtros)
+    if cursor is not None:
+        if len(orden) == 1 and cursor[0] is not None:
+            operador = 'lt' if descendente else 'gt'
+            consulta = getattr(consulta, operador)(orden[0], cursor[0])
+        else:
+            consulta = consulta.or_(_filtro_keyset(orden, cursor, descendente))
+    for columna in orden:
+        consulta = consulta.order(columna, desc=descendente)
+    return datos_respuesta(consulta.limit(tamano_pagina).execute())
+
+
+def iterar_filas(cliente, tabla, columnas, filtros=(), orden=('id',), tamano_pagina=None):
+    """
+    Recorre una tabla página a página mediante paginación keyset y devuelve
+    las filas de una en una (generador). Ver leer_pagina para los parámetros.
+
+    No se pierde ninguna fila aunque PostgREST limite el número máximo de filas
+    por respuesta (max-rows).
+    """
+    tamano_pagina = tamano_pagina or TAMANO_PAGINA_POR_DEFECTO
+    cursor = None
+    maximo_recibido = 0
+    while True:
+        filas = leer_pagina(cliente, tabla, columnas, filtros, orden, cursor, tamano_pagina)
+        if not filas:
+            return
+        yield from filas
+
+        # Si el servidor recorta las páginas (max-rows) recibiremos menos filas de las
+        # pedidas sin haber llegado al final: sólo paramos cuando una página es más
+        # corta que la mayor recibida hasta el momento.
+        if len(filas) < min(tamano_pagina, maximo_recibido):
+            return
+        maximo_recibido = max(maximo_recibido, len(filas))
+        cursor = tuple(filas[-1].get(c) for c in orden)
+
+
+_cache_estimaciones = {}
+
+
+def contar_estimado(cliente, tabla, ttl_segundos=300):
+    """
+    Devuelve el número aproximado de filas de una tabla usando la estimación del
+    planificador de PostgreSQL (count=estimated), cacheada en memoria durante
+    ttl_segundos para no repetirla en cada petición de página.
+    """
+    ahora = time.monotonic()
+    en_cache = _cache_estimaciones.get(tabla)
+    if en_cache and ahora - en_cache[1] < ttl_segundos:
+        return en_cache[0]
+    respuesta = cliente.table(tabla).select('id', count='estimated').limit(1).execute()
+    datos_respuesta(respuesta)
+    total = getattr(respuesta, 'count', None)
+    _cache_estimaciones[tabla] = (total, ahora)
+    return total
+
+
+def iterar_facturas(cliente, columnas, filtros=(), orden=('id',), tamano_pagina=None):
+    """Atajo de iterar_filas para la tabla 'facturas'."""
+    return iterar_filas(cliente, 'facturas', columnas, filtros, orden, tamano_pagina)
@@ -0,0 +1,109 @@
+# datos/repositorio.py
+
+from datos.paginacion import datos_respuesta, aplicar_filtros, leer_pagina, iterar_filas, contar_estimado
+
+# Operadores admitidos en los filtros (operador, columna, valor) por todos los repositorios.
+# 'or_' no lleva columna: su valor es una lista de grupos de filtros, y basta con que
+# se cumpla uno de ellos. 'is_' sólo admite el valor None (la columna es nula).
+OPERADORES = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in_', 'is_', 'or_')
+
+
+class Repositorio:
+    """
+    Interfaz de acceso a datos que usan las rutas de la API.
+
+    Los filtros son secuencias de tuplas (operador, columna, valor), con operador en
+    OPERADORES. Los errores de la base de datos se lanzan como ErrorConsulta.
+    """
+
+    nombre = ''
+
+    def consultar(self, tabla, columnas='*', filtros=(), orden=(), descendente=False, rango=None):
+        """Devuelve las filas que cumplen los filtros. 'rango' es (desde, hasta), ambos incluidos."""
+        raise NotImplementedError
+
+    def leer_pagina(self, tabla, columnas, filtros=(), orden=('id',), cursor=None,
+                    tamano_pagina=None, descendente=False):
+        """Devuelve la página que sigue al cursor (paginación keyset, ver datos.paginacion)."""
+        raise NotImplementedError
+
+    def iterar(self, tabla, columnas, filtros=(), orden=('id',), tamano_pagina=None):
+        """Recorre todas las filas que cumplen los filtros sin cargarlas a la vez en memoria."""
+        raise NotImplementedError
+
+    def contar_estimado(self, tabla, ttl_segundos=300):
+        """Número aproximado de filas de la tabla."""
+        raise NotImplementedError
+
+    def upsert(self, tabla, filas, on_conflict='id', tamano_lote=1000):
+        """
+        Inserta o actualiza filas (diccionarios) en lotes de 'tamano_lote'. 'on_conflict' es
+        la columna, o las columnas separadas por comas, que identifican cada fila.
+        Devuelve el número de filas escritas.
+        """
+        raise NotImplementedError
+
+    def existe_tabla(self, tabla):
+        """Si la tabla existe. En Supabase las tablas las crea el esquema, así que se supone que sí."""
+        return True
+
+    def existe_columna(self, tabla, columna):
+        """Si la tabla tiene la columna (para las columnas añadidas después del esquema inicial)."""
+        raise NotImplementedError
+
+
+def lotes(filas, tamano_lote):
+    """Agrupa un iterable de filas en listas de como mucho 'tamano_lote' elementos."""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class RepositorioSupabase(Repositorio):
+    """Repositorio sobre el cliente de Supabase (PostgREST)."""
+
+    nombre = 'Supabase'
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def consultar(self, tabla, columnas='*', filtros=(), orden=(), descendente=False, rango=None):
+        consulta = aplicar_filtros(self.cliente.table(tabla).select(columnas), filtros)
+        for columna in orden:
+            consulta = consulta.order(columna, desc=descendente)
+        if rango is not None:
+            consulta = consulta.range(rango[0], rango[1])
+        return datos_respuesta(consulta.execute())
+
+    def leer_pagina(self, tabla, columnas, filtros=(), orden=('id',), cursor=None,
+                    tamano_pagina=None, descendente=False):
+        return leer_pagina(self.cliente, tabla, columnas, filtros, orden, cursor, tamano_pagina, descendente)
+
+    def iterar(self, tabla, columnas, filtros=(), orden=('id',), tamano_pagina=None):
+        return iterar_filas(self.cliente, tabla, columnas, filtros, orden, tamano_pagina)
+
+    def contar_estimado(self, tabla, ttl_segundos=300):
+        return contar_estimado(self.cliente, tabla, ttl_segundos)
+
+    def upsert(self, tabla, filas, on_conflict='id', tamano_lote=1000):
+        """Cada lote es una única petición POST con resolución de conflictos (merge-duplicates)."""
+        escritas = 0
+        for lote in lotes(filas, tamano_lote):
+            datos_respuesta(self.cliente.table(tabla).upsert(lote, on_conflict=on_conflict).execute())
+            escritas += len(lote)
+        return escritas
+
+    def existe_columna(self, tabla, columna):
+        """Se prueba a leer la columna: PostgreSQL responde 42703 (undefined_column) si no existe."""
+        try:
+            self.consultar(tabla, columna, rango=(0, 0))
+        except Exception as e:
+            if getattr(e, 'code', None) == '42703' or '42703' in str(e):
+                return False
+            raise
+        return True
@@ -0,0 +1,111 @@
+# components/api.py
+
+import os
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from contextlib import contextmanager
+import streamlit as st
+
+
+def backend_url():
+    """URL base de la API (backend-app.py): variable de entorno BACKEND_URL o secreto de Streamlit."""
+    url = os.environ.get("BACKEND_URL")
+    if not url:
+        try:
+            url = st.secrets.get("BACKEND_URL")
+        except Exception:
+            url = None
+    return (url or "http://localhost:5000").rstrip('/')
+
+
+@contextmanager
+def _abrir(peticion, timeout):
+    """Respuesta de una petición a la API; los errores de la API y de conexión se lanzan como RuntimeError."""
+    try:
+        with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+            yield respuesta
+    except urllib.error.HTTPError as e:
+        try:
+            error = json.loads(e.read().decode('utf-8'))
+            mensaje = error.get("details") or error.get("error") or str(e)
+        except Exception:
+            mensaje = str(e)
+        raise RuntimeError(mensaje)
+    except (urllib.error.URLError, OSError) as e:
+        raise RuntimeError(f"No se puede conectar con la API en {backend_url()}: {e}")
+
+
+def _enviar(peticion, timeout):
+    """Envía una petición a la API y devuelve la respuesta JSON decodificada (RuntimeError si falla)."""
+    with _abrir(peticion, timeout) as respuesta:
+        return json.loads(respuesta.read().decode('utf-8'))
+
+
+def post_api(ruta, datos=None, timeout=120):
+    """
+    Envía una petición POST con cuerpo JSON a la API y devuelve la respuesta decodificada.
+    Lanza RuntimeError con el mensaje de la API (o de la conexión) si falla.
+    """
+    peticion = urllib.request.Request(
+        backend_url() + ruta,
+        data=json.dumps(datos or {}).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    return _enviar(peticion, timeout)
+
+
+def get_api(ruta, parametros=None, timeout=120):
+    """
+    Envía una petición GET a la API con los parámetros de consulta indicados (se omiten los
+    None) y devuelve la respuesta decodificada. Lanza RuntimeError si falla, como post_api.
+    """
+    consulta = urllib.parse.urlencode({k: v for k, v in (parametros or {}).items() if v is not None})
+    return _enviar(urllib.request.Request(backend_url() + ruta + (f"?{consulta}" if consulta else ''), method="GET"),
+                   timeout)
+
+
+def _multipart(campos, nombre_campo, nombre_fichero, contenido):
+    """Cuerpo multipart/form-data con los campos de texto y un fichero. Devuelve (cuerpo, content_type)."""
+    limite = uuid.uuid4().hex
+    partes = []
+    for campo, valor in campos.items():
+        if valor is not None:
+            partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="{campo}"\r\n\r\n{valor}\r\n'.encode('utf-8'))
+    partes.append(
+        f'--{limite}\r\nContent-Disposition: form-data; name="{nombre_campo}"; filename="{nombre_fichero}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8')
+    )
+    partes.append(contenido)
+    partes.append(f'\r\n--{limite}--\r\n'.encode('utf-8'))
+    return b''.join(partes), f'multipart/form-data; boundary={limite}'
+
+
+def post_formulario_api(ruta, nombre_fichero, contenido, campos=None, timeout=600):
+    """
+    Envía un fichero (campo 'fichero') y campos de formulario a una ruta de la API que
+    responde con un único JSON y devuelve la respuesta decodificada. Lanza RuntimeError si
+    falla, como post_api.
+    """
+    cuerpo, tipo = _multipart(campos or {}, 'fichero', nombre_fichero, contenido)
+    peticion = urllib.request.Request(backend_url() + ruta, data=cuerpo,
+                                      headers={"Content-Type": tipo}, method="POST")
+    return _enviar(peticion, timeout)
+
+
+def post_fichero_api(ruta, nombre_fichero, contenido, campos=None, timeout=600):
+    """
+    Envía un fichero (campo 'fichero') y campos de formulario a una ruta de la API que
+    responde con un flujo NDJSON, y devuelve sus líneas decodificadas a medida que llegan
+    (generador). Lanza RuntimeError si la API rechaza la petición o no se puede conectar.
+    """
+    cuerpo, tipo = _multipart(campos or {}, 'fichero', nombre_fichero, contenido)
+    peticion = urllib.request.Request(backend_url() + ruta, data=cuerpo,
+                                      headers={"Content-Type": tipo}, method="POST")
+    with _abrir(peticion, timeout) as respuesta:
+        for linea in respuesta:
+            if linea.strip():
+                yield json.loads(linea.decode('utf-8'))
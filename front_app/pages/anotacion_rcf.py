@@ -3,11 +3,77 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from components.boxes import info_box, success_box
+from components.boxes import info_box, success_box, warning_box
 from components.downloads import download_excel
 from components.charts import create_line_chart
+from components.api import get_api, post_formulario_api
 import plotly.express as px
 
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cargar_tiempos_anotacion():
+    """Tiempo medio de anotación por mes y canal, del resumen mensual de la API."""
+    return get_api('/api/resumen/mensual', {"dimensiones": "mes,es_electronica"})
+
+
+def conciliar_registro(uploaded_file, fecha_corte):
+    """Concilia el registro de FACe subido con el RCF (POST /api/auditar/v2/conciliacion)."""
+    return post_formulario_api('/api/auditar/v2/conciliacion', uploaded_file.name, uploaded_file.getvalue(),
+                               {"fecha_corte": fecha_corte.isoformat()})
+
+
+def tablas_conciliacion(datos):
+    """DataFrames de facturas no anotadas en RCF, no registradas en FACe y discrepancias de la conciliación."""
+    df_no_anotadas = pd.DataFrame([{
+        "Número Factura": f['numero_factura'],
+        "NIF Emisor": f['proveedor_nif'],
+        "Razón Social": f.get('nombre_proveedor'),
+        "Fecha Emisión": f['fecha_factura'],
+        "Importe": f['importe'],
+        "Nº Registro FACe": f['numero_registro'],
+        "Fecha Registro FACe": f['fecha_registro'],
+        "Días Pendientes": f['dias_pendientes'],
+    } for f in datos.get('faltan_en_rcf', [])], columns=["Número Factura", "NIF Emisor", "Razón Social", "Fecha Emisión",
+                                                        "Importe", "Nº Registro FACe", "Fecha Registro FACe",
+                                                        "Días Pendientes"])
+    df_no_registradas = pd.DataFrame([{
+        "Número Factura": f['numero_factura'],
+        "NIF Emisor": f['proveedor_nif'],
+        "Fecha Emisión": f['fecha_factura'],
+        "Importe": f['importe'],
+        "Nº Registro": f['numero_registro'],
+        "Fecha Presentación": f['fecha_presentacion_registro'],
+    } for f in datos.get('faltan_en_plataforma', [])], columns=["Número Factura", "NIF Emisor", "Fecha Emisión", "Importe",
+                                                               "Nº Registro", "Fecha Presentación"])
+    df_discrepancias = pd.DataFrame([{
+        "Nº Registro FACe": d['numero_registro'],
+        "Número Factura": d['numero_factura'],
+        "NIF Emisor": d['proveedor_nif'],
+        "Campo": d['campo'],
+        "Valor FACe": d['valor_plataforma'],
+        "Valor RCF": d['valor_rcf'],
+    } for d in datos.get('discrepancias', [])], columns=["Nº Registro FACe", "Número Factura", "NIF Emisor", "Campo",
+                                                        "Valor FACe", "Valor RCF"])
+    return df_no_anotadas, df_no_registradas, df_discrepancias
+
+
+def tabla_tiempos_anotacion(filas):
+    """DataFrame de 'Tiempos medios de anotación' (minutos) por mes, en papel y electrónicas."""
+    por_mes = {}
+    for fila in filas:
+        if fila['media_horas_anotacion'] is None or fila['es_electronica'] is None:
+            continue
+        columna = 'Electrónicas (minutos)' if fila['es_electronica'] else 'Papel (minutos)'
+        por_mes.setdefault(fila['mes'], {'Mes': fila['mes']})[columna] = round(fila['media_horas_anotacion'] * 60, 1)
+        total = por_mes[fila['mes']]
+        total['_minutos'] = total.get('_minutos', 0) + fila['media_horas_anotacion'] * 60 * fila['facturas_con_anotacion']
+        total['_facturas'] = total.get('_facturas', 0) + fila['facturas_con_anotacion']
+    for total in por_mes.values():
+        total['Tiempo Medio (minutos)'] = round(total.pop('_minutos') / total.pop('_facturas'), 1)
+    return pd.DataFrame([por_mes[mes] for mes in sorted(por_mes)],
+                        columns=['Mes', 'Tiempo Medio (minutos)', 'Papel (minutos)', 'Electrónicas (minutos)'])
+
+
 def show_anotacion_rcf():
     st.markdown('<h1 class="main-header">Auditoría de Anotación en RCF</h1>', unsafe_allow_html=True)
     
@@ -23,6 +89,7 @@ def show_anotacion_rcf():
     with col2:
         if st.button("Actualizar datos", key="actualizar_rcf"):
             st.session_state.datos_actualizados_rcf = True
+            cargar_tiempos_anotacion.clear()
     with col3:
         st.markdown(
             '<div style="text-align: right;"><span style="background-color: #E5E7EB; padding: 0.5rem; border-radius: 0.5rem; font-size: 0.9rem;">Última actualización: 05/04/2025</span></div>',
@@ -46,17 +113,11 @@ def show_anotacion_rcf():
         )
     
     with tab2:
-        # Datos de ejemplo para tiempos de anotación
-        meses = ['Enero', 'Febrero', 'Marzo', 'Abril']
-        tiempos_medios = [120, 100, 90, 80]
-        tiempos_minimos = [30, 25, 20, 15]
-        tiempos_maximos = [240, 210, 180, 150]
-        df_tiempos = pd.DataFrame({
-            'Mes': meses, 
-            'Tiempo Medio (minutos)': tiempos_medios,
-            'Tiempo Mínimo (minutos)': tiempos_minimos,
-            'Tiempo Máximo (minutos)': tiempos_maximos
-        })
+        try:
+            df_tiempos = tabla_tiempos_anotacion(cargar_tiempos_anotacion()['filas'])
+        except RuntimeError as e:
+            warning_box("No se han podido cargar los tiempos de anotación", str(e))
+            df_tiempos = tabla_tiempos_anotacion([])
         
         st.plotly_chart(
             create_line_chart(df_tiempos, 'Mes', 'Tiempo Medio (minutos)', 
@@ -67,16 +128,38 @@ def show_anotacion_rcf():
         st.markdown(download_excel(df_tiempos, "tiempos_anotacion"), unsafe_allow_html=True)
     
     with tab3:
-        # Datos de ejemplo para facturas no anotadas
-        df_no_anotadas = pd.DataFrame({
-            "Número Factura": ["F2025-004", "F2025-005"],
-            "NIF Emisor": ["B12345678", "A87654321"],
-            "Razón Social": ["Empresa A", "Empresa B"],
-            "Fecha Emisión": ["04/04/2025", "05/04/2025"],
-            "Importe": [1200.00, 3500.50],
-            "Fecha Registro FACe": ["04/04/2025", "05/04/2025"],
-            "Días Pendientes": [1, 0]
-        })
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            fichero_registro = st.file_uploader("Registro de facturas exportado de FACe (Excel o CSV)",
+                                                type=["xlsx", "csv"], key="file_registro_face")
+        with col2:
+            fecha_corte = st.date_input("Fecha de corte", datetime.now().date(), key="fecha_corte_rcf")
+        if fichero_registro is not None and st.button("Conciliar con el RCF", key="conciliar_rcf"):
+            with st.spinner("Conciliando el registro de FACe con el RCF..."):
+                try:
+                    st.session_state.conciliacion_rcf = conciliar_registro(fichero_registro, fecha_corte)
+                except RuntimeError as e:
+                    warning_box("No se ha podido conciliar el registro", str(e))
+        datos_conciliacion = st.session_state.get('conciliacion_rcf') or {}
+        df_no_anotadas, df_no_registradas, df_discrepancias = tablas_conciliacion(datos_conciliacion)
+
+        if datos_conciliacion:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Registradas en FACe", datos_conciliacion['total_registro'])
+            col2.metric("Emparejadas", datos_conciliacion['emparejadas'])
+            col3.metric("No anotadas en RCF", datos_conciliacion['total_faltan_en_rcf'])
+            col4.metric("No registradas en FACe", datos_conciliacion['total_faltan_en_plataforma'])
+            if not datos_conciliacion['total_faltan_en_rcf']:
+                success_box("Sin facturas pendientes", "Todas las facturas registradas en FACe están anotadas en el RCF.")
+        else:
+            info_box("Conciliación", "Suba el registro de facturas exportado de FACe para compararlo con el RCF.")
+
         st.write("Facturas registradas en FACe pero no anotadas en RCF:")
         st.dataframe(df_no_anotadas)
         st.markdown(download_excel(df_no_anotadas, "facturas_no_anotadas"), unsafe_allow_html=True)
+        st.write("Facturas anotadas en RCF que no figuran en el registro de FACe:")
+        st.dataframe(df_no_registradas)
+        st.markdown(download_excel(df_no_registradas, "facturas_no_registradas_face"), unsafe_allow_html=True)
+        st.write("Discrepancias entre FACe y el RCF:")
+        st.dataframe(df_discrepancias)
+        st.markdown(download_excel(df_discrepancias, "discrepancias_face_rcf"), unsafe_allow_html=True)
@@ -5,6 +5,35 @@ import pandas as pd
 from components.boxes import info_box, warning_box
 from components.downloads import download_excel
 from components.charts import create_pie_chart
+from components.api import get_api, post_api
+
+# Validaciones de la Orden HAP/1650/2015 que se muestran, en orden (con el nombre que usa la API).
+VALIDACIONES = ("Formato Facturae", "Firma electrónica", "NIF emisor", "Códigos DIR3")
+
+
+@st.cache_data(ttl=300, show_spinner="Calculando validaciones de contenido...")
+def cargar_validaciones_contenido():
+    return post_api('/api/auditar/contenido/validaciones')
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cargar_proveedores_rechazos(k=10):
+    """Proveedores con más facturas rechazadas (GET /api/ranking/proveedores)."""
+    return get_api('/api/ranking/proveedores', {"estado": "RECHAZADA", "k": k})
+
+
+def tabla_validaciones(datos):
+    """DataFrame de 'Validaciones de la Orden HAP/1650/2015' a partir de la API (0 en las que no calcula)."""
+    por_validacion = {fila['validacion']: fila for fila in datos.get('validaciones', [])}
+    filas = []
+    for validacion in VALIDACIONES:
+        fila = por_validacion.get(validacion, {})
+        filas.append({
+            "Validación": validacion,
+            "Nº facturas": fila.get('facturas_no_validas', 0),
+            "Porcentaje": fila.get('porcentaje', 0.0),
+        })
+    return pd.DataFrame(filas, columns=["Validación", "Nº facturas", "Porcentaje"])
 
 def show_contenido_facturas():
     st.markdown('<h1 class="main-header">Auditoría del Contenido de Facturas</h1>', unsafe_allow_html=True)
@@ -21,6 +50,8 @@ def show_contenido_facturas():
     with col2:
         if st.button("Actualizar datos", key="actualizar_contenido"):
             st.session_state.datos_actualizados_contenido = True
+            cargar_validaciones_contenido.clear()
+            cargar_proveedores_rechazos.clear()
     with col3:
         st.markdown(
             '<div style="text-align: right;"><span style="background-color: #E5E7EB; padding: 0.5rem; border-radius: 0.5rem;">Última actualización: 05/04/2025</span></div>',
@@ -29,20 +60,35 @@ def show_contenido_facturas():
     
     st.markdown('<h2 class="section-header">Validaciones de la Orden HAP/1650/2015</h2>', unsafe_allow_html=True)
     
-    df_validaciones = pd.DataFrame({
-        "Validación": ["Formato Facturae", "Firma electrónica", "NIF emisor", "Códigos DIR3"],
-        "Nº facturas": [0, 0, 0, 0],
-        "Porcentaje": [0.0, 0.0, 0.0, 0.0]
-    })
+    try:
+        datos_validaciones = cargar_validaciones_contenido()
+    except RuntimeError as e:
+        warning_box("No se han podido calcular las validaciones de contenido", str(e))
+        datos_validaciones = {}
+    df_validaciones = tabla_validaciones(datos_validaciones)
     st.dataframe(df_validaciones)
+    if datos_validaciones.get('documentos_no_validos'):
+        df_no_validos = pd.DataFrame([{
+            "Documento": d['nombre'],
+            "Origen": d.get('origen'),
+            "Validación": d['validacion'],
+            "Errores": "; ".join(d.get('errores') or []),
+        } for d in datos_validaciones['documentos_no_validos']])
+        with st.expander(f"Documentos no válidos ({len(df_no_validos)})"):
+            st.dataframe(df_no_validos)
+            st.markdown(download_excel(df_no_validos, "documentos_no_validos"), unsafe_allow_html=True)
     st.markdown(download_excel(df_validaciones, "validaciones_facturas"), unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-header">Facturas rechazadas por motivo</h2>', unsafe_allow_html=True)
     
+    # Órgano gestor incorrecto: el código no existe en DIR3 o no está relacionado con la OC y la UT.
+    motivos_dir3 = datos_validaciones.get('motivos_dir3') or {}
+    organo_incorrecto = motivos_dir3.get('organo_gestor_desconocido', 0) + motivos_dir3.get('relacion_no_valida', 0)
     df_rechazos = pd.DataFrame({
         "Motivo": ["Duplicidad", "Órgano gestor incorrecto", "Datos incompletos", "Otros"],
-        "Nº facturas": [0, 0, 0, 0],
-        "Porcentaje": [0.0, 0.0, 0.0, 0.0]
+        "Nº facturas": [0, organo_incorrecto, 0, 0],
+        "Porcentaje": [0.0, round(organo_incorrecto * 100 / datos_validaciones['total_facturas'], 2)
+                       if datos_validaciones.get('total_facturas') else 0.0, 0.0, 0.0]
     })
     st.dataframe(df_rechazos)
     st.plotly_chart(create_pie_chart(df_rechazos, 'Motivo', 'Nº facturas', 'Distribución de rechazos'), use_container_width=True)
@@ -67,12 +113,17 @@ def show_contenido_facturas():
     
     st.markdown('<h2 class="section-header">Proveedores con mayor número de rechazos</h2>', unsafe_allow_html=True)
     
-    df_proveedores_rechazos = pd.DataFrame({
-        "CIF Proveedor": [],
-        "Razón Social": [],
-        "Nº facturas rechazadas": [],
-        "Porcentaje": []
-    })
+    try:
+        ranking_rechazos = cargar_proveedores_rechazos()['por_numero_facturas']
+    except RuntimeError as e:
+        warning_box("No se ha podido cargar el ranking de proveedores", str(e))
+        ranking_rechazos = []
+    df_proveedores_rechazos = pd.DataFrame([{
+        "CIF Proveedor": p['proveedor_nif'],
+        "Nº facturas rechazadas": p['numero_facturas'],
+        "Importe rechazado": p['importe_total'],
+        "Porcentaje": p['porcentaje_facturas'],
+    } for p in ranking_rechazos], columns=["CIF Proveedor", "Nº facturas rechazadas", "Importe rechazado", "Porcentaje"])
     
     if df_proveedores_rechazos.empty:
         st.write("No hay datos disponibles")
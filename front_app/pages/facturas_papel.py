@@ -5,7 +5,51 @@ import pandas as pd
 from components.boxes import info_box, warning_box, success_box
 from components.downloads import download_excel
 from components.charts import create_bar_chart
-from datetime import datetime
+from components.api import get_api, post_api
+from datetime import date, datetime
+
+
+@st.cache_data(ttl=300, show_spinner="Calculando la auditoría de facturas en papel...")
+def cargar_auditoria_papel(fecha_inicio, fecha_fin):
+    return post_api('/api/auditar/v1/papel', {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin})
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cargar_evolucion_papel(desde, hasta):
+    """Facturas en papel por mes de fecha de factura, del resumen mensual de la API."""
+    return get_api('/api/resumen/mensual', {"dimensiones": "mes", "es_electronica": "false",
+                                            "desde": desde, "hasta": hasta})
+
+
+def _tipo_emisor(tipo):
+    return tipo.replace('_', ' ').capitalize() if tipo else "NIF no válido"
+
+
+def tablas_papel(datos):
+    """DataFrames de las facturas en papel que incumplen la obligación y de los proveedores a partir de la API."""
+    obligacion = datos.get('v1_5_obligacion_factura_electronica') or {}
+    df_papel = pd.DataFrame([{
+        "Número Factura": f['numero_factura'],
+        "NIF Emisor": f['proveedor_nif'],
+        "Tipo de Emisor": _tipo_emisor(f.get('tipo_entidad')),
+        "Fecha Emisión": f.get('fecha_factura'),
+        "Importe": f.get('importe'),
+        "Requisito Incumplido": f.get('requisito_incumplido'),
+    } for f in obligacion.get('facturas_obligadas', [])],
+        columns=["Número Factura", "NIF Emisor", "Tipo de Emisor", "Fecha Emisión", "Importe", "Requisito Incumplido"])
+    proveedores = sorted(datos.get('facturas_papel_por_proveedor', []),
+                         key=lambda p: (-p.get('facturas_obligadas', 0), -p.get('importe_total', 0)))
+    df_proveedores = pd.DataFrame([{
+        "NIF Emisor": p['proveedor_nif'],
+        "Tipo de Emisor": _tipo_emisor(p.get('tipo_entidad')),
+        "Número de Facturas": p['numero_facturas'],
+        "Importe Total": p['importe_total'],
+        "Facturas Obligadas": p.get('facturas_obligadas', 0),
+        "Importe Obligadas": p.get('importe_obligadas', 0.0),
+    } for p in proveedores], columns=["NIF Emisor", "Tipo de Emisor", "Número de Facturas", "Importe Total",
+                                      "Facturas Obligadas", "Importe Obligadas"])
+    return df_papel, df_proveedores
+
 
 def show_facturas_papel():
     st.markdown('<h1 class="main-header">Auditoría de Facturas en Papel</h1>', unsafe_allow_html=True)
@@ -14,41 +58,48 @@ def show_facturas_papel():
     
     col1, col2, col3 = st.columns([2, 2, 3])
     with col1:
-        st.selectbox("Seleccionar fecha", ["Fecha actual", "Datos históricos"], key="fecha_tipo_papel")
+        hoy = date.today()
+        periodo = st.date_input("Periodo (registro en RCF)", (date(hoy.year, 1, 1), hoy), key="periodo_papel")
     with col2:
         if st.button("Actualizar datos", key="actualizar_papel"):
             st.session_state.datos_actualizados_papel = True
+            cargar_auditoria_papel.clear()
+            cargar_evolucion_papel.clear()
     with col3:
         st.markdown('<div style="text-align: right;"><span style="background-color: #E5E7EB; padding: 0.5rem; border-radius: 0.5rem;">Última actualización: 05/04/2025</span></div>', unsafe_allow_html=True)
     
+    datos_papel = {}
+    if isinstance(periodo, tuple) and len(periodo) == 2:
+        try:
+            datos_papel = cargar_auditoria_papel(periodo[0].isoformat(), periodo[1].isoformat())
+        except RuntimeError as e:
+            warning_box("No se ha podido calcular la auditoría de facturas en papel", str(e))
+    df_papel, df_proveedores = tablas_papel(datos_papel)
+
     tab1, tab2, tab3 = st.tabs(["Facturas que incumplen", "Evolución mensual", "Proveedores destacados"])
     
     with tab1:
-        df_papel = pd.DataFrame({
-            "Número Factura": ["P2025-001", "P2025-002", "P2025-003"],
-            "NIF Emisor": ["B12345678", "A87654321", "B11223344"],
-            "Razón Social": ["Empresa A", "Empresa B", "Empresa C"],
-            "Fecha Emisión": ["01/04/2025", "02/04/2025", "03/04/2025"],
-            "Importe": [1000.00, 2500.50, 750.25],
-            "Requisito Incumplido": ["Obligado", "Obligado", "Obligado"]
-        })
+        criterios = (datos_papel.get('v1_5_obligacion_factura_electronica') or {}).get('criterios')
+        if criterios and criterios.get('umbral_exencion'):
+            st.caption(f"Se excluyen las facturas de hasta {criterios['umbral_exencion']:g} € (art. 4 Ley 25/2013).")
+        if datos_papel and df_papel.empty:
+            success_box("Sin incumplimientos", "Ninguna factura en papel del periodo procede de un emisor obligado a la factura electrónica.")
         st.dataframe(df_papel)
         st.markdown(download_excel(df_papel, "facturas_papel_incumplen"), unsafe_allow_html=True)
     
     with tab2:
-        meses = ['Enero', 'Febrero', 'Marzo', 'Abril']
-        cantidades = [10, 8, 5, 3]
-        df_evolucion = pd.DataFrame({'Mes': meses, 'Cantidad': cantidades})
+        filas_mes = []
+        if isinstance(periodo, tuple) and len(periodo) == 2:
+            try:
+                filas_mes = cargar_evolucion_papel(periodo[0].strftime('%Y-%m'), periodo[1].strftime('%Y-%m'))['filas']
+            except RuntimeError as e:
+                warning_box("No se ha podido cargar la evolución mensual", str(e))
+        df_evolucion = pd.DataFrame([{'Mes': f['mes'], 'Cantidad': f['numero_facturas'], 'Importe': f['importe_total']}
+                                     for f in filas_mes], columns=['Mes', 'Cantidad', 'Importe'])
         st.plotly_chart(create_bar_chart(df_evolucion, 'Mes', 'Cantidad', 'Evolución mensual', 'Mes', 'Cantidad'), use_container_width=True)
         st.dataframe(df_evolucion)
         st.markdown(download_excel(df_evolucion, "evolucion_facturas_papel"), unsafe_allow_html=True)
     
     with tab3:
-        df_proveedores = pd.DataFrame({
-            "NIF Emisor": ["B12345678", "A87654321", "B11223344"],
-            "Razón Social": ["Empresa A", "Empresa B", "Empresa C"],
-            "Número de Facturas": [5, 3, 2],
-            "Importe Total": [5000.00, 7500.50, 1500.25]
-        })
         st.dataframe(df_proveedores)
         st.markdown(download_excel(df_proveedores, "proveedores_facturas_papel"), unsafe_allow_html=True)
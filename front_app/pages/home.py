@@ -3,11 +3,23 @@
 import streamlit as st
 import pandas as pd
 from components.charts import create_bar_chart, create_line_chart
-from components.boxes import info_box
+from components.boxes import info_box, warning_box
 from components.downloads import download_excel
+from components.api import get_api
 from datetime import datetime
 from PIL import Image
 
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cargar_resumen_mensual(dimensiones, **filtros):
+    """Corte del resumen mensual de la API (GET /api/resumen/mensual)."""
+    return get_api('/api/resumen/mensual', dict(filtros, dimensiones=dimensiones))
+
+
+def _numero(valor):
+    return f"{valor:,}".replace(',', '.')
+
+
 def show_home():
     st.markdown('<h1 class="main-header">Auditoría del Registro Contable de Facturas</h1>', unsafe_allow_html=True)
     
@@ -16,31 +28,41 @@ def show_home():
     
     st.markdown('<h2 class="section-header">Resumen de Datos</h2>', unsafe_allow_html=True)
     
+    try:
+        por_canal = cargar_resumen_mensual('es_electronica')['filas']
+        por_estado = cargar_resumen_mensual('estado')['filas']
+        por_mes = cargar_resumen_mensual('mes')['filas']
+    except RuntimeError as e:
+        warning_box("No se ha podido cargar el resumen de facturas", str(e))
+        por_canal, por_estado, por_mes = [], [], []
+    facturas_canal = {fila['es_electronica']: fila['numero_facturas'] for fila in por_canal}
+    con_anotacion = sum(fila['facturas_con_anotacion'] for fila in por_canal)
+    horas_anotacion = sum(fila['media_horas_anotacion'] * fila['facturas_con_anotacion'] for fila in por_canal
+                          if fila['media_horas_anotacion'] is not None)
+
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric(label="Total Facturas", value="0")
+        st.metric(label="Total Facturas", value=_numero(sum(facturas_canal.values())))
     with col2:
-        st.metric(label="Facturas Electrónicas", value="0")
+        st.metric(label="Facturas Electrónicas", value=_numero(facturas_canal.get(True, 0)))
     with col3:
-        st.metric(label="Facturas en Papel", value="0")
+        st.metric(label="Facturas en Papel", value=_numero(facturas_canal.get(False, 0)))
     with col4:
-        st.metric(label="Tiempo Medio Tramitación", value="0 días")
+        st.metric(label="Tiempo Medio Anotación",
+                  value=f"{horas_anotacion / con_anotacion:.1f} h" if con_anotacion else "-")
     
     st.markdown('<h2 class="section-header">Gráficos de Resumen</h2>', unsafe_allow_html=True)
     
-    estados = ['Registrada', 'Contabilizada', 'Conformada', 'Pagada', 'Rechazada']
-    cantidades = [50, 30, 20, 10, 5]
-    df_estados = pd.DataFrame({'Estado': estados, 'Cantidad': cantidades})
-    
-    meses = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    tiempos = [15, 14, 12, 10]
-    df_tiempos = pd.DataFrame({'Mes': meses, 'Tiempo Medio (días)': tiempos})
+    df_estados = pd.DataFrame([{'Estado': fila['estado'] or 'Sin estado', 'Cantidad': fila['numero_facturas']}
+                               for fila in por_estado], columns=['Estado', 'Cantidad'])
+    df_meses = pd.DataFrame([{'Mes': fila['mes'], 'Facturas': fila['numero_facturas']} for fila in por_mes],
+                            columns=['Mes', 'Facturas'])
     
     col1, col2 = st.columns(2)
     with col1:
         st.plotly_chart(create_bar_chart(df_estados, 'Estado', 'Cantidad', 'Facturas por Estado', 'Estado', 'Cantidad'), use_container_width=True)
     with col2:
-        st.plotly_chart(create_line_chart(df_tiempos, 'Mes', 'Tiempo Medio (días)', 'Evolución de Tiempos de Tramitación', 'Mes', 'Tiempo Medio (días)'), use_container_width=True)
+        st.plotly_chart(create_line_chart(df_meses, 'Mes', 'Facturas', 'Evolución mensual de facturas', 'Mes', 'Facturas'), use_container_width=True)
     
     st.markdown('<h2 class="section-header">Accesos Rápidos</h2>', unsafe_allow_html=True)
     col1, col2, col3 = st.columns(3)
@@ -5,6 +5,97 @@ import pandas as pd
 from datetime import datetime
 from components.boxes import info_box, warning_box, success_box
 from components.downloads import download_excel
+from components.api import post_fichero_api
+
+# Filas del fichero que se leen para la vista previa.
+FILAS_VISTA_PREVIA = 5
+
+
+def vista_previa(uploaded_file, filas=FILAS_VISTA_PREVIA):
+    """
+    Primeras filas del fichero subido, sin analizar el resto: read_csv/read_excel con
+    nrows (con el motor calamine si está instalado, que sólo lee las filas pedidas).
+    """
+    uploaded_file.seek(0)
+    try:
+        if uploaded_file.name.lower().endswith('.csv'):
+            return pd.read_csv(uploaded_file, nrows=filas, sep=None, engine='python', dtype=str,
+                               encoding='utf-8-sig')
+        try:
+            import python_calamine  # noqa: F401
+            motor = 'calamine'
+        except ImportError:
+            motor = None
+        return pd.read_excel(uploaded_file, nrows=filas, dtype=str, engine=motor)
+    finally:
+        uploaded_file.seek(0)
+
+
+def importar_fichero_facturas(uploaded_file, plataforma, reanudar=True):
+    """
+    Envía el fichero a la API de importación (POST /api/importar/facturas) y va mostrando
+    el progreso que devuelve tras cada lote escrito. Si el mismo fichero tiene una
+    importación interrumpida, la API la reanuda desde su último lote confirmado (salvo con
+    'reanudar' a False). Devuelve el resumen final.
+    """
+    barra = st.progress(0.0, text="Importando facturas...")
+    ultimo = None
+    for estado in post_fichero_api("/api/importar/facturas", uploaded_file.name, uploaded_file.getvalue(),
+                                   {"plataforma": plataforma, "reanudar": "true" if reanudar else "false"}):
+        if estado.get("error"):
+            raise RuntimeError(estado.get("details") or estado["error"])
+        if ultimo is None and estado.get("reanudada_desde_fila"):
+            info_box("Importación reanudada",
+                     f"Este fichero ya se había importado en parte: se continúa desde la fila "
+                     f"{estado['reanudada_desde_fila']}.")
+        ultimo = estado
+        fraccion = estado["bytes_leidos"] / estado["bytes_totales"] if estado.get("bytes_totales") else 0.0
+        barra.progress(min(fraccion, 1.0),
+                       text=f"{estado['filas_escritas']} facturas importadas de {estado['filas_leidas']} filas leídas")
+    return ultimo
+
+
+def importar_fichero_historico(uploaded_file, plataforma):
+    """
+    Envía un fichero del histórico de estados a la API (POST /api/importar/historico),
+    que lo añade al almacén del histórico, y muestra el progreso. Devuelve el resumen final.
+    """
+    barra = st.progress(0.0, text="Importando histórico de estados...")
+    ultimo = None
+    for estado in post_fichero_api("/api/importar/historico", uploaded_file.name, uploaded_file.getvalue(),
+                                   {"plataforma": plataforma}):
+        if estado.get("error"):
+            raise RuntimeError(estado.get("details") or estado["error"])
+        ultimo = estado
+        fraccion = estado["bytes_leidos"] / estado["bytes_totales"] if estado.get("bytes_totales") else 0.0
+        barra.progress(min(fraccion, 1.0), text=f"{estado['eventos_anadidos']} eventos añadidos")
+    return ultimo
+
+
+def importar_documentos_facturae(uploaded_file, plataforma):
+    """
+    Envía un documento Facturae o un ZIP con muchos a la API (POST /api/importar/facturae),
+    que los valida, importa sus facturas y verifica sus firmas, y muestra el progreso.
+    Devuelve el resumen final de cada etapa: (importación, firma).
+    """
+    estado_texto = st.empty()
+    ultimo = {}
+    for estado in post_fichero_api("/api/importar/facturae", uploaded_file.name, uploaded_file.getvalue(),
+                                   {"plataforma": plataforma}):
+        if estado.get("error"):
+            raise RuntimeError(estado.get("details") or estado["error"])
+        ultimo[estado["etapa"]] = estado
+        if estado.get("aviso"):
+            continue
+        if estado["etapa"] == "firma":
+            estado_texto.write(f"{estado['documentos']} firmas comprobadas "
+                               f"({estado['facturas_por_segundo'] or 0} facturas por segundo)")
+        else:
+            estado_texto.write(f"{estado['documentos']} documentos analizados "
+                               f"({estado['documentos_por_segundo'] or 0} por segundo), "
+                               f"{estado['facturas_escritas']} facturas importadas")
+    return ultimo.get("importacion"), ultimo.get("firma")
+
 
 def show_importacion_datos():
     st.markdown('<h1 class="main-header">Importación de Datos</h1>', unsafe_allow_html=True)
@@ -12,11 +103,12 @@ def show_importacion_datos():
     info_box("Información",
              "Esta sección permite importar datos desde diferentes plataformas de facturación electrónica.")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Facturas presentadas en plataforma", 
         "Facturas pendientes de descargar", 
         "Solicitudes de anulación",
-        "Histórico de estados"
+        "Histórico de estados",
+        "Documentos Facturae"
     ])
     
     with tab1:
@@ -26,11 +118,21 @@ def show_importacion_datos():
         uploaded_file = st.file_uploader("Seleccione el archivo de facturas (Excel o CSV)", type=["xlsx", "csv"], key="file_facturas")
         if uploaded_file is not None:
             try:
-                df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith('.csv') else pd.read_excel(uploaded_file)
                 st.write("Vista previa:")
-                st.dataframe(df.head())
+                st.dataframe(vista_previa(uploaded_file))
+                reanudar = st.checkbox("Reanudar si el fichero tiene una importación interrumpida", value=True,
+                                       key="reanudar_facturas")
                 if st.button("Procesar facturas", key="procesar_facturas"):
-                    success_box("Procesamiento exitoso", f"Se han procesado {len(df)} facturas correctamente.")
+                    resumen = importar_fichero_facturas(uploaded_file, plataforma, reanudar)
+                    success_box("Procesamiento exitoso",
+                                f"Se han importado {resumen['filas_escritas']} facturas "
+                                f"({resumen['filas_nuevas']} nuevas y {resumen['filas_actualizadas']} actualizadas; "
+                                f"{resumen['filas_omitidas']} sin cambios omitidas) en {resumen['segundos']} segundos.")
+                    if resumen["filas_descartadas"] or resumen["valores_no_validos"]:
+                        no_validos = ", ".join(f"{c}: {n}" for c, n in resumen["valores_no_validos"].items())
+                        warning_box("Filas con incidencias",
+                                    f"{resumen['filas_descartadas']} filas descartadas por no tener número, NIF "
+                                    f"o fecha de factura. Valores no válidos por columna: {no_validos or 'ninguno'}.")
             except Exception as e:
                 warning_box("Error", f"Se ha producido un error: {str(e)}")
     
@@ -50,4 +152,59 @@ def show_importacion_datos():
             st.dataframe(df_pendientes)
             st.markdown(download_excel(df_pendientes, "facturas_pendientes"), unsafe_allow_html=True)
     
-    # Los tabs 3 y 4 se estructuran de forma similar
+    # El tab 3 se estructura de forma similar
+
+    with tab4:
+        st.markdown('<h2 class="subsection-header">Importar histórico de estados</h2>', unsafe_allow_html=True)
+        plataforma_historico = st.selectbox("Plataforma de los eventos", ["FACe", "RCF", "Indicada en el fichero"],
+                                            key="plataforma_historico")
+        fichero_historico = st.file_uploader("Seleccione el archivo del histórico de estados (Excel o CSV)",
+                                             type=["xlsx", "csv"], key="file_historico")
+        if fichero_historico is not None:
+            try:
+                st.write("Vista previa:")
+                st.dataframe(vista_previa(fichero_historico))
+                if st.button("Importar histórico", key="procesar_historico"):
+                    resumen = importar_fichero_historico(
+                        fichero_historico,
+                        None if plataforma_historico == "Indicada en el fichero" else plataforma_historico)
+                    success_box("Histórico importado",
+                                f"Se han añadido {resumen['eventos_anadidos']} eventos de {resumen['filas_leidas']} "
+                                f"filas leídas en {resumen['segundos']} segundos "
+                                f"({resumen.get('eventos_repetidos', 0)} ya estaban en el histórico).")
+                    if resumen["filas_descartadas"] or resumen["valores_no_validos"]:
+                        no_validos = ", ".join(f"{c}: {n}" for c, n in resumen["valores_no_validos"].items())
+                        warning_box("Filas con incidencias",
+                                    f"{resumen['filas_descartadas']} filas descartadas por no tener factura o estado. "
+                                    f"Valores no válidos por columna: {no_validos or 'ninguno'}.")
+            except Exception as e:
+                warning_box("Error", f"Se ha producido un error: {str(e)}")
+
+    with tab5:
+        st.markdown('<h2 class="subsection-header">Importar documentos Facturae</h2>', unsafe_allow_html=True)
+        plataforma_facturae = st.selectbox("Seleccione la plataforma", ["FACe", "AOC", "Biskaiticc", "Otra"],
+                                           key="plataforma_facturae")
+        fichero_facturae = st.file_uploader("Seleccione un documento Facturae (XML o XSIG) o un ZIP con varios",
+                                            type=["xml", "xsig", "zip"], key="file_facturae")
+        if fichero_facturae is not None:
+            try:
+                if st.button("Importar documentos", key="procesar_facturae"):
+                    resumen, firmas = importar_documentos_facturae(fichero_facturae, plataforma_facturae)
+                    success_box("Documentos importados",
+                                f"Se han analizado {resumen['documentos']} documentos e importado "
+                                f"{resumen['facturas_escritas']} facturas en {resumen['segundos']} segundos.")
+                    if resumen["documentos_no_validos"] or resumen["facturas_descartadas"]:
+                        warning_box("Documentos con incidencias",
+                                    f"{resumen['documentos_no_validos']} documentos no superan la validación de "
+                                    f"formato Facturae (el detalle está en Contenido de facturas); "
+                                    f"{resumen['facturas_descartadas']} facturas descartadas por no tener número, "
+                                    f"NIF o fecha.")
+                    if firmas and firmas.get("aviso"):
+                        warning_box("Firmas sin verificar", firmas["aviso"])
+                    elif firmas:
+                        info_box("Firmas electrónicas",
+                                 f"{firmas['firmas_validas']} firmas válidas, {firmas['firmas_no_validas']} no válidas "
+                                 f"y {firmas['sin_firma']} documentos sin firma ({firmas['documentos_omitidos']} ya "
+                                 f"verificados antes) a {firmas['facturas_por_segundo'] or 0} facturas por segundo.")
+            except Exception as e:
+                warning_box("Error", f"Se ha producido un error: {str(e)}")
@@ -3,8 +3,66 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from components.boxes import info_box
+from components.boxes import info_box, warning_box
 from components.downloads import download_excel
+from components.api import post_api
+
+# Estados del histórico cuya permanencia media se muestra, con su etiqueta (PAGADA es un
+# estado final y no tiene permanencia).
+ESTADOS_TIEMPOS = {
+    "REGISTRADA EN RCF": "Registrada",
+    "RECIBIDA EN DESTINO": "Recibida en destino",
+    "CONFORMADA": "Conformada",
+    "CONTABILIZADA": "Contabilizada",
+}
+
+# Columnas de la evolución mensual: tiempo medio en RCF hasta alcanzar cada estado.
+EVOLUCION_HASTA_ESTADO = {
+    "CONTABILIZADA": "Tiempo medio hasta contabilización (días)",
+    "CONFORMADA": "Tiempo medio hasta conformidad (días)",
+    "PAGADA": "Tiempo medio hasta pago (días)",
+}
+
+
+@st.cache_data(ttl=300, show_spinner="Calculando tiempos de tramitación...")
+def cargar_tiempos_tramitacion():
+    return post_api('/api/auditar/v4/tiempos')
+
+
+def _media(estadisticas, campo='media_dias'):
+    valor = (estadisticas or {}).get(campo)
+    return round(valor, 1) if valor is not None else None
+
+
+def tablas_tiempos(datos):
+    """DataFrames de 'Tiempos medios de tramitación' y de su evolución mensual a partir de la API."""
+    por_estado = {fila['estado']: fila for fila in datos.get('tiempos_por_estado', [])}
+    filas = []
+    for estado, etiqueta in ESTADOS_TIEMPOS.items():
+        fila = por_estado.get(estado)
+        if not fila:
+            continue
+        diferencia = fila.get('diferencia_media_dias')
+        filas.append({
+            "Estado": etiqueta,
+            "Tiempo medio en FACe (días)": _media(fila.get('face')),
+            "Tiempo medio en RCF (días)": _media(fila.get('rcf')),
+            "Diferencia (días)": round(diferencia, 1) if diferencia is not None else None,
+            "Mediana en RCF (días)": _media(fila.get('rcf'), 'mediana_dias'),
+            "P95 en RCF (días)": _media(fila.get('rcf'), 'p95_dias'),
+        })
+    df_tiempos = pd.DataFrame(filas, columns=["Estado", "Tiempo medio en FACe (días)", "Tiempo medio en RCF (días)",
+                                              "Diferencia (días)", "Mediana en RCF (días)", "P95 en RCF (días)"])
+
+    evolucion = {}
+    for fila in datos.get('tiempos_por_estado_y_mes', []):
+        columna = EVOLUCION_HASTA_ESTADO.get(fila['estado'])
+        if columna:
+            evolucion.setdefault(fila['mes'], {"Mes": fila['mes']})[columna] = \
+                _media(fila.get('rcf'), 'media_hasta_estado_dias')
+    df_evolucion = pd.DataFrame([evolucion[mes] for mes in sorted(evolucion)],
+                                columns=["Mes"] + list(EVOLUCION_HASTA_ESTADO.values()))
+    return df_tiempos, df_evolucion
 
 def show_tramitacion():
     st.markdown('<h1 class="main-header">Auditoría de Tramitación</h1>', unsafe_allow_html=True)
@@ -43,77 +101,77 @@ def show_tramitacion():
     
     st.markdown('<h2 class="section-header">Tiempos medios de tramitación</h2>', unsafe_allow_html=True)
     
-    df_tiempos_tramitacion = pd.DataFrame({
-        "Estado": ["Registrada", "Contabilizada", "Conformada", "Pagada"],
-        "Tiempo medio en FACe (días)": [1, 5, 10, 20],
-        "Tiempo medio en RCF (días)": [1, 4, 8, 18],
-        "Diferencia (días)": [0, 1, 2, 2]
-    })
-    st.dataframe(df_tiempos_tramitacion)
+    try:
+        df_tiempos_tramitacion, df_evolucion_tiempos = tablas_tiempos(cargar_tiempos_tramitacion())
+    except RuntimeError as e:
+        warning_box("No se han podido calcular los tiempos de tramitación", str(e))
+        df_tiempos_tramitacion, df_evolucion_tiempos = pd.DataFrame(), pd.DataFrame()
+
+    if df_tiempos_tramitacion.empty:
+        st.write("No hay datos disponibles")
+    else:
+        st.dataframe(df_tiempos_tramitacion)
     
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=df_tiempos_tramitacion['Estado'],
-        y=df_tiempos_tramitacion['Tiempo medio en FACe (días)'],
-        name='FACe',
-        marker_color='#3B82F6'
-    ))
-    fig.add_trace(go.Bar(
-        x=df_tiempos_tramitacion['Estado'],
-        y=df_tiempos_tramitacion['Tiempo medio en RCF (días)'],
-        name='RCF',
-        marker_color='#10B981'
-    ))
-    fig.update_layout(
-        title='Comparativa de tiempos medios de tramitación',
-        xaxis_title='Estado',
-        yaxis_title='Tiempo medio (días)',
-        barmode='group',
-        height=500
-    )
-    st.plotly_chart(fig, use_container_width=True)
-    st.markdown(download_excel(df_tiempos_tramitacion, "tiempos_tramitacion"), unsafe_allow_html=True)
+        fig = go.Figure()
+        fig.add_trace(go.Bar(
+            x=df_tiempos_tramitacion['Estado'],
+            y=df_tiempos_tramitacion['Tiempo medio en FACe (días)'],
+            name='FACe',
+            marker_color='#3B82F6'
+        ))
+        fig.add_trace(go.Bar(
+            x=df_tiempos_tramitacion['Estado'],
+            y=df_tiempos_tramitacion['Tiempo medio en RCF (días)'],
+            name='RCF',
+            marker_color='#10B981'
+        ))
+        fig.update_layout(
+            title='Comparativa de tiempos medios de tramitación',
+            xaxis_title='Estado',
+            yaxis_title='Tiempo medio (días)',
+            barmode='group',
+            height=500
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.markdown(download_excel(df_tiempos_tramitacion, "tiempos_tramitacion"), unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-header">Evolución mensual de tiempos de tramitación</h2>', unsafe_allow_html=True)
     
-    df_evolucion_tiempos = pd.DataFrame({
-        "Mes": ["Enero", "Febrero", "Marzo", "Abril"],
-        "Tiempo medio hasta contabilización (días)": [4, 3, 3, 2],
-        "Tiempo medio hasta conformidad (días)": [8, 7, 6, 5],
-        "Tiempo medio hasta pago (días)": [20, 18, 16, 15]
-    })
-    st.dataframe(df_evolucion_tiempos)
+    if df_evolucion_tiempos.empty:
+        st.write("No hay datos disponibles")
+    else:
+        st.dataframe(df_evolucion_tiempos)
     
-    fig2 = go.Figure()
-    fig2.add_trace(go.Scatter(
-        x=df_evolucion_tiempos['Mes'],
-        y=df_evolucion_tiempos['Tiempo medio hasta contabilización (días)'],
-        name='Contabilización',
-        mode='lines+markers',
-        marker_color='#3B82F6'
-    ))
-    fig2.add_trace(go.Scatter(
-        x=df_evolucion_tiempos['Mes'],
-        y=df_evolucion_tiempos['Tiempo medio hasta conformidad (días)'],
-        name='Conformidad',
-        mode='lines+markers',
-        marker_color='#10B981'
-    ))
-    fig2.add_trace(go.Scatter(
-        x=df_evolucion_tiempos['Mes'],
-        y=df_evolucion_tiempos['Tiempo medio hasta pago (días)'],
-        name='Pago',
-        mode='lines+markers',
-        marker_color='#F59E0B'
-    ))
-    fig2.update_layout(
-        title='Evolución mensual de tiempos de tramitación',
-        xaxis_title='Mes',
-        yaxis_title='Tiempo medio (días)',
-        height=500
-    )
-    st.plotly_chart(fig2, use_container_width=True)
-    st.markdown(download_excel(df_evolucion_tiempos, "evolucion_tiempos_tramitacion"), unsafe_allow_html=True)
+        fig2 = go.Figure()
+        fig2.add_trace(go.Scatter(
+            x=df_evolucion_tiempos['Mes'],
+            y=df_evolucion_tiempos['Tiempo medio hasta contabilización (días)'],
+            name='Contabilización',
+            mode='lines+markers',
+            marker_color='#3B82F6'
+        ))
+        fig2.add_trace(go.Scatter(
+            x=df_evolucion_tiempos['Mes'],
+            y=df_evolucion_tiempos['Tiempo medio hasta conformidad (días)'],
+            name='Conformidad',
+            mode='lines+markers',
+            marker_color='#10B981'
+        ))
+        fig2.add_trace(go.Scatter(
+            x=df_evolucion_tiempos['Mes'],
+            y=df_evolucion_tiempos['Tiempo medio hasta pago (días)'],
+            name='Pago',
+            mode='lines+markers',
+            marker_color='#F59E0B'
+        ))
+        fig2.update_layout(
+            title='Evolución mensual de tiempos de tramitación',
+            xaxis_title='Mes',
+            yaxis_title='Tiempo medio (días)',
+            height=500
+        )
+        st.plotly_chart(fig2, use_container_width=True)
+        st.markdown(download_excel(df_evolucion_tiempos, "evolucion_tiempos_tramitacion"), unsafe_allow_html=True)
     
     st.markdown('<h2 class="section-header">Facturas con mayor tiempo de tramitación</h2>', unsafe_allow_html=True)
     
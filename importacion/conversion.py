@@ -0,0 +1,174 @@
+# importacion/conversion.py
+
+import unicodedata
+import numpy as np
+import pandas as pd
+from analisis.importes import a_centimos
+from analisis.nif import normalizar_nifs
+
+# Tipo de cada columna de 'facturas' que se puede importar.
+TIPOS_FACTURAS = {
+    'numero_factura': 'texto',
+    'numero_registro': 'texto',
+    'proveedor_nif': 'nif',
+    'fecha_factura': 'fecha',
+    'fecha_presentacion_registro': 'fecha_hora',
+    'fecha_registro_rcf': 'fecha_hora',
+    'es_electronica': 'booleano',
+    'estado': 'categoria',
+    'plataforma': 'categoria',
+    'total_importe_bruto': 'importe',
+    'total_descuentos': 'importe',
+    'total_cargos': 'importe',
+    'total_importe_bruto_antes_impuestos': 'importe',
+    'total_impuestos_repercutidos': 'importe',
+    'total_impuestos_retenidos': 'importe',
+    'total_factura': 'importe',
+}
+
+# Columnas sin las que una fila no se importa (las de la clave con la que se actualizan las facturas existentes).
+COLUMNAS_OBLIGATORIAS = ('numero_factura', 'proveedor_nif', 'fecha_factura')
+
+# Formatos de fecha que se prueban, en orden, con los valores que no son ISO 8601.
+FORMATOS_FECHA = ('%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d-%m-%Y')
+
+_VERDADEROS = ['true', '1', 'si', 'sí', 's', 'x', 'yes', 'verdadero']
+_FALSOS = ['false', '0', 'no', 'n', 'falso']
+
+def normalizar_cabecera(nombre):
+    """Nombre de columna comparable entre ficheros: sin tildes, en minúsculas y con '_'."""
+    nombre = unicodedata.normalize('NFKD', str(nombre)).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(nombre.strip().lower().replace('-', ' ').replace('.', ' ').split())
+
+
+def _texto(serie):
+    """Texto sin espacios en los extremos (vacío como nulo); los valores que no son texto se conservan."""
+    serie = serie.astype(object)
+    if pd.api.types.infer_dtype(serie, skipna=True) in ('string', 'empty'):
+        serie = serie.str.strip()
+    else:
+        textos = serie.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        serie = serie.copy()
+        serie[textos] = serie[textos].str.strip()
+    return serie.where(serie.notna() & (serie != ''))
+
+
+def _nif(serie, normalizar=True):
+    """NIF en su forma canónica (analisis.nif.normalizar_nifs, como lo compara la prueba de duplicados de V.1)."""
+    serie = _texto(serie)
+    if not normalizar:
+        return serie
+    return pd.Series(normalizar_nifs(serie.to_numpy(dtype=object)), index=serie.index, dtype=object)
+
+
+def _instantes(serie, formatos=FORMATOS_FECHA):
+    """Fechas de una serie de texto: primero ISO 8601 y, para el resto, cada formato de 'formatos'."""
+    instantes = pd.to_datetime(serie, format='ISO8601', errors='coerce')
+    if getattr(instantes.dt, 'tz', None) is not None:
+        instantes = instantes.dt.tz_convert('UTC').dt.tz_localize(None)
+    for formato in formatos:
+        pendientes = instantes.isna() & serie.notna()
+        if not pendientes.any():
+            break
+        instantes[pendientes] = pd.to_datetime(serie[pendientes], format=formato, errors='coerce')
+    return instantes.astype('datetime64[s]')
+
+
+def _fecha(serie, formatos):
+    serie = _texto(serie)
+    instantes = _instantes(serie, formatos)
+    return instantes, serie.notna() & instantes.isna()
+
+
+def _booleano(serie):
+    serie = _texto(serie)
+    serie = serie.where(serie.isna(), serie.astype(str)).str.lower()
+    valores = pd.Series(pd.NA, index=serie.index, dtype='boolean')
+    valores[serie.isin(_VERDADEROS)] = True
+    valores[serie.isin(_FALSOS)] = False
+    return valores, serie.notna() & valores.isna()
+
+
+def _importe(serie):
+    """Importe en céntimos (Int64 con nulos) de una serie de texto o números."""
+    serie = _texto(serie)
+    centimos, validos = a_centimos(serie)
+    valores = pd.Series(pd.arrays.IntegerArray(centimos, ~validos), index=serie.index)
+    return valores, serie.notna() & ~validos
+
+
+def _categoria(serie):
+    """Categoría sin espacios sobrantes (vacía como nulo); se limpian las categorías, no las filas."""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    limpias = pd.Index(serie.cat.categories.astype(str)).str.strip()
+    categorias = limpias[limpias != ''].unique()
+    # El código -1 (nulo) toma el último elemento del mapa, que también es -1.
+    mapa = np.append(categorias.get_indexer(limpias), -1)
+    codigos = mapa[serie.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=categorias), index=serie.index), None
+
+
+def convertir_columnas(bloque, tipos=TIPOS_FACTURAS, formatos_fecha=FORMATOS_FECHA, normalizar_nif=True,
+                       obligatorias=COLUMNAS_OBLIGATORIAS):
+    """
+    Convierte un bloque de filas (con las columnas ya renombradas a las de 'facturas') a
+    columnas tipadas: texto sin espacios sobrantes, NIF normalizados, fechas datetime64,
+    booleanos y categorías con nulos, e importes en céntimos Int64. Los valores que no se
+    pueden convertir quedan nulos.
+
+    Devuelve (tipado, errores, descartadas): el DataFrame tipado (sólo las filas con todas
+    las columnas 'obligatorias'), el número de valores no convertibles por columna y el
+    número de filas descartadas.
+    """
+    tipado = pd.DataFrame(index=bloque.index)
+    errores = {}
+    for columna in bloque.columns:
+        tipo = tipos.get(columna)
+        no_validos = None
+        if tipo in ('fecha', 'fecha_hora'):
+            valores, no_validos = _fecha(bloque[columna], formatos_fecha)
+        elif tipo == 'booleano':
+            valores, no_validos = _booleano(bloque[columna])
+        elif tipo == 'importe':
+            valores, no_validos = _importe(bloque[columna])
+        elif tipo == 'categoria':
+            valores, no_validos = _categoria(bloque[columna])
+        elif tipo == 'nif':
+            valores = _nif(bloque[columna], normalizar_nif)
+        elif tipo == 'texto':
+            valores = _texto(bloque[columna])
+        else:
+            continue
+        tipado[columna] = valores
+        if no_validos is not None and no_validos.any():
+            errores[columna] = int(no_validos.sum())
+
+    completas = np.ones(len(tipado), dtype=bool)
+    for columna in obligatorias:
+        completas &= tipado[columna].notna().to_numpy() if columna in tipado else False
+    return tipado[completas], errores, int((~completas).sum())
+
+
+def filas_facturas(tipado, tipos=TIPOS_FACTURAS):
+    """
+    Filas (diccionarios aptos para JSON) de un bloque tipado con convertir_columnas: fechas
+    en ISO 8601, importes en euros y nulos como None.
+    """
+    columnas = list(tipado.columns)
+    valores = []
+    for columna in columnas:
+        serie = tipado[columna]
+        tipo = tipos.get(columna)
+        if tipo in ('fecha', 'fecha_hora'):
+            textos = np.datetime_as_string(serie.to_numpy(dtype='datetime64[s]'),
+                                           unit='D' if tipo == 'fecha' else 's').astype(object)
+            textos[serie.isna().to_numpy()] = None
+            valores.append(textos.tolist())
+        elif tipo == 'importe':
+            euros = (serie.to_numpy(dtype=np.int64, na_value=0) / 100).astype(object)
+            euros[serie.isna().to_numpy()] = None
+            valores.append(euros.tolist())
+        else:
+            valores.append(serie.astype(object).where(serie.notna(), None).tolist())
+    return [dict(zip(columnas, fila)) for fila in zip(*valores)]
@@ -0,0 +1,180 @@
+# importacion/deduplicacion.py
+
+import numpy as np
+import pandas as pd
+from analisis.papel import claves_duplicidad
+from importacion.conversion import TIPOS_FACTURAS, convertir_columnas
+
+COLUMNAS_CLAVE = ('proveedor_nif', 'numero_factura', 'fecha_factura')
+
+# Clasificación de cada fila importada frente a las ya guardadas.
+NUEVA, ACTUALIZADA, SIN_CAMBIOS = 0, 1, 2
+
+
+def _hash(claves):
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy(dtype=np.uint64)
+
+
+def hash_claves(nifs, numeros, fechas):
+    """Hash de 64 bits de la clave de duplicidad V.1.4 (ver analisis.papel.claves_duplicidad) de cada fila."""
+    return _hash(claves_duplicidad(nifs, numeros, fechas))
+
+
+def claves_no_canonicas(claves, nifs, numeros, canonicas):
+    """
+    NIF y número tal como se escriben de las filas cuya clave no es la canónica
+    (claves_duplicidad 'canonicas'), p. ej. un NIF sin normalizar: {hash de la clave: (nif, número)}.
+    """
+    nifs, numeros = np.asarray(nifs, dtype=object), np.asarray(numeros, dtype=object)
+    distintas = (nifs != canonicas['nif'].to_numpy()) | (numeros != canonicas['num'].to_numpy())
+    return {int(c): (n, m) for c, n, m in zip(claves[distintas].tolist(), nifs[distintas].tolist(),
+                                              numeros[distintas].tolist())}
+
+
+def huellas(tipado, columnas):
+    """
+    Hash de 64 bits del contenido de cada fila de un bloque tipado (convertir_columnas) en
+    las columnas indicadas, sobre una representación canónica: fechas en segundos, importes
+    en céntimos y texto. Las columnas que falten cuentan como nulas.
+    """
+    canonico = {}
+    for columna in columnas:
+        if columna not in tipado:
+            canonico[columna] = np.full(len(tipado), -1, dtype=np.int64)
+            continue
+        serie = tipado[columna]
+        tipo = TIPOS_FACTURAS.get(columna)
+        if tipo in ('fecha', 'fecha_hora'):
+            canonico[columna] = serie.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        elif tipo == 'importe':
+            canonico[columna] = serie.to_numpy(dtype=np.int64, na_value=np.iinfo(np.int64).min)
+        elif tipo == 'booleano':
+            canonico[columna] = serie.astype('Int8').to_numpy(dtype=np.int8, na_value=-1)
+        else:
+            canonico[columna] = serie.astype(object).where(serie.notna(), None).to_numpy(dtype=object)
+    return pd.util.hash_pandas_object(pd.DataFrame(canonico, index=pd.RangeIndex(len(tipado))),
+                                      index=False).to_numpy(dtype=np.uint64)
+
+
+class IndiceClaves:
+    """
+    Índice en memoria de las facturas ya guardadas: el hash de su clave de duplicidad y el
+    de su contenido (el resto de columnas), en dos arrays ordenados por clave (16 bytes por
+    factura). Se carga por rangos de fecha_factura a medida que llegan bloques con fechas no
+    cubiertas, de modo que sólo se leen de la base de datos las facturas del periodo del
+    fichero. De las pocas facturas guardadas con una clave que no es la canónica (NIF o
+    número sin normalizar) se guarda además su NIF y número, para escribir sobre ellas.
+    """
+
+    def __init__(self, repositorio, columnas, tabla='facturas', tamano_pagina=None):
+        self.repositorio = repositorio
+        self.tabla = tabla
+        self.columnas = list(dict.fromkeys((*COLUMNAS_CLAVE, *columnas)))
+        self.contenido = [c for c in self.columnas if c not in COLUMNAS_CLAVE]
+        self.guardadas = {}
+        self.tamano_pagina = tamano_pagina
+        self.claves = np.zeros(0, dtype=np.uint64)
+        self.contenidos = np.zeros(0, dtype=np.uint64)
+        self.desde = self.hasta = None
+        self.leidas = 0
+
+    def _cargar(self, filtros):
+        filas = {c: [] for c in self.columnas}
+        if not self.repositorio.existe_tabla(self.tabla):
+            return
+        for fila in self.repositorio.iterar(self.tabla, ', '.join(['id', *self.columnas]), filtros=filtros,
+                                            tamano_pagina=self.tamano_pagina):
+            for columna, valores in filas.items():
+                valores.append(fila.get(columna))
+        self.leidas += len(filas['fecha_factura'])
+        if not filas['fecha_factura']:
+            return
+        existentes = pd.DataFrame(filas, dtype=object)
+        canonicas = claves_duplicidad(existentes['proveedor_nif'], existentes['numero_factura'],
+                                      existentes['fecha_factura'])
+        claves = _hash(canonicas)
+        tipado, _, _ = convertir_columnas(existentes, normalizar_nif=False)
+        contenidos = np.zeros(len(existentes), dtype=np.uint64)
+        contenidos[existentes.index.get_indexer(tipado.index)] = huellas(tipado, self.contenido)
+        self.agregar(claves, contenidos, claves_no_canonicas(claves, existentes['proveedor_nif'],
+                                                             existentes['numero_factura'], canonicas))
+
+    def cubrir(self, desde, hasta):
+        """Carga las facturas con fecha_factura entre 'desde' y 'hasta' (ISO) que aún no estén en el índice."""
+        if self.desde is None:
+            self._cargar([('gte', 'fecha_factura', desde), ('lte', 'fecha_factura', hasta)])
+            self.desde, self.hasta = desde, hasta
+            return
+        if desde < self.desde:
+            self._cargar([('gte', 'fecha_factura', desde), ('lt', 'fecha_factura', self.desde)])
+            self.desde = desde
+        if hasta > self.hasta:
+            self._cargar([('gt', 'fecha_factura', self.hasta), ('lte', 'fecha_factura', hasta)])
+            self.hasta = hasta
+
+    def agregar(self, claves, contenidos, no_canonicas=None):
+        """Añade (o sustituye) claves con el hash de su contenido (y la clave guardada de las no canónicas)."""
+        self.guardadas.update(no_canonicas or {})
+        claves = np.concatenate([self.claves, claves])
+        contenidos = np.concatenate([self.contenidos, contenidos])
+        orden = np.argsort(claves, kind='stable')
+        claves, contenidos = claves[orden], contenidos[orden]
+        # Con claves repetidas se queda la última añadida.
+        ultima = np.ones(len(claves), dtype=bool)
+        ultima[:-1] = claves[1:] != claves[:-1]
+        self.claves, self.contenidos = claves[ultima], contenidos[ultima]
+
+    def clasificar(self, claves, contenidos):
+        """NUEVA, ACTUALIZADA o SIN_CAMBIOS para cada fila, según su clave y su contenido."""
+        posiciones = np.searchsorted(self.claves, claves)
+        encontrada = posiciones < len(self.claves)
+        encontrada[encontrada] = self.claves[posiciones[encontrada]] == claves[encontrada]
+        clases = np.full(len(claves), NUEVA, dtype=np.int8)
+        iguales = encontrada.copy()
+        iguales[encontrada] = self.contenidos[posiciones[encontrada]] == contenidos[encontrada]
+        clases[encontrada & ~iguales] = ACTUALIZADA
+        clases[iguales] = SIN_CAMBIOS
+        return clases
+
+
+def deduplicar_bloque(indice, tipado, filas):
+    """
+    Clasifica en memoria las filas de un bloque (tipado y ya convertido a diccionarios)
+    frente al índice en nuevas, actualizadas u omitidas: se omiten las que no cambian nada
+    y, si una clave se repite en el bloque, todas menos la última (un upsert no puede tocar
+    dos veces la misma fila).
+
+    Las actualizadas se escriben con el NIF y el número de la factura guardada, de modo que
+    el upsert (que compara los valores guardados, no la clave canónica) la sustituye en
+    lugar de añadir otra. Devuelve (filas a escribir, número de nuevas, de actualizadas y de
+    omitidas). Las filas devueltas se añaden al índice, para que las repeticiones
+    posteriores se reconozcan.
+    """
+    if not filas:
+        return [], 0, 0, 0
+    fechas = [f['fecha_factura'] for f in filas]
+    indice.cubrir(min(fechas), max(fechas))
+    nifs, numeros = [f['proveedor_nif'] for f in filas], [f['numero_factura'] for f in filas]
+    canonicas = claves_duplicidad(nifs, numeros, fechas)
+    claves = _hash(canonicas)
+    contenidos = huellas(tipado, indice.contenido)
+
+    ultima = ~pd.Series(claves).duplicated(keep='last').to_numpy()
+    clases = indice.clasificar(claves, contenidos)
+    escribir = ultima & (clases != SIN_CAMBIOS)
+    actualizadas = escribir & (clases == ACTUALIZADA)
+    salida = []
+    for f, clave, canonica_nif, canonico_num, e, a in zip(
+            filas, claves.tolist(), canonicas['nif'].tolist(), canonicas['num'].tolist(), escribir.tolist(),
+            actualizadas.tolist()):
+        if e and a:
+            nif, numero = indice.guardadas.get(clave, (canonica_nif, canonico_num))
+            f = dict(f, proveedor_nif=nif, numero_factura=numero) if (nif, numero) != (
+                f['proveedor_nif'], f['numero_factura']) else f
+        if e:
+            salida.append(f)
+    nuevas = escribir & (clases == NUEVA)
+    indice.agregar(claves[escribir], contenidos[escribir],
+                   claves_no_canonicas(claves[nuevas], np.asarray(nifs, dtype=object)[nuevas],
+                                       np.asarray(numeros, dtype=object)[nuevas], canonicas[nuevas]))
+    return salida, int(nuevas.sum()), int(actualizadas.sum()), int((~escribir).sum())
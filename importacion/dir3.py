@@ -0,0 +1,50 @@
+# importacion/dir3.py
+
+import time
+import pandas as pd
+from importacion.lectura import leer_bloques, leer_cabeceras
+from importacion.perfiles import PerfilImportacion
+
+# Tipo de cada columna del catálogo DIR3 que se puede importar.
+TIPOS_DIR3 = {
+    'oficina_contable': 'texto',
+    'organo_gestor': 'texto',
+    'unidad_tramitadora': 'texto',
+    'nombre_oficina_contable': 'texto',
+    'nombre_organo_gestor': 'texto',
+    'nombre_unidad_tramitadora': 'texto',
+}
+
+# Cabeceras del fichero de relaciones OC-OG-UT (como el que exporta FACe) para cada columna.
+_COLUMNAS_DIR3 = {
+    'oficina_contable': ['codigo_oc', 'cod_oc', 'oc', 'codigo_oficina_contable'],
+    'organo_gestor': ['codigo_og', 'cod_og', 'og', 'codigo_organo_gestor'],
+    'unidad_tramitadora': ['codigo_ut', 'cod_ut', 'ut', 'codigo_unidad_tramitadora'],
+    'nombre_oficina_contable': ['nombre_oc', 'denominacion_oc', 'oficina_contable_nombre'],
+    'nombre_organo_gestor': ['nombre_og', 'denominacion_og', 'organo_gestor_nombre'],
+    'nombre_unidad_tramitadora': ['nombre_ut', 'denominacion_ut', 'unidad_tramitadora_nombre'],
+}
+
+# Perfil del catálogo: ninguna columna es obligatoria (una fila puede dar de alta sólo
+# algunos códigos); las filas sin ningún código se descartan al publicarlo.
+PERFIL_DIR3 = PerfilImportacion('DIR3', _COLUMNAS_DIR3, tipos=TIPOS_DIR3, obligatorias=())
+
+
+def importar_catalogo_dir3(catalogo, fichero, nombre, tamano_bloque=50000):
+    """
+    Lee un fichero CSV o Excel de relaciones DIR3 (una fila por terna OC-OG-UT, con los
+    nombres opcionalmente) y lo publica como versión nueva de 'catalogo'
+    (datos.dir3.CatalogoDIR3), que sustituye a la anterior. Devuelve el manifiesto de la
+    versión publicada con 'filas_leidas', 'columnas_ignoradas' y 'segundos'. Lanza
+    ValueError si el fichero no se puede leer o no tiene ninguna columna de códigos.
+    """
+    inicio = time.monotonic()
+    lector = PERFIL_DIR3.compilar(leer_cabeceras(fichero, nombre))
+    if not {'oficina_contable', 'organo_gestor', 'unidad_tramitadora'} & set(lector.renombrar.values()):
+        raise ValueError("El fichero no tiene columnas de códigos DIR3 (código OC, OG o UT)")
+    bloques = [lector.convertir(bloque)[0]
+               for bloque in leer_bloques(fichero, nombre, tamano_bloque, columnas=lector.columnas, dtype=lector.dtype)]
+    relaciones = pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame(columns=list(TIPOS_DIR3))
+    manifiesto = catalogo.publicar(relaciones, fuente=nombre)
+    return dict(manifiesto, filas_leidas=len(relaciones), columnas_ignoradas=lector.ignoradas,
+                segundos=round(time.monotonic() - inicio, 3))
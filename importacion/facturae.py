@@ -0,0 +1,416 @@
+# importacion/facturae.py
+#
+# Ingesta masiva de documentos Facturae (3.2, 3.2.1 y 3.2.2) desde carpetas o ficheros
+# ZIP. Cada documento se analiza de forma incremental (iterparse) quitando del árbol cada
+# elemento en cuanto se ha leído, así que la memoria no depende del tamaño del documento;
+# a la vez se calcula su hash y se valida contra el esquema, que se compila una vez por
+# proceso. Los documentos se reparten entre varios procesos y de cada factura se extraen
+# los datos de cabecera y los totales para 'facturas'.
+
+import datetime
+import hashlib
+import os
+import re
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import pandas as pd
+from datos.historico import MES_SIN_FECHA
+from datos.repositorio import lotes
+from importacion.conversion import convertir_columnas, filas_facturas
+from importacion.deduplicacion import IndiceClaves, deduplicar_bloque
+
+EXTENSIONES_FACTURAE = ('.xml', '.xsig')
+
+# Campos de cada factura (ruta dentro de <Invoice>) que se guardan en 'facturas'.
+CAMPOS_FACTURA = {
+    ('InvoiceHeader', 'InvoiceNumber'): 'numero',
+    ('InvoiceHeader', 'InvoiceSeriesCode'): 'serie',
+    ('InvoiceIssueData', 'IssueDate'): 'fecha_factura',
+    ('InvoiceTotals', 'TotalGrossAmount'): 'total_importe_bruto',
+    ('InvoiceTotals', 'TotalGeneralDiscounts'): 'total_descuentos',
+    ('InvoiceTotals', 'TotalGeneralSurcharges'): 'total_cargos',
+    ('InvoiceTotals', 'TotalGrossAmountBeforeTaxes'): 'total_importe_bruto_antes_impuestos',
+    ('InvoiceTotals', 'TotalTaxOutputs'): 'total_impuestos_repercutidos',
+    ('InvoiceTotals', 'TotalTaxesWithheld'): 'total_impuestos_retenidos',
+    ('InvoiceTotals', 'InvoiceTotal'): 'total_factura',
+}
+
+# Campos del documento (ruta desde la raíz) que se guardan en el resumen del documento.
+CAMPOS_DOCUMENTO = {
+    ('FileHeader', 'SchemaVersion'): 'version',
+    ('FileHeader', 'Batch', 'InvoicesCount'): 'numero_facturas_declarado',
+    ('Parties', 'SellerParty', 'TaxIdentification', 'TaxIdentificationNumber'): 'proveedor_nif',
+    ('Parties', 'BuyerParty', 'TaxIdentification', 'TaxIdentificationNumber'): 'destinatario_nif',
+}
+
+# Papel de cada centro administrativo del destinatario (RoleTypeCode) y columna del resumen.
+CENTROS_DIR3 = {'01': 'oficina_contable', '02': 'organo_gestor', '03': 'unidad_tramitadora'}
+
+# Esquema estructural de Facturae: elementos obligatorios, valores admitidos y formatos.
+ESQUEMA_FACTURAE = {
+    'versiones': ('3.2', '3.2.1', '3.2.2'),
+    'obligatorios_documento': [
+        ('FileHeader', 'SchemaVersion'), ('FileHeader', 'Modality'), ('FileHeader', 'InvoiceIssuerType'),
+        ('FileHeader', 'Batch', 'BatchIdentifier'), ('FileHeader', 'Batch', 'InvoicesCount'),
+        ('Parties', 'SellerParty', 'TaxIdentification', 'TaxIdentificationNumber'),
+        ('Parties', 'BuyerParty', 'TaxIdentification', 'TaxIdentificationNumber'),
+    ],
+    'obligatorios_factura': [
+        ('InvoiceHeader', 'InvoiceNumber'), ('InvoiceHeader', 'InvoiceDocumentType'),
+        ('InvoiceHeader', 'InvoiceClass'), ('InvoiceIssueData', 'IssueDate'),
+        ('InvoiceIssueData', 'InvoiceCurrencyCode'), ('InvoiceIssueData', 'TaxCurrencyCode'),
+        ('InvoiceTotals', 'TotalGrossAmount'), ('InvoiceTotals', 'TotalGrossAmountBeforeTaxes'),
+        ('InvoiceTotals', 'TotalTaxOutputs'), ('InvoiceTotals', 'TotalTaxesWithheld'),
+        ('InvoiceTotals', 'InvoiceTotal'), ('InvoiceTotals', 'TotalOutstandingAmount'),
+        ('InvoiceTotals', 'TotalExecutableAmount'),
+    ],
+    'valores': {
+        'Modality': ('I', 'L'),
+        'InvoiceIssuerType': ('EM', 'RE', 'TE'),
+        'InvoiceDocumentType': ('FC', 'FA', 'AF'),
+        'InvoiceClass': ('OO', 'OR', 'OC', 'CO', 'CR', 'CC'),
+    },
+    'formatos': {
+        'IssueDate': r'\d{4}-\d{2}-\d{2}',
+        'InvoicesCount': r'\d+',
+        'TotalGrossAmount': r'-?\d+(\.\d+)?',
+        'TotalGeneralDiscounts': r'-?\d+(\.\d+)?',
+        'TotalGeneralSurcharges': r'-?\d+(\.\d+)?',
+        'TotalGrossAmountBeforeTaxes': r'-?\d+(\.\d+)?',
+        'TotalTaxOutputs': r'-?\d+(\.\d+)?',
+        'TotalTaxesWithheld': r'-?\d+(\.\d+)?',
+        'InvoiceTotal': r'-?\d+(\.\d+)?',
+    },
+}
+
+
+class EsquemaCompilado:
+    """ESQUEMA_FACTURAE preparado para validar: rutas como conjuntos y formatos como expresiones compiladas."""
+
+    def __init__(self, esquema, xsd=None):
+        self.versiones = frozenset(esquema['versiones'])
+        self.obligatorios_documento = frozenset(esquema['obligatorios_documento'])
+        self.obligatorios_factura = frozenset(esquema['obligatorios_factura'])
+        self.valores = {k: frozenset(v) for k, v in esquema['valores'].items()}
+        self.formatos = {k: re.compile(v + r'\Z') for k, v in esquema['formatos'].items()}
+        self.xsd = xsd
+
+    def comprobar(self, etiqueta, texto):
+        """Motivo por el que el texto de un elemento no es válido, o None."""
+        admitidos = self.valores.get(etiqueta)
+        if admitidos is not None and texto not in admitidos:
+            return f"{etiqueta}: valor no admitido '{texto}'"
+        formato = self.formatos.get(etiqueta)
+        if formato is not None and not formato.match(texto):
+            return f"{etiqueta}: formato no válido '{texto}'"
+        return None
+
+
+@lru_cache(maxsize=None)
+def esquema_facturae(ruta_xsd=None):
+    """
+    Esquema compilado (una vez por proceso). Con 'ruta_xsd' y lxml instalado se compila
+    además el XSD oficial de Facturae, con el que lxml valida mientras analiza.
+    """
+    xsd = None
+    if ruta_xsd:
+        try:
+            from lxml import etree
+        except ImportError:
+            etree = None
+        if etree is not None:
+            xsd = etree.XMLSchema(etree.parse(ruta_xsd))
+    return EsquemaCompilado(ESQUEMA_FACTURAE, xsd)
+
+
+def _local(etiqueta):
+    """Nombre de una etiqueta sin espacio de nombres ('{ns}Invoice' -> 'Invoice')."""
+    return etiqueta.rpartition('}')[2] if isinstance(etiqueta, str) else ''
+
+
+class _LecturaConHash:
+    """Fichero que calcula el SHA-256 de lo que se va leyendo."""
+
+    def __init__(self, fichero):
+        self.fichero = fichero
+        self.hash = hashlib.sha256()
+        self.bytes = 0
+
+    def read(self, tamano=-1):
+        datos = self.fichero.read(tamano)
+        self.hash.update(datos)
+        self.bytes += len(datos)
+        return datos
+
+
+def analizar_facturae(fichero, esquema=None):
+    """
+    Analiza un documento Facturae (objeto binario) de forma incremental y lo valida.
+    Devuelve (documento, facturas): un diccionario con el hash SHA-256 del documento, su
+    versión, si es válido y los errores encontrados, si está firmado, los NIF de las
+    partes y los códigos DIR3 del destinatario; y una lista con los datos de cabecera y
+    totales (como texto) de cada factura que contiene.
+    """
+    esquema = esquema or esquema_facturae()
+    lectura = _LecturaConHash(fichero)
+    if esquema.xsd is not None:
+        from lxml import etree
+        eventos = etree.iterparse(lectura, events=('start', 'end'), schema=esquema.xsd)
+    else:
+        eventos = ET.iterparse(lectura, events=('start', 'end'))
+
+    documento = {'version': None, 'formato_valido': False, 'errores': [], 'firmado': False}
+    documento.update({c: None for c in (*CAMPOS_DOCUMENTO.values(), *CENTROS_DIR3.values())})
+    facturas = []
+    ruta, elementos = [], []
+    encontrados = set()
+    factura = centro = None
+    try:
+        for evento, elemento in eventos:
+            etiqueta = _local(elemento.tag)
+            if evento == 'start':
+                ruta.append(etiqueta)
+                elementos.append(elemento)
+                if etiqueta == 'Invoice' and ruta[-2:-1] == ['Invoices']:
+                    factura = {'_encontrados': set()}
+                elif etiqueta == 'AdministrativeCentre':
+                    centro = {}
+                elif etiqueta == 'Signature' and len(ruta) == 2:
+                    documento['firmado'] = True
+                continue
+
+            texto = (elemento.text or '').strip()
+            clave = tuple(ruta[1:])
+            if factura is not None and etiqueta != 'Invoice':
+                relativa = tuple(ruta[ruta.index('Invoice') + 1:])
+                factura['_encontrados'].add(relativa)
+                if relativa in CAMPOS_FACTURA:
+                    factura[CAMPOS_FACTURA[relativa]] = texto
+            else:
+                encontrados.add(clave)
+                if clave in CAMPOS_DOCUMENTO:
+                    documento[CAMPOS_DOCUMENTO[clave]] = texto
+            if texto:
+                error = esquema.comprobar(etiqueta, texto)
+                if error:
+                    documento['errores'].append(error)
+            if centro is not None and etiqueta in ('CentreCode', 'RoleTypeCode'):
+                centro[etiqueta] = texto
+            elif etiqueta == 'AdministrativeCentre' and centro is not None:
+                papel = CENTROS_DIR3.get(centro.get('RoleTypeCode'))
+                if papel and ruta[1:3] == ['Parties', 'BuyerParty']:
+                    documento[papel] = centro.get('CentreCode')
+                centro = None
+            elif etiqueta == 'Invoice' and factura is not None:
+                faltan = esquema.obligatorios_factura - factura.pop('_encontrados')
+                documento['errores'].extend(f"Factura {factura.get('numero')}: falta {'/'.join(r)}"
+                                            for r in sorted(faltan))
+                facturas.append(factura)
+                factura = None
+
+            # El elemento ya se ha leído: se quita del árbol para que la memoria no crezca.
+            ruta.pop()
+            elementos.pop()
+            if elementos:
+                elementos[-1].remove(elemento)
+            else:
+                elemento.clear()
+    except SyntaxError as e:
+        # ET.ParseError y lxml.etree.XMLSyntaxError (también los errores del XSD) derivan de SyntaxError.
+        documento['errores'].append(f"XML no válido: {e}")
+        # El hash es el del documento entero (el mismo que guarda la verificación de firmas).
+        while lectura.read(1 << 16):
+            pass
+
+    documento['version'] = documento['version'] or None
+    if documento['version'] is not None and documento['version'] not in esquema.versiones:
+        documento['errores'].append(f"SchemaVersion: versión no admitida '{documento['version']}'")
+    faltan = esquema.obligatorios_documento - encontrados
+    documento['errores'].extend(f"Falta {'/'.join(r)}" for r in sorted(faltan))
+    declarado = documento['numero_facturas_declarado']
+    if declarado and declarado.isdigit() and int(declarado) != len(facturas):
+        documento['errores'].append(f"InvoicesCount: declara {declarado} facturas y contiene {len(facturas)}")
+    documento['numero_facturas'] = len(facturas)
+    documento['formato_valido'] = not documento['errores']
+    documento['hash_documento'] = lectura.hash.hexdigest()
+    documento['bytes'] = lectura.bytes
+
+    filas = [{
+        'numero_factura': f"{f.get('serie') or ''}{f.get('numero') or ''}" or None,
+        'proveedor_nif': documento['proveedor_nif'],
+        **{c: v for c, v in f.items() if c not in ('numero', 'serie')},
+    } for f in facturas]
+    return documento, filas
+
+
+def origenes_facturae(rutas):
+    """
+    Documentos Facturae de una lista de rutas (ficheros .xml/.xsig, carpetas, que se
+    recorren recursivamente, o ficheros ZIP): pares (ruta, miembro del ZIP o None).
+    """
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for carpeta, _, ficheros in os.walk(ruta):
+                for nombre in sorted(ficheros):
+                    yield from origenes_facturae([os.path.join(carpeta, nombre)])
+        elif zipfile.is_zipfile(ruta):
+            with zipfile.ZipFile(ruta) as comprimido:
+                for miembro in comprimido.namelist():
+                    if miembro.lower().endswith(EXTENSIONES_FACTURAE):
+                        yield ruta, miembro
+        elif ruta.lower().endswith(EXTENSIONES_FACTURAE):
+            yield ruta, None
+
+
+@lru_cache(maxsize=8)
+def _zip(ruta, proceso):
+    """
+    ZIP abierto (uno por proceso y fichero). La clave incluye el pid: un proceso creado con
+    fork hereda la caché del padre, y compartir el descriptor corrompe las lecturas.
+    """
+    return zipfile.ZipFile(ruta)
+
+
+def abrir_origen(origen):
+    """Abre para lectura binaria un documento (ruta, miembro del ZIP o None)."""
+    ruta, miembro = origen
+    return _zip(ruta, os.getpid()).open(miembro) if miembro else open(ruta, 'rb')
+
+
+def procesar_documento(origen, ruta_xsd=None):
+    """Analiza un documento (ruta, miembro) con el esquema del proceso. Se ejecuta en los procesos del pool."""
+    ruta, miembro = origen
+    esquema = esquema_facturae(ruta_xsd)
+    try:
+        with abrir_origen(origen) as fichero:
+            documento, filas = analizar_facturae(fichero, esquema)
+    except OSError as e:
+        documento, filas = {'formato_valido': False, 'errores': [f"No se puede leer: {e}"],
+                            'hash_documento': None, 'numero_facturas': 0}, []
+    documento['nombre'] = miembro or os.path.basename(ruta)
+    documento['origen'] = os.path.basename(ruta) if miembro else None
+    return documento, filas
+
+
+def _procesar(argumentos):
+    return procesar_documento(*argumentos)
+
+
+def en_paralelo(funcion, elementos, procesos=None, inicializador=None, argumentos_inicializador=(),
+                tamano_tarea=16):
+    """
+    Aplica 'funcion' a cada elemento en un pool de 'procesos' procesos (los núcleos
+    disponibles por defecto; con 1, en este mismo proceso, tras llamar al inicializador) y
+    devuelve los resultados en el orden de 'elementos'. Los elementos se envían al pool por
+    tandas, de modo que los resultados pendientes de recoger no crecen con su número.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        if inicializador is not None:
+            inicializador(*argumentos_inicializador)
+        yield from map(funcion, elementos)
+        return
+    with ProcessPoolExecutor(max_workers=procesos, initializer=inicializador,
+                             initargs=argumentos_inicializador) as pool:
+        for tanda in lotes(elementos, procesos * tamano_tarea * 4):
+            yield from pool.map(funcion, tanda, chunksize=tamano_tarea)
+
+
+def _iniciar_proceso(ruta_xsd):
+    # Se compila el esquema al arrancar el proceso, no con el primer documento.
+    esquema_facturae(ruta_xsd)
+
+
+def analizar_en_paralelo(origenes, procesos=None, ruta_xsd=None, tamano_tarea=16):
+    """Analiza los documentos en paralelo (ver en_paralelo) y devuelve (documento, filas) de cada uno."""
+    return en_paralelo(_procesar, ((origen, ruta_xsd) for origen in origenes), procesos,
+                       _iniciar_proceso, (ruta_xsd,), tamano_tarea)
+
+
+def importar_facturae(repositorio, rutas, tabla='facturas', tabla_documentos='documentos_facturae',
+                      on_conflict='proveedor_nif,numero_factura,fecha_factura', plataforma=None,
+                      procesos=None, ruta_xsd=None, tamano_lote=500, deduplicar=True, resumen=None):
+    """
+    Importa los documentos Facturae de 'rutas' (ver origenes_facturae): los analiza en
+    paralelo (analizar_en_paralelo), escribe en 'tabla_documentos' el resumen de cada
+    documento (clave: hash_documento) y en 'tabla' la cabecera y los totales de sus
+    facturas, marcadas como electrónicas, con la conversión y la deduplicación de la
+    importación de ficheros. Las facturas de los documentos no válidos también se
+    importan si tienen número, NIF y fecha; su documento queda con 'formato_valido' False.
+    Con 'resumen' (analisis.resumen.ResumenMensual), al terminar se recalculan los meses de
+    las facturas escritas ('resumen_mensual' en el último progreso).
+
+    Es un generador: tras cada lote devuelve el progreso ('documentos', 'documentos_validos',
+    'documentos_no_validos', 'facturas_leidas', 'facturas_escritas', 'facturas_descartadas',
+    'segundos' y 'documentos_por_segundo'); el último lleva 'completado': True.
+    """
+    inicio = time.monotonic()
+    progreso = {
+        "documentos": 0,
+        "documentos_validos": 0,
+        "documentos_no_validos": 0,
+        "facturas_leidas": 0,
+        "facturas_escritas": 0,
+        "facturas_descartadas": 0,
+        "segundos": 0.0,
+        "documentos_por_segundo": None,
+        "completado": False,
+    }
+    constantes = {'es_electronica': 'true'}
+    if plataforma:
+        constantes['plataforma'] = plataforma
+    columnas = ['numero_factura', 'proveedor_nif',
+                *[c for c in CAMPOS_FACTURA.values() if c not in ('numero', 'serie')], *constantes]
+    indice = IndiceClaves(repositorio, columnas, tabla) if deduplicar else None
+    meses = set()
+
+    def actualizar():
+        progreso["segundos"] = round(time.monotonic() - inicio, 3)
+        if progreso["segundos"]:
+            progreso["documentos_por_segundo"] = round(progreso["documentos"] / progreso["segundos"], 1)
+        return dict(progreso)
+
+    for lote in lotes(analizar_en_paralelo(origenes_facturae(rutas), procesos, ruta_xsd), tamano_lote):
+        documentos = [dict(d, analizado=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'))
+                      for d, _ in lote if d.get('hash_documento')]
+        textos = pd.DataFrame([dict(f, **constantes) for _, filas in lote for f in filas], columns=columnas)
+        tipado, _, descartadas = convertir_columnas(textos.astype(object))
+        filas = filas_facturas(tipado)
+        if indice is not None:
+            filas, _, _, _ = deduplicar_bloque(indice, tipado, filas)
+        progreso["documentos"] += len(lote)
+        progreso["documentos_validos"] += sum(1 for d, _ in lote if d.get('formato_valido'))
+        progreso["documentos_no_validos"] = progreso["documentos"] - progreso["documentos_validos"]
+        progreso["facturas_leidas"] += len(textos)
+        progreso["facturas_descartadas"] += descartadas
+        if filas:
+            meses.update(str(f['fecha_factura'])[:7] if f.get('fecha_factura') else MES_SIN_FECHA for f in filas)
+            progreso["facturas_escritas"] += repositorio.upsert(tabla, filas, on_conflict=on_conflict,
+                                                                tamano_lote=tamano_lote)
+        if documentos:
+            repositorio.upsert(tabla_documentos, documentos, on_conflict='hash_documento', tamano_lote=tamano_lote)
+        yield actualizar()
+
+    progreso["completado"] = True
+    if resumen is not None:
+        progreso["resumen_mensual"] = resumen.actualizar(meses)
+    yield actualizar()
+
+
+if __name__ == '__main__':
+    # Uso: python -m importacion.facturae carpeta_o_zip [...]
+    from config import repositorio, CLAVE_IMPORTACION_FACTURAS, TABLA_DOCUMENTOS_FACTURAE, FACTURAE_XSD, \
+        PROCESOS_FACTURAE
+
+    if len(sys.argv) < 2 or not repositorio:
+        print("Uso: python -m importacion.facturae carpeta_o_zip [...] (requiere conexión con la base de datos)")
+        sys.exit(1)
+    for estado in importar_facturae(repositorio, sys.argv[1:], tabla_documentos=TABLA_DOCUMENTOS_FACTURAE,
+                                    on_conflict=CLAVE_IMPORTACION_FACTURAS, procesos=PROCESOS_FACTURAE,
+                                    ruta_xsd=FACTURAE_XSD):
+        print(f"{estado['documentos']} documentos ({estado['documentos_no_validos']} no válidos), "
+              f"{estado['facturas_escritas']} facturas escritas, {estado['documentos_por_segundo']} documentos/s")
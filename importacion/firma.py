@@ -0,0 +1,598 @@
+# importacion/firma.py
+#
+# Verificación de la firma electrónica XAdES (enveloped, perfil de Facturae) de los
+# documentos Facturae. Es trabajo criptográfico, así que los documentos se reparten entre
+# varios procesos (importacion.facturae.en_paralelo). Cada proceso carga una vez el
+# almacén de confianza local (certificados raíz e intermedios en una carpeta) y guarda las
+# cadenas de certificados ya validadas por huella del certificado firmante: los documentos
+# de un mismo proveedor, firmados con el mismo certificado, no vuelven a validar la cadena.
+# El resultado de cada documento se guarda por su hash, y un documento ya verificado no
+# se vuelve a verificar. No se hace ninguna consulta de red (ni OCSP, ni CRL, ni descarga
+# de certificados): la revocación no se comprueba.
+#
+# Requiere lxml (canonicalización C14N) y cryptography (certificados y firmas).
+
+import base64
+import datetime
+import hashlib
+import os
+import sys
+import time
+from functools import lru_cache
+from datos.repositorio import lotes
+from importacion.facturae import abrir_origen, en_paralelo, origenes_facturae
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    x509 = None
+
+NS_DS = 'http://www.w3.org/2000/09/xmldsig#'
+NS_XADES = ('http://uri.etsi.org/01903/v1.3.2#', 'http://uri.etsi.org/01903/v1.4.1#')
+
+# Algoritmos de resumen (DigestMethod) admitidos: nombre de hashlib.
+RESUMENES = {
+    'http://www.w3.org/2000/09/xmldsig#sha1': 'sha1',
+    'http://www.w3.org/2001/04/xmlenc#sha256': 'sha256',
+    'http://www.w3.org/2001/04/xmldsig-more#sha384': 'sha384',
+    'http://www.w3.org/2001/04/xmlenc#sha512': 'sha512',
+}
+
+# Algoritmos de firma (SignatureMethod) admitidos: (tipo de clave, resumen).
+FIRMAS = {
+    'http://www.w3.org/2000/09/xmldsig#rsa-sha1': ('rsa', 'sha1'),
+    'http://www.w3.org/2001/04/xmldsig-more#rsa-sha256': ('rsa', 'sha256'),
+    'http://www.w3.org/2001/04/xmldsig-more#rsa-sha384': ('rsa', 'sha384'),
+    'http://www.w3.org/2001/04/xmldsig-more#rsa-sha512': ('rsa', 'sha512'),
+    'http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256': ('ec', 'sha256'),
+    'http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha384': ('ec', 'sha384'),
+    'http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha512': ('ec', 'sha512'),
+}
+
+# Canonicalizaciones admitidas: (exclusiva, con comentarios). C14N 1.1 se trata como 1.0,
+# que sólo difiere en el tratamiento de xml:id y xml:base al canonicalizar un fragmento.
+CANONICALIZACIONES = {
+    'http://www.w3.org/TR/2001/REC-xml-c14n-20010315': (False, False),
+    'http://www.w3.org/TR/2001/REC-xml-c14n-20010315#WithComments': (False, True),
+    'http://www.w3.org/2001/10/xml-exc-c14n#': (True, False),
+    'http://www.w3.org/2001/10/xml-exc-c14n#WithComments': (True, True),
+    'http://www.w3.org/2006/12/xml-c14n11': (False, False),
+    'http://www.w3.org/2006/12/xml-c14n11#WithComments': (False, True),
+}
+
+TRANSFORMACION_ENVELOPED = 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'
+
+# Extensiones de los certificados del almacén de confianza (PEM, con uno o varios, o DER).
+EXTENSIONES_CERTIFICADO = ('.pem', '.crt', '.cer', '.der')
+
+# Eslabones máximos de una cadena de certificados.
+MAXIMO_CADENA = 10
+
+
+def requisitos_firma():
+    """Paquetes que faltan para verificar firmas (lista vacía si no falta ninguno)."""
+    return [nombre for nombre, modulo in (('lxml', etree), ('cryptography', x509)) if modulo is None]
+
+
+def _base64(texto):
+    """Bytes de un valor en base64 de la firma (con saltos de línea). Lanza ValueError si no es base64 válido."""
+    return base64.b64decode(''.join((texto or '').split()), validate=True)
+
+
+def _huella(certificado):
+    return certificado.fingerprint(hashes.SHA256()).hex()
+
+
+@lru_cache(maxsize=4096)
+def _certificado(der):
+    """Certificado X.509 a partir de su DER (cada certificado distinto se analiza una vez por proceso)."""
+    return x509.load_der_x509_certificate(der)
+
+
+def _cargar_certificados(contenido):
+    if b'-----BEGIN CERTIFICATE-----' in contenido:
+        return x509.load_pem_x509_certificates(contenido)
+    return [x509.load_der_x509_certificate(contenido)]
+
+
+class AlmacenConfianza:
+    """
+    Certificados de confianza (raíz e intermedios de los prestadores de confianza) leídos de
+    una carpeta local, indexados por el DER de su sujeto. Una cadena es de confianza si
+    llega a cualquiera de ellos.
+    """
+
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self.por_sujeto = {}
+        self.huellas = set()
+        self.errores = []
+        if not ruta:
+            return
+        for carpeta, _, ficheros in os.walk(ruta):
+            for nombre in sorted(ficheros):
+                if not nombre.lower().endswith(EXTENSIONES_CERTIFICADO):
+                    continue
+                try:
+                    with open(os.path.join(carpeta, nombre), 'rb') as fichero:
+                        certificados = _cargar_certificados(fichero.read())
+                except (OSError, ValueError) as e:
+                    self.errores.append(f"{nombre}: {e}")
+                    continue
+                for certificado in certificados:
+                    self.anadir(certificado)
+
+    def anadir(self, certificado):
+        huella = _huella(certificado)
+        if huella not in self.huellas:
+            self.huellas.add(huella)
+            self.por_sujeto.setdefault(certificado.subject.public_bytes(), []).append(certificado)
+
+    def __len__(self):
+        return len(self.huellas)
+
+    def emisores(self, certificado):
+        return self.por_sujeto.get(certificado.issuer.public_bytes(), [])
+
+
+def _emitido_por(certificado, emisor):
+    try:
+        certificado.verify_directly_issued_by(emisor)
+        return True
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+
+
+def _puede_emitir(emisor, intermedios_debajo):
+    """
+    Si 'emisor' es una autoridad de certificación que puede firmar certificados con
+    'intermedios_debajo' autoridades intermedias por debajo: BasicConstraints con ca=True
+    y longitud de ruta suficiente, y KeyUsage (si lo tiene) con keyCertSign.
+    """
+    try:
+        restricciones = emisor.extensions.get_extension_for_class(x509.BasicConstraints).value
+    except x509.ExtensionNotFound:
+        return False
+    if not restricciones.ca:
+        return False
+    if restricciones.path_length is not None and restricciones.path_length < intermedios_debajo:
+        return False
+    try:
+        usos = emisor.extensions.get_extension_for_class(x509.KeyUsage).value
+    except x509.ExtensionNotFound:
+        return True
+    return usos.key_cert_sign
+
+
+def construir_cadena(firmante, intermedios, almacen):
+    """
+    Cadena desde el certificado firmante hasta un certificado del almacén de confianza,
+    usando los intermedios incluidos en la firma. Cada emisor tiene que ser una autoridad
+    de certificación (_puede_emitir). Devuelve (cadena, error): la lista de certificados
+    (del firmante al de confianza) y None, o la cadena parcial y el motivo.
+    """
+    cadena = [firmante]
+    actual = firmante
+    while len(cadena) <= MAXIMO_CADENA:
+        if _huella(actual) in almacen.huellas:
+            return cadena, None
+        # Autoridades intermedias por debajo del emisor: todos los eslabones salvo el firmante.
+        debajo = len(cadena) - 1
+        emisor = next((c for c in almacen.emisores(actual)
+                       if _puede_emitir(c, debajo) and _emitido_por(actual, c)), None)
+        if emisor is not None:
+            cadena.append(emisor)
+            return cadena, None
+        emisor = next((c for c in intermedios if c.subject == actual.issuer and c not in cadena
+                       and _puede_emitir(c, debajo) and _emitido_por(actual, c)), None)
+        if emisor is None:
+            return cadena, f"Certificado no emitido por una autoridad de confianza: {actual.issuer.rfc4514_string()}"
+        cadena.append(emisor)
+        actual = emisor
+    return cadena, "Cadena de certificados demasiado larga"
+
+
+def _hash_cryptography(nombre):
+    return {'sha1': hashes.SHA1, 'sha256': hashes.SHA256, 'sha384': hashes.SHA384, 'sha512': hashes.SHA512}[nombre]()
+
+
+def _canonicalizar(elemento, algoritmo, prefijos=None):
+    exclusiva, comentarios = CANONICALIZACIONES[algoritmo]
+    return etree.tostring(elemento, method='c14n', exclusive=exclusiva, with_comments=comentarios,
+                          inclusive_ns_prefixes=prefijos if exclusiva else None)
+
+
+def _sin_firma(raiz, firma, algoritmo, prefijos):
+    """Canonicalización del documento sin el elemento de firma (transformación enveloped-signature)."""
+    padre = firma.getparent()
+    posicion = padre.index(firma)
+    anterior = firma.getprevious()
+    # lxml mueve el texto que sigue a un elemento junto con él: se deja en su sitio.
+    cola = firma.tail
+    if anterior is not None:
+        texto_anterior = anterior.tail
+        anterior.tail = (anterior.tail or '') + (cola or '')
+    else:
+        texto_anterior = padre.text
+        padre.text = (padre.text or '') + (cola or '')
+    padre.remove(firma)
+    try:
+        return _canonicalizar(raiz, algoritmo, prefijos)
+    finally:
+        padre.insert(posicion, firma)
+        firma.tail = cola
+        if anterior is not None:
+            anterior.tail = texto_anterior
+        else:
+            padre.text = texto_anterior
+
+
+def _comprobar_referencia(referencia, raiz, firma, por_id):
+    """Motivo por el que una ds:Reference no coincide con su contenido, o None."""
+    uri = referencia.get('URI')
+    metodo = referencia.find(f'{{{NS_DS}}}DigestMethod')
+    resumen = RESUMENES.get(metodo.get('Algorithm') if metodo is not None else None)
+    if resumen is None:
+        return f"Referencia '{uri}': algoritmo de resumen no admitido"
+    enveloped = False
+    algoritmo = 'http://www.w3.org/TR/2001/REC-xml-c14n-20010315'
+    prefijos = None
+    for transformacion in referencia.iterfind(f'{{{NS_DS}}}Transforms/{{{NS_DS}}}Transform'):
+        nombre = transformacion.get('Algorithm')
+        if nombre == TRANSFORMACION_ENVELOPED:
+            enveloped = True
+        elif nombre in CANONICALIZACIONES:
+            algoritmo = nombre
+            inclusivos = next(iter(transformacion), None)
+            prefijos = (inclusivos.get('PrefixList') or '').split() if inclusivos is not None else None
+        else:
+            return f"Referencia '{uri}': transformación no admitida ({nombre})"
+    if uri == '':
+        objetivo = raiz
+    elif uri and uri.startswith('#'):
+        objetivo = por_id.get(uri[1:])
+        if objetivo is None:
+            return f"Referencia '{uri}': no se encuentra el elemento"
+    else:
+        return f"Referencia '{uri}': sólo se admiten referencias al propio documento"
+    if enveloped and firma in objetivo.iter(f'{{{NS_DS}}}Signature'):
+        contenido = _sin_firma(objetivo, firma, algoritmo, prefijos)
+    else:
+        contenido = _canonicalizar(objetivo, algoritmo, prefijos)
+    try:
+        valor = _base64(referencia.findtext(f'{{{NS_DS}}}DigestValue'))
+    except ValueError:
+        return f"Referencia '{uri or 'documento'}': DigestValue no es base64 válido"
+    if hashlib.new(resumen, contenido).digest() != valor:
+        return f"Referencia '{uri or 'documento'}': el resumen no coincide (contenido modificado)"
+    return None
+
+
+def _comprobar_cobertura(referencias, raiz, por_id):
+    """
+    Motivo por el que las referencias no cubren lo que firma una XAdES enveloped, o None:
+    el documento entero (URI vacía o Id de la raíz, con la transformación enveloped) y las
+    propiedades firmadas (xades:SignedProperties).
+    """
+    documento = propiedades = False
+    for referencia in referencias:
+        uri = referencia.get('URI')
+        objetivo = raiz if uri == '' else por_id.get(uri[1:]) if uri and uri.startswith('#') else None
+        if objetivo is raiz:
+            documento = documento or any(
+                t.get('Algorithm') == TRANSFORMACION_ENVELOPED
+                for t in referencia.iterfind(f'{{{NS_DS}}}Transforms/{{{NS_DS}}}Transform'))
+        elif objetivo is not None and objetivo.tag in {f'{{{ns}}}SignedProperties' for ns in NS_XADES}:
+            propiedades = True
+    if not documento:
+        return "Ninguna referencia de la firma cubre el documento completo"
+    if not propiedades:
+        return "Ninguna referencia de la firma cubre las propiedades firmadas (xades:SignedProperties)"
+    return None
+
+
+def _verificar_valor(certificado, tipo, resumen, valor, datos):
+    clave = certificado.public_key()
+    algoritmo = _hash_cryptography(resumen)
+    try:
+        if tipo == 'rsa' and isinstance(clave, rsa.RSAPublicKey):
+            clave.verify(valor, datos, padding.PKCS1v15(), algoritmo)
+        elif tipo == 'ec' and isinstance(clave, ec.EllipticCurvePublicKey):
+            # XML-DSig codifica ECDSA como r||s; cryptography espera DER.
+            mitad = len(valor) // 2
+            clave.verify(encode_dss_signature(int.from_bytes(valor[:mitad], 'big'),
+                                              int.from_bytes(valor[mitad:], 'big')), datos, ec.ECDSA(algoritmo))
+        else:
+            return False
+    except InvalidSignature:
+        return False
+    return True
+
+
+def _atributo(nombre, oid):
+    valores = nombre.get_attributes_for_oid(oid)
+    return valores[0].value if valores else None
+
+
+def _nif_certificado(certificado):
+    """NIF del titular o de la entidad del certificado (serialNumber u organizationIdentifier, sin prefijos)."""
+    for oid in (NameOID.ORGANIZATION_IDENTIFIER, NameOID.SERIAL_NUMBER):
+        valor = _atributo(certificado.subject, oid)
+        if valor:
+            for prefijo in ('VATES-', 'IDCES-', 'PASES-', 'NIFES-'):
+                if valor.upper().startswith(prefijo):
+                    return valor[len(prefijo):].upper()
+            return valor.upper()
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _cadena_en_cache(huella, firmante_der, intermedios_der, almacen):
+    """Cadena del certificado firmante (huella SHA-256) con 'almacen', validada una vez por proceso."""
+    return construir_cadena(_certificado(firmante_der), [_certificado(d) for d in intermedios_der], almacen)
+
+
+def _fecha_firma(firma):
+    for ns in NS_XADES:
+        texto = firma.findtext(f'.//{{{ns}}}SigningTime')
+        if texto:
+            try:
+                fecha = datetime.datetime.fromisoformat(texto.strip().replace('Z', '+00:00'))
+            except ValueError:
+                return None
+            return fecha if fecha.tzinfo else fecha.replace(tzinfo=datetime.timezone.utc)
+    return None
+
+
+def _comprobar_certificado_firmante(firma, firmante_der):
+    """Motivo por el que el SigningCertificate de XAdES no corresponde al certificado firmante, o None."""
+    resumenes = []
+    for ns in NS_XADES:
+        for nombre in ('SigningCertificate', 'SigningCertificateV2'):
+            for cert in firma.iterfind(f'.//{{{ns}}}{nombre}/{{{ns}}}Cert/{{{ns}}}CertDigest'):
+                metodo = cert.find(f'{{{NS_DS}}}DigestMethod')
+                resumenes.append((RESUMENES.get(metodo.get('Algorithm') if metodo is not None else None),
+                                  cert.findtext(f'{{{NS_DS}}}DigestValue') or ''))
+    if not resumenes:
+        return "Falta xades:SigningCertificate"
+    for resumen, valor in resumenes:
+        try:
+            if resumen and hashlib.new(resumen, firmante_der).digest() == _base64(valor):
+                return None
+        except ValueError:
+            continue
+    return "xades:SigningCertificate no corresponde al certificado firmante"
+
+
+def verificar_firma(contenido, almacen):
+    """
+    Verifica la firma XAdES de un documento (bytes): que las referencias cubren el documento
+    sin la firma y las propiedades firmadas, los resúmenes de todas ellas, el valor de la
+    firma con el certificado firmante, que el SigningCertificate de XAdES es ese certificado, que la
+    cadena llega al almacén de confianza y que los certificados eran válidos en la fecha de
+    la firma (SigningTime; si falta, la fecha actual).
+
+    Devuelve un diccionario con 'firmado', 'firma_valida', 'errores', 'algoritmo',
+    'firmante', 'firmante_nif', 'emisor_certificado', 'huella_certificado', 'fecha_firma'
+    y 'numero_facturas'.
+    """
+    resultado = {'firmado': False, 'firma_valida': False, 'errores': [], 'algoritmo': None, 'firmante': None,
+                 'firmante_nif': None, 'emisor_certificado': None, 'huella_certificado': None,
+                 'fecha_firma': None, 'numero_facturas': 0}
+    errores = resultado['errores']
+    try:
+        # Sin entidades ni DTD externas: el documento no puede provocar accesos a red o a disco.
+        raiz = etree.fromstring(contenido, etree.XMLParser(resolve_entities=False, no_network=True,
+                                                           huge_tree=True, remove_blank_text=False))
+    except etree.XMLSyntaxError as e:
+        errores.append(f"XML no válido: {e}")
+        return resultado
+    resultado['numero_facturas'] = sum(1 for e in raiz.iter('{*}Invoice'))
+    firma = raiz.find(f'{{{NS_DS}}}Signature')
+    if firma is None:
+        firma = next(raiz.iter(f'{{{NS_DS}}}Signature'), None)
+    if firma is None:
+        errores.append("El documento no está firmado")
+        return resultado
+    resultado['firmado'] = True
+
+    info = firma.find(f'{{{NS_DS}}}SignedInfo')
+    metodo = info.find(f'{{{NS_DS}}}SignatureMethod') if info is not None else None
+    canonicalizacion = info.find(f'{{{NS_DS}}}CanonicalizationMethod') if info is not None else None
+    algoritmo = FIRMAS.get(metodo.get('Algorithm') if metodo is not None else None)
+    c14n = canonicalizacion.get('Algorithm') if canonicalizacion is not None else None
+    if algoritmo is None or c14n not in CANONICALIZACIONES:
+        errores.append("Algoritmo de firma o de canonicalización no admitido")
+        return resultado
+    resultado['algoritmo'] = metodo.get('Algorithm').rpartition('#')[2]
+
+    por_id = {}
+    for elemento in raiz.iter():
+        for atributo in ('Id', 'ID', 'id'):
+            if elemento.get(atributo):
+                por_id.setdefault(elemento.get(atributo), elemento)
+    referencias = info.findall(f'{{{NS_DS}}}Reference')
+    if not referencias:
+        errores.append("La firma no tiene referencias")
+    for referencia in referencias:
+        error = _comprobar_referencia(referencia, raiz, firma, por_id)
+        if error:
+            errores.append(error)
+    error = _comprobar_cobertura(referencias, raiz, por_id)
+    if error:
+        errores.append(error)
+
+    try:
+        ders = [_base64(t) for t in firma.xpath('./ds:KeyInfo/ds:X509Data/ds:X509Certificate/text()',
+                                                namespaces={'ds': NS_DS})]
+        certificados = [_certificado(d) for d in ders]
+    except ValueError as e:
+        errores.append(f"Certificado no válido en KeyInfo: {e}")
+        return resultado
+    if not certificados:
+        errores.append("La firma no incluye el certificado firmante (KeyInfo/X509Certificate)")
+        return resultado
+
+    datos = _canonicalizar(info, c14n)
+    try:
+        valor = _base64(firma.findtext(f'{{{NS_DS}}}SignatureValue'))
+    except ValueError:
+        errores.append("SignatureValue no es base64 válido")
+        return resultado
+    posicion = next((i for i, c in enumerate(certificados)
+                     if _verificar_valor(c, *algoritmo, valor, datos)), None)
+    if posicion is None:
+        errores.append("El valor de la firma no es válido para el certificado incluido")
+        posicion = 0
+    firmante, firmante_der = certificados[posicion], ders[posicion]
+    huella = _huella(firmante)
+    resultado.update({
+        'firmante': _atributo(firmante.subject, NameOID.COMMON_NAME),
+        'firmante_nif': _nif_certificado(firmante),
+        'emisor_certificado': _atributo(firmante.issuer, NameOID.COMMON_NAME) or firmante.issuer.rfc4514_string(),
+        'huella_certificado': huella,
+    })
+    error = _comprobar_certificado_firmante(firma, firmante_der)
+    if error:
+        errores.append(error)
+
+    fecha = _fecha_firma(firma)
+    resultado['fecha_firma'] = fecha.isoformat() if fecha else None
+    intermedios = tuple(d for i, d in enumerate(ders) if i != posicion)
+    cadena, error = _cadena_en_cache(huella, firmante_der, intermedios, almacen)
+    if error:
+        errores.append(error)
+    momento = fecha or datetime.datetime.now(datetime.timezone.utc)
+    for certificado in cadena:
+        if not certificado.not_valid_before_utc <= momento <= certificado.not_valid_after_utc:
+            errores.append(f"Certificado fuera de su periodo de validez en la fecha de la firma: "
+                           f"{certificado.subject.rfc4514_string()}")
+    resultado['firma_valida'] = not errores
+    return resultado
+
+
+# Estado de cada proceso del pool: almacén de confianza y hashes ya verificados.
+_PROCESO = {}
+
+
+def _iniciar_proceso(ruta_confianza, verificados):
+    _PROCESO['almacen'] = AlmacenConfianza(ruta_confianza)
+    _PROCESO['verificados'] = verificados
+
+
+def verificar_origen(origen):
+    """
+    Verifica un documento (ruta, miembro del ZIP o None) en un proceso del pool. Si su hash
+    ya estaba verificado sólo devuelve 'hash_documento' y 'omitido': True.
+    """
+    ruta, miembro = origen
+    nombres = {'nombre': miembro or os.path.basename(ruta), 'origen': os.path.basename(ruta) if miembro else None}
+    try:
+        with abrir_origen(origen) as fichero:
+            contenido = fichero.read()
+    except OSError as e:
+        return dict(nombres, hash_documento=None, firmado=False, firma_valida=False,
+                    errores=[f"No se puede leer: {e}"], numero_facturas=0)
+    hash_documento = hashlib.sha256(contenido).hexdigest()
+    if hash_documento in _PROCESO['verificados']:
+        return dict(nombres, hash_documento=hash_documento, omitido=True)
+    return dict(nombres, hash_documento=hash_documento, **verificar_firma(contenido, _PROCESO['almacen']))
+
+
+def hashes_verificados(repositorio, tabla):
+    """Hashes de los documentos con la firma ya verificada en 'tabla'."""
+    if not repositorio.existe_tabla(tabla):
+        return frozenset()
+    return frozenset(f['hash_documento'] for f in repositorio.iterar(tabla, 'id, hash_documento'))
+
+
+def verificar_firmas(repositorio, rutas, tabla='firmas_facturae', procesos=None, ruta_confianza=None,
+                     tamano_lote=500):
+    """
+    Verifica la firma de los documentos Facturae de 'rutas' (ver
+    importacion.facturae.origenes_facturae) en paralelo y guarda el resultado de cada uno en
+    'tabla' (clave: hash_documento). Los documentos cuyo hash ya está en 'tabla', o que ya
+    se han verificado en esta misma ejecución, se omiten. 'ruta_confianza' es la carpeta
+    con los certificados de confianza. Lanza RuntimeError si faltan lxml o cryptography.
+
+    Es un generador: tras cada lote devuelve el progreso ('documentos', 'documentos_omitidos',
+    'firmas_validas', 'firmas_no_validas', 'sin_firma', 'facturas', 'segundos',
+    'documentos_por_segundo' y 'facturas_por_segundo', de los documentos verificados); el
+    último lleva 'completado': True.
+    """
+    faltan = requisitos_firma()
+    if faltan:
+        raise RuntimeError(f"La verificación de firmas requiere los paquetes: {', '.join(faltan)}")
+    inicio = time.monotonic()
+    progreso = {
+        "documentos": 0,
+        "documentos_omitidos": 0,
+        "firmas_validas": 0,
+        "firmas_no_validas": 0,
+        "sin_firma": 0,
+        "facturas": 0,
+        "segundos": 0.0,
+        "documentos_por_segundo": None,
+        "facturas_por_segundo": None,
+        "completado": False,
+    }
+    verificados = set(hashes_verificados(repositorio, tabla))
+
+    def actualizar():
+        progreso["segundos"] = round(time.monotonic() - inicio, 3)
+        if progreso["segundos"]:
+            verificados_ahora = progreso["documentos"] - progreso["documentos_omitidos"]
+            progreso["documentos_por_segundo"] = round(verificados_ahora / progreso["segundos"], 1)
+            progreso["facturas_por_segundo"] = round(progreso["facturas"] / progreso["segundos"], 1)
+        return dict(progreso)
+
+    resultados = en_paralelo(verificar_origen, origenes_facturae(rutas), procesos,
+                             _iniciar_proceso, (ruta_confianza, frozenset(verificados)))
+    for lote in lotes(resultados, tamano_lote):
+        filas = []
+        for r in lote:
+            progreso["documentos"] += 1
+            if r.get('omitido') or r['hash_documento'] in verificados:
+                progreso["documentos_omitidos"] += 1
+                continue
+            if r['hash_documento'] is not None:
+                verificados.add(r['hash_documento'])
+                filas.append(dict(r, verificado=datetime.datetime.now(datetime.timezone.utc).isoformat(
+                    timespec='seconds')))
+            progreso["facturas"] += r['numero_facturas']
+            if not r['firmado']:
+                progreso["sin_firma"] += 1
+            elif r['firma_valida']:
+                progreso["firmas_validas"] += 1
+            else:
+                progreso["firmas_no_validas"] += 1
+        if filas:
+            repositorio.upsert(tabla, filas, on_conflict='hash_documento', tamano_lote=tamano_lote)
+        yield actualizar()
+
+    progreso["completado"] = True
+    yield actualizar()
+
+
+if __name__ == '__main__':
+    # Uso: python -m importacion.firma carpeta_o_zip [...]
+    from config import repositorio, TABLA_FIRMAS_FACTURAE, FIRMA_ALMACEN_CONFIANZA, PROCESOS_FACTURAE
+
+    if len(sys.argv) < 2 or not repositorio:
+        print("Uso: python -m importacion.firma carpeta_o_zip [...] (requiere conexión con la base de datos)")
+        sys.exit(1)
+    for estado in verificar_firmas(repositorio, sys.argv[1:], tabla=TABLA_FIRMAS_FACTURAE,
+                                   procesos=PROCESOS_FACTURAE, ruta_confianza=FIRMA_ALMACEN_CONFIANZA):
+        print(f"{estado['documentos']} documentos ({estado['documentos_omitidos']} ya verificados), "
+              f"{estado['firmas_validas']} firmas válidas, {estado['firmas_no_validas']} no válidas, "
+              f"{estado['sin_firma']} sin firma, {estado['facturas_por_segundo']} facturas/s")
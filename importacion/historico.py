@@ -0,0 +1,103 @@
+# importacion/historico.py
+
+import time
+from functools import lru_cache
+from importacion.lectura import leer_bloques, leer_cabeceras
+from importacion.perfiles import PerfilImportacion
+from importacion.pipeline import _tamano
+
+# Tipo de cada columna del histórico de estados que se puede importar.
+TIPOS_HISTORICO = {
+    'id': 'texto',
+    'factura_id': 'texto',
+    'estado': 'categoria',
+    'fecha_estado': 'fecha_hora',
+    'plataforma': 'categoria',
+}
+
+# Un evento sin factura o sin estado no se importa.
+COLUMNAS_OBLIGATORIAS_HISTORICO = ('factura_id', 'estado')
+
+_COLUMNAS_HISTORICO = {
+    'id': ['id_evento'],
+    'factura_id': ['id_factura', 'factura'],
+    'estado': ['estado_factura', 'codigo_estado'],
+    'fecha_estado': ['fecha', 'fecha_cambio', 'fecha_cambio_estado', 'fecha_evento'],
+    'plataforma': ['origen'],
+}
+
+
+@lru_cache(maxsize=16)
+def perfil_historico(plataforma=None):
+    """
+    Perfil de importación del histórico de estados. Con 'plataforma', todos los eventos
+    se asignan a ella (si el fichero tiene columna de plataforma, se ignora).
+    """
+    return PerfilImportacion(
+        f"Histórico {plataforma}" if plataforma else "Histórico", _COLUMNAS_HISTORICO,
+        formatos_fecha=('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y'),
+        constantes={'plataforma': plataforma} if plataforma else None,
+        tipos=TIPOS_HISTORICO, obligatorias=COLUMNAS_OBLIGATORIAS_HISTORICO,
+    )
+
+
+def importar_historico(almacen, fichero, nombre, plataforma=None, tamano_bloque=10000):
+    """
+    Importa un fichero CSV o Excel del histórico de estados al almacén del histórico
+    (datos.historico.AlmacenHistorico) por bloques de 'tamano_bloque' filas: cada bloque se
+    convierte con perfil_historico(plataforma) (los estados, en mayúsculas) y se añade al
+    almacén, que omite los eventos que ya tiene: volver a importar un fichero, o reintentar
+    una importación interrumpida, no duplica eventos. Al terminar se compactan los meses
+    que han recibido eventos.
+
+    Es un generador: tras cada bloque devuelve un diccionario con el progreso
+    ('filas_leidas', 'eventos_anadidos', 'eventos_repetidos', 'filas_descartadas',
+    'valores_no_validos' por columna, 'segmentos' escritos, 'segundos', 'bytes_leidos' y
+    'bytes_totales'); el último lleva además 'completado': True, 'columnas_ignoradas' y, en
+    'segmentos', los del almacén tras compactarlo. Los errores de lectura se lanzan como
+    ValueError.
+    """
+    inicio = time.monotonic()
+    perfil = perfil_historico(plataforma)
+    progreso = {
+        "fichero": nombre,
+        "perfil": perfil.nombre,
+        "filas_leidas": 0,
+        "eventos_anadidos": 0,
+        "eventos_repetidos": 0,
+        "filas_descartadas": 0,
+        "valores_no_validos": {},
+        "segmentos": 0,
+        "segundos": 0.0,
+        "bytes_leidos": None,
+        "bytes_totales": _tamano(fichero),
+        "completado": False,
+    }
+    lector = perfil.compilar(leer_cabeceras(fichero, nombre))
+    meses = set()
+    for bloque in leer_bloques(fichero, nombre, tamano_bloque, columnas=lector.columnas, dtype=lector.dtype):
+        tipado, errores, descartadas = lector.convertir(bloque)
+        if 'estado' in tipado:
+            tipado['estado'] = tipado['estado'].astype(object).str.upper()
+        anadidos = almacen.anadir(tipado)
+        meses.update(anadidos["meses"])
+        progreso["filas_leidas"] += len(bloque)
+        progreso["eventos_anadidos"] += anadidos["eventos"]
+        progreso["eventos_repetidos"] += anadidos["repetidos"]
+        progreso["segmentos"] += anadidos["segmentos"]
+        progreso["filas_descartadas"] += descartadas + anadidos["descartados"]
+        for columna, total in errores.items():
+            progreso["valores_no_validos"][columna] = progreso["valores_no_validos"].get(columna, 0) + total
+        if progreso["bytes_totales"] is not None:
+            progreso["bytes_leidos"] = min(fichero.tell(), progreso["bytes_totales"])
+        progreso["segundos"] = round(time.monotonic() - inicio, 3)
+        yield dict(progreso, valores_no_validos=dict(progreso["valores_no_validos"]))
+
+    # Cada bloque deja un segmento por mes: al terminar se unen los de los meses importados.
+    almacen.compactar(meses)
+    progreso["segmentos"] = almacen.resumen()["segmentos"]
+    progreso["completado"] = True
+    progreso["bytes_leidos"] = progreso["bytes_totales"]
+    progreso["columnas_ignoradas"] = lector.ignoradas
+    progreso["segundos"] = round(time.monotonic() - inicio, 3)
+    yield progreso
@@ -0,0 +1,165 @@
+# importacion/lectura.py
+
+import datetime
+import io
+import pandas as pd
+from importacion.xlsx import LibroXlsx
+
+# Separadores que se prueban en la cabecera de un CSV, por orden de preferencia.
+SEPARADORES_CSV = (';', ',', '\t', '|')
+
+EXTENSIONES_ADMITIDAS = ('.csv', '.xlsx')
+
+
+def detectar_separador(fichero, encoding='utf-8-sig'):
+    """
+    Separador del CSV según la primera línea: el de SEPARADORES_CSV que más aparece.
+    Lee solo la cabecera y deja el fichero en la posición en que estaba.
+    """
+    posicion = fichero.tell()
+    cabecera = fichero.readline()
+    fichero.seek(posicion)
+    if isinstance(cabecera, bytes):
+        cabecera = cabecera.decode(encoding, errors='replace')
+    return max(SEPARADORES_CSV, key=cabecera.count)
+
+
+def leer_bloques_csv(fichero, tamano_bloque, separador=None, encoding='utf-8-sig', columnas=None, dtype=None):
+    """
+    Recorre un CSV en DataFrames de como mucho 'tamano_bloque' filas. Sin 'dtype' todas las
+    columnas se leen como texto (la conversión de tipos se hace después, por columna);
+    'columnas' limita la lectura a esas columnas de la cabecera.
+    """
+    separador = separador or detectar_separador(fichero, encoding)
+    lector = pd.read_csv(fichero, sep=separador, dtype=dtype or str, encoding=encoding, usecols=columnas,
+                         chunksize=tamano_bloque, skipinitialspace=True)
+    with lector:
+        yield from lector
+
+
+def _filas_calamine(fichero):
+    """Filas de la primera hoja con python-calamine (lector en Rust), si está instalado."""
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        return None
+    hoja = CalamineWorkbook.from_filelike(fichero).get_sheet_by_index(0)
+    if not hasattr(hoja, 'iter_rows'):
+        return None
+    return hoja.iter_rows()
+
+
+def _filas_xlsx(fichero):
+    """Filas de la primera hoja con el lector en streaming de importacion.xlsx."""
+    libro = LibroXlsx(fichero)
+    try:
+        yield from libro.filas(0)
+    finally:
+        libro.close()
+
+
+def _texto_celda(valor):
+    """Valor de una celda como texto, igual que se leería de un CSV."""
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, (datetime.datetime, datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def filas_excel(fichero):
+    """
+    Recorre las filas de la primera hoja de un .xlsx sin construir el libro en memoria:
+    con python-calamine si está instalado y, si no, con el lector de importacion.xlsx.
+    """
+    if hasattr(fichero, 'seek'):
+        fichero.seek(0)
+    filas = _filas_calamine(fichero)
+    return filas if filas is not None else _filas_xlsx(fichero)
+
+
+def _cabecera_excel(fila):
+    return [_texto_celda(c) or f"columna_{i + 1}" for i, c in enumerate(fila)]
+
+
+def leer_bloques_excel(fichero, tamano_bloque, columnas=None, dtype=None):
+    """
+    Recorre la primera hoja de un Excel en DataFrames de como mucho 'tamano_bloque' filas,
+    con las columnas como texto salvo las que indique 'dtype' ({columna: dtype}). Las filas
+    se leen en streaming, de modo que la memoria usada depende del tamaño del bloque y no
+    del del libro; 'columnas' limita las celdas que se conservan a esas columnas.
+    """
+    filas = iter(filas_excel(fichero))
+    primera = next(filas, None)
+    if primera is None:
+        return
+    cabecera = _cabecera_excel(primera)
+    if columnas is None:
+        columnas = cabecera
+    posiciones = [cabecera.index(c) for c in columnas]
+    tipos = {c: t for c, t in (dtype or {}).items() if t is not str}
+
+    def marco(bloque):
+        df = pd.DataFrame(bloque, columns=columnas, dtype=object)
+        return df.astype(tipos) if tipos else df
+
+    bloque = []
+    for fila in filas:
+        if not any(c is not None and c != '' for c in fila):
+            continue
+        bloque.append([_texto_celda(fila[i]) if i < len(fila) else None for i in posiciones])
+        if len(bloque) >= tamano_bloque:
+            yield marco(bloque)
+            bloque = []
+    if bloque:
+        yield marco(bloque)
+
+
+def leer_cabeceras(fichero, nombre, encoding='utf-8-sig'):
+    """Nombres de las columnas de un CSV o Excel (su primera fila). Deja el fichero al principio."""
+    extension = extension_admitida(nombre)
+    fichero.seek(0)
+    try:
+        if extension == '.csv':
+            return list(pd.read_csv(fichero, sep=detectar_separador(fichero, encoding), nrows=0,
+                                    encoding=encoding, skipinitialspace=True).columns)
+        return _cabecera_excel(next(iter(filas_excel(fichero)), ()))
+    finally:
+        fichero.seek(0)
+
+
+def vista_previa(fichero, nombre, filas=5):
+    """Primeras 'filas' filas de un CSV o Excel como DataFrame, sin leer el resto del fichero."""
+    extension = extension_admitida(nombre)
+    posicion = fichero.tell()
+    try:
+        if extension == '.csv':
+            return next(leer_bloques_csv(fichero, filas), pd.DataFrame())
+        return next(leer_bloques_excel(fichero, filas), pd.DataFrame())
+    finally:
+        fichero.seek(posicion)
+
+
+def extension_admitida(nombre):
+    """Extensión del fichero ('.csv' o '.xlsx'). Lanza ValueError si no está admitida."""
+    extension = '.' + nombre.rsplit('.', 1)[-1].lower() if '.' in nombre else ''
+    if extension not in EXTENSIONES_ADMITIDAS:
+        raise ValueError(f"Formato de fichero no admitido: {nombre} (se admiten {', '.join(EXTENSIONES_ADMITIDAS)})")
+    return extension
+
+
+def leer_bloques(fichero, nombre, tamano_bloque, columnas=None, dtype=None):
+    """
+    Bloques de filas (DataFrames) de un fichero CSV o Excel según su extensión, con las
+    columnas de 'columnas' (todas si es None) y los tipos de 'dtype' (texto si es None).
+    'fichero' es un objeto binario con seek() (un fichero subido o abierto en 'rb').
+    Lanza ValueError si la extensión no está admitida.
+    """
+    extension = extension_admitida(nombre)
+    if not hasattr(fichero, 'seek'):
+        fichero = io.BytesIO(fichero.read())
+    if extension == '.csv':
+        return leer_bloques_csv(fichero, tamano_bloque, columnas=columnas, dtype=dtype)
+    return leer_bloques_excel(fichero, tamano_bloque, columnas=columnas, dtype=dtype)
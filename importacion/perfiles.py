@@ -0,0 +1,138 @@
+# importacion/perfiles.py
+
+from functools import lru_cache
+from importacion.conversion import (TIPOS_FACTURAS, COLUMNAS_OBLIGATORIAS, FORMATOS_FECHA, normalizar_cabecera,
+                                    convertir_columnas, filas_facturas)
+
+
+class PerfilImportacion:
+    """
+    Correspondencia entre las columnas del fichero exportado por una plataforma y las de
+    'facturas'. 'columnas' asocia cada columna de 'facturas' con los nombres con que puede
+    aparecer en la cabecera del fichero (se comparan normalizados con normalizar_cabecera);
+    el tipo de cada columna es el de 'tipos' (TIPOS_FACTURAS por defecto) y las filas sin
+    alguna de las columnas 'obligatorias' se descartan. 'constantes' son valores que se
+    asignan a todas las filas (p. ej. la plataforma).
+    """
+
+    def __init__(self, nombre, columnas, formatos_fecha=FORMATOS_FECHA, normalizar_nif=True, constantes=None,
+                 tipos=TIPOS_FACTURAS, obligatorias=COLUMNAS_OBLIGATORIAS):
+        self.nombre = nombre
+        self.formatos_fecha = tuple(formatos_fecha)
+        self.normalizar_nif = normalizar_nif
+        self.constantes = dict(constantes or {})
+        self.tipos = tipos
+        self.obligatorias = tuple(obligatorias)
+        self.origen = {}
+        for destino, cabeceras in columnas.items():
+            if destino not in tipos:
+                raise ValueError(f"Columna de destino desconocida en el perfil {nombre}: {destino}")
+            for cabecera in (destino, *cabeceras):
+                self.origen.setdefault(normalizar_cabecera(cabecera), destino)
+
+    def compilar(self, cabeceras):
+        """Lector tipado para un fichero con estas cabeceras (se compila una vez por cabecera)."""
+        return _compilar(self, tuple(cabeceras))
+
+
+class LectorTipado:
+    """
+    Perfil aplicado a unas cabeceras concretas: qué columnas del fichero se leen, con qué
+    dtype ('category' para las categorías y texto para el resto, que se convierte después
+    con el formato del perfil) y con qué nombre de 'facturas'.
+    """
+
+    def __init__(self, perfil, cabeceras):
+        self.perfil = perfil
+        self.renombrar = {}
+        for cabecera in cabeceras:
+            destino = perfil.origen.get(normalizar_cabecera(cabecera))
+            if destino is not None and destino not in self.renombrar.values() and destino not in perfil.constantes:
+                self.renombrar[cabecera] = destino
+        self.columnas = list(self.renombrar)
+        self.dtype = {c: 'category' if perfil.tipos[d] == 'categoria' else str for c, d in self.renombrar.items()}
+        self.ignoradas = [c for c in cabeceras if c not in self.renombrar]
+
+    def convertir(self, bloque):
+        """
+        Convierte un bloque leído del fichero a columnas tipadas del destino y añade las
+        constantes del perfil. Devuelve (tipado, errores, descartadas) como convertir_columnas.
+        """
+        bloque = bloque[[c for c in self.columnas if c in bloque.columns]].rename(columns=self.renombrar)
+        tipado, errores, descartadas = convertir_columnas(
+            bloque, tipos=self.perfil.tipos, formatos_fecha=self.perfil.formatos_fecha,
+            normalizar_nif=self.perfil.normalizar_nif, obligatorias=self.perfil.obligatorias)
+        for columna, valor in self.perfil.constantes.items():
+            tipado[columna] = valor
+            if self.perfil.tipos[columna] == 'categoria':
+                tipado[columna] = tipado[columna].astype('category')
+        return tipado, errores, descartadas
+
+    def filas(self, bloque):
+        """Como convertir(), pero con las filas ya como diccionarios listos para escribir."""
+        tipado, errores, descartadas = self.convertir(bloque)
+        return filas_facturas(tipado, self.perfil.tipos), errores, descartadas
+
+
+@lru_cache(maxsize=64)
+def _compilar(perfil, cabeceras):
+    return LectorTipado(perfil, cabeceras)
+
+
+# Columnas comunes a todos los perfiles: los nombres de 'facturas' y los más habituales.
+_COLUMNAS_COMUNES = {
+    **{columna: [] for columna in TIPOS_FACTURAS},
+    'numero_factura': ['numero', 'num_factura', 'n_factura', 'numero_de_factura'],
+    'proveedor_nif': ['nif_proveedor', 'nif_emisor', 'cif_emisor', 'nif'],
+    'fecha_factura': ['fecha_emision', 'fecha_expedicion', 'fecha_de_expedicion'],
+    'total_factura': ['importe', 'importe_total'],
+    'estado': ['estado_factura'],
+}
+
+
+def _columnas(**especificas):
+    columnas = {destino: list(cabeceras) for destino, cabeceras in _COLUMNAS_COMUNES.items()}
+    for destino, cabeceras in especificas.items():
+        columnas[destino] = list(cabeceras) + columnas.get(destino, [])
+    return columnas
+
+
+# Perfiles de las plataformas del selector de importación. Las plataformas de facturación
+# electrónica marcan todas sus facturas como electrónicas.
+PERFILES = {
+    'FACe': PerfilImportacion('FACe', _columnas(
+        numero_factura=['numero_factura', 'factura'],
+        numero_registro=['n_registro', 'no_registro', 'numero_de_registro', 'registro'],
+        fecha_factura=['fecha_expedicion'],
+        fecha_presentacion_registro=['fecha_registro', 'fecha_de_registro', 'fecha_presentacion'],
+        estado=['estado'],
+    ), formatos_fecha=('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y'),
+        constantes={'es_electronica': True, 'plataforma': 'FACe'}),
+    'AOC': PerfilImportacion('AOC', _columnas(
+        numero_factura=['num_factura', 'numero_de_la_factura'],
+        proveedor_nif=['nif_emissor', 'nif_proveidor'],
+        fecha_factura=['data_emissio', 'data_factura'],
+        fecha_presentacion_registro=['data_registre', 'data_de_registre', 'data_presentacio'],
+        total_factura=['import', 'import_total'],
+        estado=['estat'],
+    ), formatos_fecha=('%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M'),
+        constantes={'es_electronica': True, 'plataforma': 'AOC'}),
+    'Biskaiticc': PerfilImportacion('Biskaiticc', _columnas(
+        numero_factura=['num_factura', 'numero_factura_proveedor'],
+        fecha_factura=['fecha_factura'],
+        fecha_presentacion_registro=['fecha_entrada', 'fecha_de_entrada'],
+        total_factura=['importe_total_factura'],
+    ), formatos_fecha=('%d/%m/%Y', '%Y/%m/%d', '%d/%m/%Y %H:%M:%S'),
+        constantes={'es_electronica': True, 'plataforma': 'Biskaiticc'}),
+    'Otra': PerfilImportacion('Otra', _columnas()),
+}
+
+
+def obtener_perfil(plataforma):
+    """Perfil de importación de la plataforma ('Otra' si no se indica). Lanza ValueError si no existe."""
+    if not plataforma:
+        return PERFILES['Otra']
+    for nombre, perfil in PERFILES.items():
+        if nombre.lower() == str(plataforma).strip().lower():
+            return perfil
+    raise ValueError(f"Plataforma sin perfil de importación: {plataforma} (disponibles: {', '.join(PERFILES)})")
@@ -0,0 +1,159 @@
+# importacion/pipeline.py
+
+import os
+import time
+from datos.historico import MES_SIN_FECHA
+from datos.repositorio import lotes
+from importacion.lectura import leer_bloques, leer_cabeceras
+from importacion.conversion import filas_facturas
+from importacion.perfiles import obtener_perfil
+from importacion.deduplicacion import IndiceClaves, deduplicar_bloque
+from importacion.puntos_control import hash_fichero
+
+# Contadores del progreso que se guardan en los puntos de control para continuarlos al reanudar.
+CONTADORES = ('filas_leidas', 'filas_escritas', 'filas_nuevas', 'filas_actualizadas', 'filas_omitidas',
+              'filas_descartadas', 'valores_no_validos', 'lotes')
+
+
+def _tamano(fichero):
+    """Tamaño en bytes de un fichero con seek(), o None si no se puede saber."""
+    try:
+        posicion = fichero.tell()
+        tamano = fichero.seek(0, os.SEEK_END)
+        fichero.seek(posicion)
+        return tamano
+    except (AttributeError, OSError):
+        return None
+
+
+def importar_facturas(repositorio, fichero, nombre, perfil=None, tabla='facturas',
+                      on_conflict='proveedor_nif,numero_factura,fecha_factura',
+                      tamano_bloque=10000, tamano_lote=500, deduplicar=True, puntos_control=None, resumen=None):
+    """
+    Importa un fichero CSV o Excel de facturas a 'tabla' por bloques de 'tamano_bloque'
+    filas, que se escriben con upsert en lotes de 'tamano_lote'. Con 'deduplicar' sólo se
+    escriben las facturas nuevas o que cambian (importacion.deduplicacion); con
+    'puntos_control' (importacion.puntos_control.PuntosControl) una importación
+    interrumpida del mismo fichero se reanuda desde el último lote confirmado; con
+    'resumen' (analisis.resumen.ResumenMensual) al terminar se recalculan los meses escritos.
+
+    Es un generador: tras cada lote escrito devuelve el progreso (los CONTADORES,
+    'segundos', 'bytes_leidos', 'bytes_totales', 'hash_fichero', 'reanudada_desde_fila' y
+    'puntos_control'); el último lleva además 'completado': True, 'columnas_ignoradas' y,
+    con 'resumen', 'resumen_mensual'. Los errores de lectura se lanzan como ValueError y
+    los de la base de datos como ErrorConsulta.
+    """
+    inicio = time.monotonic()
+    perfil = perfil or obtener_perfil(None)
+    progreso = {
+        "fichero": nombre,
+        "perfil": perfil.nombre,
+        "filas_leidas": 0,
+        "filas_escritas": 0,
+        "filas_nuevas": None,
+        "filas_actualizadas": None,
+        "filas_omitidas": 0,
+        "filas_descartadas": 0,
+        "valores_no_validos": {},
+        "lotes": 0,
+        "segundos": 0.0,
+        "bytes_leidos": None,
+        "bytes_totales": _tamano(fichero),
+        "hash_fichero": None,
+        "reanudada_desde_fila": None,
+        "puntos_control": False,
+        "completado": False,
+    }
+    if deduplicar:
+        progreso["filas_nuevas"] = progreso["filas_actualizadas"] = 0
+
+    meses = set()
+    punto = None
+    if puntos_control is not None and progreso["bytes_totales"] is not None:
+        progreso["hash_fichero"] = hash_fichero(fichero)
+        punto = puntos_control.cargar(progreso["hash_fichero"], perfil.nombre, tabla)
+        progreso["puntos_control"] = puntos_control.disponible
+    fila_reanudacion, lotes_saltados = 0, 0
+    if punto is not None:
+        tamano_bloque, tamano_lote = punto["tamano_bloque"], punto["tamano_lote"]
+        progreso.update({c: v for c, v in (punto.get("progreso") or {}).items() if c in CONTADORES})
+        meses.update((punto.get("progreso") or {}).get("meses") or ())
+        fila_reanudacion = progreso["reanudada_desde_fila"] = punto["fila_bloque"]
+        lotes_saltados = 0 if deduplicar else punto["lotes_bloque"]
+
+    def guardar_punto(fila_bloque, lotes_bloque, contadores, completado=False):
+        if not progreso["puntos_control"]:
+            return
+        progreso["puntos_control"] = puntos_control.guardar({
+            "hash_fichero": progreso["hash_fichero"],
+            "perfil": perfil.nombre,
+            "tabla": tabla,
+            "nombre_fichero": nombre,
+            "tamano_bloque": tamano_bloque,
+            "tamano_lote": tamano_lote,
+            "fila_bloque": fila_bloque,
+            "lotes_bloque": lotes_bloque,
+            "lote": progreso["lotes"],
+            "bytes_leidos": progreso["bytes_leidos"],
+            "progreso": contadores,
+            "completado": completado,
+        })
+
+    def contadores():
+        return {**{c: dict(progreso[c]) if c == "valores_no_validos" else progreso[c] for c in CONTADORES},
+                "meses": sorted(meses)}
+
+    lector = perfil.compilar(leer_cabeceras(fichero, nombre))
+    indice = None
+    if deduplicar:
+        indice = IndiceClaves(repositorio, [*lector.renombrar.values(), *perfil.constantes], tabla)
+    fila_bloque = 0
+    for bloque in leer_bloques(fichero, nombre, tamano_bloque, columnas=lector.columnas, dtype=lector.dtype):
+        if fila_bloque < fila_reanudacion:
+            # Bloque ya importado antes de la interrupción: sus contadores vienen del punto de control.
+            fila_bloque += len(bloque)
+            continue
+        al_empezar = contadores()
+        tipado, errores, descartadas = lector.convertir(bloque)
+        filas = filas_facturas(tipado)
+        if indice is not None:
+            filas, nuevas, actualizadas, omitidas = deduplicar_bloque(indice, tipado, filas)
+            progreso["filas_nuevas"] += nuevas
+            progreso["filas_actualizadas"] += actualizadas
+            progreso["filas_omitidas"] += omitidas
+        progreso["filas_leidas"] += len(bloque)
+        if progreso["bytes_totales"] is not None:
+            progreso["bytes_leidos"] = min(fichero.tell(), progreso["bytes_totales"])
+        progreso["filas_descartadas"] += descartadas
+        for columna, total in errores.items():
+            progreso["valores_no_validos"][columna] = progreso["valores_no_validos"].get(columna, 0) + total
+
+        # Se informa (y se guarda el punto de control) tras cada lote escrito, o tras el
+        # bloque si no había nada que escribir.
+        lotes_bloque = list(lotes(filas, tamano_lote)) or [None]
+        for numero, lote in enumerate(lotes_bloque, start=1):
+            if lote is not None:
+                meses.update(str(f['fecha_factura'])[:7] if f.get('fecha_factura') else MES_SIN_FECHA for f in lote)
+                if fila_bloque == fila_reanudacion and numero <= lotes_saltados:
+                    progreso["filas_escritas"] += len(lote)
+                    progreso["lotes"] += 1
+                    continue
+                progreso["filas_escritas"] += repositorio.upsert(tabla, lote, on_conflict=on_conflict,
+                                                                 tamano_lote=tamano_lote)
+                progreso["lotes"] += 1
+            if numero == len(lotes_bloque):
+                guardar_punto(fila_bloque + len(bloque), 0, contadores())
+            else:
+                guardar_punto(fila_bloque, numero, al_empezar)
+            progreso["segundos"] = round(time.monotonic() - inicio, 3)
+            yield dict(progreso, valores_no_validos=dict(progreso["valores_no_validos"]))
+        fila_bloque += len(bloque)
+
+    progreso["completado"] = True
+    progreso["bytes_leidos"] = progreso["bytes_totales"]
+    guardar_punto(fila_bloque, 0, contadores(), completado=True)
+    progreso["columnas_ignoradas"] = lector.ignoradas
+    if resumen is not None:
+        progreso["resumen_mensual"] = resumen.actualizar(meses)
+    progreso["segundos"] = round(time.monotonic() - inicio, 3)
+    yield progreso
@@ -0,0 +1,73 @@
+# importacion/puntos_control.py
+
+import datetime
+import hashlib
+from datos.paginacion import ErrorConsulta
+
+CLAVE_PUNTOS_CONTROL = 'hash_fichero,perfil,tabla'
+
+
+def hash_fichero(fichero, tamano_lectura=1 << 20):
+    """SHA-256 (hexadecimal) del contenido de un fichero con seek(); la posición de lectura se conserva."""
+    posicion = fichero.tell()
+    fichero.seek(0)
+    resumen = hashlib.sha256()
+    while True:
+        tramo = fichero.read(tamano_lectura)
+        if not tramo:
+            break
+        resumen.update(tramo)
+    fichero.seek(posicion)
+    return resumen.hexdigest()
+
+
+class PuntosControl:
+    """
+    Puntos de control de las importaciones, guardados en una tabla del repositorio (una
+    fila por fichero, perfil y tabla de destino). Tras cada lote confirmado se guarda:
+    el hash del fichero, la fila en que empieza el bloque en curso ('fila_bloque'), los
+    lotes de ese bloque ya escritos ('lotes_bloque'), el número de lote global, la
+    posición aproximada en bytes y el progreso acumulado al empezar el bloque.
+
+    Si un punto de control no se puede escribir (p. ej. la tabla no existe en Supabase)
+    la importación sigue sin puntos de control: 'error' guarda el motivo.
+    """
+
+    def __init__(self, repositorio, tabla='importaciones'):
+        self.repositorio = repositorio
+        self.tabla = tabla
+        self.error = None
+
+    @property
+    def disponible(self):
+        return self.error is None
+
+    def cargar(self, hash_fichero, perfil, tabla):
+        """Último punto de control de una importación sin completar de este fichero, o None."""
+        if not self.disponible:
+            return None
+        if not self.repositorio.existe_tabla(self.tabla):
+            return None
+        try:
+            filas = self.repositorio.consultar(
+                self.tabla, '*',
+                filtros=[('eq', 'hash_fichero', hash_fichero), ('eq', 'perfil', perfil), ('eq', 'tabla', tabla)],
+            )
+        except ErrorConsulta as e:
+            self.error = str(e)
+            return None
+        if not filas or filas[0].get('completado'):
+            return None
+        return filas[0]
+
+    def guardar(self, punto):
+        """Guarda (sustituye) el punto de control de una importación. Devuelve False si no se ha podido."""
+        if not self.disponible:
+            return False
+        try:
+            self.repositorio.upsert(self.tabla, [dict(punto, actualizado=datetime.datetime.now(
+                datetime.timezone.utc).isoformat(timespec='seconds'))], on_conflict=CLAVE_PUNTOS_CONTROL)
+        except ErrorConsulta as e:
+            self.error = str(e)
+            return False
+        return True
@@ -0,0 +1,56 @@
+# importacion/registro.py
+
+import pandas as pd
+from importacion.lectura import leer_bloques, leer_cabeceras
+from importacion.perfiles import PerfilImportacion
+
+# Tipo de cada columna del registro de facturas de la plataforma (p. ej. el listado de
+# facturas registradas que exporta FACe) que se puede leer.
+TIPOS_REGISTRO = {
+    'numero_registro': 'texto',
+    'numero_factura': 'texto',
+    'proveedor_nif': 'nif',
+    'nombre_proveedor': 'texto',
+    'fecha_factura': 'fecha',
+    'fecha_registro': 'fecha_hora',
+    'total_factura': 'importe',
+    'estado': 'categoria',
+}
+
+# Cabeceras del registro exportado por la plataforma para cada columna.
+_COLUMNAS_REGISTRO = {
+    'numero_registro': ['n_registro', 'no_registro', 'numero_de_registro', 'registro', 'num_registro',
+                        'codigo_registro'],
+    'numero_factura': ['numero', 'factura', 'num_factura', 'n_factura', 'no_factura', 'numero_de_factura'],
+    'proveedor_nif': ['nif_emisor', 'nif_proveedor', 'cif_emisor', 'nif'],
+    'nombre_proveedor': ['razon_social', 'emisor', 'nombre_emisor', 'proveedor'],
+    'fecha_factura': ['fecha_expedicion', 'fecha_de_expedicion', 'fecha_emision'],
+    'fecha_registro': ['fecha_de_registro', 'fecha_presentacion', 'fecha_registro_face'],
+    'total_factura': ['importe', 'importe_total'],
+    'estado': ['estado_factura'],
+}
+
+# Perfil del registro: ninguna columna es obligatoria porque una fila se concilia por su
+# número de registro o por NIF, número y fecha de la factura (analisis.conciliacion).
+PERFIL_REGISTRO = PerfilImportacion('Registro', _COLUMNAS_REGISTRO, tipos=TIPOS_REGISTRO, obligatorias=(),
+                                    formatos_fecha=('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y'))
+
+
+def leer_registro(fichero, nombre, tamano_bloque=50000):
+    """
+    Lee un fichero CSV o Excel con el registro de facturas de la plataforma (una fila por
+    factura registrada) y devuelve sus columnas tipadas (TIPOS_REGISTRO: NIF normalizados,
+    fechas datetime64 e importes en céntimos) en un DataFrame. Lanza ValueError si el
+    fichero no se puede leer o no tiene con qué conciliar sus filas.
+    """
+    lector = PERFIL_REGISTRO.compilar(leer_cabeceras(fichero, nombre))
+    leidas = set(lector.renombrar.values())
+    if 'numero_registro' not in leidas and not {'numero_factura', 'proveedor_nif', 'fecha_factura'} <= leidas:
+        raise ValueError("El fichero no tiene número de registro ni NIF del emisor, número y fecha de la factura")
+    bloques = [lector.convertir(bloque)[0]
+               for bloque in leer_bloques(fichero, nombre, tamano_bloque, columnas=lector.columnas, dtype=lector.dtype)]
+    registro = pd.concat(bloques, ignore_index=True) if bloques else pd.DataFrame(columns=list(leidas))
+    for columna in TIPOS_REGISTRO:
+        if columna not in registro:
+            registro[columna] = None
+    return registro
@@ -0,0 +1,197 @@
+# importacion/xlsx.py
+#
+# Lector de .xlsx en streaming: la hoja se analiza con expat por tramos, entregando cada
+# fila en cuanto se cierra, y la tabla de cadenas compartidas se lee bajo demanda, sólo
+# hasta la última cadena que se ha pedido. Así las primeras filas (la vista previa) se obtienen sin analizar el
+# resto del libro y la memoria no depende del número de filas.
+
+import datetime
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PAQUETE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Formatos de número predefinidos de Excel que son fechas u horas.
+_FORMATOS_FECHA_PREDEFINIDOS = set(range(14, 23)) | {45, 46, 47}
+
+# Texto entre comillas, escapes y secciones entre corchetes ([Red], [$-es-ES]) de un formato.
+_LITERALES_FORMATO = re.compile(r'"[^"]*"|\\.|\[[^\]]*\]')
+
+_COLUMNA = re.compile(r'[A-Z]+')
+
+
+def _local(etiqueta):
+    """Nombre de una etiqueta sin prefijo de espacio de nombres ('x:row' -> 'row')."""
+    return etiqueta.rpartition(':')[2]
+
+
+def _es_formato_fecha(codigo):
+    return bool(re.search(r'[dmyhs]', _LITERALES_FORMATO.sub('', codigo), re.IGNORECASE))
+
+
+def _indice_columna(referencia):
+    """Posición (desde 0) de la columna de una referencia de celda como 'AB12'."""
+    letras = _COLUMNA.match(referencia).group()
+    indice = 0
+    for letra in letras:
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _texto_cadena(elemento):
+    """Texto de un <si> o <is>: texto simple o concatenación de los tramos con formato (sin fonética)."""
+    texto = elemento.find(_NS + 't')
+    if texto is not None:
+        return texto.text or ''
+    return ''.join(t.text or '' for r in elemento.iterfind(_NS + 'r') for t in r.iterfind(_NS + 't'))
+
+
+class CadenasCompartidas:
+    """Tabla sharedStrings.xml que se analiza sólo hasta el índice más alto pedido."""
+
+    def __init__(self, libro, ruta):
+        self.cadenas = []
+        self._eventos = ET.iterparse(libro.open(ruta), events=('end',)) if ruta else iter(())
+
+    def __getitem__(self, indice):
+        while indice >= len(self.cadenas):
+            for _, elemento in self._eventos:
+                if elemento.tag == _NS + 'si':
+                    self.cadenas.append(_texto_cadena(elemento))
+                    elemento.clear()
+                    break
+            else:
+                raise IndexError(f"Cadena compartida inexistente: {indice}")
+        return self.cadenas[indice]
+
+
+class LibroXlsx:
+    """
+    Libro .xlsx abierto para leer sus hojas fila a fila. 'fichero' es una ruta o un objeto
+    binario con seek(). Las filas se devuelven como tuplas de valores Python (texto,
+    números, booleanos, fechas o None), como las de openpyxl con values_only=True.
+    """
+
+    def __init__(self, fichero):
+        self.libro = zipfile.ZipFile(fichero)
+        nombres = set(self.libro.namelist())
+        relaciones = self._relaciones('xl/_rels/workbook.xml.rels')
+        libro_xml = ET.fromstring(self.libro.read('xl/workbook.xml'))
+        propiedades = libro_xml.find(_NS + 'workbookPr')
+        fecha_1904 = propiedades is not None and propiedades.get('date1904') in ('1', 'true')
+        self.origen_fechas = datetime.datetime(1904, 1, 1) if fecha_1904 else datetime.datetime(1899, 12, 30)
+        self.hojas = [
+            relaciones[hoja.get(_NS_REL + 'id')][1]
+            for hoja in libro_xml.iter(_NS + 'sheet')
+        ]
+        por_tipo = {tipo.rsplit('/', 1)[-1]: ruta for tipo, ruta in relaciones.values()}
+        ruta_cadenas = por_tipo.get('sharedStrings')
+        self.cadenas = CadenasCompartidas(self.libro, ruta_cadenas if ruta_cadenas in nombres else None)
+        ruta_estilos = por_tipo.get('styles')
+        self.estilos_fecha = self._estilos_fecha(ruta_estilos) if ruta_estilos in nombres else set()
+
+    def _relaciones(self, ruta):
+        """{id: (tipo, ruta dentro del zip)} de un fichero .rels de xl/."""
+        relaciones = {}
+        for relacion in ET.fromstring(self.libro.read(ruta)).iter(_NS_PAQUETE + 'Relationship'):
+            destino = relacion.get('Target')
+            destino = destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(posixpath.join('xl', destino))
+            relaciones[relacion.get('Id')] = (relacion.get('Type'), destino)
+        return relaciones
+
+    def _estilos_fecha(self, ruta):
+        """Índices de los estilos de celda (cellXfs) cuyo formato de número es una fecha."""
+        estilos = ET.fromstring(self.libro.read(ruta))
+        formatos_fecha = set(_FORMATOS_FECHA_PREDEFINIDOS)
+        for formato in estilos.iter(_NS + 'numFmt'):
+            if _es_formato_fecha(formato.get('formatCode', '')):
+                formatos_fecha.add(int(formato.get('numFmtId')))
+        celdas = estilos.find(_NS + 'cellXfs')
+        if celdas is None:
+            return set()
+        return {i for i, xf in enumerate(celdas.iterfind(_NS + 'xf'))
+                if int(xf.get('numFmtId', 0)) in formatos_fecha}
+
+    def _fecha(self, serial):
+        instante = self.origen_fechas + datetime.timedelta(days=serial)
+        if instante.hour == instante.minute == instante.second == instante.microsecond == 0:
+            return instante.date()
+        return instante
+
+    def _valor(self, tipo, estilo, texto):
+        """Valor Python de una celda a partir de su tipo ('t'), su estilo ('s') y el texto de <v>."""
+        if tipo == 's':
+            return self.cadenas[int(texto)]
+        if tipo in ('str', 'd', 'inlineStr'):
+            return texto
+        if tipo == 'b':
+            return texto == '1'
+        if tipo == 'e':
+            return None
+        numero = float(texto)
+        if estilo is not None and int(estilo) in self.estilos_fecha:
+            return self._fecha(numero)
+        return int(numero) if numero.is_integer() and 'E' not in texto.upper() else numero
+
+    def filas(self, hoja=0, tamano_lectura=1 << 16):
+        """
+        Recorre las filas de la hoja indicada (por posición) como tuplas de valores. La hoja
+        se analiza con expat por tramos de 'tamano_lectura' bytes, sin construir elementos.
+        """
+        filas = []
+        fila = []
+        celda = {}
+        texto = []
+
+        def inicio(etiqueta, atributos):
+            if etiqueta == 'c':
+                celda.clear()
+                celda.update(atributos)
+                texto.clear()
+                referencia = atributos.get('r')
+                if referencia:
+                    posicion = _indice_columna(referencia)
+                    if posicion > len(fila):
+                        fila.extend([None] * (posicion - len(fila)))
+            elif etiqueta in ('v', 't'):
+                celda['_texto'] = True
+            elif etiqueta == 'rPh':
+                celda['_fonetica'] = True
+
+        def caracteres(datos):
+            if celda.get('_texto') and not celda.get('_fonetica'):
+                texto.append(datos)
+
+        def fin(etiqueta):
+            if etiqueta == 'c':
+                fila.append(self._valor(celda.get('t', 'n'), celda.get('s'), ''.join(texto))
+                            if texto else None)
+            elif etiqueta in ('v', 't'):
+                celda['_texto'] = False
+            elif etiqueta == 'rPh':
+                celda['_fonetica'] = False
+            elif etiqueta == 'row':
+                filas.append(tuple(fila))
+                fila.clear()
+
+        analizador = expat.ParserCreate(namespace_separator=None)
+        analizador.buffer_text = True
+        analizador.StartElementHandler = lambda etiqueta, atributos: inicio(_local(etiqueta), atributos)
+        analizador.EndElementHandler = lambda etiqueta: fin(_local(etiqueta))
+        analizador.CharacterDataHandler = caracteres
+        with self.libro.open(self.hojas[hoja]) as datos:
+            while True:
+                tramo = datos.read(tamano_lectura)
+                analizador.Parse(tramo, not tramo)
+                yield from filas
+                filas.clear()
+                if not tramo:
+                    return
+
+    def close(self):
+        self.libro.close()
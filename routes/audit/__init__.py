@@ -6,4 +6,4 @@ from flask import Blueprint
 audit_bp = Blueprint('audit', __name__)
 
 # Importamos los endpoints de cada versión para registrarlos en el blueprint
-from . import v1, v2, v3, v4
+from . import v1, v2, v3, v4, completa, contenido
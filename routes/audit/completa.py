@@ -0,0 +1,69 @@
+# routes/audit/completa.py
+
+from flask import request, jsonify
+from datetime import datetime
+import traceback
+import requests
+from config import repositorio, obligacion_factura_electronica, TAMANO_PAGINA_FACTURAS
+from datos.paginacion import ErrorConsulta
+from analisis.papel import AuditoriaPapel
+from analisis.anotacion import AuditoriaAnotacion
+from analisis.validaciones import AuditoriaValidaciones
+from analisis.tramitacion import AuditoriaTramitacion
+from analisis.completa import columnas_union, filtro_union, ejecutar_en_un_recorrido
+from . import audit_bp
+
+@audit_bp.route('/api/auditar/completa', methods=['POST'])
+def auditar_completa():
+    """
+    Ejecuta las pruebas de auditoría V.1 a V.4 sobre el mismo periodo con un único
+    recorrido de la tabla 'facturas': se piden una sola vez las columnas que necesitan
+    todas las pruebas y cada fila se reparte entre las que le corresponden.
+    La respuesta contiene las mismas secciones que los endpoints individuales.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+
+    try:
+        data = request.get_json()
+        if not data or 'fecha_inicio' not in data or 'fecha_fin' not in data:
+            return jsonify({"error": "Faltan parámetros 'fecha_inicio' o 'fecha_fin' en el cuerpo JSON"}), 400
+
+        fecha_inicio_str = data['fecha_inicio']
+        fecha_fin_str = data['fecha_fin']
+
+        try:
+            fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
+            fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
+            if fecha_inicio > fecha_fin:
+                return jsonify({"error": "La fecha de inicio no puede ser posterior a la fecha de fin"}), 400
+        except ValueError:
+            return jsonify({"error": "Formato de fecha inválido. Usar YYYY-MM-DD"}), 400
+
+        papel = AuditoriaPapel(fecha_inicio_str, fecha_fin_str, obligacion_factura_electronica)
+        anotacion = AuditoriaAnotacion(fecha_inicio_str, fecha_fin_str)
+        validaciones = AuditoriaValidaciones(fecha_inicio_str, fecha_fin_str)
+        tramitacion = AuditoriaTramitacion(fecha_inicio_str, fecha_fin_str)
+        auditorias = [papel, anotacion, validaciones, tramitacion]
+
+        try:
+            filas = repositorio.iterar('facturas', columnas_union(auditorias), filtros=filtro_union(auditorias),
+                                       tamano_pagina=TAMANO_PAGINA_FACTURAS)
+            ejecutar_en_un_recorrido(filas, auditorias)
+        except ErrorConsulta as e:
+            return jsonify({"error": "Error al consultar facturas para la auditoría completa", "details": str(e)}), 500
+
+        return jsonify({
+            "periodo_analizado": {"inicio": fecha_inicio_str, "fin": fecha_fin_str},
+            "v1_papel": papel.resultado(),
+            "v2_anotacion": anotacion.resultado(),
+            "v3_validaciones": validaciones.resultado(),
+            "v4_tramitacion": tramitacion.resultado()
+        }), 200
+
+    except requests.exceptions.RequestException as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error de conexión externa durante la auditoría"}), 503
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error interno del servidor durante la auditoría completa", "details": str(e)}), 500
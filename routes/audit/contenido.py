@@ -0,0 +1,36 @@
+# routes/audit/contenido.py
+
+from flask import jsonify
+from config import (repositorio, catalogo_dir3, TAMANO_PAGINA_FACTURAS, TABLA_DOCUMENTOS_FACTURAE,
+                    TABLA_FIRMAS_FACTURAE)
+from datos.paginacion import ErrorConsulta
+from analisis.contenido import ValidacionesContenido
+from . import audit_bp
+
+
+@audit_bp.route('/api/auditar/contenido/validaciones', methods=['POST'])
+def auditar_validaciones_contenido():
+    """
+    Validaciones del contenido de las facturas (Orden HAP/1650/2015) sobre los documentos
+    Facturae importados (TABLA_DOCUMENTOS_FACTURAE) y sobre la verificación de sus firmas
+    (TABLA_FIRMAS_FACTURAE), y del NIF de su emisor: documentos y facturas que no superan
+    cada validación, con el detalle de los documentos no válidos. Si hay catálogo DIR3 (DIR3_CATALOGO_RUTA) se
+    validan además los códigos DIR3 de los documentos, con las facturas por motivo.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+    validaciones = ValidacionesContenido(catalogo_dir3)
+    try:
+        if repositorio.existe_tabla(TABLA_DOCUMENTOS_FACTURAE):
+            for d in repositorio.iterar(TABLA_DOCUMENTOS_FACTURAE, ', '.join(validaciones.COLUMNAS),
+                                        filtros=validaciones.filtros(), tamano_pagina=TAMANO_PAGINA_FACTURAS):
+                validaciones.procesar(d)
+        if repositorio.existe_tabla(TABLA_FIRMAS_FACTURAE):
+            for f in repositorio.iterar(TABLA_FIRMAS_FACTURAE, ', '.join(validaciones.COLUMNAS_FIRMAS),
+                                        filtros=validaciones.filtros(), tamano_pagina=TAMANO_PAGINA_FACTURAS):
+                validaciones.procesar_firma(f)
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al consultar los documentos Facturae", "details": str(e)}), 500
+    except Exception as e:
+        return jsonify({"error": "Error interno en las validaciones de contenido", "details": str(e)}), 500
+    return jsonify(validaciones.resultado()), 200
@@ -3,16 +3,23 @@
 from flask import request, jsonify
 from datetime import datetime
 import traceback
-from config import supabase
+from config import repositorio, TAMANO_PAGINA_FACTURAS
+from datos.paginacion import ErrorConsulta
+from datos.repositorio import lotes
+from analisis.anotacion import AuditoriaAnotacion, combinar_estadisticas
+from analisis.conciliacion import ConciliacionRegistro, TAMANO_BLOQUE_CONCILIACION
+from importacion.registro import leer_registro
 from . import audit_bp
 
 @audit_bp.route('/api/auditar/v2/anotacion', methods=['POST'])
 def auditar_anotacion_electronica():
     """
     Ejecuta las pruebas de auditoría V.2: Anotación de facturas electrónicas en el RCF.
-    Calcula los tiempos de anotación y genera estadísticas.
+    Calcula los tiempos de anotación y genera estadísticas (media, percentiles e
+    histograma, en total y por mes). El detalle por factura sólo se devuelve si se pide
+    con "detalle": true, paginado con "detalle_pagina" y "detalle_por_pagina".
     """
-    if not supabase:
+    if not repositorio:
         return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
     try:
         data = request.get_json()
@@ -28,51 +35,93 @@ def auditar_anotacion_electronica():
         except ValueError:
             return jsonify({"error": "Formato de fecha inválido. Usar YYYY-MM-DD"}), 400
 
-        query_facturas = supabase.table('facturas')\
-            .select('id, numero_factura, proveedor_nif, fecha_factura, fecha_presentacion_registro, fecha_registro_rcf')\
-            .eq('es_electronica', True)\
-            .gte('fecha_registro_rcf', fecha_inicio_str)\
-            .lte('fecha_registro_rcf', fecha_fin_str)\
-            .execute()
-        if not hasattr(query_facturas, 'data') or (hasattr(query_facturas, 'error') and query_facturas.error):
-            error_details = str(query_facturas.error) if hasattr(query_facturas, 'error') else str(query_facturas)
-            return jsonify({"error": "Error al consultar facturas electrónicas", "details": error_details}), 500
-        facturas = query_facturas.data
-        total_facturas = len(facturas)
-        tiempos = []
-        facturas_sin_fechas = []
-
-        for f in facturas:
-            f_presentacion = f.get('fecha_presentacion_registro')
-            f_registro = f.get('fecha_registro_rcf')
-            if not f_presentacion or not f_registro:
-                facturas_sin_fechas.append(f.get('id'))
-                continue
+        detalle = None
+        if data.get('detalle'):
             try:
-                dt_presentacion = datetime.fromisoformat(f_presentacion.replace('Z', '+00:00'))
-                dt_registro = datetime.fromisoformat(f_registro.replace('Z', '+00:00'))
-                diferencia_minutos = (dt_registro - dt_presentacion).total_seconds() / 60
-                tiempos.append(diferencia_minutos)
-            except Exception as e:
-                facturas_sin_fechas.append(f.get('id'))
-        if tiempos:
-            promedio = sum(tiempos) / len(tiempos)
-            minimo = min(tiempos)
-            maximo = max(tiempos)
-        else:
-            promedio = minimo = maximo = None
-        resultados = {
-            "periodo_analizado": {"inicio": fecha_inicio_str, "fin": fecha_fin_str},
-            "total_facturas_electronicas_analizadas": total_facturas,
-            "tiempos_anotacion": {
-                "promedio_minutos": promedio,
-                "minimo_minutos": minimo,
-                "maximo_minutos": maximo,
-                "detalle": tiempos,
-            },
-            "facturas_sin_fechas": facturas_sin_fechas
-        }
-        return jsonify(resultados), 200
+                pagina = int(data.get('detalle_pagina', 1))
+                por_pagina = int(data.get('detalle_por_pagina', TAMANO_PAGINA_FACTURAS))
+            except (TypeError, ValueError):
+                return jsonify({"error": "'detalle_pagina' y 'detalle_por_pagina' deben ser números enteros"}), 400
+            if pagina < 1 or por_pagina < 1:
+                return jsonify({"error": "'detalle_pagina' y 'detalle_por_pagina' deben ser mayores que 0"}), 400
+            detalle = (pagina, min(por_pagina, TAMANO_PAGINA_FACTURAS))
+
+        auditoria = AuditoriaAnotacion(fecha_inicio_str, fecha_fin_str, detalle)
+        try:
+            for f in repositorio.iterar('facturas', ', '.join(auditoria.COLUMNAS), filtros=auditoria.filtros(),
+                                        orden=('fecha_registro_rcf', 'id'), tamano_pagina=TAMANO_PAGINA_FACTURAS):
+                auditoria.procesar(f)
+        except ErrorConsulta as e:
+            return jsonify({"error": "Error al consultar facturas electrónicas", "details": str(e)}), 500
+
+        return jsonify(auditoria.resultado()), 200
 
     except Exception as e:
         return jsonify({"error": "Error interno del servidor en auditoría V.2", "details": str(e)}), 500
+
+
+@audit_bp.route('/api/auditar/v2/anotacion/combinar', methods=['POST'])
+def combinar_anotacion_electronica():
+    """
+    Combina estadísticas de V.2 ya calculadas (el campo "sketch" de cada periodo,
+    p. ej. los meses de un año) sin volver a leer las facturas.
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get('sketches'), list):
+        return jsonify({"error": "Falta la lista 'sketches' en el cuerpo JSON"}), 400
+    try:
+        return jsonify({"tiempos_anotacion": combinar_estadisticas(data['sketches'])}), 200
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": "Estadísticas no válidas", "details": str(e)}), 400
+
+
+@audit_bp.route('/api/auditar/v2/conciliacion', methods=['POST'])
+def conciliar_registro_rcf():
+    """
+    Concilia el registro de facturas de la plataforma (CSV o Excel exportado de FACe,
+    enviado como multipart en el campo 'fichero') con las facturas electrónicas del RCF:
+    facturas registradas que faltan en el RCF (con sus días pendientes), facturas del RCF
+    que faltan en la plataforma y discrepancias de importe, fechas, NIF y número (ver
+    analisis.conciliacion). Opcionales (campos del formulario): 'fecha_inicio' y
+    'fecha_fin' (YYYY-MM-DD; por defecto, las fechas de registro del fichero),
+    'fecha_corte' para los días pendientes (hoy por defecto) y 'plataforma' para
+    conciliar sólo las facturas del RCF de esa plataforma.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+    fichero = request.files.get('fichero')
+    if fichero is None or not fichero.filename:
+        return jsonify({"error": "Falta el fichero del registro de la plataforma (campo 'fichero')"}), 400
+    fechas = {nombre: request.form.get(nombre) or None for nombre in ('fecha_inicio', 'fecha_fin', 'fecha_corte')}
+    try:
+        for valor in fechas.values():
+            if valor:
+                datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "Formato de fecha inválido. Usar YYYY-MM-DD"}), 400
+    if fechas['fecha_inicio'] and fechas['fecha_fin'] and fechas['fecha_inicio'] > fechas['fecha_fin']:
+        return jsonify({"error": "La fecha de inicio no puede ser posterior a la fecha de fin"}), 400
+
+    try:
+        registro = leer_registro(fichero.stream, fichero.filename)
+    except ValueError as e:
+        return jsonify({"error": "Registro de la plataforma no válido", "details": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error al leer el registro de la plataforma", "details": str(e)}), 400
+
+    try:
+        conciliacion = ConciliacionRegistro(registro, plataforma=request.form.get('plataforma') or None, **fechas)
+        if repositorio.existe_tabla('facturas'):
+            columnas = [c for c in conciliacion.COLUMNAS if c not in conciliacion.COLUMNAS_OPCIONALES
+                        or repositorio.existe_columna('facturas', c)]
+            facturas = repositorio.iterar('facturas', ', '.join(columnas), filtros=conciliacion.filtros(),
+                                          tamano_pagina=TAMANO_PAGINA_FACTURAS)
+            for bloque in lotes(facturas, TAMANO_BLOQUE_CONCILIACION):
+                conciliacion.procesar_lote(bloque)
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al consultar facturas electrónicas", "details": str(e)}), 500
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error interno en la conciliación con el RCF", "details": str(e)}), 500
+    return jsonify(conciliacion.resultado()), 200
@@ -1,50 +1,85 @@
 # routes/audit/v4.py
 
 from flask import request, jsonify
-from config import supabase
+from config import repositorio, almacen_historico, TAMANO_PAGINA_FACTURAS, TABLA_HISTORICO_ESTADOS
+from datos.paginacion import ErrorConsulta
+from analisis.tramitacion import AuditoriaTramitacion, AuditoriaTransiciones
+from analisis.permanencia import TiemposTramitacion
 import traceback
 from . import audit_bp
 
+
+def _leer_historico(calculo):
+    """
+    Pasa a un cálculo sobre el histórico (con COLUMNAS, filtros() y procesar()) los eventos
+    que necesita: del almacén local si está configurado (de una vez, por columnas) o de la
+    tabla del histórico. Los errores de lectura se lanzan como ErrorConsulta.
+    """
+    if almacen_historico is not None:
+        calculo.procesar_columnas(almacen_historico.leer(calculo.filtros(), calculo.COLUMNAS))
+        return
+    for f in repositorio.iterar(TABLA_HISTORICO_ESTADOS, ', '.join(calculo.COLUMNAS),
+                                filtros=calculo.filtros(), tamano_pagina=TAMANO_PAGINA_FACTURAS):
+        calculo.procesar(f)
+
 @audit_bp.route('/api/auditar/v4/tramitacion', methods=['POST'])
 def auditar_tramitacion():
     """
     Ejecuta pruebas de auditoría V.4: Tramitación de facturas.
     Verifica que el campo 'estado' de cada factura esté dentro de los valores válidos.
+    Con "modo": "transiciones" valida en su lugar la secuencia de estados de cada factura
+    en el histórico de estados (opcionalmente de una sola "plataforma").
     """
-    if not supabase:
+    if not repositorio:
         return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
     try:
         data = request.get_json()
         fecha_inicio_str = data.get('fecha_inicio')
         fecha_fin_str = data.get('fecha_fin')
-        query = supabase.table('facturas')\
-            .select('id, numero_factura, proveedor_nif, estado, fecha_factura')\
-            .eq('es_electronica', True)
-        if fecha_inicio_str:
-            query = query.gte('fecha_factura', fecha_inicio_str)
-        if fecha_fin_str:
-            query = query.lte('fecha_factura', fecha_fin_str)
-        response = query.execute()
-        if not hasattr(response, 'data') or (hasattr(response, 'error') and response.error):
-            error_details = str(response.error) if hasattr(response, 'error') else str(response)
-            return jsonify({"error": "Error al consultar facturas para tramitación", "details": error_details}), 500
-        facturas = response.data
-        estados_incorrectos = []
-        estados_validos = ["REGISTRADA", "REGISTRADA EN RCF", "VERIFICADA EN RCF", "RECIBIDA EN DESTINO",
-                           "CONFORMADA", "CONTABILIZADA", "PAGADA", "ANULADA", "RECHAZADA"]
-        for f in facturas:
-            estado = f.get('estado', '')
-            if estado not in estados_validos:
-                estados_incorrectos.append({
-                    "id": f.get('id'),
-                    "numero_factura": f.get('numero_factura'),
-                    "estado": estado
-                })
-        resultados = {
-            "total_facturas_tramitacion": len(facturas),
-            "facturas_con_estado_incorrecto": estados_incorrectos
-        }
-        return jsonify(resultados), 200
+        if data.get('modo') == 'transiciones':
+            return _auditar_transiciones(fecha_inicio_str, fecha_fin_str, data.get('plataforma'))
+        auditoria = AuditoriaTramitacion(fecha_inicio_str, fecha_fin_str)
+        try:
+            for f in repositorio.iterar('facturas', ', '.join(auditoria.COLUMNAS), filtros=auditoria.filtros(),
+                                        tamano_pagina=TAMANO_PAGINA_FACTURAS):
+                auditoria.procesar(f)
+        except ErrorConsulta as e:
+            return jsonify({"error": "Error al consultar facturas para tramitación", "details": str(e)}), 500
+
+        return jsonify(auditoria.resultado()), 200
 
     except Exception as e:
         return jsonify({"error": "Error interno en auditoría V.4", "details": str(e)}), 500
+
+
+def _auditar_transiciones(fecha_inicio_str, fecha_fin_str, plataforma):
+    auditoria = AuditoriaTransiciones(fecha_inicio_str, fecha_fin_str, plataforma)
+    try:
+        _leer_historico(auditoria)
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al consultar el histórico de estados", "details": str(e)}), 500
+
+    return jsonify(auditoria.resultado()), 200
+
+
+@audit_bp.route('/api/auditar/v4/tiempos', methods=['POST'])
+def tiempos_tramitacion():
+    """
+    Tiempos de tramitación por estado calculados sobre el histórico de estados: permanencia
+    media, mediana y p95 en cada estado, en FACe y en RCF, en total y por mes, con la
+    diferencia FACe - RCF. "fecha_inicio" y "fecha_fin" (opcionales) limitan los meses.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+    try:
+        data = request.get_json(silent=True) or {}
+        calculo = TiemposTramitacion(data.get('fecha_inicio'), data.get('fecha_fin'))
+        try:
+            _leer_historico(calculo)
+        except ErrorConsulta as e:
+            return jsonify({"error": "Error al consultar el histórico de estados", "details": str(e)}), 500
+
+        return jsonify(calculo.resultado()), 200
+
+    except Exception as e:
+        return jsonify({"error": "Error interno en tiempos de tramitación", "details": str(e)}), 500
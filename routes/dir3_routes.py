@@ -0,0 +1,87 @@
+# routes/dir3_routes.py
+
+from flask import Blueprint, jsonify, request
+from config import catalogo_dir3
+from datos.dir3 import MOTIVOS_DIR3
+from importacion.dir3 import importar_catalogo_dir3
+from importacion.lectura import extension_admitida
+import traceback
+
+dir3_bp = Blueprint('dir3', __name__)
+
+# Ternas que se validan como máximo en una petición.
+MAXIMO_TERNAS = 100000
+
+
+def _sin_catalogo():
+    return jsonify({"error": "Servicio no disponible: No hay catálogo DIR3 (DIR3_CATALOGO_RUTA)"}), 503
+
+
+@dir3_bp.route('/api/dir3/catalogo', methods=['GET'])
+def resumen_catalogo_dir3():
+    """Versión publicada del catálogo DIR3: número de códigos por papel, ternas, fuente y fecha."""
+    if catalogo_dir3 is None:
+        return _sin_catalogo()
+    resumen = catalogo_dir3.resumen()
+    if resumen is None:
+        return jsonify({"error": "No se ha publicado ningún catálogo DIR3"}), 404
+    return jsonify(resumen), 200
+
+
+@dir3_bp.route('/api/dir3/catalogo', methods=['POST'])
+def publicar_catalogo_dir3():
+    """
+    Publica un catálogo DIR3 nuevo a partir de un fichero de relaciones OC-OG-UT (CSV o
+    Excel, campo 'fichero'), que sustituye al anterior sin reiniciar la API.
+    """
+    if catalogo_dir3 is None:
+        return _sin_catalogo()
+    fichero = request.files.get('fichero')
+    if fichero is None or not fichero.filename:
+        return jsonify({"error": "Falta el fichero del catálogo (campo 'fichero')"}), 400
+    try:
+        extension_admitida(fichero.filename)
+        return jsonify(importar_catalogo_dir3(catalogo_dir3, fichero.stream, fichero.filename)), 200
+    except ValueError as e:
+        return jsonify({"error": "Catálogo DIR3 no válido", "details": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error al publicar el catálogo DIR3", "details": str(e)}), 500
+
+
+@dir3_bp.route('/api/dir3/codigos/<codigo>', methods=['GET'])
+def buscar_codigo_dir3(codigo):
+    """Código DIR3 con su nombre y sus papeles (oficina contable, órgano gestor, unidad tramitadora)."""
+    if catalogo_dir3 is None:
+        return _sin_catalogo()
+    unidad = catalogo_dir3.buscar(codigo)
+    if unidad is None:
+        return jsonify({"error": f"Código DIR3 no encontrado: {codigo}"}), 404
+    return jsonify(unidad), 200
+
+
+@dir3_bp.route('/api/dir3/validar', methods=['POST'])
+def validar_ternas_dir3():
+    """
+    Valida una lista de ternas ({"ternas": [{"oficina_contable", "organo_gestor",
+    "unidad_tramitadora"}, ...]}) de una vez. Devuelve, en el mismo orden, si cada una es
+    válida y los motivos de las que no lo son.
+    """
+    if catalogo_dir3 is None:
+        return _sin_catalogo()
+    data = request.get_json(silent=True)
+    ternas = data.get('ternas') if isinstance(data, dict) else None
+    if not isinstance(ternas, list) or not all(isinstance(t, dict) for t in ternas):
+        return jsonify({"error": "Falta la lista 'ternas' en el cuerpo JSON"}), 400
+    if len(ternas) > MAXIMO_TERNAS:
+        return jsonify({"error": f"Se admiten como máximo {MAXIMO_TERNAS} ternas por petición"}), 400
+    try:
+        mascaras = catalogo_dir3.validar_ternas([t.get('oficina_contable') for t in ternas],
+                                                [t.get('organo_gestor') for t in ternas],
+                                                [t.get('unidad_tramitadora') for t in ternas])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify({"resultados": [{
+        "valida": not mascara,
+        "motivos": [clave for bit, (clave, _) in MOTIVOS_DIR3.items() if mascara & bit],
+    } for mascara in mascaras.tolist()]}), 200
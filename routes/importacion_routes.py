@@ -0,0 +1,198 @@
+# routes/importacion_routes.py
+
+import json
+import os
+import shutil
+import tempfile
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from werkzeug.utils import secure_filename
+from config import (repositorio, almacen_historico, resumen_mensual, TAMANO_BLOQUE_IMPORTACION,
+                    TAMANO_LOTE_IMPORTACION, CLAVE_IMPORTACION_FACTURAS, TABLA_IMPORTACIONES,
+                    TABLA_DOCUMENTOS_FACTURAE, FACTURAE_XSD, PROCESOS_FACTURAE, TABLA_FIRMAS_FACTURAE,
+                    FIRMA_ALMACEN_CONFIANZA)
+from datos.paginacion import ErrorConsulta
+from importacion.lectura import extension_admitida
+from importacion.perfiles import obtener_perfil
+from importacion.pipeline import importar_facturas
+from importacion.historico import importar_historico
+from importacion.facturae import EXTENSIONES_FACTURAE, importar_facturae
+from importacion.firma import requisitos_firma, verificar_firmas
+from importacion.puntos_control import PuntosControl
+import traceback
+
+importacion_bp = Blueprint('importacion', __name__)
+
+
+def _entero_positivo(valor, por_defecto, nombre):
+    if valor in (None, ''):
+        return por_defecto
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        numero = 0
+    if numero < 1:
+        raise ValueError(f"'{nombre}' debe ser un entero positivo")
+    return numero
+
+
+@importacion_bp.route('/api/importar/facturas', methods=['POST'])
+def importar_facturas_route():
+    """
+    Importa un fichero de facturas (CSV o Excel) enviado como multipart en el campo 'fichero'.
+    Opcionales (campos del formulario): 'plataforma' (perfil de importación de
+    importacion.perfiles.PERFILES; 'Otra' por defecto), 'tamano_bloque', 'tamano_lote' y
+    'reanudar' ('false' para empezar de cero aunque el fichero tenga una importación
+    interrumpida; por defecto se reanuda desde su último lote confirmado).
+
+    La respuesta es un flujo NDJSON: una línea JSON con el progreso tras cada lote escrito
+    (ver importacion.pipeline.importar_facturas) y una última con 'completado': true. Si la
+    importación falla a mitad, la última línea lleva 'error' y 'details'; los lotes ya
+    escritos se conservan y quedan registrados en el punto de control de la importación.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+    fichero = request.files.get('fichero')
+    if fichero is None or not fichero.filename:
+        return jsonify({"error": "Falta el fichero a importar (campo 'fichero')"}), 400
+    try:
+        tamano_bloque = _entero_positivo(request.form.get('tamano_bloque'), TAMANO_BLOQUE_IMPORTACION, 'tamano_bloque')
+        tamano_lote = _entero_positivo(request.form.get('tamano_lote'), TAMANO_LOTE_IMPORTACION, 'tamano_lote')
+        extension_admitida(fichero.filename)
+        perfil = obtener_perfil(request.form.get('plataforma'))
+    except ValueError as e:
+        return jsonify({"error": "Parámetros de importación no válidos", "details": str(e)}), 400
+    nombre = fichero.filename
+    reanudar = request.form.get('reanudar', 'true').strip().lower() not in ('false', '0', 'no')
+
+    # Werkzeug cierra el fichero subido al terminar la vista, antes de que se recorra la
+    # respuesta: se copia a un temporal propio (en disco a partir de 8 MB).
+    copia = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    fichero.save(copia)
+    copia.seek(0)
+
+    def progreso():
+        try:
+            for estado in importar_facturas(repositorio, copia, nombre, perfil,
+                                            on_conflict=CLAVE_IMPORTACION_FACTURAS,
+                                            tamano_bloque=tamano_bloque, tamano_lote=tamano_lote,
+                                            puntos_control=PuntosControl(repositorio, TABLA_IMPORTACIONES)
+                                            if reanudar else None, resumen=resumen_mensual):
+                yield json.dumps(estado) + '\n'
+        except ErrorConsulta as e:
+            yield json.dumps({"error": "Error al escribir las facturas importadas", "details": str(e)}) + '\n'
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"error": "Error al leer el fichero de facturas", "details": str(e)}) + '\n'
+        finally:
+            copia.close()
+
+    return Response(stream_with_context(progreso()), mimetype='application/x-ndjson')
+
+
+@importacion_bp.route('/api/importar/historico', methods=['POST'])
+def importar_historico_route():
+    """
+    Importa un fichero del histórico de estados (CSV o Excel, campo 'fichero') al almacén
+    del histórico (HISTORICO_ESTADOS_RUTA). Opcionales: 'plataforma' (se asigna a todos
+    los eventos, p. ej. 'FACe' o 'RCF') y 'tamano_bloque'.
+
+    La respuesta es un flujo NDJSON con el progreso tras cada bloque (ver
+    importacion.historico.importar_historico) y una última línea con 'completado': true o
+    con 'error' y 'details'.
+    """
+    if almacen_historico is None:
+        return jsonify({"error": "Servicio no disponible: No hay almacén del histórico de estados "
+                                 "(HISTORICO_ESTADOS_RUTA)"}), 503
+    fichero = request.files.get('fichero')
+    if fichero is None or not fichero.filename:
+        return jsonify({"error": "Falta el fichero a importar (campo 'fichero')"}), 400
+    try:
+        tamano_bloque = _entero_positivo(request.form.get('tamano_bloque'), TAMANO_BLOQUE_IMPORTACION, 'tamano_bloque')
+        extension_admitida(fichero.filename)
+    except ValueError as e:
+        return jsonify({"error": "Parámetros de importación no válidos", "details": str(e)}), 400
+    nombre = fichero.filename
+    plataforma = (request.form.get('plataforma') or '').strip() or None
+
+    copia = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    fichero.save(copia)
+    copia.seek(0)
+
+    def progreso():
+        try:
+            for estado in importar_historico(almacen_historico, copia, nombre, plataforma, tamano_bloque=tamano_bloque):
+                yield json.dumps(estado) + '\n'
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"error": "Error al importar el histórico de estados", "details": str(e)}) + '\n'
+        finally:
+            copia.close()
+
+    return Response(stream_with_context(progreso()), mimetype='application/x-ndjson')
+
+
+@importacion_bp.route('/api/importar/facturae', methods=['POST'])
+def importar_facturae_route():
+    """
+    Importa documentos Facturae enviados como multipart en el campo 'fichero': un documento
+    .xml/.xsig o un ZIP con muchos. Cada documento se valida y su resumen se guarda en
+    TABLA_DOCUMENTOS_FACTURAE; sus facturas se escriben en 'facturas' como electrónicas.
+    Opcionales: 'plataforma' (se asigna a todas las facturas), 'tamano_lote' y
+    'verificar_firma' ('false' para no verificar las firmas).
+
+    La respuesta es un flujo NDJSON con el progreso tras cada lote, primero de la importación
+    ("etapa": "importacion", ver importacion.facturae.importar_facturae) y después de la
+    verificación de firmas ("etapa": "firma", ver importacion.firma.verificar_firmas; se
+    omite con un 'aviso' si faltan sus dependencias). La última línea de cada etapa lleva
+    'completado': true, o 'error' y 'details'. Las carpetas del servidor se importan con
+    'python -m importacion.facturae' y 'python -m importacion.firma'.
+    """
+    if not repositorio:
+        return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+    fichero = request.files.get('fichero')
+    if fichero is None or not fichero.filename:
+        return jsonify({"error": "Falta el fichero a importar (campo 'fichero')"}), 400
+    extension = os.path.splitext(fichero.filename)[1].lower()
+    if extension not in (*EXTENSIONES_FACTURAE, '.zip'):
+        return jsonify({"error": "Parámetros de importación no válidos",
+                        "details": f"Formato de fichero no admitido: '{extension}' (se admiten .xml, .xsig y .zip)"}), 400
+    try:
+        tamano_lote = _entero_positivo(request.form.get('tamano_lote'), TAMANO_LOTE_IMPORTACION, 'tamano_lote')
+    except ValueError as e:
+        return jsonify({"error": "Parámetros de importación no válidos", "details": str(e)}), 400
+    plataforma = (request.form.get('plataforma') or '').strip() or None
+    verificar = request.form.get('verificar_firma', 'true').strip().lower() not in ('false', '0', 'no')
+
+    # Los procesos del pool abren el fichero por su ruta: se copia, con su nombre (que queda
+    # en el resumen de cada documento), a una carpeta temporal.
+    carpeta = tempfile.mkdtemp(prefix='facturae-')
+    ruta = os.path.join(carpeta, secure_filename(fichero.filename) or f'facturae{extension}')
+    fichero.save(ruta)
+
+    def progreso():
+        try:
+            for estado in importar_facturae(repositorio, [ruta], tabla_documentos=TABLA_DOCUMENTOS_FACTURAE,
+                                            on_conflict=CLAVE_IMPORTACION_FACTURAS, plataforma=plataforma,
+                                            procesos=PROCESOS_FACTURAE, ruta_xsd=FACTURAE_XSD,
+                                            tamano_lote=tamano_lote, resumen=resumen_mensual):
+                yield json.dumps(dict(estado, etapa="importacion")) + '\n'
+            if not verificar:
+                return
+            faltan = requisitos_firma()
+            if faltan:
+                yield json.dumps({"etapa": "firma", "completado": True,
+                                  "aviso": f"Firmas sin verificar: faltan los paquetes {', '.join(faltan)}"}) + '\n'
+                return
+            for estado in verificar_firmas(repositorio, [ruta], tabla=TABLA_FIRMAS_FACTURAE,
+                                           procesos=PROCESOS_FACTURAE, ruta_confianza=FIRMA_ALMACEN_CONFIANZA,
+                                           tamano_lote=tamano_lote):
+                yield json.dumps(dict(estado, etapa="firma")) + '\n'
+        except ErrorConsulta as e:
+            yield json.dumps({"error": "Error al escribir los documentos Facturae", "details": str(e)}) + '\n'
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"error": "Error al importar los documentos Facturae", "details": str(e)}) + '\n'
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    return Response(stream_with_context(progreso()), mimetype='application/x-ndjson')
@@ -1,50 +1,86 @@
 # routes/main_routes.py
 
 from flask import Blueprint, jsonify, request
-from config import supabase
+from config import repositorio, TAMANO_PAGINA_FACTURAS, TTL_ESTIMACION_TOTAL
+from datos.paginacion import codificar_cursor, decodificar_cursor, CursorInvalido, ErrorConsulta
 import traceback
 
 main_bp = Blueprint('main', __name__)
 
+# Orden estable del listado: la fecha se desempata por id.
+ORDEN_FACTURAS = ('fecha_factura', 'id')
+
 @main_bp.route('/')
 def home():
     """Ruta básica para verificar que la app funciona."""
-    if supabase:
-        return jsonify({"status": "OK", "message": "API Auditoría Facturas - Funcionando y conectada a Supabase."})
+    if repositorio:
+        return jsonify({"status": "OK", "message": f"API Auditoría Facturas - Funcionando y conectada a {repositorio.nombre}."})
     else:
         return jsonify({"status": "ERROR", "message": "API Auditoría Facturas - Funcionando pero SIN conexión a Supabase."}), 503
 
 @main_bp.route('/api/facturas', methods=['GET'])
 def get_facturas():
     """
-    Endpoint para obtener una lista de facturas.
-    Se pueden agregar filtros mediante parámetros en la URL.
+    Endpoint para obtener una lista de facturas, de la más reciente a la más antigua
+    (por fecha_factura y, a igualdad de fecha, por id).
+
+    Admite dos modos de paginación:
+    - Por cursor: ?after=<cursor>&per_page=N. Un 'after' vacío pide la primera página y
+      la respuesta incluye 'next_cursor' para la siguiente (null en la última). El coste
+      de cada página es el mismo sea cual sea su profundidad.
+    - Por número de página: ?page=N&per_page=N (el coste crece con el offset).
+
+    Con ?count=estimated se añade 'total_estimado', una estimación cacheada del total
+    de facturas en lugar de un recuento completo.
     """
-    if not supabase:
+    if not repositorio:
         return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
 
     try:
-        page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
+        extra = {}
+        if request.args.get('count') == 'estimated':
+            extra["total_estimado"] = repositorio.contar_estimado('facturas', TTL_ESTIMACION_TOTAL)
+
+        if 'after' in request.args:
+            # Limitado al tamaño de página del servidor: así una página incompleta
+            # significa siempre que no quedan más facturas.
+            per_page = max(1, min(per_page, TAMANO_PAGINA_FACTURAS))
+            after = request.args.get('after')
+            try:
+                cursor = decodificar_cursor(after, len(ORDEN_FACTURAS)) if after else None
+            except CursorInvalido as e:
+                return jsonify({"error": str(e)}), 400
+
+            filas = repositorio.leer_pagina('facturas', '*', orden=ORDEN_FACTURAS, cursor=cursor,
+                                            tamano_pagina=per_page, descendente=True)
+            next_cursor = None
+            if len(filas) == per_page:
+                next_cursor = codificar_cursor(filas[-1].get(c) for c in ORDEN_FACTURAS)
+            return jsonify({
+                "data": filas,
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                **extra
+            }), 200
+
+        page = int(request.args.get('page', 1))
         offset = (page - 1) * per_page
 
-        response = supabase.table('facturas')\
-            .select('*')\
-            .order('fecha_factura', desc=True)\
-            .range(offset, offset + per_page - 1)\
-            .execute()
+        filas = repositorio.consultar('facturas', '*', orden=ORDEN_FACTURAS, descendente=True,
+                                      rango=(offset, offset + per_page - 1))
 
-        if response.data:
+        if filas:
             return jsonify({
-                "data": response.data,
+                "data": filas,
                 "page": page,
                 "per_page": per_page,
+                **extra
             }), 200
-        else:
-            if hasattr(response, 'error') and response.error:
-                return jsonify({"error": "Error al obtener facturas", "details": str(response.error)}), 500
-            return jsonify({"data": [], "message": "No se encontraron facturas"}), 200
+        return jsonify({"data": [], "message": "No se encontraron facturas", **extra}), 200
 
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al obtener facturas", "details": str(e)}), 500
     except Exception as e:
         print(f"Error en /api/facturas: {e}")
         traceback.print_exc()
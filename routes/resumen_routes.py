@@ -0,0 +1,122 @@
+# routes/resumen_routes.py
+
+from flask import Blueprint, jsonify, request
+from config import resumen_mensual, TAMANO_PAGINA_FACTURAS
+from datos.historico import MES_SIN_FECHA
+from datos.paginacion import ErrorConsulta
+from analisis.resumen import DIMENSIONES
+from analisis.ranking import RankingProveedores, K_POR_DEFECTO, K_MAXIMO
+import re
+import traceback
+
+resumen_bp = Blueprint('resumen', __name__)
+
+_MES = re.compile(r'\d{4}-\d{2}')
+_BOOLEANOS = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def _sin_conexion():
+    return jsonify({"error": "Servicio no disponible: Sin conexión con la base de datos"}), 503
+
+
+def _filtros_comunes():
+    """
+    Parámetros ?desde=, ?hasta= y ?es_electronica= validados: ((desde, hasta, es_electronica), None)
+    o (None, respuesta de error).
+    """
+    desde, hasta = request.args.get('desde'), request.args.get('hasta')
+    for nombre, mes in (('desde', desde), ('hasta', hasta)):
+        if mes and not _MES.fullmatch(mes):
+            return None, (jsonify({"error": f"Formato de '{nombre}' inválido. Usar YYYY-MM"}), 400)
+    es_electronica = request.args.get('es_electronica')
+    if es_electronica is not None:
+        if es_electronica.strip().lower() not in _BOOLEANOS:
+            return None, (jsonify({"error": "'es_electronica' debe ser true o false"}), 400)
+        es_electronica = _BOOLEANOS[es_electronica.strip().lower()]
+    return (desde, hasta, es_electronica), None
+
+
+@resumen_bp.route('/api/resumen/mensual', methods=['GET'])
+def consultar_resumen_mensual():
+    """
+    Corte del resumen mensual de las facturas (analisis.resumen): número de facturas,
+    importe total y tiempo medio de anotación agregados por las dimensiones de
+    ?dimensiones= (separadas por comas, de mes, estado, es_electronica y proveedor_nif;
+    'mes' por defecto y vacío para el total). Filtros opcionales: ?desde= y ?hasta=
+    (AAAA-MM, incluidos), ?estado=, ?es_electronica= (true/false) y ?proveedor_nif=.
+    Sólo se leen celdas del resumen, nunca facturas.
+    """
+    if resumen_mensual is None:
+        return _sin_conexion()
+    dimensiones = [d.strip() for d in request.args.get('dimensiones', 'mes').split(',') if d.strip()]
+    filtros, error = _filtros_comunes()
+    if error:
+        return error
+    desde, hasta, es_electronica = filtros
+    try:
+        return jsonify(resumen_mensual.consultar(dimensiones, desde, hasta, estado=request.args.get('estado'),
+                                                 es_electronica=es_electronica,
+                                                 proveedor_nif=request.args.get('proveedor_nif'))), 200
+    except ValueError as e:
+        return jsonify({"error": str(e), "dimensiones_admitidas": list(DIMENSIONES)}), 400
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al consultar el resumen mensual", "details": str(e)}), 500
+
+
+@resumen_bp.route('/api/ranking/proveedores', methods=['GET'])
+def ranking_proveedores():
+    """
+    Los ?k= proveedores (10 por defecto) con más facturas y con más importe, con su
+    porcentaje sobre el total filtrado. Filtros opcionales: ?desde= y ?hasta= (AAAA-MM,
+    incluidos, por la fecha de la factura), ?estado= (uno o varios separados por comas) y
+    ?es_electronica= (true/false). Se calcula sobre el resumen mensual, ya agrupado por
+    proveedor, sin leer facturas.
+    """
+    if resumen_mensual is None:
+        return _sin_conexion()
+    filtros, error = _filtros_comunes()
+    if error:
+        return error
+    desde, hasta, es_electronica = filtros
+    try:
+        k = int(request.args.get('k', K_POR_DEFECTO))
+    except ValueError:
+        return jsonify({"error": "'k' debe ser un número entero"}), 400
+    if not 1 <= k <= K_MAXIMO:
+        return jsonify({"error": f"'k' debe estar entre 1 y {K_MAXIMO}"}), 400
+    estados = [e.strip() for e in request.args.get('estado', '').split(',') if e.strip()]
+
+    ranking = RankingProveedores(k, desde, hasta, estados, es_electronica)
+    try:
+        if resumen_mensual.repositorio.existe_tabla(resumen_mensual.tabla):
+            for c in resumen_mensual.repositorio.iterar(resumen_mensual.tabla, ', '.join(ranking.COLUMNAS),
+                                                        filtros=ranking.filtros(), orden=('clave',),
+                                                        tamano_pagina=TAMANO_PAGINA_FACTURAS):
+                ranking.procesar(c)
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al consultar el resumen mensual", "details": str(e)}), 500
+    return jsonify(ranking.resultado()), 200
+
+
+@resumen_bp.route('/api/resumen/mensual/actualizar', methods=['POST'])
+def actualizar_resumen_mensual():
+    """
+    Recalcula el resumen mensual de los meses de {"meses": ["AAAA-MM", ...]} (o "sin_fecha"
+    para las facturas sin fecha) a partir de sus facturas o, sin 'meses', lo reconstruye entero. Las importaciones ya recalculan los
+    meses que escriben; esto sirve para la carga inicial y para cambios hechos fuera de la API.
+    """
+    if resumen_mensual is None:
+        return _sin_conexion()
+    data = request.get_json(silent=True) or {}
+    meses = data.get('meses') if isinstance(data, dict) else None
+    if meses is not None and (not isinstance(meses, list) or not all(
+            isinstance(m, str) and (_MES.fullmatch(m) or m == MES_SIN_FECHA) for m in meses)):
+        return jsonify({"error": f"'meses' debe ser una lista de meses AAAA-MM o '{MES_SIN_FECHA}'"}), 400
+    try:
+        resultado = resumen_mensual.reconstruir() if meses is None else resumen_mensual.actualizar(meses)
+    except ErrorConsulta as e:
+        return jsonify({"error": "Error al actualizar el resumen mensual", "details": str(e)}), 500
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": "Error interno al actualizar el resumen mensual", "details": str(e)}), 500
+    return jsonify(resultado), 200
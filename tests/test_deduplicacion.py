@@ -0,0 +1,31 @@
+# tests/test_deduplicacion.py
+
+import io
+from datos.local import RepositorioLocal
+from importacion.pipeline import importar_facturas
+
+CLAVE = 'proveedor_nif,numero_factura,fecha_factura'
+COLUMNAS = 'proveedor_nif, numero_factura, fecha_factura, total_factura'
+
+
+def _importar(repositorio, contenido):
+    *_, progreso = importar_facturas(repositorio, io.BytesIO(contenido.encode()), 'facturas.csv')
+    return progreso
+
+
+def test_clave_guardada_sin_normalizar(tmp_path):
+    # Factura guardada con el NIF sin normalizar: la importación la reconoce por la clave
+    # canónica y escribe sobre ella, sin añadir otra fila.
+    repositorio = RepositorioLocal(str(tmp_path / 'datos.sqlite'))
+    repositorio.upsert('facturas', [{'id': 1, 'proveedor_nif': 'b-12345674', 'numero_factura': 'F1',
+                                     'fecha_factura': '2024-03-01', 'total_factura': 10.0}], on_conflict=CLAVE)
+
+    progreso = _importar(repositorio, 'proveedor_nif;numero_factura;fecha_factura;total_factura\n'
+                                      'B12345674;F1;01/03/2024;10,00\n')
+    assert (progreso['filas_nuevas'], progreso['filas_actualizadas'], progreso['filas_omitidas']) == (0, 0, 1)
+
+    progreso = _importar(repositorio, 'proveedor_nif;numero_factura;fecha_factura;total_factura\n'
+                                      'B12345674;F1;01/03/2024;12,00\n')
+    assert (progreso['filas_nuevas'], progreso['filas_actualizadas'], progreso['filas_omitidas']) == (0, 1, 0)
+    assert repositorio.consultar('facturas', COLUMNAS) == [
+        {'proveedor_nif': 'b-12345674', 'numero_factura': 'F1', 'fecha_factura': '2024-03-01', 'total_factura': 12.0}]
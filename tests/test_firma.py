@@ -0,0 +1,152 @@
+# tests/test_firma.py
+
+import base64
+import datetime
+import pytest
+
+pytest.importorskip('cryptography')
+pytest.importorskip('lxml')
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from lxml import etree
+from importacion.firma import (AlmacenConfianza, NS_DS, NS_XADES, _comprobar_cobertura, construir_cadena,
+                               verificar_firma)
+
+AHORA = datetime.datetime.now(datetime.timezone.utc)
+
+
+def _nombre(texto):
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, texto)])
+
+
+def _certificado(sujeto, clave, emisor=None, clave_emisor=None, ca=False, path_length=None, key_cert_sign=None):
+    """Certificado de 'sujeto' con la clave pública de 'clave', firmado por 'clave_emisor' (o autofirmado)."""
+    constructor = (x509.CertificateBuilder()
+                   .subject_name(_nombre(sujeto))
+                   .issuer_name(_nombre(emisor or sujeto))
+                   .public_key(clave.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(AHORA - datetime.timedelta(days=1))
+                   .not_valid_after(AHORA + datetime.timedelta(days=365))
+                   .add_extension(x509.BasicConstraints(ca=ca, path_length=path_length if ca else None),
+                                  critical=True))
+    if key_cert_sign is not None:
+        constructor = constructor.add_extension(x509.KeyUsage(
+            digital_signature=not key_cert_sign, content_commitment=False, key_encipherment=False,
+            data_encipherment=False, key_agreement=False, key_cert_sign=key_cert_sign, crl_sign=key_cert_sign,
+            encipher_only=False, decipher_only=False), critical=True)
+    return constructor.sign(clave_emisor or clave, hashes.SHA256())
+
+
+@pytest.fixture(scope='module')
+def ca():
+    clave = ec.generate_private_key(ec.SECP256R1())
+    return clave, _certificado('CA raíz', clave, ca=True, key_cert_sign=True)
+
+
+def _almacen(*certificados):
+    almacen = AlmacenConfianza()
+    for certificado in certificados:
+        almacen.anadir(certificado)
+    return almacen
+
+
+def test_cadena_hasta_el_almacen(ca):
+    clave_ca, certificado_ca = ca
+    clave = ec.generate_private_key(ec.SECP256R1())
+    firmante = _certificado('Proveedor', clave, 'CA raíz', clave_ca)
+    cadena, error = construir_cadena(firmante, [], _almacen(certificado_ca))
+    assert error is None
+    assert cadena == [firmante, certificado_ca]
+
+
+def test_entidad_final_no_puede_emitir(ca):
+    # CA -> E (ca=False) -> F firmado con la clave de E y un sujeto cualquiera.
+    clave_ca, certificado_ca = ca
+    clave_e = ec.generate_private_key(ec.SECP256R1())
+    e = _certificado('Entidad final', clave_e, 'CA raíz', clave_ca)
+    f = _certificado('Otro NIF', ec.generate_private_key(ec.SECP256R1()), 'Entidad final', clave_e)
+    cadena, error = construir_cadena(f, [e], _almacen(certificado_ca))
+    assert error is not None
+    assert cadena == [f]
+
+
+def test_intermedia_sin_key_cert_sign(ca):
+    clave_ca, certificado_ca = ca
+    clave_i = ec.generate_private_key(ec.SECP256R1())
+    intermedia = _certificado('Intermedia', clave_i, 'CA raíz', clave_ca, ca=True, key_cert_sign=False)
+    firmante = _certificado('Proveedor', ec.generate_private_key(ec.SECP256R1()), 'Intermedia', clave_i)
+    _, error = construir_cadena(firmante, [intermedia], _almacen(certificado_ca))
+    assert error is not None
+
+
+def test_longitud_de_ruta():
+    clave_raiz = ec.generate_private_key(ec.SECP256R1())
+    raiz = _certificado('Raíz', clave_raiz, ca=True, path_length=0, key_cert_sign=True)
+    clave_i = ec.generate_private_key(ec.SECP256R1())
+    intermedia = _certificado('Intermedia', clave_i, 'Raíz', clave_raiz, ca=True, key_cert_sign=True)
+    firmante = _certificado('Proveedor', ec.generate_private_key(ec.SECP256R1()), 'Intermedia', clave_i)
+    # pathLen=0 en la raíz: puede emitir la intermedia, pero no una cadena con una intermedia debajo.
+    _, error = construir_cadena(intermedia, [], _almacen(raiz))
+    assert error is None
+    _, error = construir_cadena(firmante, [intermedia], _almacen(raiz))
+    assert error is not None
+
+
+def _firma(*referencias):
+    """Documento con una ds:Signature enveloped y las referencias (URI, transformaciones) indicadas."""
+    raiz = etree.Element('Facturae', Id='Documento')
+    firma = etree.SubElement(raiz, f'{{{NS_DS}}}Signature')
+    info = etree.SubElement(firma, f'{{{NS_DS}}}SignedInfo')
+    objeto = etree.SubElement(firma, f'{{{NS_DS}}}Object')
+    etree.SubElement(objeto, f'{{{NS_XADES[0]}}}SignedProperties', Id='Propiedades')
+    for uri, transformaciones in referencias:
+        referencia = etree.SubElement(info, f'{{{NS_DS}}}Reference', URI=uri)
+        contenedor = etree.SubElement(referencia, f'{{{NS_DS}}}Transforms')
+        for transformacion in transformaciones:
+            etree.SubElement(contenedor, f'{{{NS_DS}}}Transform', Algorithm=transformacion)
+    por_id = {e.get('Id'): e for e in raiz.iter() if e.get('Id')}
+    return info.findall(f'{{{NS_DS}}}Reference'), raiz, por_id
+
+
+ENVELOPED = ('http://www.w3.org/2000/09/xmldsig#enveloped-signature',)
+
+
+@pytest.mark.parametrize('referencias, cubre', [
+    ([('', ENVELOPED), ('#Propiedades', ())], True),
+    ([('#Documento', ENVELOPED), ('#Propiedades', ())], True),
+    ([('#Propiedades', ())], False),
+    ([('', ()), ('#Propiedades', ())], False),
+    ([('', ENVELOPED)], False),
+])
+def test_cobertura_de_las_referencias(referencias, cubre):
+    assert (_comprobar_cobertura(*_firma(*referencias)) is None) == cubre
+
+
+def _documento(digest, certificado, valor='AAAA'):
+    return f"""<Facturae xmlns:ds="{NS_DS}" xmlns:xades="{NS_XADES[0]}"><Invoice/>
+<ds:Signature><ds:SignedInfo>
+<ds:CanonicalizationMethod Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/>
+<ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"/>
+<ds:Reference URI=""><ds:Transforms><ds:Transform Algorithm="{ENVELOPED[0]}"/></ds:Transforms>
+<ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256"/><ds:DigestValue>{digest}</ds:DigestValue>
+</ds:Reference></ds:SignedInfo><ds:SignatureValue>{valor}</ds:SignatureValue>
+<ds:KeyInfo><ds:X509Data><ds:X509Certificate>{certificado}</ds:X509Certificate></ds:X509Data></ds:KeyInfo>
+</ds:Signature></Facturae>""".encode()
+
+
+@pytest.mark.parametrize('digest, certificado, valor', [
+    ('abc', None, 'AAAA'),
+    ('AAAA', 'Zm9', 'AAAA'),
+    ('AAAA', None, 'Zm9'),
+])
+def test_base64_no_valido(ca, digest, certificado, valor):
+    # Un valor en base64 mal formado invalida la firma en lugar de lanzar una excepción.
+    if certificado is None:
+        certificado = base64.b64encode(ca[1].public_bytes(serialization.Encoding.DER)).decode()
+    resultado = verificar_firma(_documento(digest, certificado, valor), AlmacenConfianza())
+    assert resultado['firmado'] and not resultado['firma_valida']
+    assert resultado['errores']
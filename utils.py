@@ -1,10 +1,75 @@
 # utils.py
 
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from datetime import datetime
+import numpy as np
+import pandas as pd
 
-def calcular_diferencia_dias_habiles(fecha_inicio, fecha_fin):
+# Ordinal (date.toordinal) del 1970-01-01, origen de los datetime64[D] de NumPy.
+_ORDINAL_EPOCH = 719163
+
+
+def _dias_laborables_antes(ordinal):
+    """Número de días de lunes a viernes con ordinal en [1, ordinal). El ordinal 1 (0001-01-01) es lunes."""
+    semanas, resto = divmod(ordinal - 1, 7)
+    return 5 * semanas + min(resto, 5)
+
+
+def _dias_laborables_antes_array(dias):
+    """Como _dias_laborables_antes, para días desde 1970-01-01 (un jueves) en un array de enteros."""
+    desplazados = dias + 3  # el lunes anterior al 1970-01-01 pasa a ser el día 0
+    return 5 * (desplazados // 7) + np.minimum(desplazados % 7, 5)
+
+
+class CalendarioFestivos:
+    """
+    Calendario de festivos combinable: nacionales, de la comunidad autónoma y locales.
+
+    Las fechas se guardan una sola vez como un array ordenado y sin repetidos, y sólo las
+    que caen de lunes a viernes (las de fin de semana ya no son días hábiles), de modo
+    que contar los festivos de un intervalo son dos búsquedas binarias.
+    """
+
+    def __init__(self, nacional=(), autonomico=(), local=()):
+        fechas = [*nacional, *autonomico, *local]
+        dias = np.unique(_dias_epoch(fechas)) if fechas else np.zeros(0, dtype=np.int64)
+        dias = dias[dias != np.iinfo(np.int64).min]
+        self.dias = dias[_dias_laborables_antes_array(dias + 1) > _dias_laborables_antes_array(dias)]
+        self._ordinales = (self.dias + _ORDINAL_EPOCH).tolist()
+
+    def combinar(self, otro):
+        """Calendario con los festivos de ambos (p. ej. el autonómico y el de un municipio)."""
+        combinado = CalendarioFestivos()
+        combinado.dias = np.union1d(self.dias, otro.dias)
+        combinado._ordinales = (combinado.dias + _ORDINAL_EPOCH).tolist()
+        return combinado
+
+    def festivos_entre(self, ordinal_inicio, ordinal_fin):
+        """Festivos laborables con ordinal en [ordinal_inicio, ordinal_fin)."""
+        return bisect_left(self._ordinales, ordinal_fin) - bisect_left(self._ordinales, ordinal_inicio)
+
+    def festivos_entre_array(self, inicios, fines):
+        """Versión vectorizada de festivos_entre, con días desde 1970-01-01."""
+        return np.searchsorted(self.dias, fines) - np.searchsorted(self.dias, inicios)
+
+
+def _dias_epoch(valores):
+    """
+    Días desde 1970-01-01 (int64) de una secuencia de fechas: date, datetime, datetime64
+    o texto ISO (se usa el día escrito, sin convertir zonas horarias). Los valores vacíos
+    o no válidos quedan como NaT, es decir, el mínimo de int64.
+    """
+    if isinstance(valores, (np.ndarray, pd.Series)) and np.issubdtype(valores.dtype, np.datetime64):
+        return np.asarray(valores).astype('datetime64[D]').astype(np.int64)
+    serie = pd.Series(list(valores), dtype=object).astype(str).str[:10]
+    dias = pd.to_datetime(serie, format='%Y-%m-%d', errors='coerce').to_numpy().astype('datetime64[D]')
+    return dias.astype(np.int64)
+
+
+def calcular_diferencia_dias_habiles(fecha_inicio, fecha_fin, calendario=None):
     """
     Calcula la diferencia en días hábiles (Lunes a Viernes) entre dos fechas.
+    Cuenta ambos extremos y descuenta los festivos del calendario, si se indica.
     """
     if not fecha_inicio or not fecha_fin:
         return None
@@ -14,10 +79,32 @@ def calcular_diferencia_dias_habiles(fecha_inicio, fecha_fin):
     if isinstance(fecha_fin, datetime):
         fecha_fin = fecha_fin.date()
 
-    dias_habiles = 0
-    current_date = fecha_inicio
-    while current_date <= fecha_fin:
-        if current_date.weekday() < 5:  # 0=Lunes, 4=Viernes
-            dias_habiles += 1
-        current_date += timedelta(days=1)
+    inicio = fecha_inicio.toordinal()
+    fin = fecha_fin.toordinal() + 1
+    if fin <= inicio:
+        return 0
+    dias_habiles = _dias_laborables_antes(fin) - _dias_laborables_antes(inicio)
+    if calendario is not None:
+        dias_habiles -= calendario.festivos_entre(inicio, fin)
     return dias_habiles
+
+
+def calcular_diferencias_dias_habiles(fechas_inicio, fechas_fin, calendario=None):
+    """
+    Versión vectorizada de calcular_diferencia_dias_habiles (al estilo de numpy.busday_count)
+    para dos secuencias de fechas de la misma longitud. Devuelve un array float64 con
+    NaN donde falta alguna de las dos fechas.
+    """
+    inicios = _dias_epoch(fechas_inicio)
+    fines = _dias_epoch(fechas_fin) + 1
+    nat = np.iinfo(np.int64).min
+    faltan = (inicios == nat) | (fines == nat + 1)
+    inicios = np.where(faltan, 0, inicios)
+    fines = np.where(faltan, 0, np.maximum(fines, inicios))
+
+    dias_habiles = _dias_laborables_antes_array(fines) - _dias_laborables_antes_array(inicios)
+    if calendario is not None:
+        dias_habiles -= calendario.festivos_entre_array(inicios, fines)
+    resultado = dias_habiles.astype(np.float64)
+    resultado[faltan] = np.nan
+    return resultado